@@ -0,0 +1,164 @@
+"""Benchmark the checkpointer on a simulated orchestrator run.
+
+Runs an orchestrator-shaped graph, delegating to a tool and reading its output
+at every other super-step, once with message lists stored in full and once with
+message deltas, and reports the bytes written and the write and read latency
+per step.
+
+    uv run python scripts/benchmark_checkpointer.py --steps 200
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Annotated
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, ToolMessage
+from langgraph.graph import END, START, StateGraph, add_messages
+
+from common.components.checkpointer import SqliteCheckpointer
+
+# ruff: noqa: D101 D103 T201
+
+
+@dataclass(kw_only=True)
+class State:
+    # the channels of orchestrator.state.State, without importing the agents
+    messages: Annotated[list[AnyMessage], add_messages]
+    summary: str = ""
+    error: str = ""
+
+
+TOOL_OUTPUT = "def handler(request):\n    return process(request.payload)\n"
+
+
+def build_graph(checkpointer: SqliteCheckpointer, steps: int):
+    async def orchestrator(state: State) -> dict:
+        turn = len(state.messages) // 2
+        call = {
+            "name": "coder_new_pr",
+            "args": {"task": f"Implement task {turn} of the plan"},
+            "id": str(uuid.uuid4()),
+        }
+        return {
+            "messages": [
+                AIMessage(content=f"Delegating task {turn}.", tool_calls=[call])
+            ]
+        }
+
+    async def tools(state: State) -> dict:
+        call = state.messages[-1].tool_calls[0]
+        turn = len(state.messages) // 2
+        # every fifth delegation returns a large output, such as a file or a diff
+        output = TOOL_OUTPUT * (400 if turn % 5 == 0 else 4)
+        return {
+            "messages": [
+                ToolMessage(content=f"{turn}\n{output}", tool_call_id=call["id"])
+            ]
+        }
+
+    builder = StateGraph(State)
+    builder.add_node(orchestrator)
+    builder.add_node(tools)
+    builder.add_edge(START, "orchestrator")
+    builder.add_conditional_edges(
+        "orchestrator",
+        lambda state: "tools" if len(state.messages) < steps else END,
+    )
+    builder.add_edge("tools", "orchestrator")
+    return builder.compile(checkpointer=checkpointer)
+
+
+def percentile(samples: list[float], q: float) -> float:
+    return sorted(samples)[min(len(samples) - 1, int(q / 100 * len(samples)))]
+
+
+async def run(steps: int, message_deltas: bool, directory: Path) -> dict:
+    path = directory / f"{'delta' if message_deltas else 'full'}.db"
+    checkpointer = SqliteCheckpointer(path, message_deltas=message_deltas)
+    if not message_deltas:
+        # no compression either, like the LangGraph savers
+        checkpointer.compress_threshold = 2**62
+
+    write_latencies = []
+    put = checkpointer.put
+
+    def timed_put(*args, **kwargs):
+        start = time.perf_counter()
+        result = put(*args, **kwargs)
+        write_latencies.append(time.perf_counter() - start)
+        return result
+
+    checkpointer.put = timed_put
+    graph = build_graph(checkpointer, steps)
+    config = {"configurable": {"thread_id": "benchmark"}, "recursion_limit": steps + 10}
+    await graph.ainvoke(
+        State(messages=[HumanMessage(content="Build the project")]), config
+    )
+
+    read_latencies = []
+    for checkpoint in list(checkpointer.list(config)):
+        # a fresh checkpointer, without the cached references
+        reader = SqliteCheckpointer(path, message_deltas=message_deltas)
+        start = time.perf_counter()
+        reader.get_tuple(checkpoint.config)
+        read_latencies.append(time.perf_counter() - start)
+        reader.close()
+    checkpointer.close()
+
+    return {
+        "mode": "delta" if message_deltas else "full",
+        "steps": len(write_latencies),
+        "bytes_written": checkpointer.stats.bytes_written,
+        "file_bytes": sum(p.stat().st_size for p in directory.glob(f"{path.name}*")),
+        "bytes_per_step": checkpointer.stats.bytes_written / len(write_latencies),
+        "write_ms_mean": 1e3 * statistics.mean(write_latencies),
+        "write_ms_p95": 1e3 * percentile(write_latencies, 95),
+        "read_ms_mean": 1e3 * statistics.mean(read_latencies),
+        "read_ms_p95": 1e3 * percentile(read_latencies, 95),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--steps", type=int, default=200, help="Super-steps of the run."
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="Print the results as JSON."
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = [
+            await run(args.steps, message_deltas, Path(directory))
+            for message_deltas in (False, True)
+        ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    columns = list(results[0])
+    print(" | ".join(f"{c:>14}" for c in columns))
+    for result in results:
+        print(
+            " | ".join(
+                f"{v:>14.2f}" if isinstance(v, float) else f"{v:>14}"
+                for v in result.values()
+            )
+        )
+    full, delta = results
+    print(
+        f"\nBytes written: {full['bytes_written'] / delta['bytes_written']:.1f}x less "
+        "with message deltas"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
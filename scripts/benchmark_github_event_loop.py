@@ -0,0 +1,137 @@
+"""Measure how much GitHub tool calls block the event loop.
+
+Runs concurrent `get_pull_request_diff` calls against a local stand-in of the
+GitHub API, slowed down to a realistic latency, once the way the tools used to
+call GitHub, with PyGithub and `requests` in their `_arun`, and once with the
+async client. A ticker task measures how late the event loop runs it, which is
+the latency every other run sharing the loop would see.
+
+    uv run python scripts/benchmark_github_event_loop.py --calls 50 --latency 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Awaitable, Callable
+
+import requests
+from github import Auth, Github
+
+from common.components.github_client import AsyncGithubApi, GithubClientConfiguration
+from common.components.github_server import GithubStandInServer
+
+# ruff: noqa: D103 T201
+
+TICK_SECONDS = 0.01
+
+
+def blocking_diff(server: GithubStandInServer) -> Callable[[int], Awaitable[str]]:
+    """Return a diff getter working as the tool used to, blocking the loop during the requests."""
+    github = Github(base_url=server.url, auth=Auth.Token("token"))
+    repository = github.get_repo(server.repository, lazy=True)
+
+    async def diff(pr_number: int) -> str:
+        pull_request = repository.get_pull(pr_number)
+        response = requests.get(
+            pull_request.diff_url, headers={"Accept": "application/vnd.github.v3.diff"}
+        )
+        response.raise_for_status()
+        return response.text
+
+    return diff
+
+
+async def run(
+    mode: str, server: GithubStandInServer, calls: int, concurrency: int
+) -> dict:
+    if mode == "blocking":
+        diff = blocking_diff(server)
+    else:
+        api = AsyncGithubApi(
+            server.repository,
+            token=lambda: "token",
+            config=GithubClientConfiguration(
+                base_url=server.url, max_concurrency=concurrency
+            ),
+        )
+        diff = api.get_pull_request_diff
+        # create the client and its connections outside of the measure
+        await diff(1)
+    connections = server.connections
+
+    lags: list[float] = []
+
+    async def ticker():
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(TICK_SECONDS)
+            lags.append(time.perf_counter() - start - TICK_SECONDS)
+
+    ticking = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(diff(1) for _ in range(calls)))
+    duration = time.perf_counter() - start
+    ticking.cancel()
+    if mode == "async":
+        await api.aclose()
+
+    lags = lags or [duration]
+    return {
+        "mode": mode,
+        "seconds": round(duration, 2),
+        "lag_p50_ms": round(statistics.median(lags) * 1000, 1),
+        "lag_max_ms": round(max(lags) * 1000, 1),
+        "ticks": len(lags),
+        "connections": server.connections - connections,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=50, help="Concurrent calls.")
+    parser.add_argument(
+        "--latency", type=float, default=0.1, help="Seconds per GitHub request."
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=10, help="Requests in flight at once."
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="Print the results as JSON."
+    )
+    args = parser.parse_args()
+
+    results = []
+    for mode in ("blocking", "async"):
+        with GithubStandInServer(
+            files={"app.py": "print('hello')\n"}, latency=args.latency
+        ) as server:
+            server.branches["feature"] = {"app.py": "print('hello world')\n"}
+            server.pulls[1] = {
+                "number": 1,
+                "title": "Greet the world",
+                "body": "",
+                "state": "open",
+                "head": {"ref": "feature"},
+                "base": {"ref": "main"},
+            }
+            results.append(await run(mode, server, args.calls, args.concurrency))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    columns = list(results[0])
+    print(" | ".join(f"{c:>11}" for c in columns))
+    for result in results:
+        print(" | ".join(f"{v:>11}" for v in result.values()))
+    blocking, non_blocking = results
+    print(
+        f"\nMaximum event loop lag: {blocking['lag_max_ms'] / max(non_blocking['lag_max_ms'], 0.1):.0f}x "
+        f"lower, calls done {blocking['seconds'] / non_blocking['seconds']:.1f}x faster "
+        "with the async client"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
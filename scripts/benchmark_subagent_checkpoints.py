@@ -0,0 +1,158 @@
+"""Measure the checkpoint writes saved by ephemeral sub-agents.
+
+Runs the orchestrator through every sub-agent, stubbed, with a scripted
+orchestrator model and mocked GitHub, once with the sub-agents checkpointed
+under the orchestrator's thread and once with ephemeral sub-agents, and
+reports the checkpoints and bytes written by each run.
+
+    uv run python scripts/benchmark_subagent_checkpoints.py --tasks 5
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import tempfile
+import uuid
+from pathlib import Path
+from typing import Any, List
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# ruff: noqa: D101 D102 D103 E402 T201
+
+# the orchestrator module compiles a graph on import
+os.environ.setdefault("GOOGLE_API_KEY", "unused")
+os.environ.setdefault("AI_NEXUS_MOCKS", "1")
+
+from common.components.checkpointer import SqliteCheckpointer
+from orchestrator.configuration import Configuration, SubAgentConfig
+from orchestrator.graph import OrchestratorGraph
+from orchestrator.state import State
+
+# the module, shadowed by the compiled graph exported by the package
+orchestrator_module = importlib.import_module("orchestrator.graph")
+
+SUB_AGENTS = (
+    "requirements_agent",
+    "architect_agent",
+    "task_manager_agent",
+    "coder_new_pr_agent",
+    "coder_change_request_agent",
+    "tester_agent",
+    "reviewer_agent",
+)
+
+
+class ScriptedOrchestrator(BaseChatModel):
+    """Delegates to every sub-agent, then a coder, tester and reviewer per task, then summarizes."""
+
+    tasks: int
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Any, **kwargs: Any):
+        return self
+
+    def _script(self) -> list[str]:
+        per_task = ["coder_new_pr", "tester", "code_reviewer", "coder_change_request"]
+        return ["requirements", "architect", "task_manager"] + per_task * self.tasks
+
+    def _generate(
+        self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs
+    ) -> ChatResult:
+        script = self._script()
+        turn = sum(isinstance(m, AIMessage) for m in messages)
+        if turn < len(script):
+            name, args = script[turn], {"content": f"Step {turn} of the plan."}
+        else:
+            name, args = "summarize", {"summary": "The project is done."}
+        call = {"name": name, "args": args, "id": str(uuid.uuid4())}
+        message = AIMessage(content="", tool_calls=[call])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+async def run(tasks: int, ephemeral: bool, directory: Path) -> dict:
+    checkpointer = SqliteCheckpointer(
+        directory / f"{'ephemeral' if ephemeral else 'nested'}.db"
+    )
+    sub_agents = {
+        field: SubAgentConfig(use_stub=True, ephemeral=ephemeral)
+        for field in SUB_AGENTS
+    }
+    # keep the stub messages of each sub-agent
+    defaults = Configuration()
+    for field, sub_agent in sub_agents.items():
+        sub_agent.stub_messages = getattr(defaults, field).stub_messages
+    orchestrator_module.create_chat_model = lambda *args, **kwargs: (
+        ScriptedOrchestrator(tasks=tasks)
+    )
+    graph = OrchestratorGraph(
+        agent_config=Configuration(use_mocks=True, **sub_agents),
+        checkpointer=checkpointer,
+    )
+    config = graph.create_runnable_config(
+        {"configurable": {"thread_id": "benchmark"}, "recursion_limit": 200}
+    )
+    result = await graph.compiled_graph.ainvoke(
+        State(messages=[HumanMessage(content="Build the project")]), config
+    )
+    assert result["summary"], "the orchestrator did not finish"
+
+    (namespaces,) = checkpointer.conn.execute(
+        "SELECT COUNT(DISTINCT checkpoint_ns) FROM checkpoints"
+    ).fetchone()
+    checkpointer.close()
+    return {
+        "mode": "ephemeral" if ephemeral else "nested",
+        "delegations": sum(
+            1 for m in result["messages"] if m.type == "tool" and m.name != "summarize"
+        ),
+        "checkpoints": checkpointer.stats.checkpoints,
+        "namespaces": namespaces,
+        "bytes_written": checkpointer.stats.bytes_written,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--tasks", type=int, default=5, help="Tasks coded, tested and reviewed."
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="Print the results as JSON."
+    )
+    args = parser.parse_args()
+
+    original = orchestrator_module.create_chat_model
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            results = [
+                await run(args.tasks, ephemeral, Path(directory))
+                for ephemeral in (False, True)
+            ]
+    finally:
+        orchestrator_module.create_chat_model = original
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    columns = list(results[0])
+    print(" | ".join(f"{c:>14}" for c in columns))
+    for result in results:
+        print(" | ".join(f"{v:>14}" for v in result.values()))
+    nested, ephemeral = results
+    print(
+        f"\nCheckpoints written: {nested['checkpoints'] / ephemeral['checkpoints']:.1f}x "
+        f"fewer, bytes written: {nested['bytes_written'] / ephemeral['bytes_written']:.1f}x "
+        "less with ephemeral sub-agents"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
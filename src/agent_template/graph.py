@@ -2,7 +2,6 @@
 
 from typing import Any, Callable, Coroutine, Dict, Optional
 
-from langchain.chat_models import init_chat_model
 from langchain_core.language_models import LanguageModelInput
 from langchain_core.messages import BaseMessage, SystemMessage
 from langchain_core.runnables import Runnable, RunnableConfig
@@ -14,6 +13,7 @@ from langgraph.types import Checkpointer
 from agent_template.configuration import Configuration
 from agent_template.prompts import SYSTEM_PROMPT
 from agent_template.state import State
+from common.chat_model import create_chat_model
 from common.components.memory import MemoryConfiguration
 from common.graph import AgentGraph
 from common.logging import get_logger
@@ -101,7 +101,7 @@ class AgentTemplateGraph(AgentGraph):
             all_tools += self._memory.get_tools()
 
         # Init model
-        llm = init_chat_model(self._agent_config.model)
+        llm = create_chat_model(self._agent_config)
 
         # Bind tools to the LLM if there are any
         if all_tools:
@@ -3,7 +3,6 @@
 from datetime import datetime
 from typing import Awaitable, Callable, Optional
 
-from langchain.chat_models import init_chat_model
 from langchain_core.language_models import LanguageModelInput
 from langchain_core.messages import (
     BaseMessage,
@@ -21,6 +20,8 @@ from architect.configuration import Configuration
 from architect.state import State
 from common import utils
 from common.chain import prechain, skip_on_summary_and_tool_errors
+from common.chat_model import create_chat_model
+from common.components.compaction import add_compaction_node
 from common.graph import AgentGraph
 from common.logging import get_logger
 
@@ -132,7 +133,7 @@ class ArchitectGraph(AgentGraph):
             common.tools.read_file,
         ]
 
-        llm = init_chat_model(self._agent_config.model).bind_tools(all_tools)
+        llm = create_chat_model(self._agent_config).bind_tools(all_tools)
         tool_node = ToolNode(all_tools, name="tools")
         call_model = _create_call_model(self._agent_config, llm)
 
@@ -140,9 +141,12 @@ class ArchitectGraph(AgentGraph):
         builder.add_node(call_model)
         builder.add_node(tool_node.name, tool_node)
 
-        builder.add_edge(START, call_model.__name__)
+        entry = add_compaction_node(
+            builder, self._agent_config.compaction, target=call_model.__name__
+        )
+        builder.add_edge(START, entry)
         builder.add_conditional_edges(call_model.__name__, tools_condition)
-        builder.add_edge(tool_node.name, call_model.__name__)
+        builder.add_edge(tool_node.name, entry)
 
         return builder
 
@@ -3,7 +3,7 @@
 from dataclasses import dataclass
 from typing import List, Optional
 
-from langchain.chat_models import init_chat_model
+from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import SystemMessage
 from langchain_core.tools import Tool
 from langgraph.graph import StateGraph
@@ -14,6 +14,11 @@ from langgraph.types import Checkpointer
 import common.tools
 from code_reviewer.prompts import LOCAL_REVIEW_PROMPT, PR_REVIEW_PROMPT, SYSTEM_PROMPT
 from code_reviewer.state import State
+from common.chat_model import ChatModelFactory, create_chat_model, lazy_chat_model
+from common.components.compaction import (
+    CompactionConfiguration,
+    add_compaction_node,
+)
 from common.configuration import AgentConfiguration
 from common.graph import AgentGraph
 from common.logging import get_logger
@@ -32,9 +37,14 @@ class CodeReviewerInstanceConfig:
     github_tools_filter: List[str]
     other_tools: List[Tool]
 
-    def graph_builder(self, github_toolset: list[Tool], model: str):
+    def graph_builder(
+        self,
+        github_toolset: list[Tool],
+        model: str | BaseChatModel | ChatModelFactory,
+        compaction: Optional[CompactionConfiguration] = None,
+    ):
         tools = self.other_tools + self.filter_github_tools(github_toolset)
-        builder = _graph_builder(tools, self.system_prompt, model)
+        builder = _graph_builder(tools, self.system_prompt, model, compaction)
         builder.name = self.name
         return builder
 
@@ -92,8 +102,10 @@ def github_code_reviewer_config():
         github_tools_filter=[
             "get_files_from_a_directory",
             "read_file",
-            "get_pull_request",
-            "get_pull_request_diff",
+            "read_files",
+            "get_pr_context",
+            "list_diff_files",
+            "get_file_diff",
             "create_pull_request_review",
         ],
         other_tools=[],
@@ -136,17 +148,25 @@ class CodeReviewerGraph(AgentGraph):
             if self._agent_config
             else "google_genai:gemini-2.0-flash"
         )
-        return self._config.graph_builder(self._github_tools, model)
+        return self._config.graph_builder(
+            self._github_tools,
+            lambda: create_chat_model(self._agent_config, model),
+            self._agent_config.compaction,
+        )
 
 
 class CallModel:
-    def __init__(self, github_tools: list[Tool], system_prompt: str, model: str):
+    def __init__(
+        self,
+        github_tools: list[Tool],
+        system_prompt: str,
+        model: str | BaseChatModel | ChatModelFactory,
+    ):
         self.github_tools = github_tools
         self.system_prompt = system_prompt
-        self.model = model
+        self.get_llm = lazy_chat_model(model)
 
     async def __call__(self, state: State) -> dict:
-        llm = init_chat_model(self.model)
         project_path = state.project.path if state.project else "Unknown"
 
         system_prompt = self.system_prompt.format(
@@ -155,13 +175,18 @@ class CallModel:
 
         system_msg = SystemMessage(system_prompt)
         messages = [system_msg] + state.messages
-        messages_after_invoke = await llm.bind_tools(self.github_tools).ainvoke(
-            messages
+        messages_after_invoke = (
+            await self.get_llm().bind_tools(self.github_tools).ainvoke(messages)
         )
         return {"messages": messages_after_invoke, "project": state.project}
 
 
-def _graph_builder(github_toolset: list[Tool], system_prompt: str, model: str):
+def _graph_builder(
+    github_toolset: list[Tool],
+    system_prompt: str,
+    model: str | BaseChatModel | ChatModelFactory,
+    compaction: Optional[CompactionConfiguration] = None,
+):
     """Return code_reviewer graph builder."""
     builder = StateGraph(State)
 
@@ -170,9 +195,12 @@ def _graph_builder(github_toolset: list[Tool], system_prompt: str, model: str):
     builder.add_node("call_model", CallModel(github_toolset, system_prompt, model))
     builder.add_node("tools", tool_node)
 
-    builder.add_edge("__start__", "call_model")
+    entry = add_compaction_node(
+        builder, compaction or CompactionConfiguration(), target="call_model"
+    )
+    builder.add_edge("__start__", entry)
     builder.add_conditional_edges("call_model", tools_condition)
-    builder.add_edge("tools", "call_model")
+    builder.add_edge("tools", entry)
     return builder
 
 
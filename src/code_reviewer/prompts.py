@@ -17,8 +17,9 @@ SYSTEM_PROMPT = SYSTEM_PROMPT.replace("{{time}}", "{time}")
 # Prompt for PR reviews
 PR_REVIEW_PROMPT = """
 Your task is to review a pull request (PR) and provide feedback. You will receive a diff of the PR,
-which includes the changes made to the code. Using the GitHub tools, you should pull all the files
-from the PR, read them, and then consider the diff. When it makes sense, feedback should be given
+which includes the changes made to the code. Using the GitHub tools, you should fetch the context of the PR,
+its description, comments, reviews and checks, at once with `get_pr_context`, list the files
+changed by the PR, read them and the pages of their diff you need, and then consider the diff. When it makes sense, feedback should be given
 on the diff itself. You should also provide a summary of the feedback in the PR. The feedback
 should be constructive and helpful. Use GitHub Markdown for formatting in your response.
 """
@@ -3,11 +3,11 @@
 from dataclasses import dataclass
 from typing import List, Optional
 
-from langchain.chat_models import init_chat_model
+from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import SystemMessage
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import Tool
-from langgraph.graph import StateGraph
+from langgraph.graph import END, StateGraph
 from langgraph.prebuilt import ToolNode, tools_condition
 from langgraph.store.base import BaseStore
 from langgraph.types import Checkpointer
@@ -15,6 +15,11 @@ from langgraph.types import Checkpointer
 from coder.prompts import CHANGE_REQUEST_SYSTEM_PROMPT, NEW_PR_SYSTEM_PROMPT
 from coder.state import State
 from common.chain import prechain, skip_on_summary_and_tool_errors
+from common.chat_model import ChatModelFactory, create_chat_model, lazy_chat_model
+from common.components.compaction import (
+    CompactionConfiguration,
+    add_compaction_node,
+)
 from common.configuration import AgentConfiguration
 from common.graph import AgentGraph
 
@@ -29,9 +34,14 @@ class CoderInstanceConfig:
     system_prompt: str
     github_tools: List[str]
 
-    def graph_builder(self, github_toolset: list[Tool], model: str):
+    def graph_builder(
+        self,
+        github_toolset: list[Tool],
+        model: str | BaseChatModel | ChatModelFactory,
+        compaction: Optional[CompactionConfiguration] = None,
+    ):
         builder = _graph_builder(
-            self.filter_tools(github_toolset), self.system_prompt, model
+            self.filter_tools(github_toolset), self.system_prompt, model, compaction
         )
         builder.name = self.name
         return builder
@@ -69,7 +79,9 @@ def coder_new_pr_config():
             "create_file",
             "update_file",
             "read_file",
+            "read_files",
             "delete_file",
+            "commit_changes",
             "get_latest_pr_workflow_run",
         ],
     )
@@ -86,10 +98,10 @@ def coder_change_request_config():
             "create_file",
             "update_file",
             "read_file",
+            "read_files",
             "delete_file",
-            "get_pull_request",
-            "list_pull_requests_files",
-            "get_pull_request_head_branch",
+            "commit_changes",
+            "get_pr_context",
             "get_latest_pr_workflow_run",
         ],
     )
@@ -129,7 +141,11 @@ class CoderNewPRGraph(AgentGraph):
             if self._agent_config
             else "google_genai:gemini-2.0-flash"
         )
-        return coder_new_pr_config().graph_builder(self._github_tools, model)
+        return coder_new_pr_config().graph_builder(
+            self._github_tools,
+            lambda: create_chat_model(self._agent_config, model),
+            self._agent_config.compaction,
+        )
 
 
 class CoderChangeRequestGraph(AgentGraph):
@@ -166,27 +182,41 @@ class CoderChangeRequestGraph(AgentGraph):
             if self._agent_config
             else "google_genai:gemini-2.0-flash"
         )
-        return coder_change_request_config().graph_builder(self._github_tools, model)
+        return coder_change_request_config().graph_builder(
+            self._github_tools,
+            lambda: create_chat_model(self._agent_config, model),
+            self._agent_config.compaction,
+        )
+
 
+def _create_call_model(
+    github_tools: list[Tool],
+    system_prompt: str,
+    model: str | BaseChatModel | ChatModelFactory,
+):
+    get_llm = lazy_chat_model(model)
 
-def _create_call_model(github_tools: list[Tool], system_prompt: str, model: str):
     @prechain(skip_on_summary_and_tool_errors())
     async def call_model(
         state: State,
         config: RunnableConfig,
     ) -> dict:
-        llm = init_chat_model(model)
         system_msg = SystemMessage(content=system_prompt)
         messages = [system_msg] + state.messages
-        messages_after_invoke = await llm.bind_tools(github_tools).ainvoke(
-            messages, config=config
+        messages_after_invoke = (
+            await get_llm().bind_tools(github_tools).ainvoke(messages, config=config)
         )
         return {"messages": messages_after_invoke}
 
     return call_model
 
 
-def _graph_builder(github_toolset: list[Tool], system_prompt: str, model: str):
+def _graph_builder(
+    github_toolset: list[Tool],
+    system_prompt: str,
+    model: str | BaseChatModel | ChatModelFactory,
+    compaction: Optional[CompactionConfiguration] = None,
+):
     """Return coder graph builder."""
     builder = StateGraph(State)
 
@@ -197,10 +227,44 @@ def _graph_builder(github_toolset: list[Tool], system_prompt: str, model: str):
     )
     builder.add_node("tools", tool_node)
 
-    builder.add_edge("__start__", "call_model")
-    builder.add_conditional_edges("call_model", tools_condition)
-    builder.add_edge("tools", "call_model")
+    entry = add_compaction_node(
+        builder, compaction or CompactionConfiguration(), target="call_model"
+    )
+    builder.add_edge("__start__", entry)
+    commit_tool = next((t for t in github_toolset if t.name == "commit_changes"), None)
+    if commit_tool:
+        # the changes staged by the coder are committed when it finishes
+        builder.add_node("commit_changes", _create_commit_changes(commit_tool))
+        builder.add_conditional_edges(
+            "call_model", tools_condition, {"tools": "tools", END: "commit_changes"}
+        )
+        builder.add_edge("commit_changes", END)
+    else:
+        builder.add_conditional_edges("call_model", tools_condition)
+    builder.add_edge("tools", entry)
     return builder
 
 
+def _create_commit_changes(commit_tool: Tool):
+    async def commit_changes(state: State, config: RunnableConfig) -> dict:
+        if state.error:
+            # the coder stopped on tool errors, its work is not committed
+            return {}
+        final = state.messages[-1]
+        summary = final.text().strip().split("\n")[0]
+        result = await commit_tool.ainvoke(
+            {"message": summary[:72] or "Apply the coder changes"}, config
+        )
+        if result.startswith(("Committed", "No staged changes")):
+            return {}
+        # the final message is the result of the coder, so it stays last
+        return {
+            "messages": [
+                final.model_copy(update={"content": f"{final.text()}\n\n{result}"})
+            ]
+        }
+
+    return commit_changes
+
+
 __all__ = [CoderNewPRGraph.__name__, CoderChangeRequestGraph.__name__]
@@ -20,6 +20,7 @@ If you can't for some reason, explain what happened.
 CHANGE_REQUEST_SYSTEM_PROMPT = """You are a software developer whose task is to write code.
 You are linked to a GitHub repository. You will receive an instruction of a change that needs to be
 implemented on an existing pull request. You will be given the PR number and you need to work on the PR's head branch.
+Fetch the PR, its head branch, comments, reviews, changed files and checks at once with `get_pr_context`.
 From that instruction you will need to sync with the latest changes on the PR's head branch
 and then submit a pull request that satisfies the request.
 You should submit changes on the PR's head branch
@@ -0,0 +1,97 @@
+"""Create the chat models of agents."""
+
+from typing import Any, Callable, Optional
+
+from langchain.chat_models import init_chat_model
+from langchain_core.language_models import BaseChatModel
+
+from common.components.llm_cache import (
+    ReplayChatModel,
+    init_recorded_chat_model,
+    recorded,
+)
+from common.components.model_router import routed
+from common.components.rate_limiter import rate_limited
+from common.components.resilience import resilient
+from common.configuration import AgentConfiguration
+
+
+def _init_chat_model(
+    agent_config: AgentConfiguration, model: str, **kwargs: Any
+) -> BaseChatModel:
+    if agent_config.llm_cache.mode == "replay":
+        # replayed responses need no provider model, nor rate limiting and retries
+        return recorded(
+            ReplayChatModel(model_name=model), model, agent_config.llm_cache, kwargs
+        )
+    llm = init_chat_model(model, **kwargs)
+    if agent_config.rate_limiter.use_rate_limiter:
+        llm = rate_limited(llm, model, agent_config.rate_limiter)
+    if agent_config.model_calls.use_model_call_policy:
+        # outermost, so that retries and hedged requests are rate limited too
+        llm = resilient(llm, agent_config.model_calls)
+    # outermost, so that replayed responses skip rate limiting and retries
+    return recorded(llm, model, agent_config.llm_cache, kwargs)
+
+
+def create_chat_model(
+    agent_config: AgentConfiguration,
+    model: Optional[str] = None,
+    step: Optional[str] = None,
+    **kwargs: Any,
+) -> BaseChatModel:
+    """Initialize a chat model, wrapped with the model call components enabled in the agent configuration.
+
+    Args:
+        agent_config: The agent configuration.
+        model: The model to initialize. Defaults to the model of the agent configuration.
+        step: The step the model is used for (see `common.components.model_router`).
+            With model routing enabled, some steps are sent to a small model first.
+        **kwargs: Additional arguments passed to `init_chat_model`.
+
+    Returns:
+        The chat model.
+    """
+    model = model or agent_config.model
+    llm = _init_chat_model(agent_config, model, **kwargs)
+    routing = agent_config.routing
+    if routing.use_model_routing and routing.small_model != model:
+        small_llm = _init_chat_model(agent_config, routing.small_model, **kwargs)
+        llm = routed(llm, model, small_llm, routing, step)
+    return llm
+
+
+ChatModelFactory = Callable[[], BaseChatModel]
+
+
+def lazy_chat_model(
+    model: str | BaseChatModel | ChatModelFactory,
+) -> ChatModelFactory:
+    """Return a function initializing the chat model on its first call.
+
+    Graphs are built when their packages are imported: their nodes get the model
+    on their first call instead, so that importing an agent needs no credentials.
+
+    Args:
+        model: A model name, a chat model, or a function initializing it.
+
+    Returns:
+        The function returning the chat model, initialized once.
+    """
+    llm: Optional[BaseChatModel] = None
+
+    def get_llm() -> BaseChatModel:
+        nonlocal llm
+        if llm is None:
+            if isinstance(model, str):
+                llm = init_recorded_chat_model(model)
+            elif isinstance(model, BaseChatModel):
+                llm = model
+            else:
+                llm = model()
+        return llm
+
+    return get_llm
+
+
+__all__ = ["ChatModelFactory", "create_chat_model", "lazy_chat_model"]
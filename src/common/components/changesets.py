@@ -0,0 +1,94 @@
+"""Staged changesets of file writes.
+
+Every `create_file`, `update_file` and `delete_file` call used to be its own
+commit through the contents API: a change of 20 files made 20 sequential
+commits, triggered CI 20 times, and concurrent writes to a branch failed on
+stale shas. In staged mode, the writes are kept in a `Changeset` per branch
+instead, read back by the file tools, and committed together as a single
+commit through the Git Data API by `commit_changes`:
+
+1. the tree of the head of the branch is read, to check that the staged files
+   were not changed on the branch since they were read,
+2. a tree with the staged files is created on it, then a commit of the tree,
+3. the branch is moved to the commit if it is still at the head read, the
+   commit being made again on the new head otherwise.
+
+The coder graphs commit their staged changes when they finish, and creating a
+pull request commits the ones of its head branch first.
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+
+@dataclass(kw_only=True)
+class ChangesetConfiguration:
+    """Configuration for staging file writes in changesets."""
+
+    staged: bool = field(
+        default_factory=lambda: os.getenv("AI_NEXUS_GITHUB_CHANGESETS") is not None
+    )
+    """Stage the writes until `commit_changes`, instead of committing every write. Defaults to whether the `AI_NEXUS_GITHUB_CHANGESETS` environment variable is set."""
+    max_attempts: int = 3
+    """Attempts to move the branch to the commit, when the branch moves meanwhile."""
+
+
+@dataclass(kw_only=True)
+class StagedFile:
+    """A staged write of a file."""
+
+    content: Optional[str]
+    """The new content, None if the file is deleted."""
+    base_sha: Optional[str]
+    """The blob sha of the file the write was made on, None if the file was created."""
+
+
+@dataclass(kw_only=True)
+class Changeset:
+    """The staged writes of a branch."""
+
+    branch: str
+    files: dict[str, StagedFile] = field(default_factory=dict)
+
+    def stage(self, path: str, content: Optional[str], base_sha: Optional[str]):
+        """Stage a write, keeping the blob sha of the first write of the file."""
+        if path in self.files:
+            base_sha = self.files[path].base_sha
+        self.files[path] = StagedFile(content=content, base_sha=base_sha)
+
+    def conflicts(self, tree: dict[str, dict[str, Any]]) -> list[str]:
+        """Return the staged files changed in a tree since they were read.
+
+        Args:
+            tree: The files of the tree, by path, with their blob `sha`.
+        """
+        return [
+            path
+            for path, file in self.files.items()
+            if tree.get(path, {}).get("sha") != file.base_sha
+        ]
+
+    def tree_entries(self, tree: dict[str, dict[str, Any]]) -> list[dict[str, Any]]:
+        """Return the entries of the tree creating the staged files on a tree.
+
+        Args:
+            tree: The files of the base tree, by path, with their `mode`.
+        """
+        return [
+            {
+                "path": path,
+                "mode": tree.get(path, {}).get("mode", "100644"),
+                "type": "blob",
+                # a null sha deletes the file
+                **(
+                    {"content": file.content}
+                    if file.content is not None
+                    else {"sha": None}
+                ),
+            }
+            for path, file in self.files.items()
+        ]
+
+
+__all__ = ["Changeset", "ChangesetConfiguration", "StagedFile"]
@@ -0,0 +1,1062 @@
+"""SQLite checkpointer storing message lists as deltas.
+
+LangGraph checkpoints the value of every channel updated by a super-step. For
+the `messages` channel this is the whole conversation, so a persistent
+checkpointer writing the full list at every step grows quadratically with the
+length of the conversation.
+
+`SqliteCheckpointer` stores every message once, content-addressed by the hash
+of its serialized form, and checkpoints a message list as references: the
+references kept from an earlier version of the channel plus the new ones. A
+full list of references is written every `snapshot_interval` versions, so that
+reading a checkpoint resolves a bounded chain of deltas. Values larger than
+`compress_threshold` bytes, typically large tool outputs, are compressed.
+
+Other channels, checkpoints and pending writes are stored as with the
+LangGraph savers. The database only uses the standard library `sqlite3`, and
+the async methods run the queries in a worker thread.
+
+`prune` bounds the growth of long-lived threads: it keeps the last checkpoints
+of every thread and namespace, thins the older history past a TTL, then deletes
+the values, writes and messages no remaining checkpoint references, rewriting
+the deltas whose base was deleted as snapshots. `CheckpointRetention` runs it
+periodically in a background thread.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.types import TASKS, ChannelProtocol
+
+from common.logging import get_logger
+
+logger = get_logger(__name__)
+
+MESSAGE_REFS = "message_refs"
+"""Type of the blobs holding the references of a message list."""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    created_at REAL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB,
+    compressed INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    compressed INTEGER NOT NULL DEFAULT 0,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    hash TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    compressed INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+@dataclass(kw_only=True)
+class CheckpointerStats:
+    """Write metrics of a checkpointer."""
+
+    checkpoints: int = 0
+    bytes_written: int = 0
+    """Bytes of serialized values written, after compression."""
+    messages_written: int = 0
+    messages_deduplicated: int = 0
+    """Messages referenced by a checkpoint but already stored."""
+    bytes_saved_by_compression: int = 0
+
+
+@dataclass(kw_only=True)
+class CheckpointRetentionConfiguration:
+    """Configuration for pruning old checkpoints."""
+
+    use_retention: bool = True
+    """Whether old checkpoints are pruned in the background."""
+    keep_last: int = 50
+    """Checkpoints kept per thread and namespace, whatever their age. At least the latest is always kept."""
+    ttl_seconds: Optional[float] = 24 * 3600
+    """Older checkpoints are kept until this age. If None, they are deleted right away."""
+    keep_run_starts: bool = True
+    """Whether the checkpoints starting a run, on a new input, are kept whatever their age."""
+    interval_seconds: float = 600
+    """Seconds between two background prunings."""
+    vacuum: bool = False
+    """Whether the database file is vacuumed after pruning, returning the freed pages to the file system."""
+
+
+@dataclass(kw_only=True)
+class RetentionStats:
+    """Storage reclaimed by pruning."""
+
+    runs: int = 0
+    checkpoints_deleted: int = 0
+    writes_deleted: int = 0
+    blobs_deleted: int = 0
+    deltas_compacted: int = 0
+    """Message list deltas rewritten as snapshots, their base having been deleted."""
+    messages_deleted: int = 0
+    bytes_reclaimed: int = 0
+    """Bytes of serialized values deleted, minus the bytes of the compacted deltas."""
+    duration_seconds: float = 0.0
+
+    def add(self, other: "RetentionStats"):
+        """Add the stats of another pruning to these."""
+        for f in fields(self):
+            setattr(self, f.name, getattr(self, f.name) + getattr(other, f.name))
+
+
+def _is_message_list(value: Any) -> bool:
+    return (
+        isinstance(value, list)
+        and bool(value)
+        and all(isinstance(v, BaseMessage) for v in value)
+    )
+
+
+def _common_prefix(a: list[str], b: list[str]) -> int:
+    n = 0
+    for x, y in zip(a, b, strict=False):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+class SqliteCheckpointer(BaseCheckpointSaver[str]):
+    """A SQLite checkpointer storing messages once and message lists as deltas.
+
+    Examples:
+        checkpointer = SqliteCheckpointer("checkpoints.db")
+        graph = OrchestratorGraph(checkpointer=checkpointer, ...)
+    """
+
+    def __init__(
+        self,
+        path: str | Path = ":memory:",
+        *,
+        serde: Optional[SerializerProtocol] = None,
+        compress_threshold: int = 4_096,
+        snapshot_interval: int = 50,
+        message_deltas: bool = True,
+    ) -> None:
+        """Initialize the checkpointer.
+
+        Args:
+            path: The SQLite database file, created if missing. Defaults to an in-memory database.
+            serde: The serializer of the values.
+            compress_threshold: Values larger than this number of bytes are compressed.
+            snapshot_interval: A full list of message references is written every this number of versions.
+            message_deltas: Whether message lists are stored as references and deltas.
+                If False, they are stored in full like any other value.
+        """
+        super().__init__(serde=serde)
+        self.path = str(path)
+        self.compress_threshold = compress_threshold
+        self.snapshot_interval = snapshot_interval
+        self.message_deltas = message_deltas
+        self.stats = CheckpointerStats()
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        if self.path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        columns = {
+            row[1] for row in self.conn.execute("PRAGMA table_info(checkpoints)")
+        }
+        if "created_at" not in columns:
+            # databases created before retention, their checkpoints are treated as expired
+            self.conn.execute("ALTER TABLE checkpoints ADD COLUMN created_at REAL")
+        # (thread_id, checkpoint_ns, channel, version) -> (refs, delta depth)
+        self._refs: OrderedDict[tuple[str, str, str, str], tuple[list[str], int]] = (
+            OrderedDict()
+        )
+        # id of a message object -> (message, hash), the message kept alive so its id is not reused
+        self._message_refs: OrderedDict[int, tuple[BaseMessage, str]] = OrderedDict()
+        # the message refs of the transaction of `put`, cached once committed
+        self._pending_message_refs: list[tuple[BaseMessage, str]] = []
+        # (thread_id, checkpoint_ns, channel) -> version, the base of the next delta
+        self._latest: dict[tuple[str, str, str], str] = {}
+        self.retention: Optional[CheckpointRetention] = None
+        """The background pruning, if started by `create_checkpointer`."""
+
+    def close(self):
+        """Stop the background pruning, if any, and close the database connection."""
+        if self.retention:
+            self.retention.stop()
+        with self.lock:
+            self.conn.close()
+
+    # serialization
+
+    def _dumps(self, value: Any) -> tuple[str, bytes, int]:
+        type_, data = self.serde.dumps_typed(value)
+        return self._compress(type_, data)
+
+    def _compress(self, type_: str, data: bytes) -> tuple[str, bytes, int]:
+        if len(data) > self.compress_threshold:
+            compressed = zlib.compress(data)
+            if len(compressed) < len(data):
+                self.stats.bytes_saved_by_compression += len(data) - len(compressed)
+                return type_, compressed, 1
+        return type_, data, 0
+
+    def _loads(self, type_: str, data: bytes, compressed: int) -> Any:
+        return self.serde.loads_typed(
+            (type_, zlib.decompress(data) if compressed else data)
+        )
+
+    def _write(self, sql: str, params: Sequence[Any]):
+        self.stats.bytes_written += sum(len(p) for p in params if isinstance(p, bytes))
+        self.conn.execute(sql, params)
+
+    # message lists
+
+    def _cache_refs(self, key: tuple[str, str, str, str], refs: list[str], depth: int):
+        self._refs[key] = (refs, depth)
+        self._refs.move_to_end(key)
+        while len(self._refs) > 1_024:
+            self._refs.popitem(last=False)
+
+    def _put_messages(self, messages: list[BaseMessage]) -> list[str]:
+        refs = []
+        for message in messages:
+            # messages are carried over from step to step, skip serializing them again
+            cached = self._message_refs.get(id(message))
+            if cached and cached[0] is message:
+                refs.append(cached[1])
+                self.stats.messages_deduplicated += 1
+                continue
+            type_, data = self.serde.dumps_typed(message)
+            ref = hashlib.sha256(type_.encode() + data).hexdigest()
+            refs.append(ref)
+            if self.conn.execute(
+                "SELECT 1 FROM messages WHERE hash = ?", (ref,)
+            ).fetchone():
+                self.stats.messages_deduplicated += 1
+            else:
+                blob = self._compress(type_, data)
+                self.conn.execute(
+                    "INSERT INTO messages (hash, type, value, compressed) VALUES (?, ?, ?, ?)",
+                    (ref, *blob),
+                )
+                self.stats.messages_written += 1
+                self.stats.bytes_written += len(blob[1])
+            self._pending_message_refs.append((message, ref))
+        return refs
+
+    def _cache_message_refs(self):
+        for message, ref in self._pending_message_refs:
+            self._message_refs[id(message)] = (message, ref)
+        self._pending_message_refs.clear()
+        while len(self._message_refs) > 10_000:
+            self._message_refs.popitem(last=False)
+
+    def _put_message_list(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        channel: str,
+        version: str,
+        messages: list[BaseMessage],
+    ) -> bytes:
+        refs = self._put_messages(messages)
+        base_version = self._latest.get((thread_id, checkpoint_ns, channel))
+        base = self._refs.get((thread_id, checkpoint_ns, channel, base_version))
+        if base and base[1] + 1 < self.snapshot_interval:
+            keep = _common_prefix(base[0], refs)
+            delta = {"base": base_version, "keep": keep, "add": refs[keep:]}
+            depth = base[1] + 1
+        else:
+            delta = {"base": None, "keep": 0, "add": refs}
+            depth = 0
+        self._cache_refs((thread_id, checkpoint_ns, channel, version), refs, depth)
+        self._latest[(thread_id, checkpoint_ns, channel)] = version
+        return json.dumps(delta, separators=(",", ":")).encode()
+
+    def _resolve_refs(
+        self, thread_id: str, checkpoint_ns: str, channel: str, version: str
+    ) -> list[str]:
+        chain: list[dict[str, Any]] = []
+        refs: Optional[list[str]] = None
+        depth = 0
+        while version is not None:
+            if cached := self._refs.get((thread_id, checkpoint_ns, channel, version)):
+                refs, depth = list(cached[0]), cached[1]
+                break
+            row = self.conn.execute(
+                "SELECT value FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, version),
+            ).fetchone()
+            delta = json.loads(row[0])
+            chain.append({**delta, "version": version})
+            version = delta["base"]
+        refs = refs or []
+        for delta in reversed(chain):
+            refs = refs[: delta["keep"]] + delta["add"]
+            depth = 0 if delta["base"] is None else depth + 1
+            self._cache_refs(
+                (thread_id, checkpoint_ns, channel, delta["version"]), refs, depth
+            )
+        return refs
+
+    def _load_messages(self, refs: list[str]) -> list[BaseMessage]:
+        rows: dict[str, tuple[str, bytes, int]] = {}
+        unique = list(dict.fromkeys(refs))
+        for i in range(0, len(unique), 500):
+            batch = unique[i : i + 500]
+            for ref, type_, value, compressed in self.conn.execute(
+                f"SELECT hash, type, value, compressed FROM messages WHERE hash IN ({','.join('?' * len(batch))})",
+                batch,
+            ):
+                rows[ref] = (type_, value, compressed)
+        return [self._loads(*rows[ref]) for ref in refs]
+
+    # checkpoints
+
+    def _load_blobs(
+        self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions
+    ) -> dict[str, Any]:
+        channel_values: dict[str, Any] = {}
+        for channel, version in versions.items():
+            row = self.conn.execute(
+                "SELECT type, value, compressed FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            ).fetchone()
+            if row is None or row[0] == "empty":
+                continue
+            if row[0] == MESSAGE_REFS:
+                refs = self._resolve_refs(
+                    thread_id, checkpoint_ns, channel, str(version)
+                )
+                channel_values[channel] = self._load_messages(refs)
+            else:
+                channel_values[channel] = self._loads(*row)
+        return channel_values
+
+    def _load_writes(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_id: str
+    ) -> list[tuple[str, str, Any, str]]:
+        return [
+            (task_id, channel, self._loads(type_, value, compressed), task_path)
+            for task_id, channel, type_, value, compressed, task_path in self.conn.execute(
+                "SELECT task_id, channel, type, value, compressed, task_path FROM writes "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            )
+        ]
+
+    def _load_sends(
+        self, thread_id: str, checkpoint_ns: str, parent_checkpoint_id: Optional[str]
+    ) -> list[Any]:
+        if not parent_checkpoint_id:
+            return []
+        return [
+            self._loads(type_, value, compressed)
+            for type_, value, compressed in self.conn.execute(
+                "SELECT type, value, compressed FROM writes "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? AND channel = ? "
+                "ORDER BY task_path, task_id, idx",
+                (thread_id, checkpoint_ns, parent_checkpoint_id, TASKS),
+            )
+        ]
+
+    def _tuple(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        checkpoint_id: str,
+        parent_checkpoint_id: Optional[str],
+        type_: str,
+        checkpoint_b: bytes,
+        metadata: CheckpointMetadata,
+    ) -> CheckpointTuple:
+        checkpoint: Checkpoint = self.serde.loads_typed((type_, checkpoint_b))
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_blobs(
+                    thread_id, checkpoint_ns, checkpoint["channel_versions"]
+                ),
+                "pending_sends": self._load_sends(
+                    thread_id, checkpoint_ns, parent_checkpoint_id
+                ),
+            },
+            metadata=metadata,
+            pending_writes=[
+                (task_id, channel, value)
+                for task_id, channel, value, _ in self._load_writes(
+                    thread_id, checkpoint_ns, checkpoint_id
+                )
+            ],
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Get a checkpoint tuple, the latest of the thread unless the config has a checkpoint id.
+
+        Args:
+            config: The config to use for retrieving the checkpoint.
+
+        Returns:
+            The checkpoint tuple, or None if no matching checkpoint was found.
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        with self.lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self.conn.execute(
+                    "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self.conn.execute(
+                    "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            if row is None:
+                return None
+            *keys, type_, checkpoint_b, metadata_type, metadata_b = row
+            return self._tuple(
+                thread_id,
+                checkpoint_ns,
+                *keys,
+                type_,
+                checkpoint_b,
+                self.serde.loads_typed((metadata_type, metadata_b)),
+            )
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """List checkpoints, most recent first.
+
+        Args:
+            config: Base configuration for filtering checkpoints.
+            filter: Additional filtering criteria for metadata.
+            before: List checkpoints created before this configuration.
+            limit: Maximum number of checkpoints to return.
+
+        Yields:
+            The matching checkpoint tuples.
+        """
+        where, params = [], []
+        if config:
+            where.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (
+                checkpoint_ns := config["configurable"].get("checkpoint_ns")
+            ) is not None:
+                where.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                where.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_checkpoint_id := get_checkpoint_id(before)):
+            where.append("checkpoint_id < ?")
+            params.append(before_checkpoint_id)
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+            "FROM checkpoints"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + " ORDER BY checkpoint_id DESC"
+        )
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        for row in rows:
+            if limit is not None and limit <= 0:
+                break
+            *keys, type_, checkpoint_b, metadata_type, metadata_b = row
+            metadata = self.serde.loads_typed((metadata_type, metadata_b))
+            if filter and not all(metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            with self.lock:
+                checkpoint_tuple = self._tuple(*keys, type_, checkpoint_b, metadata)
+            yield checkpoint_tuple
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Save a checkpoint and the values of the channels updated since the previous one.
+
+        Args:
+            config: The config to associate with the checkpoint.
+            checkpoint: The checkpoint to save.
+            metadata: Additional metadata to save with the checkpoint.
+            new_versions: New versions as of this write.
+
+        Returns:
+            The updated config containing the saved checkpoint's id.
+        """
+        c = checkpoint.copy()
+        c.pop("pending_sends", None)  # type: ignore[misc]
+        values: dict[str, Any] = c.pop("channel_values")  # type: ignore[misc]
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        type_, checkpoint_b = self.serde.dumps_typed(c)
+        metadata_type, metadata_b = self.serde.dumps_typed(
+            get_checkpoint_metadata(config, metadata)
+        )
+
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                for channel, version in new_versions.items():
+                    version = str(version)
+                    if channel not in values:
+                        blob: tuple[str, bytes, int] = ("empty", b"", 0)
+                    elif self.message_deltas and _is_message_list(values[channel]):
+                        blob = (
+                            MESSAGE_REFS,
+                            self._put_message_list(
+                                thread_id,
+                                checkpoint_ns,
+                                channel,
+                                version,
+                                values[channel],
+                            ),
+                            0,
+                        )
+                    else:
+                        blob = self._dumps(values[channel])
+                    self._write(
+                        "INSERT OR REPLACE INTO blobs (thread_id, checkpoint_ns, channel, version, type, value, compressed) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (thread_id, checkpoint_ns, channel, version, *blob),
+                    )
+                self._write(
+                    "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        thread_id,
+                        checkpoint_ns,
+                        checkpoint["id"],
+                        config["configurable"].get("checkpoint_id"),
+                        type_,
+                        checkpoint_b,
+                        metadata_type,
+                        metadata_b,
+                        time.time(),
+                    ),
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                self._pending_message_refs.clear()
+                self._refs.clear()
+                self._latest.clear()
+                raise
+            self._cache_message_refs()
+            self.stats.checkpoints += 1
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Save the pending writes of a task.
+
+        Args:
+            config: The config of the checkpoint the writes belong to.
+            writes: The writes to save, each as a (channel, value) pair.
+            task_id: Identifier for the task creating the writes.
+            task_path: Path of the task creating the writes.
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                for idx, (channel, value) in enumerate(writes):
+                    write_idx = WRITES_IDX_MAP.get(channel, idx)
+                    # special writes are written once, regular writes are replaced
+                    verb = "INSERT OR IGNORE" if write_idx < 0 else "INSERT OR REPLACE"
+                    self._write(
+                        f"{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, compressed, task_path) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            thread_id,
+                            checkpoint_ns,
+                            checkpoint_id,
+                            task_id,
+                            write_idx,
+                            channel,
+                            *self._dumps(value),
+                            task_path,
+                        ),
+                    )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete the checkpoints and writes of a thread.
+
+        Messages are shared between threads and are left in the database,
+        until deleted by `prune`.
+
+        Args:
+            thread_id: The thread ID to delete.
+        """
+        with self.lock:
+            for table in ("checkpoints", "blobs", "writes"):
+                self.conn.execute(
+                    f"DELETE FROM {table} WHERE thread_id = ?", (str(thread_id),)
+                )
+            self._forget_thread(thread_id)
+
+    def _forget_thread(self, thread_id: str):
+        for cache in (self._refs, self._latest):
+            for key in [k for k in cache if k[0] == thread_id]:
+                del cache[key]
+
+    # retention
+
+    def prune(
+        self,
+        *,
+        keep_last: int = 50,
+        ttl_seconds: Optional[float] = None,
+        keep_run_starts: bool = True,
+        now: Optional[float] = None,
+    ) -> RetentionStats:
+        """Delete old checkpoints, and the values, writes and messages only they referenced.
+
+        A checkpoint is deleted when it is not among the `keep_last` latest of its
+        thread and namespace, is older than `ttl_seconds`, and, with
+        `keep_run_starts`, does not start a run. The latest checkpoint of every
+        thread is always kept, so interrupted runs can still be resumed.
+
+        Every thread is pruned in its own transaction, so checkpoints can be
+        written between two threads.
+
+        Args:
+            keep_last: Checkpoints kept per thread and namespace, whatever their age.
+            ttl_seconds: Older checkpoints are kept until this age. If None, they are deleted right away.
+            keep_run_starts: Whether the checkpoints starting a run are kept whatever their age.
+            now: The current time, as returned by `time.time()`.
+
+        Returns:
+            The storage reclaimed.
+        """
+        start = time.monotonic()
+        now = time.time() if now is None else now
+        stats = RetentionStats(runs=1)
+        with self.lock:
+            thread_ids = [
+                row[0]
+                for row in self.conn.execute(
+                    "SELECT DISTINCT thread_id FROM checkpoints"
+                )
+            ]
+        for thread_id in thread_ids:
+            with self.lock:
+                self._prune_thread(
+                    thread_id,
+                    max(1, keep_last),
+                    None if ttl_seconds is None else now - ttl_seconds,
+                    keep_run_starts,
+                    stats,
+                )
+        with self.lock:
+            self._prune_messages(stats)
+        stats.duration_seconds = time.monotonic() - start
+        return stats
+
+    def _prune_thread(
+        self,
+        thread_id: str,
+        keep_last: int,
+        expired_before: Optional[float],
+        keep_run_starts: bool,
+        stats: RetentionStats,
+    ):
+        by_ns: dict[str, list[tuple]] = defaultdict(list)
+        for row in self.conn.execute(
+            "SELECT checkpoint_ns, checkpoint_id, parent_checkpoint_id, created_at, metadata_type, metadata "
+            "FROM checkpoints WHERE thread_id = ? ORDER BY checkpoint_id DESC",
+            (thread_id,),
+        ):
+            by_ns[row[0]].append(row[1:])
+        deleted: list[tuple[str, str]] = []
+        kept_parents: set[tuple[str, str]] = set()
+        for checkpoint_ns, rows in by_ns.items():
+            for i, (checkpoint_id, parent_id, created_at, *metadata) in enumerate(rows):
+                if (
+                    i < keep_last
+                    or (
+                        expired_before is not None
+                        and (created_at or 0) >= expired_before
+                    )
+                    or (
+                        keep_run_starts
+                        and self.serde.loads_typed(tuple(metadata)).get("source")
+                        == "input"
+                    )
+                ):
+                    kept_parents.add((checkpoint_ns, parent_id))
+                else:
+                    deleted.append((checkpoint_ns, checkpoint_id))
+        if not deleted:
+            return
+
+        self.conn.execute("BEGIN")
+        try:
+            for checkpoint_ns, checkpoint_id in deleted:
+                key = (thread_id, checkpoint_ns, checkpoint_id)
+                stats.bytes_reclaimed += self.conn.execute(
+                    "SELECT LENGTH(checkpoint) + LENGTH(metadata) FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    key,
+                ).fetchone()[0]
+                self.conn.execute(
+                    "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    key,
+                )
+                # the sends of a kept checkpoint are the writes of its parent
+                where = (
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?"
+                )
+                params: tuple = key
+                if (checkpoint_ns, checkpoint_id) in kept_parents:
+                    where += " AND channel != ?"
+                    params = (*key, TASKS)
+                count, size = self.conn.execute(
+                    f"SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM writes {where}",
+                    params,
+                ).fetchone()
+                self.conn.execute(f"DELETE FROM writes {where}", params)
+                stats.checkpoints_deleted += 1
+                stats.writes_deleted += count
+                stats.bytes_reclaimed += size
+            self._prune_blobs(thread_id, stats)
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._forget_thread(thread_id)
+
+    def _prune_blobs(self, thread_id: str, stats: RetentionStats):
+        live: set[tuple[str, str, str]] = set()
+        for checkpoint_ns, type_, checkpoint_b in self.conn.execute(
+            "SELECT checkpoint_ns, type, checkpoint FROM checkpoints WHERE thread_id = ?",
+            (thread_id,),
+        ):
+            checkpoint = self.serde.loads_typed((type_, checkpoint_b))
+            live.update(
+                (checkpoint_ns, channel, str(version))
+                for channel, version in checkpoint["channel_versions"].items()
+            )
+        blobs = self.conn.execute(
+            "SELECT checkpoint_ns, channel, version, type, value FROM blobs WHERE thread_id = ?",
+            (thread_id,),
+        ).fetchall()
+
+        # deltas on a deleted base become snapshots, resolved before deleting anything
+        snapshots = {}
+        for checkpoint_ns, channel, version, type_, value in blobs:
+            if type_ != MESSAGE_REFS or (checkpoint_ns, channel, version) not in live:
+                continue
+            base = json.loads(value)["base"]
+            if base is not None and (checkpoint_ns, channel, base) not in live:
+                refs = self._resolve_refs(thread_id, checkpoint_ns, channel, version)
+                snapshots[(checkpoint_ns, channel, version)] = (value, refs)
+        for (checkpoint_ns, channel, version), (value, refs) in snapshots.items():
+            snapshot = json.dumps(
+                {"base": None, "keep": 0, "add": refs}, separators=(",", ":")
+            ).encode()
+            self._write(
+                "UPDATE blobs SET value = ? WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (snapshot, thread_id, checkpoint_ns, channel, version),
+            )
+            stats.deltas_compacted += 1
+            stats.bytes_reclaimed += len(value) - len(snapshot)
+
+        for checkpoint_ns, channel, version, _, value in blobs:
+            if (checkpoint_ns, channel, version) in live:
+                continue
+            self.conn.execute(
+                "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, version),
+            )
+            stats.blobs_deleted += 1
+            stats.bytes_reclaimed += len(value)
+
+    def _prune_messages(self, stats: RetentionStats):
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS live_messages (hash TEXT PRIMARY KEY)"
+            )
+            self.conn.execute("DELETE FROM live_messages")
+            for (value,) in self.conn.execute(
+                "SELECT value FROM blobs WHERE type = ?", (MESSAGE_REFS,)
+            ).fetchall():
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO live_messages (hash) VALUES (?)",
+                    [(ref,) for ref in json.loads(value)["add"]],
+                )
+            count, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM messages "
+                "WHERE hash NOT IN (SELECT hash FROM live_messages)"
+            ).fetchone()
+            self.conn.execute(
+                "DELETE FROM messages WHERE hash NOT IN (SELECT hash FROM live_messages)"
+            )
+            self.conn.execute("DELETE FROM live_messages")
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._message_refs.clear()
+        stats.messages_deleted += count
+        stats.bytes_reclaimed += size
+
+    def vacuum(self):
+        """Rebuild the database file, returning the pages freed by `prune` to the file system."""
+        with self.lock:
+            self.conn.execute("VACUUM")
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Get a checkpoint tuple, see `get_tuple`."""
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """List checkpoints, see `list`."""
+        tuples = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in tuples:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Save a checkpoint, see `put`."""
+        return await asyncio.to_thread(
+            self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Save the pending writes of a task, see `put_writes`."""
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Delete the checkpoints and writes of a thread, see `delete_thread`."""
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: ChannelProtocol) -> str:
+        """Return the next version of a channel, as a sortable string."""
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+
+class CheckpointRetention:
+    """Prunes the checkpoints of a `SqliteCheckpointer` periodically, in a background thread."""
+
+    def __init__(
+        self,
+        checkpointer: SqliteCheckpointer,
+        config: CheckpointRetentionConfiguration,
+    ):
+        """Initialize the pruning of the checkpointer, started by `start`."""
+        self.checkpointer = checkpointer
+        self.config = config
+        self.stats = RetentionStats()
+        """The storage reclaimed by all the prunings so far."""
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def collect(self) -> RetentionStats:
+        """Prune the checkpoints now.
+
+        Returns:
+            The storage reclaimed by this pruning.
+        """
+        stats = self.checkpointer.prune(
+            keep_last=self.config.keep_last,
+            ttl_seconds=self.config.ttl_seconds,
+            keep_run_starts=self.config.keep_run_starts,
+        )
+        if self.config.vacuum and stats.checkpoints_deleted:
+            self.checkpointer.vacuum()
+        self.stats.add(stats)
+        logger.info(
+            f"Pruned {stats.checkpoints_deleted} checkpoints and {stats.messages_deleted} messages, "
+            f"reclaiming {stats.bytes_reclaimed} bytes in {stats.duration_seconds:.2f}s"
+        )
+        return stats
+
+    def _run(self):
+        while not self._stopped.wait(self.config.interval_seconds):
+            try:
+                self.collect()
+            except Exception:
+                logger.exception("Pruning checkpoints failed")
+
+    def start(self):
+        """Start pruning in a background thread, every `interval_seconds`."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="checkpoint-retention", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background pruning, waiting for a pruning in progress."""
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+
+def create_checkpointer(
+    retention: Optional[CheckpointRetentionConfiguration] = None,
+) -> BaseCheckpointSaver:
+    """Return a `SqliteCheckpointer` on the `AI_NEXUS_CHECKPOINTS` database file if set, an `InMemorySaver` otherwise.
+
+    Args:
+        retention: The pruning of the `SqliteCheckpointer` in the background. Defaults to the default configuration.
+
+    Returns:
+        The checkpointer.
+    """
+    if path := os.getenv("AI_NEXUS_CHECKPOINTS"):
+        logger.info(f"Checkpointing to {path}")
+        checkpointer = SqliteCheckpointer(path)
+        retention = retention or CheckpointRetentionConfiguration()
+        if retention.use_retention:
+            checkpointer.retention = CheckpointRetention(checkpointer, retention)
+            checkpointer.retention.start()
+        return checkpointer
+    return InMemorySaver()
+
+
+__all__ = [
+    "CheckpointRetention",
+    "CheckpointRetentionConfiguration",
+    "CheckpointerStats",
+    "MESSAGE_REFS",
+    "RetentionStats",
+    "SqliteCheckpointer",
+    "create_checkpointer",
+]
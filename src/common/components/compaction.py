@@ -0,0 +1,289 @@
+"""Context window compaction for long agent threads.
+
+Agent graphs append every model reply, tool output and sub-agent summary to
+`messages`, and the whole list is re-sent to the model on every call. This
+module provides a compaction stage that keeps the conversation within a token
+budget: once the budget is exceeded, the oldest messages are folded into a
+rolling summary message and removed from the state.
+
+The most recent messages are always kept verbatim, and the split point is
+chosen so that an AI tool call is never separated from its tool results.
+"""
+
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, List, Optional
+
+from langchain_core.messages import (
+    AIMessage,
+    AnyMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+)
+from langchain_core.messages.utils import count_tokens_approximately
+from langgraph.graph import StateGraph
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+
+from common.components.llm_cache import init_recorded_chat_model
+from common.logging import get_logger
+
+logger = get_logger(__name__)
+
+SUMMARY_MESSAGE_ID = "compaction-summary"
+"""Id of the rolling summary message, so that it is replaced on every compaction."""
+
+COMPACTION_NODE_NAME = "compact"
+
+SUMMARIZE_PROMPT = """You are compacting the history of a conversation between an orchestrating agent, its team of sub-agents and a user.
+
+Write a concise summary of the conversation below, extending the previous summary if there is one.
+Keep every decision, requirement, project name, file path, branch name, PR number and error that may be needed later.
+Drop pleasantries, repeated content and verbose tool output.
+
+<previous_summary>
+{previous_summary}
+</previous_summary>
+
+<conversation>
+{conversation}
+</conversation>"""
+
+Summarizer = Callable[[str, List[AnyMessage]], Awaitable[str]]
+"""Async callable taking the previous summary and the messages to fold into it."""
+
+
+@dataclass(kw_only=True)
+class CompactionConfiguration:
+    """Configuration for context window compaction."""
+
+    use_compaction: bool = False
+    """Whether to add a compaction stage in front of the model calls."""
+    max_tokens: int = 64_000
+    """Token budget of the conversation. Compaction is triggered above it."""
+    target_tokens: int = 24_000
+    """Approximate token count of the verbatim messages kept after compaction."""
+    keep_last_messages: int = 6
+    """Minimum number of most recent messages that are never compacted."""
+    max_tool_output_chars: int = 400
+    """Characters kept from each tool output when building an extractive digest."""
+    summary_model: Optional[str] = None
+    """Model used to summarize the compacted messages. If unset, an extractive digest is built instead."""
+
+
+@dataclass(kw_only=True)
+class CompactionRecord:
+    """Outcome of a single compaction."""
+
+    tokens_before: int
+    tokens_after: int
+    tokens_saved: int
+    messages_compacted: int
+    timestamp: str
+
+
+def count_tokens(messages: List[AnyMessage]) -> int:
+    """Approximate the number of tokens of the given messages."""
+    return count_tokens_approximately(messages)
+
+
+def get_compaction_records(messages: List[AnyMessage]) -> List[CompactionRecord]:
+    """Return the records of all compactions applied to the given messages."""
+    if not messages or messages[0].id != SUMMARY_MESSAGE_ID:
+        return []
+    return [
+        CompactionRecord(**record)
+        for record in messages[0].response_metadata.get("compaction", [])
+    ]
+
+
+def _split_index(messages: List[AnyMessage], config: CompactionConfiguration) -> int:
+    """Return the index of the first message to keep verbatim."""
+    split = len(messages)
+    kept_tokens = 0
+    while split > 0:
+        tokens = count_tokens([messages[split - 1]])
+        kept = len(messages) - split
+        if kept >= config.keep_last_messages and (
+            kept_tokens + tokens > config.target_tokens
+        ):
+            break
+        kept_tokens += tokens
+        split -= 1
+    # the last message is kept, even over the target or with no messages to keep
+    split = min(split, max(len(messages) - 1, 0))
+
+    # tool results must stay after the AI message that requested them
+    forward = split
+    while forward < len(messages) and messages[forward].type == "tool":
+        forward += 1
+    if forward < len(messages):
+        return forward
+
+    while split > 0 and messages[split].type == "tool":
+        split -= 1
+    return split
+
+
+def _format_message(msg: AnyMessage, max_chars: Optional[int]) -> str:
+    content = msg.content if isinstance(msg.content, str) else str(msg.content)
+    if max_chars is not None and len(content) > max_chars:
+        content = f"{content[:max_chars]}... [{len(content) - max_chars} chars dropped]"
+
+    if msg.type == "tool":
+        return f"- tool `{msg.name}` ({msg.status}): {content}"
+    if isinstance(msg, AIMessage) and msg.tool_calls:
+        calls = ", ".join(tc["name"] for tc in msg.tool_calls)
+        return (
+            f"- ai: {content}\n  called: {calls}"
+            if content
+            else f"- ai called: {calls}"
+        )
+    return f"- {msg.type}: {content}"
+
+
+def build_digest(
+    previous_summary: str, messages: List[AnyMessage], max_tool_output_chars: int
+) -> str:
+    """Build an extractive digest of the given messages, appended to the previous summary.
+
+    The first human message, usually the task of the user, is kept verbatim.
+    """
+    lines = [previous_summary] if previous_summary else []
+    first_human = next((msg for msg in messages if msg.type == "human"), None)
+    for msg in messages:
+        if msg is first_human:
+            max_chars = None
+        elif msg.type == "tool":
+            max_chars = max_tool_output_chars
+        else:
+            max_chars = 4 * max_tool_output_chars
+        lines.append(_format_message(msg, max_chars))
+    return "\n".join(lines)
+
+
+def create_llm_summarizer(model: str) -> Summarizer:
+    """Create a summarizer that folds messages into the previous summary using a model."""
+    llm = init_recorded_chat_model(model)
+
+    async def summarize(previous_summary: str, messages: List[AnyMessage]) -> str:
+        conversation = "\n".join(_format_message(msg, 4_000) for msg in messages)
+        reply = await llm.ainvoke(
+            [
+                SystemMessage(
+                    content=SUMMARIZE_PROMPT.format(
+                        previous_summary=previous_summary or "None",
+                        conversation=conversation,
+                    )
+                )
+            ]
+        )
+        return reply.content
+
+    return summarize
+
+
+async def acompact_messages(
+    messages: List[AnyMessage],
+    config: CompactionConfiguration,
+    summarizer: Optional[Summarizer] = None,
+) -> Optional[dict[str, Any]]:
+    """Compact the messages if they exceed the configured token budget.
+
+    Args:
+        messages: The conversation messages, as stored in the graph state.
+        config: The compaction configuration.
+        summarizer: Optional summarizer. Defaults to an extractive digest.
+
+    Returns:
+        A state update replacing the messages with the rolling summary followed by
+        the most recent messages, or None if no compaction was needed.
+    """
+    tokens_before = count_tokens(messages)
+    if tokens_before <= config.max_tokens:
+        return None
+
+    previous_summary = ""
+    records = []
+    if messages and messages[0].id == SUMMARY_MESSAGE_ID:
+        previous_summary = messages[0].response_metadata.get("summary", "")
+        records = list(messages[0].response_metadata.get("compaction", []))
+        messages = messages[1:]
+
+    split = _split_index(messages, config)
+    if split == 0:
+        logger.debug("Nothing to compact, all messages are within the kept window")
+        return None
+
+    compacted, kept = messages[:split], messages[split:]
+    if summarizer is not None:
+        summary = await summarizer(previous_summary, compacted)
+    else:
+        summary = build_digest(
+            previous_summary, compacted, config.max_tool_output_chars
+        )
+
+    summary_msg = HumanMessage(
+        id=SUMMARY_MESSAGE_ID,
+        content=f"<conversation_summary>\n{summary}\n</conversation_summary>",
+    )
+    tokens_after = count_tokens([summary_msg, *kept])
+    record = CompactionRecord(
+        tokens_before=tokens_before,
+        tokens_after=tokens_after,
+        tokens_saved=tokens_before - tokens_after,
+        messages_compacted=len(compacted),
+        timestamp=datetime.now().isoformat(),
+    )
+    summary_msg.response_metadata = {
+        "summary": summary,
+        "compaction": [*records, asdict(record)],
+    }
+    logger.info(
+        f"Compacted {record.messages_compacted} messages: "
+        f"{record.tokens_before} -> {record.tokens_after} tokens "
+        f"({record.tokens_saved} saved)"
+    )
+
+    return {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES), summary_msg, *kept]}
+
+
+def create_compaction_node(compaction_config: CompactionConfiguration):
+    """Create a graph node compacting the `messages` of the state when over budget."""
+    summarizer = (
+        create_llm_summarizer(compaction_config.summary_model)
+        if compaction_config.summary_model
+        else None
+    )
+
+    async def compact(state: Any) -> dict:
+        update = await acompact_messages(state.messages, compaction_config, summarizer)
+        return update or {}
+
+    return compact
+
+
+def add_compaction_node(
+    builder: StateGraph, config: CompactionConfiguration, *, target: str
+) -> str:
+    """Add a compaction node routing to `target`, if compaction is enabled.
+
+    Returns:
+        The name of the node that edges leading to `target` should point to instead.
+    """
+    if not config.use_compaction:
+        return target
+
+    builder.add_node(COMPACTION_NODE_NAME, create_compaction_node(config))
+    builder.add_edge(COMPACTION_NODE_NAME, target)
+    return COMPACTION_NODE_NAME
+
+
+__all__ = [
+    "CompactionConfiguration",
+    "CompactionRecord",
+    "acompact_messages",
+    "add_compaction_node",
+    "create_compaction_node",
+    "get_compaction_records",
+]
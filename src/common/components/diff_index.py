@@ -0,0 +1,319 @@
+"""Per-file index of the unified diff of a pull request.
+
+The diff of a large pull request does not fit the context of the code reviewer,
+and every later turn of the reviewer sent it again. `DiffIndex` parses the diff
+once into the hunks of every file, so that the reviewer lists the changed
+files with `overview` and reads the diff of a file a page at a time with
+`page`.
+
+Every line of a page is numbered with its line in the base and head versions
+of the file, and keeps its position in the diff of the file, as counted by the
+review comments of the GitHub API. `position` maps the line a review comment
+is anchored to, in the head (`RIGHT`) or base (`LEFT`) of the file, to its
+position, so that invalid anchors are rejected before the review is sent.
+"""
+
+import difflib
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+_STATUS_CODES = {"added": "A", "deleted": "D", "renamed": "R", "modified": "M"}
+
+
+@dataclass(kw_only=True)
+class DiffIndexConfiguration:
+    """Configuration for paging the diffs of pull requests."""
+
+    page_lines: int = 300
+    """Lines of the diff of a file per page. Hunks are split only if longer."""
+
+
+@dataclass(kw_only=True)
+class DiffLine:
+    """A line of a hunk."""
+
+    kind: str
+    """` ` for context, `+` for an addition, `-` for a deletion, `\\` for a note."""
+    text: str
+    position: int
+    """Lines below the first hunk header of the file, counting the later headers."""
+    old_line: Optional[int] = None
+    new_line: Optional[int] = None
+
+
+@dataclass(kw_only=True)
+class DiffHunk:
+    """A hunk of the diff of a file."""
+
+    header: str
+    position: int
+    """The position of the hunk header in the diff of the file."""
+    lines: list[DiffLine] = field(default_factory=list)
+
+
+@dataclass(kw_only=True)
+class FileDiff:
+    """The diff of a file."""
+
+    path: str
+    old_path: Optional[str] = None
+    """The path in the base, if the file was renamed."""
+    status: str = "modified"
+    """`added`, `deleted`, `renamed` or `modified`."""
+    binary: bool = False
+    hunks: list[DiffHunk] = field(default_factory=list)
+    positions: dict[tuple[str, int], int] = field(default_factory=dict, repr=False)
+    """The positions of the lines of the diff, by side and line number."""
+
+    @property
+    def additions(self) -> int:
+        """The number of added lines."""
+        return sum(line.kind == "+" for hunk in self.hunks for line in hunk.lines)
+
+    @property
+    def deletions(self) -> int:
+        """The number of deleted lines."""
+        return sum(line.kind == "-" for hunk in self.hunks for line in hunk.lines)
+
+
+def _path(header: str) -> Optional[str]:
+    """Return the path of a `--- a/path` or `+++ b/path` header, None for /dev/null."""
+    path = header[4:].rstrip("\n").split("\t", 1)[0]
+    if path == "/dev/null":
+        return None
+    return path[2:] if path[:2] in ("a/", "b/") else path
+
+
+def _format_line(line: DiffLine) -> str:
+    old = "" if line.old_line is None else line.old_line
+    new = "" if line.new_line is None else line.new_line
+    return f"{old:>5} {new:>5} | {line.kind}{line.text}"
+
+
+def _lines(text: str) -> list[str]:
+    """Split a text on newlines only, keeping them."""
+    lines = text.split("\n")
+    return [line + "\n" for line in lines[:-1]] + ([lines[-1]] if lines[-1] else [])
+
+
+def unified_diff(base: dict[str, str], head: dict[str, str]) -> str:
+    """Return the unified diff of two versions of the files of a repository.
+
+    Args:
+        base: The content of the files of the base, by path.
+        head: The content of the files of the head, by path.
+    """
+    diff = []
+    for path in sorted(base.keys() | head.keys()):
+        if base.get(path) == head.get(path):
+            continue
+        diff.append(f"diff --git a/{path} b/{path}\n")
+        diff.extend(
+            difflib.unified_diff(
+                _lines(base.get(path, "")),
+                _lines(head.get(path, "")),
+                f"a/{path}" if path in base else "/dev/null",
+                f"b/{path}" if path in head else "/dev/null",
+            )
+        )
+    return "".join(line if line.endswith("\n") else line + "\n" for line in diff)
+
+
+class DiffIndex:
+    """The files of a unified diff, paged."""
+
+    def __init__(
+        self, files: list[FileDiff], config: Optional[DiffIndexConfiguration] = None
+    ):
+        """Initialize the index of parsed files."""
+        self.config = config or DiffIndexConfiguration()
+        self.files = {file.path: file for file in files}
+
+    @classmethod
+    def parse(
+        cls, diff: str, config: Optional[DiffIndexConfiguration] = None
+    ) -> "DiffIndex":
+        """Parse a unified diff, as returned by the GitHub API for a pull request."""
+        files: list[FileDiff] = []
+        file: Optional[FileDiff] = None
+        hunk: Optional[DiffHunk] = None
+        old_line = new_line = position = 0
+        # lines are split on newlines only, `splitlines` also splitting on the
+        # form feeds and other separators the lines of a file may contain
+        lines = diff.split("\n")
+        if lines[-1] == "":
+            lines.pop()
+        for line in lines:
+            line = line.removesuffix("\r")
+            if line.startswith("diff --git "):
+                # the paths are read from the headers below, the ones of this
+                # line being ambiguous when they contain spaces
+                _, _, path = line.partition(" b/")
+                file, hunk, position = FileDiff(path=path), None, 0
+                files.append(file)
+            elif file is None:
+                continue
+            elif hunk is None and not line.startswith("@@"):
+                if line.startswith("--- "):
+                    file.old_path = _path(line)
+                    if file.old_path is None:
+                        file.status = "added"
+                elif line.startswith("+++ "):
+                    path = _path(line)
+                    if path is None:
+                        file.status = "deleted"
+                    else:
+                        file.path = path
+                elif line.startswith("new file mode"):
+                    file.status = "added"
+                elif line.startswith("deleted file mode"):
+                    file.status = "deleted"
+                elif line.startswith("rename from "):
+                    file.old_path = line[len("rename from ") :]
+                elif line.startswith("rename to "):
+                    file.path = line[len("rename to ") :]
+                elif line.startswith("Binary files "):
+                    file.binary = True
+            elif line.startswith("@@"):
+                match = _HUNK_HEADER.match(line)
+                if not match:
+                    continue
+                # the first header is at position 0, the later ones count
+                position = position + 1 if file.hunks else 0
+                old_line, new_line = int(match[1]), int(match[3])
+                hunk = DiffHunk(header=line, position=position)
+                file.hunks.append(hunk)
+            elif hunk is not None:
+                position += 1
+                kind, text = (line[0], line[1:]) if line else (" ", "")
+                numbered = DiffLine(kind=kind, text=text, position=position)
+                if kind in (" ", "-"):
+                    numbered.old_line, old_line = old_line, old_line + 1
+                    file.positions["LEFT", numbered.old_line] = position
+                if kind in (" ", "+"):
+                    numbered.new_line, new_line = new_line, new_line + 1
+                    file.positions["RIGHT", numbered.new_line] = position
+                hunk.lines.append(numbered)
+        for file in files:
+            if file.old_path == file.path:
+                file.old_path = None
+            elif file.old_path and file.status == "modified":
+                file.status = "renamed"
+        return cls(files, config)
+
+    def _pages(self, file: FileDiff) -> list[list[str]]:
+        """Split the formatted hunks of a file into pages, a hunk per page at least."""
+        size = max(self.config.page_lines, 2)
+        pages: list[list[str]] = [[]]
+        for hunk in file.hunks:
+            lines = [_format_line(line) for line in hunk.lines]
+            if pages[-1] and len(pages[-1]) + 1 + len(lines) > size:
+                pages.append([])
+            pages[-1].append(hunk.header)
+            while len(pages[-1]) + len(lines) > size:
+                # a hunk longer than a page continues on the next ones
+                taken = size - len(pages[-1])
+                pages[-1].extend(lines[:taken])
+                lines = lines[taken:]
+                pages.append([f"{hunk.header} (continued)"])
+            pages[-1].extend(lines)
+        return pages
+
+    def position(self, path: str, line: int, side: str = "RIGHT") -> int:
+        """Return the position in the diff of a line a review comment is anchored to.
+
+        Args:
+            path: The path of the file.
+            line: The line number, in the head of the file for the `RIGHT`
+                side, and in the base for the `LEFT` side.
+            side: `RIGHT` for added and unchanged lines, `LEFT` for deleted ones.
+
+        Raises:
+            ValueError: If the line is not in the diff, with the lines that are.
+        """
+        if path not in self.files:
+            raise ValueError(
+                f"`{path}` is not changed, the changed files are: {', '.join(self.files)}"
+            )
+        positions = self.files[path].positions
+        if (side, line) in positions:
+            return positions[side, line]
+        lines = sorted(number for lines_side, number in positions if lines_side == side)
+        ranges: list[list[int]] = []
+        for number in lines:
+            if ranges and ranges[-1][1] == number - 1:
+                ranges[-1][1] = number
+            else:
+                ranges.append([number, number])
+        commentable = ", ".join(
+            str(start) if start == end else f"{start}-{end}" for start, end in ranges
+        )
+        raise ValueError(
+            f"line {line} of `{path}` is not in the diff on the {side} side, "
+            f"the lines that are: {commentable or 'none'}"
+        )
+
+    def page_count(self, path: str) -> int:
+        """Return the number of pages of the diff of a file."""
+        return len(self._pages(self.files[path]))
+
+    def overview(self) -> str:
+        """Return the changed files, with their status, stats and number of pages."""
+        additions = sum(file.additions for file in self.files.values())
+        deletions = sum(file.deletions for file in self.files.values())
+        lines = [
+            f"{len(self.files)} files changed, +{additions} -{deletions}. "
+            "Read the diff of a file with `get_file_diff`."
+        ]
+        for file in self.files.values():
+            name = f"{file.old_path} -> {file.path}" if file.old_path else file.path
+            if file.binary:
+                lines.append(f"{_STATUS_CODES[file.status]} {name} (binary)")
+                continue
+            pages = self.page_count(file.path)
+            lines.append(
+                f"{_STATUS_CODES[file.status]} {name} +{file.additions} "
+                f"-{file.deletions}, {len(file.hunks)} hunks, "
+                f"{pages} page{'s' if pages > 1 else ''}"
+            )
+        return "\n".join(lines)
+
+    def page(self, path: str, page: int = 1) -> str:
+        """Return a page of the diff of a file.
+
+        Args:
+            path: The path of the file in the head, or in the base if deleted.
+            page: The page, from 1.
+
+        Returns:
+            The page, or why there is none.
+        """
+        if path not in self.files:
+            return (
+                f"File `{path}` is not changed. The changed files are: "
+                f"{', '.join(self.files)}"
+            )
+        file = self.files[path]
+        if file.binary:
+            return f"File `{path}` is binary."
+        pages = self._pages(file)
+        if not 1 <= page <= len(pages):
+            return f"Page {page} does not exist: the diff of `{path}` has {len(pages)} pages."
+        header = (
+            f"File `{path}` ({file.status}, +{file.additions} -{file.deletions}), "
+            f"page {page} of {len(pages)}. Lines are numbered in the base and head."
+        )
+        return "\n".join([header, *pages[page - 1]])
+
+
+__all__ = [
+    "DiffHunk",
+    "DiffIndex",
+    "DiffIndexConfiguration",
+    "DiffLine",
+    "FileDiff",
+    "unified_diff",
+]
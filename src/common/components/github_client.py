@@ -0,0 +1,1136 @@
+"""Async GitHub REST client.
+
+The GitHub tools used to call PyGithub and `requests` from their `_arun`, so
+every GitHub request blocked the event loop shared by all the concurrent runs
+of the LangGraph server. `AsyncGithubApi` sends the requests with httpx:
+
+- connections are pooled and kept alive, with a client per event loop shared by
+  every tool built from the API,
+- at most `max_concurrency` requests are in flight per event loop, the others
+  waiting for a slot instead of opening more connections,
+- the token is read in a worker thread, since refreshing a GitHub App
+  installation token is itself a blocking request,
+- the work left on the responses, such as reading workflow logs, runs in a
+  worker thread too, and large downloads are streamed to a spooled file instead
+  of being read in memory, see `download`.
+- the requests of every API sharing a token are scheduled under the rate
+  limits of GitHub, and the rate limited ones retried, see `GithubRateLimiter`.
+- GET responses are stored and revalidated with conditional requests, see
+  `GithubHttpCache`, and the pull requests of a run are reused by its tools,
+  see `PullRequestCache`.
+- the context of a pull request is fetched in one GraphQL query, see
+  `get_pr_context`.
+- in staged mode, file writes are kept in a changeset per branch and committed
+  together by `commit_changes`, see `Changeset`.
+
+Its methods mirror the ones of `GitHubAPIWrapper` and `MockGithubApi` and
+return the same messages, so that the tools built from the three are
+interchangeable.
+"""
+
+import asyncio
+import base64
+import json
+import tempfile
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+import httpx
+from langchain_community.utilities.github import GitHubAPIWrapper
+from langchain_core.messages.utils import count_tokens_approximately
+
+from common.components.changesets import (
+    Changeset,
+    ChangesetConfiguration,
+    StagedFile,
+)
+from common.components.diff_index import DiffIndex, DiffIndexConfiguration
+from common.components.github_http_cache import (
+    GithubHttpCache,
+    GithubHttpCacheConfiguration,
+)
+from common.components.github_rate_limits import (
+    GithubRateLimitConfiguration,
+    get_github_rate_limiter,
+    is_write,
+    request_resource,
+)
+from common.components.pr_context import (
+    PR_CONTEXT_QUERY,
+    PrContextConfiguration,
+    format_pr_context,
+    merge_pages,
+    next_page_variables,
+    pr_context_variables,
+)
+from common.components.pull_request_cache import (
+    PullRequestCache,
+    PullRequestCacheConfiguration,
+)
+from common.components.read_files import (
+    ReadFilesConfiguration,
+    format_files,
+    match_paths,
+)
+from common.components.workflow_logs import WorkflowLogConfiguration, failure_report
+from common.logging import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+GITHUB_API_VERSION = "2022-11-28"
+
+PULL_REQUEST_MAX_TOKENS = 2_000
+"""Token budget of `get_pull_request`, as in `GitHubAPIWrapper`."""
+PULL_REQUEST_FILES_MAX_TOKENS = 3_000
+"""Token budget of `list_pull_request_files`, as in `GitHubAPIWrapper`."""
+
+
+@dataclass(kw_only=True)
+class GithubClientConfiguration:
+    """Configuration for the connections of the async GitHub client."""
+
+    base_url: str = "https://api.github.com"
+    max_connections: int = 20
+    """Connections open at once per event loop."""
+    max_keepalive_connections: int = 10
+    """Idle connections kept open per event loop, to be reused by the next requests."""
+    keepalive_expiry: float = 30.0
+    """Seconds an idle connection is kept open."""
+    max_concurrency: int = 10
+    """Requests in flight at once per event loop. The others wait for a slot."""
+    timeout_seconds: float = 30.0
+
+
+class GithubApiError(Exception):
+    """An error response of the GitHub API."""
+
+    def __init__(self, response: httpx.Response):
+        """Initialize the error from the response."""
+        try:
+            payload = response.json()
+            message = payload.get("message", response.text)
+            if payload.get("errors"):
+                # the errors of a GraphQL query
+                message = "; ".join(error["message"] for error in payload["errors"])
+        except ValueError:
+            message = response.text
+        super().__init__(f"{response.status_code} {message}")
+        self.response = response
+        self.status = response.status_code
+        self.message = message
+
+
+class AsyncGithubApi:
+    """GitHub API of a repository, sending the requests without blocking the event loop.
+
+    Like `GitHubAPIWrapper`, the API has an active branch, set by
+    `set_active_branch` and `create_branch`, that the file operations work on.
+    """
+
+    def __init__(
+        self,
+        repository: str,
+        *,
+        token: Callable[[], str],
+        base_branch: str = "main",
+        active_branch: Optional[str] = None,
+        config: Optional[GithubClientConfiguration] = None,
+        pull_request_cache: Optional[PullRequestCacheConfiguration] = None,
+        http_cache: Optional[GithubHttpCacheConfiguration] = None,
+        workflow_logs: Optional[WorkflowLogConfiguration] = None,
+        diff_index: Optional[DiffIndexConfiguration] = None,
+        batch_reads: Optional[ReadFilesConfiguration] = None,
+        staging: Optional[ChangesetConfiguration] = None,
+        pr_context: Optional[PrContextConfiguration] = None,
+        rate_limits: Optional[GithubRateLimitConfiguration] = None,
+    ):
+        """Initialize the API.
+
+        Args:
+            repository: The repository, as `owner/name`.
+            token: Returns the token to authenticate with. It is called in a
+                worker thread before every request, and may block to refresh it.
+            base_branch: The branch pull requests are made against.
+            active_branch: The branch the file operations work on. Defaults to
+                the base branch.
+            config: The connections configuration.
+            pull_request_cache: The configuration of the cache of the pull
+                requests of every run.
+            http_cache: The configuration of the cache of the responses to GET
+                requests, revalidated with conditional requests.
+            workflow_logs: The configuration of the failure reports of
+                workflow runs.
+            diff_index: The configuration of the pages of the diffs of pull
+                requests.
+            batch_reads: The size limits of `read_files`.
+            staging: Whether file writes are staged in changesets, committed
+                by `commit_changes`.
+            pr_context: The pagination and truncation of `get_pr_context`.
+            rate_limits: The configuration of the rate limiter shared by the
+                APIs of the repositories of the same owner, if it is created.
+        """
+        self.repository = repository
+        self.base_branch = base_branch
+        self.active_branch = active_branch or base_branch
+        self.config = config or GithubClientConfiguration()
+        self.pull_requests = PullRequestCache(pull_request_cache)
+        self.http_cache = GithubHttpCache(http_cache)
+        self.workflow_logs = workflow_logs or WorkflowLogConfiguration()
+        self.diff_index = diff_index or DiffIndexConfiguration()
+        self.batch_reads = batch_reads or ReadFilesConfiguration()
+        self.staging = staging or ChangesetConfiguration()
+        self.changesets: dict[str, Changeset] = {}
+        self.pr_context = pr_context or PrContextConfiguration()
+        # the installation token of an owner is shared by its repositories
+        owner = repository.split("/")[0]
+        self.rate_limits = get_github_rate_limiter(
+            f"{self.config.base_url}/{owner}", rate_limits
+        )
+        self._token = token
+        self._clients: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, tuple[httpx.AsyncClient, asyncio.Semaphore]
+        ] = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def from_wrapper(
+        cls,
+        wrapper: GitHubAPIWrapper,
+        config: Optional[GithubClientConfiguration] = None,
+    ) -> "AsyncGithubApi":
+        """Create the API of the repository of a `GitHubAPIWrapper`, with its credentials."""
+        auth = wrapper.github_repo_instance.requester.auth
+        return cls(
+            wrapper.github_repository,
+            token=lambda: auth.token,
+            base_branch=wrapper.github_base_branch,
+            active_branch=wrapper.active_branch,
+            config=config,
+        )
+
+    @property
+    def _repo(self) -> str:
+        return f"/repos/{self.repository}"
+
+    def _create_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=self.config.base_url,
+            headers={
+                "Accept": "application/vnd.github+json",
+                "X-GitHub-Api-Version": GITHUB_API_VERSION,
+            },
+            limits=httpx.Limits(
+                max_connections=self.config.max_connections,
+                max_keepalive_connections=self.config.max_keepalive_connections,
+                keepalive_expiry=self.config.keepalive_expiry,
+            ),
+            timeout=self.config.timeout_seconds,
+            # the logs of workflow runs are redirected to a download url
+            follow_redirects=True,
+        )
+
+    async def _client(self) -> tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        """Return the client and concurrency slots of the running event loop."""
+        loop = asyncio.get_running_loop()
+        if loop not in self._clients:
+            # creating a client loads the certificates of its SSL context from disk
+            client = await asyncio.to_thread(self._create_client)
+            if loop in self._clients:
+                # created by a concurrent request
+                await client.aclose()
+            else:
+                self._clients[loop] = (
+                    client,
+                    asyncio.Semaphore(self.config.max_concurrency),
+                )
+        return self._clients[loop]
+
+    async def aclose(self):
+        """Close the connections of the running event loop, and log the HTTP cache metrics."""
+        entry = self._clients.pop(asyncio.get_running_loop(), None)
+        if entry:
+            await entry[0].aclose()
+        stats = self.http_cache.stats
+        if stats.requests:
+            logger.info(
+                f"GitHub HTTP cache of {self.repository}: {stats.hit_ratio:.0%} of "
+                f"{stats.requests} reads served from the cache, "
+                f"{stats.rate_limit_saved} requests of the rate limit saved"
+            )
+
+    def run(self, coroutine: Awaitable[T]) -> T:
+        """Run a coroutine of the API from synchronous code, in its own event loop.
+
+        If an event loop is already running in the calling thread, such as when
+        a sync tool is called from async code, the coroutine runs in a worker
+        thread, blocking the running loop until it completes.
+        """
+
+        async def main() -> T:
+            try:
+                return await coroutine
+            finally:
+                await self.aclose()
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(main())
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, main()).result()
+
+    async def _headers(self, accept: Optional[str] = None) -> dict[str, str]:
+        token = await asyncio.to_thread(self._token)
+        headers = {"Authorization": f"Bearer {token}"}
+        if accept:
+            headers["Accept"] = accept
+        return headers
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        accept: Optional[str] = None,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """Send a request to the API.
+
+        Args:
+            method: The HTTP method.
+            url: The url, relative to the API base url, or absolute.
+            accept: The media type to request instead of JSON.
+            **kwargs: The arguments of `httpx.AsyncClient.build_request`.
+
+        Returns:
+            The response. A GET of a response stored by the HTTP cache is sent
+            conditionally, and the stored response returned if not modified.
+            A rate limited request is retried once the rate limiter allows it.
+
+        Raises:
+            GithubApiError: If the API returns an error.
+            GithubRateLimitExceeded: If the request would wait longer than
+                allowed for the rate limits.
+        """
+        client, slots = await self._client()
+        headers = await self._headers(accept)
+        request = client.build_request(method, url, headers=headers, **kwargs)
+        cacheable = self.http_cache.cacheable(request)
+        cached = None
+        if cacheable:
+            key = self.http_cache.key(request)
+            cached = await self.http_cache.get(key)
+            self.http_cache.stats.requests += 1
+            if cached:
+                request.headers.update(cached.validators)
+                self.http_cache.stats.conditional_requests += 1
+        resource = request_resource(request)
+        for attempt in range(self.rate_limits.config.max_retries + 1):
+            await self.rate_limits.acquire(resource, write=is_write(request))
+            async with slots:
+                response = await client.send(request)
+            delay = self.rate_limits.update(response, resource, attempt)
+            if (
+                delay is None
+                or delay > self.rate_limits.config.max_wait_seconds
+                or attempt == self.rate_limits.config.max_retries
+            ):
+                break
+            self.rate_limits.stats.retries += 1
+        if response.status_code == 304 and cached:
+            self.http_cache.stats.not_modified += 1
+            self.http_cache.stats.bytes_saved += len(cached.content)
+            self.rate_limits.stats.not_modified += 1
+            return cached.to_response(request)
+        if response.is_error:
+            raise GithubApiError(response)
+        if cacheable:
+            await self.http_cache.put(key, response)
+        return response
+
+    async def graphql(self, query: str, variables: dict[str, Any]) -> dict[str, Any]:
+        """Send a query to the GraphQL API.
+
+        Returns:
+            The data of the response.
+
+        Raises:
+            GithubApiError: If the API returns an error, or the query errors.
+        """
+        # the GraphQL API is at /api/graphql on GitHub Enterprise, beside /api/v3
+        url = self.config.base_url.rstrip("/").removesuffix("/v3") + "/graphql"
+        response = await self.request(
+            "POST", url, json={"query": query, "variables": variables}
+        )
+        if response.json().get("errors"):
+            raise GithubApiError(response)
+        return response.json()["data"]
+
+    async def download(
+        self, url: str, *, max_bytes: int, spool_bytes: int
+    ) -> tempfile.SpooledTemporaryFile:
+        """Stream a download to a file, kept in memory up to `spool_bytes` then on disk.
+
+        Args:
+            url: The url, relative to the API base url, or absolute.
+            max_bytes: The largest download accepted.
+            spool_bytes: The size past which the file is written to disk.
+
+        Returns:
+            The file, at its start. The caller closes it.
+
+        Raises:
+            GithubApiError: If the API returns an error.
+            ValueError: If the download is larger than `max_bytes`.
+        """
+        client, slots = await self._client()
+        headers = await self._headers()
+        file = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+        try:
+            await self.rate_limits.acquire()
+            async with slots, client.stream("GET", url, headers=headers) as response:
+                self.rate_limits.update(response)
+                if response.is_error:
+                    await response.aread()
+                    raise GithubApiError(response)
+                async for chunk in response.aiter_bytes():
+                    if file.tell() + len(chunk) > max_bytes:
+                        raise ValueError(f"{url} is larger than {max_bytes} bytes")
+                    # writes past spool_bytes go to disk
+                    await asyncio.to_thread(file.write, chunk)
+            file.seek(0)
+            return file
+        except BaseException:
+            file.close()
+            raise
+
+    async def paginate(
+        self, url: str, *, params: Optional[dict] = None, limit: Optional[int] = None
+    ) -> list[Any]:
+        """Return the items of a list endpoint, following the pages of its `Link` header.
+
+        Args:
+            url: The url of the first page.
+            params: The query parameters of the first page.
+            limit: Stop after the page reaching this number of items.
+        """
+        items: list[Any] = []
+        params = {"per_page": 100, **(params or {})}
+        next_url: Optional[str] = url
+        while next_url:
+            response = await self.request("GET", next_url, params=params)
+            items.extend(response.json())
+            if limit is not None and len(items) >= limit:
+                break
+            # the next url carries the query parameters
+            next_url, params = response.links.get("next", {}).get("url"), None
+        return items
+
+    async def _get_contents(self, path: str) -> Any:
+        response = await self.request(
+            "GET",
+            f"{self._repo}/contents/{path.strip('/')}",
+            params={"ref": self.active_branch},
+        )
+        return response.json()
+
+    async def _fetch_pull(self, pr_number: int) -> dict[str, Any]:
+        response = await self.request("GET", f"{self._repo}/pulls/{int(pr_number)}")
+        return response.json()
+
+    async def _get_pull(self, pr_number: int) -> dict[str, Any]:
+        """Return a pull request, fetched once per run and head commit."""
+        return await self.pull_requests.pull(
+            int(pr_number), lambda: self._fetch_pull(pr_number)
+        )
+
+    async def _get_pull_value(
+        self,
+        pr_number: int,
+        name: str,
+        fetch: Callable[[dict[str, Any]], Awaitable[T]],
+    ) -> T:
+        """Return a value derived from the head commit of a pull request, fetched once per run."""
+        return await self.pull_requests.value(
+            int(pr_number), name, lambda: self._fetch_pull(pr_number), fetch
+        )
+
+    def _protected_branch_error(self) -> str:
+        return (
+            "You're attempting to commit to the directly"
+            f"to the {self.base_branch} branch, which is protected. "
+            "Please create a new branch and try again."
+        )
+
+    async def set_active_branch(self, branch_name: str) -> str:
+        """Equivalent to `git checkout branch_name`."""
+        branches = [
+            branch["name"] for branch in await self.paginate(f"{self._repo}/branches")
+        ]
+        if branch_name in branches:
+            self.active_branch = branch_name
+            return f"Switched to branch `{branch_name}`"
+        return (
+            f"Error {branch_name} does not exist,"
+            f"in repo with current branches: {str(branches)}"
+        )
+
+    async def create_branch(self, proposed_branch_name: str) -> str:
+        """Create a branch off the default branch and set it as the active branch.
+
+        If the branch already exists, `_v1`, `_v2`... is appended to its name.
+        """
+        repository = (await self.request("GET", self._repo)).json()
+        base = await self.request(
+            "GET", f"{self._repo}/branches/{repository['default_branch']}"
+        )
+        sha = base.json()["commit"]["sha"]
+        branch_name = proposed_branch_name
+        for i in range(1, 1001):
+            try:
+                await self.request(
+                    "POST",
+                    f"{self._repo}/git/refs",
+                    json={"ref": f"refs/heads/{branch_name}", "sha": sha},
+                )
+            except GithubApiError as e:
+                if e.status == 422 and "Reference already exists" in e.message:
+                    branch_name = f"{proposed_branch_name}_v{i}"
+                    continue
+                logger.error(f"Failed to create branch. Error: {e}")
+                raise Exception(
+                    "Unable to create branch name from proposed_branch_name: "
+                    f"{proposed_branch_name}"
+                ) from e
+            self.active_branch = branch_name
+            return (
+                f"Branch '{branch_name}' "
+                "created successfully, and set as current active branch."
+            )
+        return (
+            "Unable to create branch. "
+            "At least 1000 branches exist with named derived from "
+            f"proposed_branch_name: `{proposed_branch_name}`"
+        )
+
+    async def _list_files(self, directory_path: str) -> list[str]:
+        contents = await self._get_contents(directory_path)
+        if isinstance(contents, dict):
+            return [contents["path"]]
+        directories = [c["path"] for c in contents if c["type"] == "dir"]
+        nested = await asyncio.gather(*(self._list_files(d) for d in directories))
+        files = [c["path"] for c in contents if c["type"] != "dir"]
+        return files + [path for paths in nested for path in paths]
+
+    async def get_files_from_directory(self, directory_path: str) -> str:
+        """Recursively list the files of a directory of the active branch."""
+        try:
+            files = await self._list_files(directory_path)
+        except GithubApiError as e:
+            return f"Error: status code {e.status}, {e.message}"
+        changeset = self.changesets.get(self.active_branch)
+        if changeset:
+            prefix = directory_path.strip("/")
+            prefix = f"{prefix}/" if prefix else ""
+            staged = changeset.files
+            files = [
+                path
+                for path in files
+                if path not in staged or staged[path].content is not None
+            ] + [
+                path
+                for path, file in staged.items()
+                if file.content is not None
+                and path.startswith(prefix)
+                and path not in files
+            ]
+        return str(files)
+
+    async def create_pull_request(self, pr_query: str) -> str:
+        """Open a pull request from the active branch to the base branch.
+
+        Args:
+            pr_query: The title on the first line, then the body.
+        """
+        if self.base_branch == self.active_branch:
+            return """Cannot make a pull request because
+            commits are already in the main or master branch."""
+        title = pr_query.split("\n")[0]
+        if self.changesets.get(self.active_branch):
+            # the changes must be on the branch for it to be compared
+            committed = await self.commit_changes(title)
+            if not committed.startswith("Committed"):
+                return committed
+        try:
+            response = await self.request(
+                "POST",
+                f"{self._repo}/pulls",
+                json={
+                    "title": title,
+                    "body": pr_query[len(title) + 2 :],
+                    "head": self.active_branch,
+                    "base": self.base_branch,
+                },
+            )
+            return f"Successfully created PR number {response.json()['number']}"
+        except Exception as e:
+            return "Unable to make pull request due to error:\n" + str(e)
+
+    async def create_file(self, file_query: str) -> str:
+        """Create a file on the active branch.
+
+        Args:
+            file_query: The file path on the first line, then the contents.
+        """
+        if self.active_branch == self.base_branch:
+            return (
+                "You're attempting to commit to the directly to the"
+                f"{self.base_branch} branch, which is protected. "
+                "Please create a new branch and try again."
+            )
+        file_path = file_query.split("\n")[0]
+        staged = self._staged(file_path)
+        try:
+            try:
+                if not staged:
+                    await self._get_contents(file_path)
+                # a file deleted by the staged changes may be created again
+                if not staged or staged.content is not None:
+                    return (
+                        f"File already exists at `{file_path}` "
+                        f"on branch `{self.active_branch}`. You must use "
+                        "`update_file` to modify it."
+                    )
+            except GithubApiError:
+                # expected behavior, file shouldn't exist yet
+                pass
+            if self.staging.staged:
+                self._stage(file_path, file_query[len(file_path) + 2 :], None)
+                return "Created file " + file_path
+            await self._put_file(
+                file_path,
+                file_query[len(file_path) + 2 :],
+                message="Create " + file_path,
+            )
+            return "Created file " + file_path
+        except Exception as e:
+            return "Unable to make file due to error:\n" + str(e)
+
+    async def _put_file(
+        self, path: str, content: str, *, message: str, sha: Optional[str] = None
+    ):
+        await self.request(
+            "PUT",
+            f"{self._repo}/contents/{path.strip('/')}",
+            json={
+                "message": message,
+                "content": base64.b64encode(content.encode()).decode(),
+                "branch": self.active_branch,
+                **({"sha": sha} if sha else {}),
+            },
+        )
+        self.pull_requests.invalidate_branch(self.active_branch)
+
+    def _staged(self, path: str) -> Optional[StagedFile]:
+        """Return the staged write of a file of the active branch, if any."""
+        changeset = self.changesets.get(self.active_branch)
+        return changeset.files.get(path.strip("/")) if changeset else None
+
+    def _stage(self, path: str, content: Optional[str], base_sha: Optional[str]):
+        changeset = self.changesets.setdefault(
+            self.active_branch, Changeset(branch=self.active_branch)
+        )
+        changeset.stage(path.strip("/"), content, base_sha)
+
+    async def commit_changes(self, message: str) -> str:
+        """Commit the staged changes of the active branch as a single commit.
+
+        Args:
+            message: The commit message.
+        """
+        branch = self.active_branch
+        changeset = self.changesets.get(branch)
+        if not changeset or not changeset.files:
+            return "No staged changes to commit."
+        try:
+            for attempt in range(1, self.staging.max_attempts + 1):
+                response = await self.request(
+                    "GET", f"{self._repo}/git/ref/heads/{branch}"
+                )
+                head = response.json()["object"]["sha"]
+                response = await self.request("GET", f"{self._repo}/git/commits/{head}")
+                base_tree = response.json()["tree"]["sha"]
+                tree = await self._get_tree(base_tree)
+                conflicts = changeset.conflicts(tree)
+                if conflicts:
+                    for path in conflicts:
+                        del changeset.files[path]
+                    return (
+                        "Unable to commit the changes, files were changed on branch "
+                        f"`{branch}` since they were read: {', '.join(conflicts)}. "
+                        "Their staged changes were discarded: read them again, "
+                        "apply the changes again, then commit."
+                    )
+                response = await self.request(
+                    "POST",
+                    f"{self._repo}/git/trees",
+                    json={
+                        "base_tree": base_tree,
+                        "tree": changeset.tree_entries(tree),
+                    },
+                )
+                response = await self.request(
+                    "POST",
+                    f"{self._repo}/git/commits",
+                    json={
+                        "message": message,
+                        "tree": response.json()["sha"],
+                        "parents": [head],
+                    },
+                )
+                commit = response.json()["sha"]
+                try:
+                    await self.request(
+                        "PATCH",
+                        f"{self._repo}/git/refs/heads/{branch}",
+                        json={"sha": commit, "force": False},
+                    )
+                    break
+                except GithubApiError as e:
+                    # the branch moved since its head was read
+                    if e.status != 422 or attempt == self.staging.max_attempts:
+                        raise
+                    logger.info(f"Branch {branch} moved, committing again")
+        except Exception as e:
+            return "Unable to commit the changes due to error:\n" + str(e)
+        del self.changesets[branch]
+        self.pull_requests.invalidate_branch(branch)
+        return (
+            f"Committed {len(changeset.files)} files to branch `{branch}` "
+            f"in {commit[:7]}"
+        )
+
+    async def read_file(self, file_path: str) -> str:
+        """Read a file of the active branch, with its staged changes."""
+        staged = self._staged(file_path)
+        if staged and staged.content is not None:
+            return staged.content
+        try:
+            if staged:
+                raise ValueError("deleted by the staged changes")
+            contents = await self._get_contents(file_path)
+            return base64.b64decode(contents["content"]).decode("utf-8")
+        except Exception as e:
+            return (
+                f"File not found `{file_path}` on branch"
+                f"`{self.active_branch}`. Error: {str(e)}"
+            )
+
+    async def _get_tree(self, ref: str) -> dict[str, dict[str, Any]]:
+        """Return the files of a branch or tree by path, from its recursive tree.
+
+        The tree is revalidated by the HTTP cache, so that reading it again
+        while the branch does not move costs a 304.
+        """
+        response = await self.request(
+            "GET", f"{self._repo}/git/trees/{ref}", params={"recursive": "1"}
+        )
+        tree = response.json()
+        if tree.get("truncated"):
+            logger.warning(f"The tree of {ref} is truncated")
+        return {
+            entry["path"]: entry for entry in tree["tree"] if entry["type"] == "blob"
+        }
+
+    async def read_files(self, paths: list[str]) -> str:
+        """Read files of the active branch, by path, directory or glob pattern.
+
+        The files are matched against the tree of the branch, and their blobs
+        fetched concurrently.
+        """
+        config = self.batch_reads
+        try:
+            tree = await self._get_tree(self.active_branch)
+        except GithubApiError as e:
+            return f"Error: status code {e.status}, {e.message}"
+        changeset = self.changesets.get(self.active_branch)
+        staged = changeset.files if changeset else {}
+        sizes = {path: entry["size"] for path, entry in tree.items()}
+        for path, file in staged.items():
+            if file.content is None:
+                sizes.pop(path, None)
+            else:
+                sizes[path] = len(file.content.encode())
+        matched, unmatched = match_paths(paths, sizes)
+        matched, not_read = matched[: config.max_files], matched[config.max_files :]
+
+        async def read(path: str) -> Optional[str]:
+            if path in staged:
+                return staged[path].content
+            if tree[path]["size"] > config.max_file_bytes:
+                return None
+            response = await self.request(
+                "GET", f"{self._repo}/git/blobs/{tree[path]['sha']}"
+            )
+            try:
+                return base64.b64decode(response.json()["content"]).decode("utf-8")
+            except UnicodeDecodeError:
+                return None
+
+        contents = await asyncio.gather(*(read(path) for path in matched))
+        return format_files(
+            dict(zip(matched, contents)),
+            sizes={path: sizes[path] for path in matched},
+            unmatched=unmatched,
+            not_read=not_read,
+            config=config,
+        )
+
+    async def update_file(self, file_query: str) -> str:
+        """Replace the old contents of a file of the active branch by new contents.
+
+        Args:
+            file_query: The file path on the first line, then the old contents
+                between `OLD <<<<` and `>>>> OLD`, and the new contents between
+                `NEW <<<<` and `>>>> NEW`.
+        """
+        if self.active_branch == self.base_branch:
+            return self._protected_branch_error()
+        try:
+            file_path = file_query.split("\n")[0]
+            old = file_query.split("OLD <<<<")[1].split(">>>> OLD")[0].strip()
+            new = file_query.split("NEW <<<<")[1].split(">>>> NEW")[0].strip()
+
+            staged = self._staged(file_path)
+            if staged and staged.content is None:
+                raise ValueError(f"{file_path} is deleted by the staged changes")
+            if staged:
+                file_content, sha = staged.content, staged.base_sha
+            else:
+                contents = await self._get_contents(file_path)
+                file_content = base64.b64decode(contents["content"]).decode("utf-8")
+                sha = contents["sha"]
+            updated_file_content = file_content.replace(old, new)
+            if file_content == updated_file_content:
+                return (
+                    "File content was not updated because old content was not found."
+                    "It may be helpful to use the read_file action to get "
+                    "the current file contents."
+                )
+            if self.staging.staged:
+                self._stage(file_path, updated_file_content, sha)
+                return "Updated file " + file_path
+            await self._put_file(
+                file_path,
+                updated_file_content,
+                message="Update " + file_path,
+                sha=sha,
+            )
+            return "Updated file " + file_path
+        except Exception as e:
+            return "Unable to update file due to error:\n" + str(e)
+
+    async def delete_file(self, file_path: str) -> str:
+        """Delete a file of the active branch."""
+        if self.active_branch == self.base_branch:
+            return self._protected_branch_error()
+        try:
+            staged = self._staged(file_path)
+            if staged and staged.content is None:
+                raise ValueError(
+                    f"{file_path} is already deleted by the staged changes"
+                )
+            if staged and staged.base_sha is None:
+                # created by the changeset, never committed
+                del self.changesets[self.active_branch].files[file_path.strip("/")]
+                return "Deleted file " + file_path
+            if staged:
+                self._stage(file_path, None, staged.base_sha)
+                return "Deleted file " + file_path
+            contents = await self._get_contents(file_path)
+            if self.staging.staged:
+                self._stage(file_path, None, contents["sha"])
+                return "Deleted file " + file_path
+            await self.request(
+                "DELETE",
+                f"{self._repo}/contents/{file_path.strip('/')}",
+                json={
+                    "message": "Delete " + file_path,
+                    "branch": self.active_branch,
+                    "sha": contents["sha"],
+                },
+            )
+            self.pull_requests.invalidate_branch(self.active_branch)
+            return "Deleted file " + file_path
+        except Exception as e:
+            return "Unable to delete file due to error:\n" + str(e)
+
+    async def get_pull_request(self, pr_number: str) -> str:
+        """Return the title, body, first comments and commits of a pull request, as JSON.
+
+        The response is limited to `PULL_REQUEST_MAX_TOKENS` tokens.
+        """
+        pull, comments, commits = await asyncio.gather(
+            self._get_pull(int(pr_number)),
+            self.paginate(f"{self._repo}/issues/{int(pr_number)}/comments", limit=11),
+            self.paginate(f"{self._repo}/pulls/{int(pr_number)}/commits", limit=11),
+        )
+        budget = PULL_REQUEST_MAX_TOKENS
+        response: dict[str, str] = {}
+
+        def add(key: str, value: str):
+            nonlocal budget
+            tokens = count_tokens_approximately([value])
+            if tokens <= budget:
+                response[key] = value
+                budget -= tokens
+
+        def take(items: list[str]) -> list[str]:
+            nonlocal budget
+            taken = []
+            for item in items[:11]:
+                tokens = count_tokens_approximately([item])
+                if tokens > budget:
+                    break
+                taken.append(item)
+                budget -= tokens
+            return taken
+
+        add("title", pull["title"])
+        add("number", str(pr_number))
+        add("body", pull["body"] or "")
+        add(
+            "comments",
+            str(
+                take(
+                    [
+                        str({"body": c["body"], "user": c["user"]["login"]})
+                        for c in comments
+                    ]
+                )
+            ),
+        )
+        add(
+            "commits",
+            str(take([str({"message": c["commit"]["message"]}) for c in commits])),
+        )
+        return json.dumps(response)
+
+    async def list_pull_request_files(self, pr_number: str) -> str:
+        """Return the contents of the files of a pull request, as JSON.
+
+        The files are fetched concurrently, and the response is limited to
+        `PULL_REQUEST_FILES_MAX_TOKENS` tokens.
+        """
+        files = await self._get_pull_value(
+            pr_number,
+            "files",
+            lambda pull: self.paginate(f"{self._repo}/pulls/{pull['number']}/files"),
+        )
+
+        async def contents(file: dict[str, Any]) -> Optional[str]:
+            try:
+                response = await self.request("GET", file["contents_url"])
+                return base64.b64decode(response.json()["content"]).decode("utf-8")
+            except Exception as e:
+                # removed files have no contents
+                logger.warning(f"Failed to read {file['filename']}, skipping: {e}")
+                return None
+
+        pr_files = []
+        budget = PULL_REQUEST_FILES_MAX_TOKENS
+        for file, content in zip(
+            files, await asyncio.gather(*(contents(f) for f in files))
+        ):
+            if content is None:
+                continue
+            tokens = count_tokens_approximately(
+                [content + file["filename"] + "file_name file_contents"]
+            )
+            if tokens < budget:
+                pr_files.append(
+                    {
+                        "filename": file["filename"],
+                        "contents": content,
+                        "additions": file["additions"],
+                        "deletions": file["deletions"],
+                    }
+                )
+                budget -= tokens
+        return json.dumps(pr_files)
+
+    async def get_pull_request_head_branch(self, pr_number: str) -> str:
+        """Return the head branch of a pull request."""
+        return (await self._get_pull(int(pr_number)))["head"]["ref"]
+
+    async def get_pull_request_diff(self, pr_number: str) -> str:
+        """Return the diff of a pull request."""
+
+        async def fetch(pull: dict[str, Any]) -> str:
+            response = await self.request(
+                "GET",
+                f"{self._repo}/pulls/{pull['number']}",
+                accept="application/vnd.github.v3.diff",
+            )
+            return response.text
+
+        return await self._get_pull_value(pr_number, "diff", fetch)
+
+    async def _get_diff_index(self, pr_number: int) -> DiffIndex:
+        """Return the diff of a pull request parsed by file, once per run and head commit."""
+
+        async def fetch(pull: dict[str, Any]) -> DiffIndex:
+            diff = await self.get_pull_request_diff(pull["number"])
+            return await asyncio.to_thread(DiffIndex.parse, diff, self.diff_index)
+
+        return await self._get_pull_value(pr_number, "diff_index", fetch)
+
+    async def list_diff_files(self, pr_number: int) -> str:
+        """Return the files changed by a pull request, with their stats and pages."""
+        return (await self._get_diff_index(pr_number)).overview()
+
+    async def get_file_diff(self, pr_number: int, path: str, page: int = 1) -> str:
+        """Return a page of the diff of a file of a pull request."""
+        return (await self._get_diff_index(pr_number)).page(path, page)
+
+    async def get_pr_context(
+        self, pr_number: int, sections: Optional[list[str]] = None
+    ) -> str:
+        """Return the description, refs, comments, reviews, files and checks of a pull request.
+
+        They are fetched in one GraphQL query, and the comments, review
+        threads and files having more pages in a query per page.
+
+        Args:
+            pr_number: The pull request number.
+            sections: The sections among `comments`, `reviews`, `files` and
+                `checks` to fetch, all by default. The description and refs
+                are always fetched.
+        """
+        variables = pr_context_variables(self.repository, int(pr_number), sections)
+        try:
+            data = await self.graphql(PR_CONTEXT_QUERY, variables)
+            pull = data["repository"]["pullRequest"]
+            for _ in range(self.pr_context.max_pages - 1):
+                variables = next_page_variables(variables, pull)
+                if variables is None:
+                    break
+                data = await self.graphql(PR_CONTEXT_QUERY, variables)
+                merge_pages(pull, data["repository"]["pullRequest"])
+        except GithubApiError as e:
+            return f"Error: status code {e.status}, {e.message}"
+        return format_pr_context(pull, self.pr_context)
+
+    async def get_latest_pr_workflow_run(self, pr_number: str) -> str:
+        """Return the failures of the most recent workflow run of the head of a pull request.
+
+        Only the logs of the failed steps are read, keeping the lines around
+        their errors and their last lines, see `failure_report`.
+        """
+        pull = await self._get_pull(int(pr_number))
+        response = await self.request(
+            "GET",
+            f"{self._repo}/actions/runs",
+            params={"head_sha": pull["head"]["sha"], "event": "pull_request"},
+        )
+        runs = response.json()
+        logger.info(f"num workflow runs: {runs['total_count']}")
+        if not runs["workflow_runs"]:
+            return ""
+        run = runs["workflow_runs"][0]
+        response = await self.request(
+            "GET",
+            f"{self._repo}/actions/runs/{run['id']}/jobs",
+            params={"per_page": 100},
+        )
+        jobs = response.json()["jobs"]
+        if not any(job.get("conclusion") == "failure" for job in jobs):
+            # nothing to read in the logs
+            return failure_report(None, run, jobs, self.workflow_logs)
+        logs = await self.download(
+            run["logs_url"],
+            max_bytes=self.workflow_logs.max_download_bytes,
+            spool_bytes=self.workflow_logs.spool_bytes,
+        )
+        with logs:
+            return await asyncio.to_thread(
+                failure_report, logs, run, jobs, self.workflow_logs
+            )
+
+    async def create_pull_request_review(
+        self, pr_number: int, body: str, event: str, comments: list[dict[str, Any]]
+    ) -> str:
+        """Review the head of a pull request.
+
+        The comments are anchored to lines of the diff, checked against the
+        positions of the diff index before the review is sent, so that a
+        review with an invalid anchor is rejected without a request.
+
+        Args:
+            pr_number: The pull request number.
+            body: The overall feedback.
+            event: `REQUEST_CHANGES`, `APPROVE` or `COMMENT`.
+            comments: The comments on the diff, with their `path`, `line`,
+                `side`, `RIGHT` by default, and `body`.
+        """
+        pull = await self._get_pull(pr_number)
+        if comments:
+            index = await self._get_diff_index(pr_number)
+            errors = []
+            for i, comment in enumerate(comments, start=1):
+                try:
+                    index.position(
+                        comment["path"], comment["line"], comment.get("side", "RIGHT")
+                    )
+                except ValueError as e:
+                    errors.append(f"- comment {i}: {e}")
+            if errors:
+                return "\n".join(
+                    [
+                        "Review not created, the comments must be anchored to lines of the diff:",
+                        *errors,
+                    ]
+                )
+        await self.request(
+            "POST",
+            f"{self._repo}/pulls/{int(pr_number)}/reviews",
+            json={
+                "commit_id": pull["head"]["sha"],
+                "body": body,
+                "event": event,
+                "comments": [
+                    {
+                        "path": comment["path"],
+                        "line": comment["line"],
+                        "side": comment.get("side", "RIGHT"),
+                        "body": comment["body"],
+                    }
+                    for comment in comments
+                ],
+            },
+        )
+        return "review created successfully"
+
+    async def get_issue_body(self, issue_number: int) -> str:
+        """Return the body of an issue or pull request."""
+        response = await self.request("GET", f"{self._repo}/issues/{int(issue_number)}")
+        return response.json()["body"]
+
+    async def create_issue_comment(self, issue_number: int, body: str) -> str:
+        """Comment on an issue or pull request."""
+        await self.request(
+            "POST",
+            f"{self._repo}/issues/{int(issue_number)}/comments",
+            json={"body": body},
+        )
+        return "comment created successfully"
+
+
+__all__ = [
+    "AsyncGithubApi",
+    "GithubApiError",
+    "GithubClientConfiguration",
+]
@@ -0,0 +1,297 @@
+"""Cached credentials and clients of GitHub App installations.
+
+Every `get_github` call signed a JWT, listed the installations of the app and
+built a new client, and every client fetched its own installation token. The
+`GithubCredentialManager` of an app keeps, for the process:
+
+- the installation of every repository, by name, so that the repositories of
+  several installations are served,
+- one installation token per installation, reused until `refresh_margin_seconds`
+  before it expires, and refreshed in a background thread
+  `background_refresh_seconds` before it expires if it was used since the last
+  refresh, so that requests do not wait on a refresh,
+- one PyGithub client per installation, whose HTTP session is reused, and the
+  repository of every name, so that building a `GitHubAPIWrapper` sends no
+  request once the repository was seen.
+
+`get_credential_manager` returns the manager of the app of the environment.
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from github import Auth, Github, GithubIntegration
+from langchain_community.utilities.github import GitHubAPIWrapper
+
+from common.logging import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_BASE_URL = "https://api.github.com"
+
+
+@dataclass(kw_only=True)
+class GithubCredentialsConfiguration:
+    """Configuration for caching the tokens of GitHub App installations."""
+
+    refresh_margin_seconds: float = 300.0
+    """Tokens are not used when they expire sooner, and are refreshed first."""
+    background_refresh_seconds: float = 600.0
+    """Tokens used since their last refresh are refreshed in the background when they expire this soon. 0 disables it."""
+
+
+@dataclass(kw_only=True)
+class InstallationToken:
+    """An installation token."""
+
+    token: str
+    expires_at: float
+    """The expiry, in seconds since the epoch."""
+    used: bool = False
+    """Whether the token was used since it was fetched."""
+
+
+def read_private_key(value: str) -> str:
+    """Return a private key given as a file path or as the key itself."""
+    try:
+        with open(value) as f:
+            return f.read()
+    except OSError:
+        return value
+
+
+class _InstallationAuth(Auth.Auth):
+    """PyGithub authentication with the cached token of an installation."""
+
+    def __init__(self, manager: "GithubCredentialManager", installation_id: int):
+        self._manager = manager
+        self._installation_id = installation_id
+
+    @property
+    def token_type(self) -> str:
+        return "token"
+
+    @property
+    def token(self) -> str:
+        return self._manager.installation_token(self._installation_id)
+
+    @property
+    def _masked_token(self) -> str:
+        return "token (installation token removed)"
+
+
+class GithubCredentialManager:
+    """The installations, tokens and clients of a GitHub App."""
+
+    def __init__(
+        self,
+        app_id: str,
+        private_key: str,
+        *,
+        base_url: str = DEFAULT_BASE_URL,
+        config: Optional[GithubCredentialsConfiguration] = None,
+        integration: Optional[Any] = None,
+    ):
+        """Initialize the manager of an app, the tokens being fetched when first needed.
+
+        Args:
+            app_id: The id of the app.
+            private_key: The private key of the app.
+            base_url: The url of the GitHub API.
+            config: The token refresh configuration.
+            integration: The `GithubIntegration` of the app. Defaults to one
+                authenticated with the private key.
+        """
+        self.app_id = app_id
+        self.base_url = base_url
+        self.config = config or GithubCredentialsConfiguration()
+        self._private_key = private_key
+        self._integration = integration or GithubIntegration(
+            auth=Auth.AppAuth(app_id, private_key), base_url=base_url
+        )
+        self._lock = threading.Lock()
+        self._installations: dict[str, int] = {}
+        self._tokens: dict[int, InstallationToken] = {}
+        self._refresh_locks: dict[int, threading.Lock] = {}
+        self._timers: dict[int, threading.Timer] = {}
+        self._clients: dict[int, Github] = {}
+        self._repositories: dict[str, Any] = {}
+
+    @classmethod
+    def from_env(
+        cls, config: Optional[GithubCredentialsConfiguration] = None
+    ) -> "GithubCredentialManager":
+        """Create the manager of the app of the `GITHUB_APP_ID` and `GITHUB_APP_PRIVATE_KEY` environment variables.
+
+        Raises:
+            RuntimeError: If a variable is missing.
+        """
+        app_id = os.getenv("GITHUB_APP_ID")
+        private_key = os.getenv("GITHUB_APP_PRIVATE_KEY")
+        if not app_id or not private_key:
+            raise RuntimeError(
+                "GITHUB_APP_ID and GITHUB_APP_PRIVATE_KEY environment variables must be set"
+            )
+        return cls(app_id, read_private_key(private_key), config=config)
+
+    def installation_id(self, repository: str) -> int:
+        """Return the id of the installation of the app on a repository.
+
+        Args:
+            repository: The repository, as `owner/name`.
+        """
+        with self._lock:
+            if repository in self._installations:
+                return self._installations[repository]
+        owner, name = repository.split("/")
+        installation = self._integration.get_repo_installation(owner, name)
+        with self._lock:
+            self._installations[repository] = installation.id
+        return installation.id
+
+    def token(self, repository: str) -> str:
+        """Return a token of the installation of a repository, valid for `refresh_margin_seconds` at least."""
+        return self.installation_token(self.installation_id(repository))
+
+    def installation_token(self, installation_id: int) -> str:
+        """Return a token of an installation, valid for `refresh_margin_seconds` at least."""
+        with self._lock:
+            cached = self._tokens.get(installation_id)
+            lock = self._refresh_locks.setdefault(installation_id, threading.Lock())
+        if cached is None or self._expiring(cached):
+            with lock:
+                # refreshed by a concurrent caller meanwhile
+                cached = self._tokens.get(installation_id)
+                if cached is None or self._expiring(cached):
+                    cached = self._refresh(installation_id)
+        cached.used = True
+        return cached.token
+
+    def _expiring(self, token: InstallationToken) -> bool:
+        return token.expires_at - time.time() <= self.config.refresh_margin_seconds
+
+    def _refresh(self, installation_id: int) -> InstallationToken:
+        authorization = self._integration.get_access_token(installation_id)
+        token = InstallationToken(
+            token=authorization.token,
+            expires_at=authorization.expires_at.timestamp(),
+        )
+        logger.debug(f"Refreshed the token of GitHub installation {installation_id}")
+        with self._lock:
+            self._tokens[installation_id] = token
+            self._schedule(installation_id, token)
+        return token
+
+    def _schedule(self, installation_id: int, token: InstallationToken):
+        """Schedule the background refresh of a token."""
+        if installation_id in self._timers:
+            self._timers.pop(installation_id).cancel()
+        if self.config.background_refresh_seconds <= 0:
+            return
+        delay = token.expires_at - time.time() - self.config.background_refresh_seconds
+        timer = threading.Timer(
+            max(delay, 0.0), self._refresh_in_background, args=(installation_id,)
+        )
+        timer.daemon = True
+        self._timers[installation_id] = timer
+        timer.start()
+
+    def _refresh_in_background(self, installation_id: int):
+        with self._lock:
+            token = self._tokens.get(installation_id)
+            lock = self._refresh_locks[installation_id]
+        if token is None or not token.used:
+            # the token of an idle installation is refreshed by its next use
+            return
+        try:
+            with lock:
+                self._refresh(installation_id)
+        except Exception:
+            logger.exception(
+                f"Failed to refresh the token of GitHub installation {installation_id}"
+            )
+
+    def client(self, repository: str) -> Github:
+        """Return the client of the installation of a repository, shared by its repositories."""
+        installation_id = self.installation_id(repository)
+        with self._lock:
+            if installation_id not in self._clients:
+                self._clients[installation_id] = Github(
+                    auth=_InstallationAuth(self, installation_id),
+                    base_url=self.base_url,
+                )
+            return self._clients[installation_id]
+
+    def repository(self, repository: str) -> Any:
+        """Return the PyGithub repository of a name, fetched once."""
+        with self._lock:
+            if repository in self._repositories:
+                return self._repositories[repository]
+        repo = self.client(repository).get_repo(repository)
+        with self._lock:
+            return self._repositories.setdefault(repository, repo)
+
+    def wrapper(
+        self, repository: str, base_branch: Optional[str] = None
+    ) -> GitHubAPIWrapper:
+        """Return a `GitHubAPIWrapper` of a repository on the shared client and tokens.
+
+        Every wrapper has its own active branch, starting on the base branch.
+
+        Args:
+            repository: The repository, as `owner/name`.
+            base_branch: The branch pull requests are made against. Defaults
+                to the default branch of the repository.
+        """
+        repo = self.repository(repository)
+        base_branch = base_branch or repo.default_branch
+        # the validation of the wrapper would authenticate again
+        return GitHubAPIWrapper.model_construct(
+            github=self.client(repository),
+            github_repo_instance=repo,
+            github_repository=repository,
+            github_app_id=str(self.app_id),
+            github_app_private_key=self._private_key,
+            active_branch=base_branch,
+            github_base_branch=base_branch,
+        )
+
+    def close(self):
+        """Cancel the background refreshes and close the clients."""
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+
+_MANAGERS: dict[str, GithubCredentialManager] = {}
+_MANAGERS_LOCK = threading.Lock()
+
+
+def get_credential_manager() -> GithubCredentialManager:
+    """Return the process-wide manager of the app of the environment, see `GithubCredentialManager.from_env`.
+
+    Raises:
+        RuntimeError: If the app is not configured.
+    """
+    key = os.getenv("GITHUB_APP_ID", "")
+    with _MANAGERS_LOCK:
+        if key not in _MANAGERS:
+            _MANAGERS[key] = GithubCredentialManager.from_env()
+        return _MANAGERS[key]
+
+
+__all__ = [
+    "GithubCredentialManager",
+    "GithubCredentialsConfiguration",
+    "InstallationToken",
+    "get_credential_manager",
+    "read_private_key",
+]
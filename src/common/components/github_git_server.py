@@ -0,0 +1,623 @@
+"""Local GitHub stand-in backed by a bare git repository.
+
+`MockGithubApi` keeps a single pull request and the writes of its branch, and
+`GithubStandInServer` keeps the files of every branch in dictionaries, so
+neither has the history that diffs, merge bases and commits come from, nor
+runs the `AsyncGithubApi` the agents use against GitHub.
+`GitGithubStandInServer` serves the same endpoints from a bare git
+repository instead:
+
+- every branch is a ref, every write of the contents API a commit on it, and
+  the trees, commits and refs of the Git Data API are real git objects,
+- the diffs and changed files of pull requests are computed by git from the
+  merge base, as GitHub does, renames included,
+- the pull request context query of the GraphQL API is answered from the pull
+  requests, comments, reviews and scripted workflow runs of the server.
+
+`get_local_github` returns an `AsyncGithubApi` of a stand-in shared by the
+process, so that agent graphs built with `use_mocks="git"` run end-to-end
+without the network, and `local_github_server` the stand-in, to seed files and
+script workflow runs:
+
+    server = local_github_server()
+    server.workflow_jobs["feature"] = [{"name": "test", "conclusion": "failure"}]
+    server.workflow_logs["feature"] = {"0_test.txt": "FAILED test_app.py"}
+
+Git is driven with its command line, which must be installed.
+"""
+
+import hashlib
+import os
+import subprocess
+import tempfile
+import threading
+from collections.abc import Iterator, Mapping, MutableMapping
+from typing import Any, Optional
+
+from common.components.github_client import AsyncGithubApi, GithubClientConfiguration
+from common.components.github_server import GithubStandInServer
+from common.logging import get_logger
+
+logger = get_logger(__name__)
+
+_REVIEW_STATES = {
+    "APPROVE": "APPROVED",
+    "REQUEST_CHANGES": "CHANGES_REQUESTED",
+    "COMMENT": "COMMENTED",
+}
+
+_FILE_STATUSES = {
+    "A": "added",
+    "D": "removed",
+    "M": "modified",
+    "R": "renamed",
+    "C": "copied",
+    "T": "changed",
+}
+
+_CHANGE_TYPES = {
+    "added": "ADDED",
+    "removed": "DELETED",
+    "modified": "MODIFIED",
+    "renamed": "RENAMED",
+    "copied": "COPIED",
+    "changed": "CHANGED",
+}
+
+
+class GitRepository:
+    """A bare git repository, driven with the git command line."""
+
+    def __init__(self, path: str):
+        """Initialize the repository at `path`, creating it if needed."""
+        self.path = path
+        self._env = {
+            **os.environ,
+            "GIT_DIR": path,
+            "GIT_CONFIG_NOSYSTEM": "1",
+            "GIT_AUTHOR_NAME": "stand-in",
+            "GIT_AUTHOR_EMAIL": "stand-in@localhost",
+            "GIT_COMMITTER_NAME": "stand-in",
+            "GIT_COMMITTER_EMAIL": "stand-in@localhost",
+        }
+        if not os.path.exists(os.path.join(path, "HEAD")):
+            self.git("init", "--bare", "--quiet", "--initial-branch=main", path)
+
+    def git(
+        self, *args: str, input: Optional[bytes] = None, index: Optional[str] = None
+    ) -> str:
+        """Run a git command on the repository and return its output.
+
+        Args:
+            *args: The arguments of the command.
+            input: The standard input of the command.
+            index: The index file of the command, instead of the one of the repository.
+
+        Raises:
+            subprocess.CalledProcessError: If the command fails.
+        """
+        env = self._env if index is None else {**self._env, "GIT_INDEX_FILE": index}
+        result = subprocess.run(
+            ["git", *args], input=input, env=env, capture_output=True, check=True
+        )
+        return result.stdout.decode(errors="replace")
+
+    def head(self, branch: str) -> Optional[str]:
+        """Return the commit a branch points to, None if there is no such branch."""
+        try:
+            return self.git(
+                "rev-parse", "--verify", "--quiet", f"refs/heads/{branch}^{{commit}}"
+            ).strip()
+        except subprocess.CalledProcessError:
+            return None
+
+    def branches(self) -> list[str]:
+        """Return the names of the branches."""
+        return self.git(
+            "for-each-ref", "--format=%(refname:strip=2)", "refs/heads"
+        ).split()
+
+    def hash_blob(self, content: str) -> str:
+        """Store a blob and return its sha."""
+        return self.git("hash-object", "-w", "--stdin", input=content.encode()).strip()
+
+    def files(self, ref: str) -> dict[str, dict[str, Any]]:
+        """Return the files of a commit or tree, by path, with their `mode`, `sha` and `size`."""
+        files = {}
+        for line in self.git("ls-tree", "-r", "-l", "-z", ref).split("\0"):
+            if line:
+                info, path = line.split("\t", 1)
+                mode, _, sha, size = info.split()
+                files[path] = {"mode": mode, "sha": sha, "size": int(size)}
+        return files
+
+    def content(self, sha: str) -> str:
+        """Return the content of a blob."""
+        return self.git("cat-file", "blob", sha)
+
+    def write_tree(
+        self, base: Optional[str], changes: Mapping[str, Optional[tuple[str, str]]]
+    ) -> str:
+        """Write a tree of changes on a base tree, and return its sha.
+
+        Args:
+            base: The base tree or commit, None for an empty tree.
+            changes: The `(mode, blob sha)` of every changed file, by path,
+                None for the deleted files.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            index = os.path.join(directory, "index")
+            self.git("read-tree", *([base] if base else ["--empty"]), index=index)
+            entries = "".join(
+                f"{change[0]} {change[1]}\t{path}\n"
+                if change
+                else f"0 {'0' * 40}\t{path}\n"
+                for path, change in changes.items()
+            )
+            self.git(
+                "update-index", "--index-info", input=entries.encode(), index=index
+            )
+            return self.git("write-tree", index=index).strip()
+
+    def commit(self, tree: str, parents: list[str], message: str) -> str:
+        """Create a commit of a tree and return its sha."""
+        parent_args = [arg for parent in parents for arg in ("-p", parent)]
+        return self.git("commit-tree", tree, *parent_args, "-m", message).strip()
+
+    def commit_files(
+        self,
+        branch: str,
+        files: Mapping[str, Optional[str]],
+        message: str,
+        *,
+        replace: bool = False,
+        parent: Optional[str] = None,
+    ) -> str:
+        """Commit files on a branch, creating it if needed, and return the commit.
+
+        Args:
+            branch: The branch.
+            files: The content of the files, by path, None for the deleted files.
+            message: The commit message.
+            replace: Whether the files replace all the files of the branch.
+            parent: The parent of the commit. Defaults to the head of the branch.
+        """
+        parent = parent or self.head(branch)
+        changes = {
+            path: None if content is None else ("100644", self.hash_blob(content))
+            for path, content in files.items()
+        }
+        tree = self.write_tree(None if replace else parent, changes)
+        commit = self.commit(tree, [parent] if parent else [], message)
+        self.git("update-ref", f"refs/heads/{branch}", commit)
+        return commit
+
+
+class _BranchFiles(MutableMapping[str, str]):
+    """The files of a branch by path, every write committed on the branch."""
+
+    def __init__(self, repository: GitRepository, branch: str):
+        self._repository = repository
+        self._branch = branch
+
+    def _files(self) -> dict[str, dict[str, Any]]:
+        return self._repository.files(f"refs/heads/{self._branch}")
+
+    def __getitem__(self, path: str) -> str:
+        return self._repository.content(self._files()[path]["sha"])
+
+    def __contains__(self, path: object) -> bool:
+        return path in self._files()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._files())
+
+    def __len__(self) -> int:
+        return len(self._files())
+
+    def __setitem__(self, path: str, content: str):
+        self._repository.commit_files(self._branch, {path: content}, f"Update {path}")
+
+    def __delitem__(self, path: str):
+        if path not in self:
+            raise KeyError(path)
+        self._repository.commit_files(self._branch, {path: None}, f"Delete {path}")
+
+
+class _Branches(MutableMapping[str, _BranchFiles]):
+    """The branches of a repository by name, setting one committing its files."""
+
+    def __init__(self, repository: GitRepository):
+        self._repository = repository
+
+    def __getitem__(self, branch: str) -> _BranchFiles:
+        if self._repository.head(branch) is None:
+            raise KeyError(branch)
+        return _BranchFiles(self._repository, branch)
+
+    def __contains__(self, branch: object) -> bool:
+        return isinstance(branch, str) and self._repository.head(branch) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._repository.branches())
+
+    def __len__(self) -> int:
+        return len(self._repository.branches())
+
+    def __setitem__(self, branch: str, files: Mapping[str, str]):
+        # a new branch starts from main, so that it shares its history
+        parent = self._repository.head(branch) or self._repository.head("main")
+        self._repository.commit_files(
+            branch,
+            dict(files),
+            f"Set the files of {branch}",
+            replace=True,
+            parent=parent,
+        )
+
+    def __delitem__(self, branch: str):
+        if branch not in self:
+            raise KeyError(branch)
+        self._repository.git("update-ref", "-d", f"refs/heads/{branch}")
+
+
+class GitGithubStandInServer(GithubStandInServer):
+    """A GitHub repository served over HTTP from a bare git repository.
+
+    `branches` maps the branches to their files like the in-memory server,
+    setting a branch or a file committing it on the branch.
+
+    Attributes:
+        git: The bare git repository.
+    """
+
+    def __init__(
+        self,
+        repository: str = "owner/repository",
+        *,
+        files: Optional[dict[str, str]] = None,
+        latency: float = 0.0,
+        path: Optional[str] = None,
+    ):
+        """Initialize the server of a repository, on a free port of localhost.
+
+        Args:
+            repository: The repository, as `owner/name`.
+            files: The files of the first commit of the default branch `main`, by path.
+            latency: Seconds every response is delayed.
+            path: The directory of the bare git repository, kept when the server
+                stops. Defaults to a temporary directory, removed when it stops.
+        """
+        super().__init__(repository, latency=latency)
+        self._directory = (
+            None if path else tempfile.TemporaryDirectory(prefix="github-stand-in-")
+        )
+        self.git = GitRepository(path or self._directory.name)
+        self.branches = _Branches(self.git)
+        if "main" not in self.branches:
+            self.branches["main"] = dict(files or {})
+
+    def stop(self):
+        """Stop serving and close the server, removing its temporary repository."""
+        super().stop()
+        if self._directory:
+            self._directory.cleanup()
+
+    def sha(self, branch: str) -> str:
+        """Return the commit the head of a branch is."""
+        head = self.git.head(branch)
+        if head is None:
+            raise KeyError(branch)
+        return head
+
+    def route(
+        self, method: str, path: str, query: dict[str, str], body: Any, accept: str
+    ) -> tuple[int, Any, dict[str, str]]:
+        """Return the status, payload and headers of the response to a request."""
+        try:
+            return super().route(method, path, query, body, accept)
+        except subprocess.CalledProcessError as e:
+            # unknown shas and refs
+            logger.debug(f"git {e.cmd[1]} failed: {e.stderr.decode(errors='replace')}")
+            return 404, {"message": "Not Found"}, {}
+
+    def _blob(self, content: str) -> dict[str, Any]:
+        data = content.encode()
+        return {
+            **super()._blob(content),
+            # the sha of git blobs hashes their header too
+            "sha": hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest(),
+        }
+
+    def _blob_content(self, sha: str) -> str:
+        return self.git.content(sha)
+
+    def _pull_refs(self, number: int) -> tuple[str, str]:
+        pull = self.pulls[number]
+        return f"refs/heads/{pull['base']['ref']}", f"refs/heads/{pull['head']['ref']}"
+
+    def diff(self, number: int) -> str:
+        """Return the unified diff of a pull request, from the merge base of its branches."""
+        base, head = self._pull_refs(number)
+        return self.git.git(
+            "diff", "--no-color", "--no-ext-diff", "-M", f"{base}...{head}"
+        )
+
+    def pull_files(self, number: int) -> list[dict[str, Any]]:
+        """Return the files changed by a pull request, as listed by the API."""
+        base, head = self._pull_refs(number)
+        changes = f"{base}...{head}"
+        statuses = self.git.git("diff", "--name-status", "-M", "-z", changes).split(
+            "\0"
+        )
+        stats = self.git.git("diff", "--numstat", "-M", "-z", changes).split("\0")
+        files = []
+        while statuses and statuses[0]:
+            status = statuses.pop(0)
+            paths = [statuses.pop(0)]
+            if status[0] in "RC":
+                paths.append(statuses.pop(0))
+            added, deleted, path = stats.pop(0).split("\t")
+            if not path:
+                # the paths of renames follow their stats
+                stats[:2] = []
+            file = {
+                "filename": paths[-1],
+                "status": _FILE_STATUSES.get(status[0], "modified"),
+                "additions": int(added) if added != "-" else 0,
+                "deletions": int(deleted) if deleted != "-" else 0,
+                "contents_url": f"{self.url}/repos/{self.repository}/contents/{paths[-1]}?ref={head.removeprefix('refs/heads/')}",
+            }
+            file["changes"] = file["additions"] + file["deletions"]
+            if len(paths) > 1:
+                file["previous_filename"] = paths[0]
+            files.append(file)
+        return files
+
+    def _create_ref(self, path, query, body, accept):
+        name = body["ref"].removeprefix("refs/heads/")
+        if name in self.branches:
+            return 422, {"message": "Reference already exists"}, {}
+        sha = self.git.git("rev-parse", "--verify", f"{body['sha']}^{{commit}}").strip()
+        self.git.git("update-ref", f"refs/heads/{name}", sha)
+        return 201, {"ref": body["ref"], "object": {"sha": sha}}, {}
+
+    def _get_tree(self, path, query, body, accept, ref):
+        tree = []
+        for line in self.git.git("ls-tree", "-r", "-t", "-l", "-z", ref).split("\0"):
+            if not line:
+                continue
+            info, entry_path = line.split("\t", 1)
+            mode, kind, sha, size = info.split()
+            entry = {"path": entry_path, "type": kind, "mode": mode, "sha": sha}
+            if kind == "blob":
+                entry["size"] = int(size)
+            tree.append(entry)
+        sha = self.git.git("rev-parse", f"{ref}^{{tree}}").strip()
+        return 200, {"sha": sha, "tree": tree, "truncated": False}, {}
+
+    def _create_tree(self, path, query, body, accept):
+        changes = {}
+        for entry in body["tree"]:
+            if "content" in entry:
+                changes[entry["path"]] = (
+                    entry.get("mode", "100644"),
+                    self.git.hash_blob(entry["content"]),
+                )
+            elif entry.get("sha") is None:
+                changes[entry["path"]] = None
+            else:
+                changes[entry["path"]] = (entry.get("mode", "100644"), entry["sha"])
+        sha = self.git.write_tree(body.get("base_tree"), changes)
+        return 201, {"sha": sha}, {}
+
+    def _update_ref(self, path, query, body, accept, branch):
+        head = self.sha(branch)
+        try:
+            self.git.git("merge-base", "--is-ancestor", head, body["sha"])
+        except subprocess.CalledProcessError:
+            if not body.get("force"):
+                return 422, {"message": "Update is not a fast forward"}, {}
+        self.git.git("update-ref", f"refs/heads/{branch}", body["sha"])
+        return 200, {"ref": f"refs/heads/{branch}", "object": {"sha": body["sha"]}}, {}
+
+    def _get_commit(self, path, query, body, accept, sha):
+        tree, parents, message = self.git.git(
+            "show", "--no-patch", "--format=%T%n%P%n%B", sha
+        ).split("\n", 2)
+        commit = {
+            "sha": self.git.git("rev-parse", f"{sha}^{{commit}}").strip(),
+            "tree": {"sha": tree},
+            "parents": [{"sha": parent} for parent in parents.split()],
+            "message": message.strip(),
+        }
+        return 200, commit, {}
+
+    def _create_commit(self, path, query, body, accept):
+        sha = self.git.commit(body["tree"], body["parents"], body["message"])
+        return 201, {"sha": sha, "tree": {"sha": body["tree"]}}, {}
+
+    def _get_pull_files(self, path, query, body, accept, number):
+        return self._page(path, self.pull_files(int(number)), query)
+
+    def _get_pull_commits(self, path, query, body, accept, number):
+        base, head = self._pull_refs(int(number))
+        log = self.git.git(
+            "log", "--reverse", "--format=%H%x1f%s%x1e", f"{base}..{head}"
+        )
+        commits = [
+            {"sha": sha, "commit": {"message": message}}
+            for sha, message in (
+                entry.strip().split("\x1f")
+                for entry in log.split("\x1e")
+                if entry.strip()
+            )
+        ]
+        return self._page(path, commits, query)
+
+    def _graphql(self, body: Any) -> tuple[int, Any, dict[str, str]]:
+        variables = body.get("variables") or {}
+        recorded = any(
+            recorded.items() <= variables.items()
+            for recorded, _ in self.graphql_responses
+        )
+        if recorded or "PullRequestContext" not in body.get("query", ""):
+            return super()._graphql(body)
+        number = variables["number"]
+        if number not in self.pulls:
+            message = f"Could not resolve to a PullRequest with the number of {number}."
+            return 200, {"data": None, "errors": [{"message": message}]}, {}
+        pull = self._pull_context(number, variables)
+        return 200, {"data": {"repository": {"pullRequest": pull}}}, {}
+
+    def _pull_context(self, number: int, variables: dict[str, Any]) -> dict[str, Any]:
+        """Return the pull request of the context query, in a single page."""
+        pull = self.pulls[number]
+        files = self.pull_files(number)
+
+        def connection(nodes: list[dict[str, Any]]) -> dict[str, Any]:
+            return {
+                "totalCount": len(nodes),
+                "pageInfo": {"hasNextPage": False, "endCursor": None},
+                "nodes": nodes,
+            }
+
+        def author(item: dict[str, Any]) -> dict[str, str]:
+            return {"login": item.get("user", {}).get("login", "stand-in")}
+
+        context = {
+            "number": number,
+            "title": pull["title"],
+            "body": pull.get("body") or "",
+            "state": pull["state"].upper(),
+            "isDraft": False,
+            "url": f"{self.url}/{self.repository}/pull/{number}",
+            "author": {"login": "stand-in"},
+            "headRefName": pull["head"]["ref"],
+            "headRefOid": self.sha(pull["head"]["ref"]),
+            "baseRefName": pull["base"]["ref"],
+            "additions": sum(file["additions"] for file in files),
+            "deletions": sum(file["deletions"] for file in files),
+            "changedFiles": len(files),
+        }
+        if variables.get("withComments"):
+            context["comments"] = connection(
+                [
+                    {"author": author(c), "body": c["body"], "createdAt": ""}
+                    for c in self.comments.get(number, [])
+                ]
+            )
+        if variables.get("withReviews"):
+            reviews = self.reviews.get(number, [])
+            context["reviews"] = {
+                "nodes": [
+                    {
+                        "author": author(review),
+                        "state": _REVIEW_STATES.get(review.get("event"), "COMMENTED"),
+                        "body": review.get("body") or "",
+                    }
+                    for review in reviews
+                ]
+            }
+            context["reviewThreads"] = connection(
+                [
+                    {
+                        "path": comment["path"],
+                        "line": comment.get("line"),
+                        "isResolved": False,
+                        "isOutdated": False,
+                        "comments": {
+                            "nodes": [
+                                {"author": author(review), "body": comment["body"]}
+                            ]
+                        },
+                    }
+                    for review in reviews
+                    for comment in review.get("comments", [])
+                ]
+            )
+        if variables.get("withFiles"):
+            context["files"] = connection(
+                [
+                    {
+                        "path": file["filename"],
+                        "additions": file["additions"],
+                        "deletions": file["deletions"],
+                        "changeType": _CHANGE_TYPES[file["status"]],
+                    }
+                    for file in files
+                ]
+            )
+        if variables.get("withChecks"):
+            jobs = self.workflow_jobs.get(self._workflow_key(context["headRefOid"]), [])
+            rollup = None
+            if jobs:
+                failed = any(job.get("conclusion") == "failure" for job in jobs)
+                rollup = {
+                    "state": "FAILURE" if failed else "SUCCESS",
+                    "contexts": {
+                        "nodes": [
+                            {
+                                "__typename": "CheckRun",
+                                "name": job["name"],
+                                "status": "COMPLETED",
+                                "conclusion": (job.get("conclusion") or "").upper()
+                                or None,
+                            }
+                            for job in jobs
+                        ]
+                    },
+                }
+            context["commits"] = {"nodes": [{"commit": {"statusCheckRollup": rollup}}]}
+        return context
+
+
+_SERVER: Optional[GitGithubStandInServer] = None
+_SERVER_LOCK = threading.Lock()
+
+
+def local_github_server() -> GitGithubStandInServer:
+    """Return the git-backed stand-in of the process, started on first use.
+
+    Its repository is kept in the `AI_NEXUS_STAND_IN_REPOSITORY` directory if
+    the variable is set, so that the work of the agents can be inspected with
+    git, and in a temporary directory otherwise.
+    """
+    global _SERVER
+    with _SERVER_LOCK:
+        if _SERVER is None:
+            _SERVER = GitGithubStandInServer(
+                files={"README.md": "# Project\n"},
+                path=os.getenv("AI_NEXUS_STAND_IN_REPOSITORY"),
+            ).start()
+            logger.info(f"GitHub stand-in serving {_SERVER.git.path} on {_SERVER.url}")
+        return _SERVER
+
+
+def get_local_github(base_branch: str = "main") -> AsyncGithubApi:
+    """Return an API of the repository of the git-backed stand-in of the process.
+
+    Args:
+        base_branch: The branch pull requests are made against, created from
+            `main` if needed.
+    """
+    server = local_github_server()
+    with server.lock:
+        if base_branch not in server.branches:
+            server.git.git(
+                "update-ref", f"refs/heads/{base_branch}", server.sha("main")
+            )
+    return AsyncGithubApi(
+        server.repository,
+        token=lambda: "stand-in",
+        base_branch=base_branch,
+        config=GithubClientConfiguration(base_url=server.url),
+    )
+
+
+__all__ = [
+    "GitGithubStandInServer",
+    "GitRepository",
+    "get_local_github",
+    "local_github_server",
+]
@@ -0,0 +1,225 @@
+"""Conditional-request cache of GitHub API reads.
+
+The agents read the same files, directories and pull requests many times per
+run, and every read costs latency and a request of the rate limit. GitHub
+returns an `ETag`, and often a `Last-Modified` date, with its responses; a
+request sending them back in `If-None-Match` and `If-Modified-Since` is
+answered `304 Not Modified`, without a body, when the resource did not change,
+and a 304 does not count against the rate limit.
+
+`GithubHttpCache` stores the GET responses carrying a validator and makes the
+next requests of the same url conditional, serving the stored response on a
+304. It keeps the most recent responses in memory, and optionally all of them
+in a SQLite file shared by the runs and processes using the same path, which
+defaults to the `AI_NEXUS_GITHUB_CACHE` environment variable. Responses are
+keyed by url and media type: the urls include the repository, and the tools of
+a repository all read it with the same credentials.
+
+`stats` reports the hit ratio and the requests of the rate limit saved.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+from common.logging import get_logger
+
+logger = get_logger(__name__)
+
+_STORED_HEADERS = ("content-type", "etag", "last-modified", "link")
+"""Headers of a response kept with it, the link header carrying the next page."""
+
+
+@dataclass(kw_only=True)
+class GithubHttpCacheConfiguration:
+    """Configuration for caching GitHub API reads with conditional requests."""
+
+    use_cache: bool = True
+    max_entries: int = 2_000
+    """Responses kept in memory, the least recently used being evicted."""
+    max_body_bytes: int = 1_000_000
+    """Larger responses, such as workflow logs, are not cached."""
+    path: Optional[str] = field(
+        default_factory=lambda: os.getenv("AI_NEXUS_GITHUB_CACHE")
+    )
+    """SQLite file keeping every response, shared across runs. Defaults to the `AI_NEXUS_GITHUB_CACHE` environment variable. In memory only if None."""
+
+
+@dataclass(kw_only=True)
+class GithubHttpCacheStats:
+    """Metrics of a GitHub HTTP cache."""
+
+    requests: int = 0
+    """Cacheable GET requests sent."""
+    conditional_requests: int = 0
+    """Requests sent with the validators of a stored response."""
+    not_modified: int = 0
+    """Requests answered 304 and served from the cache."""
+    disk_hits: int = 0
+    """Stored responses found on disk, not in memory."""
+    stored: int = 0
+    bytes_saved: int = 0
+    """Bytes of the responses served from the cache instead of transferred."""
+
+    @property
+    def hit_ratio(self) -> float:
+        """The share of the requests served from the cache."""
+        return self.not_modified / self.requests if self.requests else 0.0
+
+    @property
+    def rate_limit_saved(self) -> int:
+        """The requests of the rate limit saved, 304 responses not counting against it."""
+        return self.not_modified
+
+
+@dataclass(kw_only=True)
+class CachedResponse:
+    """A stored response and its validators."""
+
+    status_code: int
+    headers: dict[str, str]
+    content: bytes
+
+    @property
+    def validators(self) -> dict[str, str]:
+        """The headers making a request conditional on the response being stale."""
+        validators = {}
+        if "etag" in self.headers:
+            validators["If-None-Match"] = self.headers["etag"]
+        if "last-modified" in self.headers:
+            validators["If-Modified-Since"] = self.headers["last-modified"]
+        return validators
+
+    def to_response(self, request: httpx.Request) -> httpx.Response:
+        """Return the stored response, as a response to the request."""
+        return httpx.Response(
+            self.status_code,
+            headers=self.headers,
+            content=self.content,
+            request=request,
+        )
+
+
+class GithubHttpCache:
+    """Stores GitHub API responses by url, to revalidate them with conditional requests."""
+
+    def __init__(self, config: Optional[GithubHttpCacheConfiguration] = None):
+        """Initialize the cache, opening its SQLite file if configured."""
+        self.config = config or GithubHttpCacheConfiguration()
+        self.stats = GithubHttpCacheStats()
+        self._memory: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        if self.config.use_cache and self.config.path:
+            Path(self.config.path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(
+                self.config.path, check_same_thread=False, isolation_level=None
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    status_code INTEGER NOT NULL,
+                    headers TEXT NOT NULL,
+                    content BLOB NOT NULL
+                )"""
+            )
+
+    @staticmethod
+    def key(request: httpx.Request) -> str:
+        """Return the key of the response to a request."""
+        accept = request.headers.get("Accept", "")
+        return hashlib.sha256(f"{accept} {request.url}".encode()).hexdigest()
+
+    def cacheable(self, request: httpx.Request) -> bool:
+        """Return whether the response to the request may be cached."""
+        return self.config.use_cache and request.method == "GET"
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        """Return the stored response of a key, reading the disk in a worker thread."""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        if not self._conn:
+            return None
+        cached = await asyncio.to_thread(self._read, key)
+        if cached:
+            self.stats.disk_hits += 1
+            self._remember(key, cached)
+        return cached
+
+    async def put(self, key: str, response: httpx.Response):
+        """Store a response, if it has a validator and is not too large."""
+        headers = {
+            name: response.headers[name]
+            for name in _STORED_HEADERS
+            if name in response.headers
+        }
+        if response.status_code != 200 or not (
+            "etag" in headers or "last-modified" in headers
+        ):
+            return
+        if len(response.content) > self.config.max_body_bytes:
+            return
+        cached = CachedResponse(
+            status_code=response.status_code, headers=headers, content=response.content
+        )
+        self._remember(key, cached)
+        self.stats.stored += 1
+        if self._conn:
+            await asyncio.to_thread(self._write, key, cached)
+
+    def _remember(self, key: str, cached: CachedResponse):
+        self._memory[key] = cached
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.config.max_entries:
+            self._memory.popitem(last=False)
+
+    def _read(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status_code, headers, content FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+        if not row:
+            return None
+        return CachedResponse(
+            status_code=row[0], headers=json.loads(row[1]), content=row[2]
+        )
+
+    def _write(self, key: str, cached: CachedResponse):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, cached.status_code, json.dumps(cached.headers), cached.content),
+            )
+
+    def clear(self):
+        """Drop every stored response, in memory and on disk."""
+        self._memory.clear()
+        if self._conn:
+            with self._lock:
+                self._conn.execute("DELETE FROM responses")
+
+    def close(self):
+        """Close the SQLite file."""
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+
+__all__ = [
+    "CachedResponse",
+    "GithubHttpCache",
+    "GithubHttpCacheConfiguration",
+    "GithubHttpCacheStats",
+]
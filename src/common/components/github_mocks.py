@@ -1,27 +1,169 @@
-"""Mock Github API for testing."""
+"""Mock Github API for testing.
 
+Every thread of a graph run with the mock works on its own in-memory
+repository, so that concurrent runs sharing the mock tools do not see each
+other's branches, files and pull requests. The thread is the one of the root
+graph, so that the sub-agents of an orchestrator share its repository. The
+repositories of the least recently used threads are deleted past
+`max_repositories`, so that a long-running server does not keep them all.
+"""
+
+import functools
 import os
-from typing import Union
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Optional, Union
 
 from langchain_community.utilities.github import GitHubAPIWrapper
-
+from langchain_core.runnables.config import var_child_runnable_config
+
+from common.components.diff_index import DiffIndex, unified_diff
+from common.components.github_client import AsyncGithubApi
+from common.components.github_credentials import get_credential_manager
+from common.components.github_git_server import get_local_github
+from common.components.pr_context import PR_CONTEXT_SECTIONS, format_pr_context
+from common.components.read_files import (
+    ReadFilesConfiguration,
+    format_files,
+    match_paths,
+)
+from common.components.sub_agents import root_thread_id
 from common.logging import get_logger
 
 logger = get_logger(__name__)
 
+_REVIEW_STATES = {
+    "APPROVE": "APPROVED",
+    "REQUEST_CHANGES": "CHANGES_REQUESTED",
+    "COMMENT": "COMMENTED",
+}
+
+_CHANGE_TYPES = {
+    "added": "ADDED",
+    "deleted": "DELETED",
+    "renamed": "RENAMED",
+    "modified": "MODIFIED",
+}
+
+
+@dataclass(kw_only=True)
+class MockRepository:
+    """The in-memory state of a mock repository."""
+
+    branches: list[str] = field(default_factory=lambda: ["main"])
+    active_branch: str = "main"
+    files: dict[str, Any] = field(
+        default_factory=lambda: {"type": "dir", "content": {}}
+    )
+    """Mock file system structure: {type: "dir"|"file", content: str|dict}."""
+    pull_request: Optional[dict[str, str]] = None
+    """The current pull request: {title: str, body: str, head: str, base: str}."""
+    operations: list[dict[str, Any]] = field(default_factory=list)
+    """File operations: [{type: str, args: dict}]."""
+    comments: list[str] = field(default_factory=list)
+    """The comments on the pull request."""
+    reviews: list[dict[str, Any]] = field(default_factory=list)
+    """The reviews of the pull request: [{body: str, event: str, comments: list}]."""
+    lock: threading.RLock = field(default_factory=threading.RLock, repr=False)
+
+
+def _synchronized(method):
+    """Run the method holding the lock of the current repository.
+
+    The mock tools are synchronous and run in worker threads, so the lock is a
+    thread lock, only held while the in-memory state is read or changed.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self: "MockGithubApi", *args, **kwargs):
+        with self.repository().lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
 
 class MockGithubApi:
-    """Mock Github API that keeps changes in memory."""
+    """Mock Github API that keeps changes in memory, in a repository per thread."""
 
-    branches = ["main"]
-    active_branch = "main"
-    # Mock file system structure: {type: "dir"|"file", content: str|dict}
-    files = {"type": "dir", "content": {}}
-    # Store the current pull request: {title: str, body: str, head: str, base: str}
-    pull_request = None
-    # Track file operations: [{type: str, args: dict}]
-    operations = []
+    def __init__(self, max_repositories: int = 100):
+        """Initialize the mock without any repository.
 
+        Args:
+            max_repositories: Repositories kept, those of the least recently used
+                threads being deleted.
+        """
+        self.max_repositories = max_repositories
+        self._repositories: OrderedDict[Optional[str], MockRepository] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def repository(self, thread_id: Optional[str] = None) -> MockRepository:
+        """Return the repository of a thread, created on first use.
+
+        Args:
+            thread_id: The thread id. Defaults to the root thread of the current run,
+                or a repository shared by calls outside of any run.
+        """
+        if thread_id is None and (config := var_child_runnable_config.get()):
+            thread_id = root_thread_id(config)
+        with self._lock:
+            if thread_id not in self._repositories:
+                self._repositories[thread_id] = MockRepository()
+                while len(self._repositories) > self.max_repositories:
+                    evicted, _ = self._repositories.popitem(last=False)
+                    logger.debug(f"Deleted the mock repository of thread {evicted}")
+            self._repositories.move_to_end(thread_id)
+            return self._repositories[thread_id]
+
+    def delete_repository(self, thread_id: Optional[str]):
+        """Delete the repository of a finished thread."""
+        with self._lock:
+            self._repositories.pop(thread_id, None)
+
+    @property
+    def branches(self) -> list[str]:
+        """The branches of the current repository."""
+        return self.repository().branches
+
+    @property
+    def active_branch(self) -> str:
+        """The active branch of the current repository."""
+        return self.repository().active_branch
+
+    @active_branch.setter
+    def active_branch(self, branch_name: str):
+        self.repository().active_branch = branch_name
+
+    @property
+    def files(self) -> dict[str, Any]:
+        """The files of the current repository."""
+        return self.repository().files
+
+    @property
+    def pull_request(self) -> Optional[dict[str, str]]:
+        """The pull request of the current repository."""
+        return self.repository().pull_request
+
+    @pull_request.setter
+    def pull_request(self, pull_request: Optional[dict[str, str]]):
+        self.repository().pull_request = pull_request
+
+    @property
+    def operations(self) -> list[dict[str, Any]]:
+        """The file operations of the current repository."""
+        return self.repository().operations
+
+    @property
+    def comments(self) -> list[str]:
+        """The comments on the pull request of the current repository."""
+        return self.repository().comments
+
+    @property
+    def reviews(self) -> list[dict[str, Any]]:
+        """The reviews of the pull request of the current repository."""
+        return self.repository().reviews
+
+    @_synchronized
     def set_active_branch(self, branch_name: str):
         """Set the active branch."""
         if branch_name in self.branches:
@@ -33,6 +175,7 @@ class MockGithubApi:
                 f"in repo with current branches: {str(self.branches)}"
             )
 
+    @_synchronized
     def create_branch(self, proposed_branch_name: str) -> str:
         """Create a new branch, and set it as the active bot branch.
 
@@ -69,6 +212,7 @@ class MockGithubApi:
                 files.extend(self._get_files_recursive(child_path, child))
         return files
 
+    @_synchronized
     def get_files_from_directory(self, directory_path: str) -> str:
         """Recursively fetches files from a directory in the repo."""
         path_parts = [p for p in directory_path.split("/") if p]
@@ -91,6 +235,7 @@ class MockGithubApi:
 
         return str(files)
 
+    @_synchronized
     def create_pull_request(self, pr_query: str) -> str:
         """Create a pull request from the bot's branch to the base branch."""
         if self.active_branch == "main":
@@ -108,6 +253,7 @@ class MockGithubApi:
 
         return "Successfully created PR number 1"
 
+    @_synchronized
     def create_file(self, file_query: str) -> str:
         """Create a new file on the Github repo."""
         if self.active_branch == "main":
@@ -133,6 +279,7 @@ class MockGithubApi:
 
         return f"Created file {file_path}"
 
+    @_synchronized
     def update_file(self, file_query: str) -> str:
         """Update a file with new content."""
         if self.active_branch == "main":
@@ -160,6 +307,7 @@ class MockGithubApi:
 
         return f"Updated file {file_path}"
 
+    @_synchronized
     def delete_file(self, file_path: str) -> str:
         """Delete a file from the repo."""
         if self.active_branch == "main":
@@ -178,6 +326,7 @@ class MockGithubApi:
 
         return f"Deleted file {file_path}"
 
+    @_synchronized
     def read_file(self, file_path: str) -> str:
         """Read a file from the repo."""
         # Split path into components
@@ -195,6 +344,28 @@ class MockGithubApi:
 
         return current["content"]
 
+    @_synchronized
+    def read_files(self, paths: list[str]) -> str:
+        """Read files from the repo, by path, directory or glob pattern."""
+        config = ReadFilesConfiguration()
+        matched, unmatched = match_paths(
+            paths, self._get_files_recursive("", self.files)
+        )
+        matched, not_read = matched[: config.max_files], matched[config.max_files :]
+        files = {path: self.read_file(path) for path in matched}
+        return format_files(
+            files,
+            sizes={path: len(content.encode()) for path, content in files.items()},
+            unmatched=unmatched,
+            not_read=not_read,
+            config=config,
+        )
+
+    def commit_changes(self, message: str) -> str:
+        """Commit the staged changes, the mock committing every write at once."""
+        return "No staged changes to commit."
+
+    @_synchronized
     def get_pull_request(self, pr_number: str) -> str:
         """Get information about a pull request."""
         if not self.pull_request:
@@ -210,6 +381,7 @@ class MockGithubApi:
 
         return str(response_dict)
 
+    @_synchronized
     def list_pull_requests_files(self, pr_number: str) -> str:
         """List files changed in a pull request."""
         if not self.pull_request:
@@ -224,43 +396,189 @@ class MockGithubApi:
 
         return str(pr_files) if pr_files else "No files changed in this pull request"
 
+    @_synchronized
     def get_pull_request_head_branch(self, pr_number: str) -> str:
         """Get the head branch of a pull request."""
         if not self.pull_request:
             return "No pull request found"
         return self.pull_request["head"]
 
+    def _base_files(self) -> dict[str, str]:
+        """Return the files of the repository, the base of the pull request."""
+        return {
+            path: self.read_file(path)
+            for path in self._get_files_recursive("", self.files)
+        }
+
+    def _head_files(self) -> dict[str, str]:
+        """Return the files of the head of the pull request, the writes of its branch applied."""
+        files = self._base_files()
+        for op in self.operations:
+            args = op["args"]
+            if args.get("branch") != self.pull_request["head"]:
+                continue
+            if op["type"] == "create":
+                files[args["path"]] = args["content"]
+            elif op["type"] == "update":
+                files[args["path"]] = files.get(args["path"], "").replace(
+                    args["old_content"], args["new_content"]
+                )
+            elif op["type"] == "delete":
+                files.pop(args["path"], None)
+        return files
+
+    def _diff_index(self) -> DiffIndex:
+        """Return the diff of the pull request, parsed by file."""
+        return DiffIndex.parse(unified_diff(self._base_files(), self._head_files()))
+
+    @_synchronized
     def get_pull_request_diff(self, pr_number: str) -> str:
-        """Get the diff of a pull request."""
-        # TODO: how to mock this...?
-        raise NotImplementedError("get_pull_request_diff mock is not implemented")
+        """Get the diff of a pull request, from the files of the repository."""
+        if not self.pull_request:
+            return "No pull request found"
+        return unified_diff(self._base_files(), self._head_files())
 
-    def create_issue_comment(self, pr_number: str, body: str) -> str:
-        """Comment on an issue."""
-        logger.warning("create_isuse_comment mock is not implemented")
-        return ""
+    @_synchronized
+    def list_diff_files(self, pr_number: str) -> str:
+        """List the files changed by a pull request."""
+        if not self.pull_request:
+            return "No pull request found"
+        return self._diff_index().overview()
 
-    def create_pull_request_review(self, pr_number: str, review: str) -> str:
-        """Leave a PR review."""
-        # TODO: store list of reviews?
-        # TODO: fn signature
-        logger.warning("create_pull_request_review mock is not implemented")
-        return ""
+    @_synchronized
+    def get_file_diff(self, pr_number: str, path: str, page: int = 1) -> str:
+        """Get a page of the diff of a file of a pull request."""
+        if not self.pull_request:
+            return "No pull request found"
+        return self._diff_index().page(path, int(page))
+
+    @_synchronized
+    def get_pr_context(
+        self, pr_number: str, sections: Optional[list[str]] = None
+    ) -> str:
+        """Get the context of a pull request, without checks."""
+        if not self.pull_request:
+            return "No pull request found"
+        sections = PR_CONTEXT_SECTIONS if sections is None else sections
+        files = list(self._diff_index().files.values())
+
+        def connection(nodes: list[dict[str, Any]]) -> dict[str, Any]:
+            return {"totalCount": len(nodes), "nodes": nodes}
+
+        pull = {
+            "number": 1,
+            "title": self.pull_request["title"],
+            "body": self.pull_request["body"],
+            "state": "OPEN",
+            "url": "",
+            "author": {"login": "mock"},
+            "headRefName": self.pull_request["head"],
+            "headRefOid": "0" * 40,
+            "baseRefName": self.pull_request["base"],
+            "additions": sum(file.additions for file in files),
+            "deletions": sum(file.deletions for file in files),
+            "changedFiles": len(files),
+        }
+        if "comments" in sections:
+            pull["comments"] = connection(
+                [{"author": {"login": "mock"}, "body": body} for body in self.comments]
+            )
+        if "reviews" in sections:
+            pull["reviews"] = connection(
+                [
+                    {
+                        "author": {"login": "mock"},
+                        "state": _REVIEW_STATES.get(review["event"], "COMMENTED"),
+                        "body": review["body"],
+                    }
+                    for review in self.reviews
+                ]
+            )
+            pull["reviewThreads"] = connection(
+                [
+                    {
+                        "path": comment["path"],
+                        "line": comment["line"],
+                        "isResolved": False,
+                        "isOutdated": False,
+                        "comments": {
+                            "nodes": [
+                                {"author": {"login": "mock"}, "body": comment["body"]}
+                            ]
+                        },
+                    }
+                    for review in self.reviews
+                    for comment in review["comments"]
+                ]
+            )
+        if "files" in sections:
+            pull["files"] = connection(
+                [
+                    {
+                        "path": file.path,
+                        "additions": file.additions,
+                        "deletions": file.deletions,
+                        "changeType": _CHANGE_TYPES[file.status],
+                    }
+                    for file in files
+                ]
+            )
+        if "checks" in sections:
+            pull["commits"] = connection([])
+        return format_pr_context(pull)
+
+    @_synchronized
+    def create_issue_comment(self, issue_number: int, body: str) -> str:
+        """Comment on the pull request."""
+        if not self.pull_request:
+            return "No pull request found"
+        self.comments.append(body)
+        return "comment created successfully"
+
+    @_synchronized
+    def create_pull_request_review(
+        self, pr_number: int, body: str, event: str, comments: list[dict[str, Any]]
+    ) -> str:
+        """Review the pull request, its comments anchored to lines of its diff."""
+        if not self.pull_request:
+            return "No pull request found"
+        index = self._diff_index()
+        errors = []
+        for i, comment in enumerate(comments, start=1):
+            try:
+                index.position(
+                    comment["path"], comment["line"], comment.get("side", "RIGHT")
+                )
+            except ValueError as e:
+                errors.append(f"- comment {i}: {e}")
+        if errors:
+            return "\n".join(
+                [
+                    "Review not created, the comments must be anchored to lines of the diff:",
+                    *errors,
+                ]
+            )
+        self.reviews.append({"body": body, "event": event, "comments": comments})
+        return "review created successfully"
 
+    @_synchronized
     def get_issue_body(self, issue_number: int) -> str:
-        """Get the body of an issue."""
-        logger.warning("get_issue_body mock is not implemented")
-        return ""
+        """Get the body of the pull request, the mock having no issues."""
+        if not self.pull_request or int(issue_number) != 1:
+            return f"Issue {issue_number} not found"
+        return self.pull_request["body"]
 
     def get_latest_pr_workflow_run(self, pr_number: str) -> str:
-        """Get the most recent workflow run for a PR."""
-        logger.warning("get_latest_pr_workflow_run mock is not implemented")
+        """Get the most recent workflow run for a PR, the mock running no workflows."""
         return ""
 
 
 def get_github(base_branch) -> GitHubAPIWrapper:
     """Initialize a GitHub API wrapper instance based on environment variables.
 
+    The wrappers share the credentials and client of the installation of the
+    repository, see `GithubCredentialManager`.
+
     Required environment variables for GitHub API:
     - GITHUB_APP_ID
     - GITHUB_APP_PRIVATE_KEY
@@ -274,12 +592,8 @@ def get_github(base_branch) -> GitHubAPIWrapper:
             f"Missing GitHub API environment variables: {', '.join(missing)}"
         )
 
-    return GitHubAPIWrapper(
-        github_app_id=vars["GITHUB_APP_ID"],
-        github_app_private_key=vars["GITHUB_APP_PRIVATE_KEY"],
-        github_repository=vars["GITHUB_REPOSITORY"],
-        github_base_branch=base_branch,
-    )
+    # the installation, token and client of the repository are reused
+    return get_credential_manager().wrapper(vars["GITHUB_REPOSITORY"], base_branch)
 
 
 def get_mock_github() -> MockGithubApi:
@@ -290,8 +604,14 @@ def get_mock_github() -> MockGithubApi:
 def maybe_mock_github(
     base_branch: str = "main",
     allow_mocks_fallback: bool = True,
-) -> Union[GitHubAPIWrapper, MockGithubApi]:
-    """Get either a real GitHub API wrapper or a mock based configuration."""
+) -> Union[GitHubAPIWrapper, AsyncGithubApi, MockGithubApi]:
+    """Get either a real GitHub API wrapper or a mock based configuration.
+
+    With `AI_NEXUS_MOCKS=git`, the API of the local git-backed stand-in is
+    returned, see `get_local_github`.
+    """
+    if os.getenv("AI_NEXUS_MOCKS") == "git":
+        return get_local_github(base_branch)
     try:
         return get_github(base_branch)
     except RuntimeError as e:
@@ -0,0 +1,304 @@
+"""Process-wide scheduling of GitHub requests under the rate limits of the API.
+
+The coder, tester, code reviewer and orchestrator share the installation token
+of the GitHub App, and so its rate limits, but each sent its requests
+regardless of them: concurrent runs hit the secondary rate limits, and the
+403 and 429 responses failed whole sub-agent runs. A `GithubRateLimiter` per
+installation schedules the requests of every `AsyncGithubApi` of the process:
+
+- the primary limit of every resource (`core`, `graphql`, ...) is tracked from
+  the `X-RateLimit-*` headers of the responses. Below `pacing_threshold` of the
+  limit, reads are spread until the reset, and below `read_reserve` requests
+  they wait for the reset, the rest of the budget being kept for writes,
+- after a secondary limit, writes are spaced by `write_interval_seconds`, as
+  GitHub recommends to avoid them, for `write_spacing_seconds`,
+- a rate limited response pauses all the requests, for its `Retry-After`, until
+  the reset of the primary limit when it is exhausted, or for an exponential
+  backoff otherwise, and the request is retried. Reads wait while writes are
+  held,
+- the remaining budget and the waits are kept in `GithubRateLimitStats`.
+
+The limiter is shared by the event loops of the process, so its state is
+guarded by a thread lock and the requests wait with `asyncio.sleep`.
+"""
+
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import httpx
+
+from common.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(kw_only=True)
+class GithubRateLimitConfiguration:
+    """Configuration for scheduling GitHub requests under the rate limits."""
+
+    read_reserve: int = 100
+    """Requests of the primary limit kept for writes, reads waiting for the reset below it."""
+    pacing_threshold: float = 0.2
+    """Fraction of the primary limit below which reads are spread until the reset."""
+    write_interval_seconds: float = 1.0
+    """Seconds between two writes after a secondary rate limit."""
+    write_spacing_seconds: float = 600.0
+    """Seconds writes stay spaced after a secondary rate limit."""
+    secondary_backoff_seconds: float = 60.0
+    """Pause after a secondary rate limit without `Retry-After`, doubled on every retry."""
+    max_retries: int = 3
+    """Retries of a rate limited request."""
+    max_wait_seconds: float = 300.0
+    """Requests that would wait longer fail with `GithubRateLimitExceeded` instead."""
+
+
+class GithubRateLimitExceeded(Exception):
+    """Raised when a request would wait longer than `max_wait_seconds` for the rate limits."""
+
+
+@dataclass(kw_only=True)
+class GithubRateLimit:
+    """The primary rate limit of a resource, as of the last response."""
+
+    limit: int
+    remaining: int
+    """Requests left until the reset, counting the requests sent since the response."""
+    reset: float
+    """The time of the reset, in seconds since the epoch."""
+
+
+@dataclass(kw_only=True)
+class GithubRateLimitStats:
+    """Metrics of a GitHub rate limiter."""
+
+    limits: dict[str, GithubRateLimit] = field(default_factory=dict)
+    """The remaining budget of every resource."""
+    requests: int = 0
+    writes: int = 0
+    waited: int = 0
+    """Number of requests that had to wait."""
+    total_wait_seconds: float = 0.0
+    rate_limited: int = 0
+    """Number of responses rejected by a primary or secondary rate limit."""
+    secondary_rate_limited: int = 0
+    retries: int = 0
+    rejected: int = 0
+    """Number of requests failed with `GithubRateLimitExceeded`."""
+    not_modified: int = 0
+    """Number of requests answered from the HTTP cache, not counting against the limit."""
+
+
+def request_resource(request: httpx.Request) -> str:
+    """Return the rate limit resource of a request."""
+    return "graphql" if request.url.path.endswith("/graphql") else "core"
+
+
+def is_write(request: httpx.Request) -> bool:
+    """Return whether a request writes, GraphQL queries being reads."""
+    return request.method not in ("GET", "HEAD") and request_resource(request) == "core"
+
+
+class GithubRateLimiter:
+    """Scheduler of the GitHub requests sent with the same token."""
+
+    def __init__(
+        self, config: Optional[GithubRateLimitConfiguration] = None, name: str = ""
+    ):
+        """Initialize the limiter, the limits being unknown until the first response.
+
+        Args:
+            config: The scheduling configuration.
+            name: Name of the limiter, used in logs.
+        """
+        self.config = config or GithubRateLimitConfiguration()
+        self.name = name
+        self._lock = threading.Lock()
+        self._limits: dict[str, GithubRateLimit] = {}
+        self._paused_until = 0.0
+        self._next_write = 0.0
+        self._spaced_until = 0.0
+        self._next_read: dict[str, float] = {}
+        self._waiting_writes = 0
+        self._stats = GithubRateLimitStats()
+
+    @property
+    def stats(self) -> GithubRateLimitStats:
+        """Returns the current metrics."""
+        with self._lock:
+            self._stats.limits = {
+                resource: GithubRateLimit(**vars(limit))
+                for resource, limit in self._limits.items()
+            }
+        return self._stats
+
+    def _reserve(self, limit: GithubRateLimit) -> int:
+        # a tenth at most of small limits is kept for writes
+        return min(self.config.read_reserve, limit.limit // 10)
+
+    def _delay(self, resource: str, write: bool, now: float) -> float:
+        """Return the seconds a request must wait before it is sent."""
+        delay = self._paused_until - now
+        limit = self._limits.get(resource)
+        if limit is not None and limit.reset > now:
+            if limit.remaining <= 0:
+                delay = max(delay, limit.reset - now)
+            elif not write and limit.remaining <= self._reserve(limit):
+                delay = max(delay, limit.reset - now)
+        if write:
+            return max(delay, self._next_write - now, 0.0)
+        if self._waiting_writes:
+            # the writes held by a pause or their spacing go first
+            delay = max(delay, 0.0) + self.config.write_interval_seconds
+        return max(delay, self._next_read.get(resource, 0.0) - now, 0.0)
+
+    def _take(self, resource: str, write: bool, now: float):
+        """Count a request sent, before its response updates the limit."""
+        self._stats.requests += 1
+        if write:
+            self._stats.writes += 1
+            if now < self._spaced_until:
+                self._next_write = now + self.config.write_interval_seconds
+        limit = self._limits.get(resource)
+        if limit is None or limit.reset <= now:
+            return
+        limit.remaining -= 1
+        spare = limit.remaining - self._reserve(limit)
+        if not write and limit.remaining < limit.limit * self.config.pacing_threshold:
+            # spread the reads left until the reset
+            self._next_read[resource] = now + (limit.reset - now) / max(spare, 1)
+
+    async def acquire(self, resource: str = "core", *, write: bool = False) -> float:
+        """Wait until a request can be sent.
+
+        Args:
+            resource: The rate limit resource of the request.
+            write: Whether the request writes. Writes use the budget kept
+                from the reads, and go first after a pause.
+
+        Returns:
+            The seconds waited.
+
+        Raises:
+            GithubRateLimitExceeded: If the request would wait longer than
+                `max_wait_seconds`.
+        """
+        waited = 0.0
+        with self._lock:
+            self._waiting_writes += write
+        try:
+            while True:
+                with self._lock:
+                    now = time.time()
+                    delay = self._delay(resource, write, now)
+                    if delay <= 0:
+                        self._take(resource, write, now)
+                        break
+                    if waited + delay > self.config.max_wait_seconds:
+                        self._stats.rejected += 1
+                        raise GithubRateLimitExceeded(
+                            f"GitHub rate limit of {self.name or resource}: "
+                            f"the request would wait {waited + delay:.0f}s"
+                        )
+                await asyncio.sleep(delay)
+                waited += delay
+        finally:
+            with self._lock:
+                self._waiting_writes -= write
+        if waited:
+            with self._lock:
+                self._stats.waited += 1
+                self._stats.total_wait_seconds += waited
+        return waited
+
+    def update(
+        self, response: httpx.Response, resource: str = "core", attempt: int = 0
+    ) -> Optional[float]:
+        """Update the limits from a response, pausing the requests if it was rate limited.
+
+        Args:
+            response: The response.
+            resource: The rate limit resource of the request, if the response
+                does not name it.
+            attempt: The number of times the request was rate limited before.
+
+        Returns:
+            The seconds to wait before retrying the request if it was rate
+            limited, None otherwise.
+        """
+        headers = response.headers
+        resource = headers.get("x-ratelimit-resource", resource)
+        with self._lock:
+            now = time.time()
+            if "x-ratelimit-limit" in headers:
+                self._limits[resource] = GithubRateLimit(
+                    limit=int(headers["x-ratelimit-limit"]),
+                    remaining=int(headers["x-ratelimit-remaining"]),
+                    reset=float(headers["x-ratelimit-reset"]),
+                )
+            if response.status_code not in (403, 429):
+                return None
+            secondary = headers.get("x-ratelimit-remaining") != "0"
+            if "retry-after" in headers:
+                delay = float(headers["retry-after"])
+            elif not secondary:
+                delay = float(headers.get("x-ratelimit-reset", now)) - now
+            elif response.status_code == 429 or "rate limit" in response.text.lower():
+                delay = self.config.secondary_backoff_seconds * 2**attempt
+            else:
+                # forbidden, not rate limited
+                return None
+            delay = max(delay, 0.0)
+            self._stats.rate_limited += 1
+            self._stats.secondary_rate_limited += secondary
+            self._paused_until = max(self._paused_until, now + delay)
+            if secondary:
+                self._spaced_until = (
+                    self._paused_until + self.config.write_spacing_seconds
+                )
+        kind = "secondary" if secondary else "primary"
+        logger.warning(
+            f"GitHub {kind} rate limit of {self.name or resource} hit, "
+            f"requests paused for {delay:.0f}s"
+        )
+        return delay
+
+
+_RATE_LIMITERS: dict[str, GithubRateLimiter] = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+
+
+def get_github_rate_limiter(
+    key: str, config: Optional[GithubRateLimitConfiguration] = None
+) -> GithubRateLimiter:
+    """Return the process-wide limiter of a token, creating it with the given configuration.
+
+    Args:
+        key: Identifies the token, such as the API url and the owner of the
+            repositories of an installation.
+        config: The scheduling configuration, if the limiter is created.
+    """
+    with _RATE_LIMITERS_LOCK:
+        if key not in _RATE_LIMITERS:
+            _RATE_LIMITERS[key] = GithubRateLimiter(config, name=key)
+        return _RATE_LIMITERS[key]
+
+
+def get_github_rate_limit_stats() -> dict[str, GithubRateLimitStats]:
+    """Return the metrics of all GitHub rate limiters, by token."""
+    return {key: limiter.stats for key, limiter in _RATE_LIMITERS.items()}
+
+
+__all__ = [
+    "GithubRateLimit",
+    "GithubRateLimitConfiguration",
+    "GithubRateLimitExceeded",
+    "GithubRateLimitStats",
+    "GithubRateLimiter",
+    "get_github_rate_limit_stats",
+    "get_github_rate_limiter",
+    "is_write",
+    "request_resource",
+]
@@ -0,0 +1,614 @@
+"""Local HTTP stand-in for the GitHub REST API.
+
+`GithubStandInServer` serves the endpoints used by `AsyncGithubApi` for one
+in-memory repository, from a thread of the process, so that the GitHub tools
+can be tested and benchmarked over real HTTP connections without the network:
+
+    with GithubStandInServer() as server:
+        api = AsyncGithubApi(
+            server.repository,
+            token=lambda: "token",
+            config=GithubClientConfiguration(base_url=server.url),
+        )
+
+The server records the requests and connections it served, and can delay its
+responses to simulate the latency of the GitHub API. Like GitHub, it returns
+an `ETag` with its GET responses, and answers `304 Not Modified` to the
+requests sending it back in `If-None-Match` if the response did not change.
+
+When `rate_limit` is set, the responses carry the `X-RateLimit-*` headers of
+a primary limit counting the requests, and `rate_limited` queues rate limit
+errors to answer the next requests with.
+
+The GraphQL API is not implemented: the server replays the responses recorded
+in `graphql_responses` instead.
+"""
+
+import base64
+import difflib
+import hashlib
+import io
+import json
+import re
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlparse
+
+from common.components.diff_index import unified_diff
+
+PAGE_SIZE = 30
+"""Default number of items of a page of a list endpoint."""
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep the connections alive between requests
+    protocol_version = "HTTP/1.1"
+    server: "GithubStandInServer"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format: str, *args: Any):
+        pass
+
+    def _handle(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        with self.server.lock:
+            self.server.requests.append((self.command, url.path))
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(
+                self.server.max_in_flight, self.server.in_flight
+            )
+        try:
+            time.sleep(self.server.latency)
+            with self.server.lock:
+                if self.server.rate_limited:
+                    status, payload, headers = self.server.rate_limited.pop(0)
+                else:
+                    status, payload, headers = self.server.route(
+                        self.command,
+                        url.path,
+                        {k: v[0] for k, v in parse_qs(url.query).items()},
+                        body,
+                        self.headers.get("Accept", ""),
+                    )
+                headers = {**self.server.rate_limit_headers(), **headers}
+        finally:
+            with self.server.lock:
+                self.server.in_flight -= 1
+        if isinstance(payload, bytes):
+            content = payload
+        elif isinstance(payload, str):
+            content = payload.encode()
+            headers.setdefault("Content-Type", "text/plain")
+        else:
+            content = json.dumps(payload).encode()
+            headers.setdefault("Content-Type", "application/json")
+        if self.command == "GET" and status == 200:
+            headers["ETag"] = f'"{hashlib.sha1(content).hexdigest()}"'
+            if self.headers.get("If-None-Match") == headers["ETag"]:
+                status, content = 304, b""
+                with self.server.lock:
+                    self.server.not_modified += 1
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+
+class GithubStandInServer(ThreadingHTTPServer):
+    """An in-memory GitHub repository served over HTTP.
+
+    Attributes:
+        branches: The files of every branch, by path.
+        pulls: The pull requests, by number.
+        comments: The comments of every issue and pull request, by number.
+        reviews: The reviews of every pull request, by number.
+        workflow_logs: The job logs of the workflow run of a commit, by the
+            commit sha, or the name of the branch it is the head of, then by
+            log file name.
+        workflow_jobs: The jobs of the workflow run of a commit, by the commit
+            sha or branch name, with their `name`, `conclusion` and `steps`.
+        graphql_responses: Recorded responses of the GraphQL API, as pairs of
+            variables and response. A query is answered the first response
+            whose variables it was sent with, among others.
+        trees: The files of the trees created with the Git Data API, by sha.
+        git_commits: The commits created with the Git Data API, by sha, with
+            their `message`, `tree` and `parents`. A commit has the sha of its
+            tree, the shas being derived from the files.
+        rate_limit: The primary limit of the requests reported in the
+            `X-RateLimit-*` headers, None to send no rate limit headers.
+        rate_limited: Responses answering the next requests instead of the
+            repository, as status, payload and headers, such as rate limit
+            errors.
+        requests: The method and path of every request served.
+        connections: The number of connections opened by the clients.
+        not_modified: The number of conditional requests answered 304.
+        max_in_flight: The maximum number of requests served at once.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        repository: str = "owner/repository",
+        *,
+        files: Optional[dict[str, str]] = None,
+        latency: float = 0.0,
+    ):
+        """Initialize the server of a repository, on a free port of localhost.
+
+        Args:
+            repository: The repository, as `owner/name`.
+            files: The files of the default branch `main`, by path.
+            latency: Seconds every response is delayed.
+        """
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.repository = repository
+        self.latency = latency
+        self.lock = threading.RLock()
+        self.branches: dict[str, dict[str, str]] = {"main": dict(files or {})}
+        self.pulls: dict[int, dict[str, Any]] = {}
+        self.issues: dict[int, dict[str, Any]] = {}
+        self.comments: dict[int, list[dict[str, Any]]] = {}
+        self.reviews: dict[int, list[dict[str, Any]]] = {}
+        self.workflow_logs: dict[str, dict[str, str]] = {}
+        self.workflow_jobs: dict[str, list[dict[str, Any]]] = {}
+        self.graphql_responses: list[tuple[dict[str, Any], dict[str, Any]]] = []
+        self.trees: dict[str, dict[str, str]] = {}
+        self.git_commits: dict[str, dict[str, Any]] = {}
+        self.rate_limit: Optional[int] = None
+        self.rate_limited: list[tuple[int, Any, dict[str, str]]] = []
+        self.rate_limit_reset = int(time.time()) + 3600
+        self.requests: list[tuple[str, str]] = []
+        self.connections = 0
+        self.not_modified = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """The base url of the API."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "GithubStandInServer":
+        """Serve the requests in a background thread."""
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="github-stand-in", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the server."""
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> "GithubStandInServer":
+        """Start serving."""
+        return self.start()
+
+    def __exit__(self, *exc_info: Any):
+        """Stop serving."""
+        self.stop()
+
+    def rate_limit_headers(self) -> dict[str, str]:
+        """Return the rate limit headers of a response, after the requests served."""
+        if self.rate_limit is None:
+            return {}
+        used = min(len(self.requests), self.rate_limit)
+        return {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(self.rate_limit - used),
+            "X-RateLimit-Used": str(used),
+            "X-RateLimit-Reset": str(self.rate_limit_reset),
+            "X-RateLimit-Resource": "core",
+        }
+
+    def sha(self, branch: str) -> str:
+        """Return the sha of the head of a branch, derived from its files."""
+        return self._tree_sha(self.branches[branch])
+
+    @staticmethod
+    def _tree_sha(files: dict[str, str]) -> str:
+        return hashlib.sha1(json.dumps(files, sort_keys=True).encode()).hexdigest()
+
+    def _tree_files(self, ref: str) -> dict[str, str]:
+        """Return the files of a branch, tree or commit."""
+        if ref in self.branches:
+            return self.branches[ref]
+        if ref in self.trees:
+            return self.trees[ref]
+        for files in self.branches.values():
+            if self._tree_sha(files) == ref:
+                return files
+        raise KeyError(ref)
+
+    def diff(self, number: int) -> str:
+        """Return the unified diff of a pull request."""
+        pull = self.pulls[number]
+        return unified_diff(
+            self.branches[pull["base"]["ref"]], self.branches[pull["head"]["ref"]]
+        )
+
+    def _page(
+        self, path: str, items: list[Any], query: dict[str, str]
+    ) -> tuple[int, Any, dict[str, str]]:
+        per_page = int(query.get("per_page", PAGE_SIZE))
+        page = int(query.get("page", 1))
+        headers = {}
+        if page * per_page < len(items):
+            headers["Link"] = (
+                f'<{self.url}{path}?per_page={per_page}&page={page + 1}>; rel="next"'
+            )
+        return 200, items[(page - 1) * per_page : page * per_page], headers
+
+    def _file(self, branch: str, path: str) -> dict[str, Any]:
+        return {
+            "type": "file",
+            "name": path.rsplit("/", 1)[-1],
+            "path": path,
+            **self._blob(self.branches[branch][path]),
+            "url": f"{self.url}/repos/{self.repository}/contents/{path}?ref={branch}",
+        }
+
+    def _pull(self, number: int) -> dict[str, Any]:
+        pull = self.pulls[number]
+        head = pull["head"]["ref"]
+        return {
+            **pull,
+            "url": f"{self.url}/repos/{self.repository}/pulls/{number}",
+            "diff_url": f"{self.url}/repos/{self.repository}/pulls/{number}.diff",
+            "head": {"ref": head, "sha": self.sha(head)},
+        }
+
+    def route(
+        self, method: str, path: str, query: dict[str, str], body: Any, accept: str
+    ) -> tuple[int, Any, dict[str, str]]:
+        """Return the status, payload and headers of the response to a request."""
+        if f"{method} {path}" == "POST /graphql":
+            return self._graphql(body)
+        prefix = f"/repos/{self.repository}"
+        if not path.startswith(prefix):
+            return 404, {"message": "Not Found"}, {}
+        resource = path[len(prefix) :]
+        for pattern, handler in self._routes():
+            match = re.fullmatch(pattern, f"{method} {resource}")
+            if match:
+                try:
+                    return handler(path, query, body, accept, *match.groups())
+                except KeyError:
+                    return 404, {"message": "Not Found"}, {}
+        return 404, {"message": "Not Found"}, {}
+
+    def _graphql(self, body: Any) -> tuple[int, Any, dict[str, str]]:
+        variables = body.get("variables") or {}
+        for recorded, response in self.graphql_responses:
+            if recorded.items() <= variables.items():
+                return 200, response, {}
+        # like GitHub, errors of a query are reported with a 200
+        return 200, {"data": None, "errors": [{"message": "No recorded response"}]}, {}
+
+    def _routes(self):
+        return [
+            (r"GET ", self._get_repository),
+            (r"GET /branches", self._get_branches),
+            (r"GET /branches/(.+)", self._get_branch),
+            (r"POST /git/refs", self._create_ref),
+            (r"GET /git/trees/(.+)", self._get_tree),
+            (r"POST /git/trees", self._create_tree),
+            (r"GET /git/blobs/(\w+)", self._get_blob),
+            (r"GET /git/ref/heads/(.+)", self._get_ref),
+            (r"PATCH /git/refs/heads/(.+)", self._update_ref),
+            (r"GET /git/commits/(\w+)", self._get_commit),
+            (r"POST /git/commits", self._create_commit),
+            (r"GET /contents/?(.*)", self._get_contents),
+            (r"PUT /contents/(.+)", self._put_contents),
+            (r"DELETE /contents/(.+)", self._delete_contents),
+            (r"POST /pulls", self._create_pull),
+            (r"GET /pulls/(\d+)\.diff", self._get_diff),
+            (r"GET /pulls/(\d+)", self._get_pull),
+            (r"GET /pulls/(\d+)/files", self._get_pull_files),
+            (r"GET /pulls/(\d+)/commits", self._get_pull_commits),
+            (r"POST /pulls/(\d+)/reviews", self._create_review),
+            (r"GET /issues/(\d+)", self._get_issue),
+            (r"GET /issues/(\d+)/comments", self._get_comments),
+            (r"POST /issues/(\d+)/comments", self._create_comment),
+            (r"GET /actions/runs", self._get_workflow_runs),
+            (r"GET /actions/runs/(\w+)/logs", self._get_workflow_logs),
+            (r"GET /actions/runs/(\w+)/jobs", self._get_workflow_jobs),
+        ]
+
+    def _get_repository(self, path, query, body, accept):
+        return (
+            200,
+            {
+                "full_name": self.repository,
+                "name": self.repository.split("/")[-1],
+                "default_branch": "main",
+                "url": f"{self.url}{path}",
+            },
+            {},
+        )
+
+    def _get_branches(self, path, query, body, accept):
+        branches = [
+            {"name": name, "commit": {"sha": self.sha(name)}} for name in self.branches
+        ]
+        return self._page(path, branches, query)
+
+    def _get_branch(self, path, query, body, accept, name):
+        if name not in self.branches:
+            return 404, {"message": "Branch not found"}, {}
+        return 200, {"name": name, "commit": {"sha": self.sha(name)}}, {}
+
+    def _create_ref(self, path, query, body, accept):
+        name = body["ref"].removeprefix("refs/heads/")
+        if name in self.branches:
+            return 422, {"message": "Reference already exists"}, {}
+        base = next(b for b in self.branches if self.sha(b) == body["sha"])
+        self.branches[name] = dict(self.branches[base])
+        return 201, {"ref": body["ref"], "object": {"sha": body["sha"]}}, {}
+
+    def _get_tree(self, path, query, body, accept, ref):
+        files = self._tree_files(ref)
+        directories = {
+            file_path[:i]
+            for file_path in files
+            for i, char in enumerate(file_path)
+            if char == "/"
+        }
+        tree = [
+            {"path": directory, "type": "tree", "mode": "040000"}
+            for directory in sorted(directories)
+        ]
+        for file_path in sorted(files):
+            file = self._blob(files[file_path])
+            tree.append(
+                {
+                    "path": file_path,
+                    "type": "blob",
+                    "mode": "100644",
+                    "sha": file["sha"],
+                    "size": file["size"],
+                }
+            )
+        return 200, {"sha": self._tree_sha(files), "tree": tree, "truncated": False}, {}
+
+    def _create_tree(self, path, query, body, accept):
+        files = dict(self._tree_files(body["base_tree"]))
+        for entry in body["tree"]:
+            if "content" in entry:
+                files[entry["path"]] = entry["content"]
+            elif entry.get("sha") is None:
+                del files[entry["path"]]
+            else:
+                files[entry["path"]] = self._blob_content(entry["sha"])
+        sha = self._tree_sha(files)
+        self.trees[sha] = files
+        return 201, {"sha": sha}, {}
+
+    def _get_ref(self, path, query, body, accept, branch):
+        return (
+            200,
+            {"ref": f"refs/heads/{branch}", "object": {"sha": self.sha(branch)}},
+            {},
+        )
+
+    def _update_ref(self, path, query, body, accept, branch):
+        commit = self.git_commits[body["sha"]]
+        if self.sha(branch) not in commit["parents"] and not body.get("force"):
+            return 422, {"message": "Update is not a fast forward"}, {}
+        self.branches[branch] = dict(self.trees[commit["tree"]])
+        return 200, {"ref": f"refs/heads/{branch}", "object": {"sha": body["sha"]}}, {}
+
+    def _get_commit(self, path, query, body, accept, sha):
+        self._tree_files(sha)
+        return 200, {"sha": sha, "tree": {"sha": sha}}, {}
+
+    def _create_commit(self, path, query, body, accept):
+        sha = body["tree"]
+        self.git_commits[sha] = {
+            "message": body["message"],
+            "tree": body["tree"],
+            "parents": body["parents"],
+        }
+        return 201, {"sha": sha, "tree": {"sha": body["tree"]}}, {}
+
+    def _blob(self, content: str) -> dict[str, Any]:
+        return {
+            "sha": hashlib.sha1(content.encode()).hexdigest(),
+            "size": len(content.encode()),
+            "content": base64.b64encode(content.encode()).decode(),
+            "encoding": "base64",
+        }
+
+    def _blob_content(self, sha: str) -> str:
+        for files in [*self.branches.values(), *self.trees.values()]:
+            for content in files.values():
+                if self._blob(content)["sha"] == sha:
+                    return content
+        raise KeyError(sha)
+
+    def _get_blob(self, path, query, body, accept, sha):
+        return 200, self._blob(self._blob_content(sha)), {}
+
+    def _get_contents(self, path, query, body, accept, file_path):
+        files = self.branches[query.get("ref", "main")]
+        file_path = file_path.strip("/")
+        if file_path in files:
+            return 200, self._file(query.get("ref", "main"), file_path), {}
+        prefix = f"{file_path}/" if file_path else ""
+        entries = {}
+        for name in files:
+            if name.startswith(prefix):
+                child, _, rest = name[len(prefix) :].partition("/")
+                entries[child] = {
+                    "type": "dir" if rest else "file",
+                    "name": child,
+                    "path": prefix + child,
+                }
+        if not entries:
+            return 404, {"message": "Not Found"}, {}
+        return 200, sorted(entries.values(), key=lambda e: e["path"]), {}
+
+    def _put_contents(self, path, query, body, accept, file_path):
+        files = self.branches[body["branch"]]
+        exists = file_path in files
+        if exists and body.get("sha") != self._file(body["branch"], file_path)["sha"]:
+            return 409, {"message": f"{file_path} does not match"}, {}
+        if not exists and body.get("sha"):
+            return 404, {"message": "Not Found"}, {}
+        files[file_path] = base64.b64decode(body["content"]).decode()
+        return (
+            200 if exists else 201,
+            {"content": self._file(body["branch"], file_path)},
+            {},
+        )
+
+    def _delete_contents(self, path, query, body, accept, file_path):
+        files = self.branches[body["branch"]]
+        if body.get("sha") != self._file(body["branch"], file_path)["sha"]:
+            return 409, {"message": f"{file_path} does not match"}, {}
+        del files[file_path]
+        return 200, {"content": None}, {}
+
+    def _create_pull(self, path, query, body, accept):
+        if body["head"] not in self.branches or body["base"] not in self.branches:
+            return 422, {"message": "Validation Failed"}, {}
+        number = max([*self.pulls, *self.issues, 0]) + 1
+        self.pulls[number] = {
+            "number": number,
+            "title": body["title"],
+            "body": body.get("body"),
+            "state": "open",
+            "head": {"ref": body["head"]},
+            "base": {"ref": body["base"]},
+        }
+        return 201, self._pull(number), {}
+
+    def _get_diff(self, path, query, body, accept, number):
+        return 200, self.diff(int(number)), {}
+
+    def _get_pull(self, path, query, body, accept, number):
+        if "diff" in accept:
+            return self._get_diff(path, query, body, accept, number)
+        return 200, self._pull(int(number)), {}
+
+    def _get_pull_files(self, path, query, body, accept, number):
+        pull = self.pulls[int(number)]
+        base = self.branches[pull["base"]["ref"]]
+        head_ref = pull["head"]["ref"]
+        head = self.branches[head_ref]
+        files = []
+        for name in sorted(base.keys() | head.keys()):
+            if base.get(name) == head.get(name):
+                continue
+            old = base.get(name, "").splitlines()
+            new = head.get(name, "").splitlines()
+            diff = list(difflib.unified_diff(old, new, lineterm="", n=0))
+            files.append(
+                {
+                    "filename": name,
+                    "status": "removed" if name not in head else "modified",
+                    "additions": sum(
+                        1 for d in diff if d[:1] == "+" and d[:3] != "+++"
+                    ),
+                    "deletions": sum(
+                        1 for d in diff if d[:1] == "-" and d[:3] != "---"
+                    ),
+                    "contents_url": f"{self.url}/repos/{self.repository}/contents/{name}?ref={head_ref}",
+                }
+            )
+        return self._page(path, files, query)
+
+    def _get_pull_commits(self, path, query, body, accept, number):
+        pull = self.pulls[int(number)]
+        commit = {
+            "sha": self.sha(pull["head"]["ref"]),
+            "commit": {"message": pull["title"]},
+        }
+        return self._page(path, [commit], query)
+
+    def _create_review(self, path, query, body, accept, number):
+        review = {"id": len(self.reviews.get(int(number), [])) + 1, **body}
+        self.reviews.setdefault(int(number), []).append(review)
+        return 200, review, {}
+
+    def _get_issue(self, path, query, body, accept, number):
+        issue = self.pulls.get(int(number)) or self.issues[int(number)]
+        return (
+            200,
+            {"number": int(number), "title": issue["title"], "body": issue["body"]},
+            {},
+        )
+
+    def _get_comments(self, path, query, body, accept, number):
+        return self._page(path, self.comments.get(int(number), []), query)
+
+    def _create_comment(self, path, query, body, accept, number):
+        comment = {"id": time.time_ns(), "body": body["body"], "user": {"login": "bot"}}
+        self.comments.setdefault(int(number), []).append(comment)
+        return 201, comment, {}
+
+    def _workflow_key(self, sha: str) -> str:
+        """Return the key of the workflow run of a commit: its sha, or its branch."""
+        if sha in self.workflow_logs:
+            return sha
+        return next(
+            (
+                branch
+                for branch in self.branches
+                if branch in self.workflow_logs and self.sha(branch) == sha
+            ),
+            sha,
+        )
+
+    def _get_workflow_runs(self, path, query, body, accept):
+        sha = query.get("head_sha")
+        key = self._workflow_key(sha)
+        failed = any(
+            job["conclusion"] == "failure" for job in self.workflow_jobs.get(key, [])
+        )
+        runs = [
+            {
+                "id": sha,
+                "name": "CI",
+                "head_sha": sha,
+                "event": "pull_request",
+                "status": "completed",
+                "conclusion": "failure" if failed else "success",
+                "logs_url": f"{self.url}{path}/{sha}/logs",
+            }
+        ]
+        runs = runs if key in self.workflow_logs else []
+        return 200, {"total_count": len(runs), "workflow_runs": runs}, {}
+
+    def _get_workflow_logs(self, path, query, body, accept, sha):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as logs:
+            for name, content in self.workflow_logs[self._workflow_key(sha)].items():
+                logs.writestr(name, content)
+        return 200, archive.getvalue(), {"Content-Type": "application/zip"}
+
+    def _get_workflow_jobs(self, path, query, body, accept, sha):
+        jobs = self.workflow_jobs.get(self._workflow_key(sha), [])
+        return 200, {"total_count": len(jobs), "jobs": jobs}, {}
+
+
+__all__ = ["GithubStandInServer"]
@@ -1,13 +1,8 @@
 """Tools for the code agent."""
 
-import asyncio
-import tempfile
-import zipfile
-from os import listdir
-from typing import List, Type, Union
-
-import requests
-from github.PullRequest import ReviewComment
+import inspect
+from typing import List, Literal, Optional, Type, Union
+
 from langchain_community.agent_toolkits.github.toolkit import (
     BranchName,
     CreateFile,
@@ -15,7 +10,6 @@ from langchain_community.agent_toolkits.github.toolkit import (
     DeleteFile,
     DirectoryPath,
     GetPR,
-    GitHubToolkit,
     ReadFile,
     UpdateFile,
 )
@@ -36,7 +30,10 @@ from langchain_core.runnables import RunnableLambda
 from langchain_core.tools import BaseTool
 from pydantic import BaseModel, Field
 
+from common.components.github_client import AsyncGithubApi
 from common.components.github_mocks import MockGithubApi
+from common.components.pr_context import PrContextSection
+from common.components.tracing import GITHUB_TAG
 from common.logging import get_logger
 
 logger = get_logger(__name__)
@@ -52,6 +49,8 @@ GITHUB_TOOLS = [
     "delete_file",
     "get_pull_request",
     "list_pull_requests_files",
+    "read_files",
+    "commit_changes",
     # TODO: evaluate adding these tools as well
     # "overview_of_existing_files_in_main_branch",
     # "overview_of_files_in_current_working_branch",
@@ -60,6 +59,9 @@ GITHUB_TOOLS = [
     "get_latest_pr_workflow_run",
     "get_pull_request_head_branch",
     "get_pull_request_diff",
+    "list_diff_files",
+    "get_file_diff",
+    "get_pr_context",
     "create_pull_request_review",
     "get_issue_body",
     "create_issue_comment",
@@ -88,17 +90,13 @@ class CreateIssueComment(BaseTool):
     name: str = "create_issue_comment"
     description: str = CREATE_ISSUE_COMMENT_PROMPT
     args_schema: Type[BaseModel] = IssueComment
-    github_api_wrapper: GitHubAPIWrapper
+    github_api: AsyncGithubApi
 
-    def _run(self, pr_number: int, body: str):
-        pull_request = self.github_api_wrapper.github_repo_instance.get_pull(pr_number)
-        pull_request.create_issue_comment(body)
-        return "comment created successfully"
+    def _run(self, issue_number: int, body: str):
+        return self.github_api.run(self._arun(issue_number, body))
 
-    async def _arun(self, pr_number: int, body: str):
-        pull_request = self.github_api_wrapper.github_repo_instance.get_pull(pr_number)
-        pull_request.create_issue_comment(body)
-        return "comment created successfully"
+    async def _arun(self, issue_number: int, body: str):
+        return await self.github_api.create_issue_comment(issue_number, body)
 
 
 GET_ISSUE_BODY_PROMPT = """
@@ -120,15 +118,13 @@ class GetIssueBody(BaseTool):
     name: str = "get_issue_body"
     description: str = GET_ISSUE_BODY_PROMPT
     args_schema: Type[BaseModel] = GetIssueBodyQuery
-    github_api_wrapper: GitHubAPIWrapper
+    github_api: AsyncGithubApi
 
     def _run(self, issue_number: int):
-        issue = self.github_api_wrapper.github_repo_instance.get_issue(issue_number)
-        return issue.body
+        return self.github_api.run(self._arun(issue_number))
 
     async def _arun(self, issue_number: int):
-        issue = self.github_api_wrapper.github_repo_instance.get_issue(issue_number)
-        return issue.body
+        return await self.github_api.get_issue_body(issue_number)
 
 
 class PRReviewComment(BaseModel):
@@ -137,27 +133,19 @@ class PRReviewComment(BaseModel):
     path: str = Field(
         0, description="The file path from the diff hunk this comment relates to."
     )
-    position: int = Field(
+    line: int = Field(
         1,
-        description="""The position in the diff where you want to add a review comment. Note this value is not the same as the line number in the file. The position value equals the number of lines down from the first "@@" hunk header in the file you want to add a comment. The line just below the "@@" line is position 1, the next line is position 2, and so on. The position in the diff continues to increase through lines of whitespace and additional hunks until the beginning of a new file. **VERY IMPORTANT:** This MUST be an integer, not a float.""",
+        description="The line number of the file this comment relates to, as numbered by `get_file_diff`: in the head of the PR for added and unchanged lines, in the base for deleted lines. The line must be in the diff. **VERY IMPORTANT:** This MUST be an integer, not a float.",
     )
     body: str = Field(2, description="Text of the review comment.")
-    line: int = Field(
-        3,
-        description="The line number from the diff hunk this comment relates to. **VERY IMPORTANT:** This MUST be an integer, not a float. The feedback is represented BELOW this line number, not above it, so you may need to add one to the number.",
+    side: Literal["RIGHT", "LEFT"] = Field(
+        "RIGHT",
+        description="'RIGHT' to comment on an added or unchanged line, numbered in the head, 'LEFT' to comment on a deleted line, numbered in the base.",
     )
 
-    # converts to a pygithub ReviewComment object
-    def to_gh_review(self):
-        """Convert self to a pygithub ReviewComment object."""
-        comment = ReviewComment()
-        comment["path"] = self.path
-        # bug fix: this fixes the eventual HTTP POST data to use "line" instead of the deprecated
-        # "position", github otherwise rejects the request. this is probably a bug in pygithub
-        comment["line"] = self.position
-        comment["body"] = self.body
-        comment["line"] = self.line
-        return comment
+    def to_gh_review(self) -> dict:
+        """Convert self to the comment sent to the API."""
+        return {"path": self.path, "line": self.line, "side": self.side, "body": self.body}
 
 
 CREATE_PULL_REQUEST_REVIEW_PROMPT = """
@@ -167,6 +155,7 @@ This tool is a wrapper for the GitHub API, useful when you want to leave a pull
 - Then you must specify the body of your main comment, which is a summary of your overall feedback. It should mention anything that is very important and clearly express whether changes are requested or not.
 - Then you must specify the event for the review, which **MUST BE** one of 'REQUEST_CHANGES', 'APPROVE', or 'COMMENT'.
 - Then you must specify comments that are specific to any diff hunks. If there are none, this MUST be an empty List and CANNOT be omitted.
+- Every comment is anchored to a line of the diff, by its line number in the file. A review whose comments are not anchored to lines of the diff is not created, and the lines that are in the diff are returned.
 """
 
 
@@ -190,24 +179,22 @@ class CreatePullRequestReviewComment(BaseTool):
     name: str = "create_pull_request_review"
     description: str = CREATE_PULL_REQUEST_REVIEW_PROMPT
     args_schema: Type[BaseModel] = CreatePRReview
-    github_api_wrapper: GitHubAPIWrapper
+    github_api: AsyncGithubApi
 
     def _run(
         self, pr_number: int, body: str, event: str, comments: List[PRReviewComment]
     ):
-        return asyncio.run(self._arun(pr_number, body, event, comments))
+        return self.github_api.run(self._arun(pr_number, body, event, comments))
 
     async def _arun(
         self, pr_number: int, body: str, event: str, comments: List[PRReviewComment]
     ):
         comments_mapped = list(map(lambda x: x.to_gh_review(), comments))
 
-        # TODO: this is a pretty heavy request, and this more or less forces it to be duplicated
-        pull_request = self.github_api_wrapper.github_repo_instance.get_pull(pr_number)
-        commit = pull_request.head.sha
-        commit_obj = self.github_api_wrapper.github_repo_instance.get_commit(commit)
-
-        pull_request.create_review(commit_obj, body, event, comments_mapped)
+        # the pull request is cached for the run, shared with the other PR tools
+        return await self.github_api.create_pull_request_review(
+            pr_number, body, event, comments_mapped
+        )
 
 
 GET_PULL_REQUEST_DIFF_PROMPT = "This tool will return the diff of the code in a PR. **VERY IMPORTANT**: You must specify the PR number as an integer."
@@ -219,22 +206,127 @@ class GetPullRequestDiff(BaseTool):
     name: str = "get_pull_request_diff"
     description: str = GET_PULL_REQUEST_DIFF_PROMPT
     args_schema: Type[BaseModel] = GetPR
-    github_api_wrapper: GitHubAPIWrapper
+    github_api: AsyncGithubApi
 
     def _run(self, pr_number: int) -> str:
-        return asyncio.run(self._arun(pr_number))
+        return self.github_api.run(self._arun(pr_number))
 
     async def _arun(self, pr_number: int) -> str:
-        # TODO: this is a pretty heavy request, and this more or less forces it to be duplicated
-        pull_request = self.github_api_wrapper.github_repo_instance.get_pull(pr_number)
-        diff_url = pull_request.diff_url
-        response = requests.get(
-            diff_url, headers={"Accept": "application/vnd.github.v3.diff"}
-        )
-        response.raise_for_status()
+        return await self.github_api.get_pull_request_diff(pr_number)
+
+
+COMMIT_CHANGES_PROMPT = "This tool will commit the file changes made on the active branch since the last commit as a single commit. Call it once the changes are complete, rather than after every file. **VERY IMPORTANT**: Your input to this tool is the commit message, summarizing the changes."
+
+
+class CommitChanges(BaseModel):
+    """Schema for committing the staged changes."""
+
+    message: str = Field(..., description="The commit message.")
+
+
+READ_FILES_PROMPT = "This tool will read several files of the active branch at once. Use it instead of calling `read_file` for every file. The paths can be file paths, directories, to read all the files below them, or glob patterns such as `src/**/*.py`. Large files are truncated, and the files past the limits of a call are listed so that they can be read in another call."
+
+
+class ReadFilesQuery(BaseModel):
+    """Schema for reading several files."""
+
+    paths: List[str] = Field(
+        0,
+        description="The file paths, directories or glob patterns to read, e.g. `['README.md', 'src/**/*.py']`.",
+    )
+
+
+class ReadFiles(BaseTool):
+    """Read several files of the active branch."""
+
+    name: str = "read_files"
+    description: str = READ_FILES_PROMPT
+    args_schema: Type[BaseModel] = ReadFilesQuery
+    github_api: AsyncGithubApi
+
+    def _run(self, paths: List[str]) -> str:
+        return self.github_api.run(self._arun(paths))
+
+    async def _arun(self, paths: List[str]) -> str:
+        return await self.github_api.read_files(paths)
+
+
+LIST_DIFF_FILES_PROMPT = "This tool will list the files changed in a PR, with their number of added and deleted lines and the number of pages of their diff. Use it before `get_file_diff` instead of fetching the whole diff. **VERY IMPORTANT**: You must specify the PR number as an integer."
+
+
+class ListDiffFiles(BaseTool):
+    """List the files changed in a specific Pull Request (by PR number)."""
+
+    name: str = "list_diff_files"
+    description: str = LIST_DIFF_FILES_PROMPT
+    args_schema: Type[BaseModel] = GetPR
+    github_api: AsyncGithubApi
+
+    def _run(self, pr_number: int) -> str:
+        return self.github_api.run(self._arun(pr_number))
+
+    async def _arun(self, pr_number: int) -> str:
+        return await self.github_api.list_diff_files(pr_number)
+
+
+GET_FILE_DIFF_PROMPT = "This tool will return a page of the diff of a file changed in a PR, its lines numbered in the base and head of the PR. The files and their number of pages are listed by `list_diff_files`. **VERY IMPORTANT**: You must specify the PR number and page as integers."
+
+
+class FileDiffQuery(BaseModel):
+    """Schema for getting a page of the diff of a file."""
+
+    pr_number: int = Field(0, description="The PR number as an integer, e.g. `12`")
+    path: str = Field(
+        1, description="The path of the file, as listed by `list_diff_files`."
+    )
+    page: int = Field(1, description="The page of the diff, from 1.")
+
+
+class GetFileDiff(BaseTool):
+    """Get a page of the diff of a file of a specific Pull Request (by PR number)."""
+
+    name: str = "get_file_diff"
+    description: str = GET_FILE_DIFF_PROMPT
+    args_schema: Type[BaseModel] = FileDiffQuery
+    github_api: AsyncGithubApi
+
+    def _run(self, pr_number: int, path: str, page: int = 1) -> str:
+        return self.github_api.run(self._arun(pr_number, path, page))
 
-        diff_content = response.text
-        return diff_content
+    async def _arun(self, pr_number: int, path: str, page: int = 1) -> str:
+        return await self.github_api.get_file_diff(pr_number, path, page)
+
+
+GET_PR_CONTEXT_PROMPT = "This tool will fetch at once the title, description, head and base branches, comments, reviews and unresolved review threads, changed files and check status of a PR. Use it instead of fetching them with separate tools. The `sections` can restrict it to some of `comments`, `reviews`, `files` and `checks`. **VERY IMPORTANT**: You must specify the PR number as an integer."
+
+
+class PRContextQuery(BaseModel):
+    """Schema for getting the context of a pull request."""
+
+    pr_number: int = Field(0, description="The PR number as an integer, e.g. `12`")
+    sections: Optional[List[PrContextSection]] = Field(
+        None,
+        description="The sections to fetch, among `comments`, `reviews`, `files` and `checks`. All by default.",
+    )
+
+
+class GetPRContext(BaseTool):
+    """Get the context of a specific Pull Request (by PR number) in one query."""
+
+    name: str = "get_pr_context"
+    description: str = GET_PR_CONTEXT_PROMPT
+    args_schema: Type[BaseModel] = PRContextQuery
+    github_api: AsyncGithubApi
+
+    def _run(
+        self, pr_number: int, sections: Optional[List[PrContextSection]] = None
+    ) -> str:
+        return self.github_api.run(self._arun(pr_number, sections))
+
+    async def _arun(
+        self, pr_number: int, sections: Optional[List[PrContextSection]] = None
+    ) -> str:
+        return await self.github_api.get_pr_context(pr_number, sections)
 
 
 GET_PULL_REQUEST_HEAD_BRANCH_PROMPT = "This tool will fetch the head branch of a specific Pull Request (by PR number). **VERY IMPORTANT**: You must specify the PR number as an integer."
@@ -246,14 +338,13 @@ class GetPullRequestHeadBranch(BaseTool):
     name: str = "get_pull_request_head_branch"
     description: str = GET_PULL_REQUEST_HEAD_BRANCH_PROMPT
     args_schema: Type[BaseModel] = GetPR
-    github_api_wrapper: GitHubAPIWrapper
+    github_api: AsyncGithubApi
 
     def _run(self, pr_number: int) -> str:
-        return asyncio.run(self._arun(pr_number))
+        return self.github_api.run(self._arun(pr_number))
 
     async def _arun(self, pr_number: int) -> str:
-        pull_request = self.github_api_wrapper.github_repo_instance.get_pull(pr_number)
-        return pull_request.head.ref
+        return await self.github_api.get_pull_request_head_branch(pr_number)
 
 
 GET_LATEST_PR_WORKFLOW_RUN_PROMPT = "This tool will get the most recent workflow run for a given PR. **VERY IMPORTANT**: You must specify the PR number as an integer."
@@ -265,73 +356,145 @@ class GetLatestPRWorkflowRun(BaseTool):
     name: str = "get_latest_pr_workflow_run"
     description: str = GET_LATEST_PR_WORKFLOW_RUN_PROMPT
     args_schema: Type[BaseModel] = GetPR
-    github_api_wrapper: GitHubAPIWrapper
+    github_api: AsyncGithubApi
 
     def _run(self, pr_number: int) -> str:
-        return asyncio.run(self._arun(pr_number))
+        return self.github_api.run(self._arun(pr_number))
 
     async def _arun(self, pr_number: int) -> str:
-        repo = self.github_api_wrapper.github_repo_instance
-        pull_request = repo.get_pull(pr_number)
-        pr_commit = pull_request.head.sha
-        workflow_runs = repo.get_workflow_runs(head_sha=pr_commit, event="pull_request")
-        logger.info(f"num workflow runs: {workflow_runs.totalCount}")
-        if workflow_runs.totalCount > 0:
-            page = workflow_runs.get_page(0)
-            logs_url = page[0].logs_url
-
-            auth_token = repo.requester.auth.token
-
-            response = requests.get(
-                logs_url,
-                headers={
-                    "Accept": "application/vnd.github+text",
-                    "Authorization": "Bearer " + auth_token,
-                },
+        return await self.github_api.get_latest_pr_workflow_run(pr_number)
+
+
+def _convert_args_schema_to_string(func, args_schema: Type[BaseModel]):
+    """Wrap a function, or coroutine function, to convert its BaseModel argument to a string."""
+
+    def value(args: dict) -> str:
+        # Get the first field from the schema class
+        field_names = list(args_schema.model_json_schema()["properties"].keys())
+        if len(field_names) > 1:
+            raise AssertionError(
+                f"Expected one argument in tool schema, got {field_names}."
             )
-            response.raise_for_status()
+        field = field_names[0] if field_names else ""
+        return str(args.get(field, ""))
 
-            # generate a random temp dir for extracting the logs (which is a zip file)
-            dir = tempfile.TemporaryDirectory()
-            dirname = f"{dir.name}/workflow_run_logs.zip"
+    if inspect.iscoroutinefunction(func):
 
-            file = open(dirname, "wb")
-            file.write(response.content)
-            file.close()
+        async def async_wrapper(args: dict):
+            return await func(value(args))
 
-            zip = zipfile.ZipFile(dirname, "r")
-            zip.extractall(dir.name)
+        return async_wrapper
 
-            content = ""
-            log_files = [f for f in listdir(dir.name) if f.endswith(".txt")]
-            for file in log_files:
-                with open(f"{dir.name}/{file}") as f:
-                    content += f.read()
-                    content += "\n\n"
+    def wrapper(args: dict):
+        return func(value(args))
 
-            dir.cleanup()
-            return content
+    return wrapper
 
-        return ""
 
+def _github_api_tool(
+    github_api: AsyncGithubApi,
+    method,
+    name: str,
+    description: str,
+    args_schema: Type[BaseModel],
+) -> BaseTool:
+    """Create a tool calling a method of the API with the value of its single argument."""
+    afunc = _convert_args_schema_to_string(method, args_schema)
+    return RunnableLambda(
+        lambda args: github_api.run(afunc(args)), afunc=afunc
+    ).as_tool(name=name, description=description, args_schema=args_schema)
 
-def github_tools(github_api_wrapper: GitHubAPIWrapper) -> list[BaseTool]:
-    """Configure and return GitHub tools for the code agent."""
-    github_toolkit = GitHubToolkit.from_github_api_wrapper(github_api_wrapper)
 
-    def make_gemini_compatible(tool):
-        tool.name = tool.name.lower().replace(" ", "_").replace("'", "")
-        return tool
+def github_tools(github_api: AsyncGithubApi) -> list[BaseTool]:
+    """Configure and return GitHub tools for the code agent.
 
+    The tools of the GitHub toolkit are rebuilt on the async API, with the
+    same names, descriptions and schemas.
+    """
     all_github_tools = [
-        make_gemini_compatible(tool) for tool in github_toolkit.get_tools()
-    ] + [
-        GetLatestPRWorkflowRun(github_api_wrapper=github_api_wrapper),
-        CreatePullRequestReviewComment(github_api_wrapper=github_api_wrapper),
-        CreateIssueComment(github_api_wrapper=github_api_wrapper),
-        GetIssueBody(github_api_wrapper=github_api_wrapper),
-        GetPullRequestHeadBranch(github_api_wrapper=github_api_wrapper),
-        GetPullRequestDiff(github_api_wrapper=github_api_wrapper),
+        _github_api_tool(
+            github_api,
+            github_api.set_active_branch,
+            "set_active_branch",
+            SET_ACTIVE_BRANCH_PROMPT,
+            BranchName,
+        ),
+        _github_api_tool(
+            github_api,
+            github_api.create_branch,
+            "create_a_new_branch",
+            CREATE_BRANCH_PROMPT,
+            BranchName,
+        ),
+        _github_api_tool(
+            github_api,
+            github_api.get_files_from_directory,
+            "get_files_from_a_directory",
+            GET_FILES_FROM_DIRECTORY_PROMPT,
+            DirectoryPath,
+        ),
+        _github_api_tool(
+            github_api,
+            github_api.create_pull_request,
+            "create_pull_request",
+            CREATE_PULL_REQUEST_PROMPT,
+            CreatePR,
+        ),
+        _github_api_tool(
+            github_api,
+            github_api.create_file,
+            "create_file",
+            CREATE_FILE_PROMPT,
+            CreateFile,
+        ),
+        _github_api_tool(
+            github_api,
+            github_api.update_file,
+            "update_file",
+            UPDATE_FILE_PROMPT,
+            UpdateFile,
+        ),
+        _github_api_tool(
+            github_api, github_api.read_file, "read_file", READ_FILE_PROMPT, ReadFile
+        ),
+        _github_api_tool(
+            github_api,
+            github_api.delete_file,
+            "delete_file",
+            DELETE_FILE_PROMPT,
+            DeleteFile,
+        ),
+        _github_api_tool(
+            github_api,
+            github_api.commit_changes,
+            "commit_changes",
+            COMMIT_CHANGES_PROMPT,
+            CommitChanges,
+        ),
+        _github_api_tool(
+            github_api,
+            github_api.get_pull_request,
+            "get_pull_request",
+            GET_PR_PROMPT,
+            GetPR,
+        ),
+        _github_api_tool(
+            github_api,
+            github_api.list_pull_request_files,
+            "list_pull_requests_files",
+            LIST_PULL_REQUEST_FILES,
+            GetPR,
+        ),
+        GetLatestPRWorkflowRun(github_api=github_api),
+        CreatePullRequestReviewComment(github_api=github_api),
+        CreateIssueComment(github_api=github_api),
+        GetIssueBody(github_api=github_api),
+        GetPullRequestHeadBranch(github_api=github_api),
+        GetPullRequestDiff(github_api=github_api),
+        ListDiffFiles(github_api=github_api),
+        ReadFiles(github_api=github_api),
+        GetFileDiff(github_api=github_api),
+        GetPRContext(github_api=github_api),
     ]
     github_tools = [tool for tool in all_github_tools if tool.name in GITHUB_TOOLS]
     assert len(github_tools) == len(GITHUB_TOOLS), "Github tool mismatch"
@@ -339,23 +502,6 @@ def github_tools(github_api_wrapper: GitHubAPIWrapper) -> list[BaseTool]:
     return github_tools
 
 
-def _convert_args_schema_to_string(func, args_schema: Type[BaseModel]):
-    """Wrap a function to convert its BaseModel argument to a string."""
-
-    def wrapper(args: dict):
-        # Get the first field from the schema class
-        field_names = list(args_schema.model_json_schema()["properties"].keys())
-        if len(field_names) > 1:
-            raise AssertionError(
-                f"Expected one argument in tool schema, got {field_names}."
-            )
-        field = field_names[0] if field_names else ""
-        value = args.get(field, "")
-        return func(str(value))
-
-    return wrapper
-
-
 def mock_github_tools(mock_api: MockGithubApi):
     """Create mocked GitHub tools.
 
@@ -406,6 +552,19 @@ def mock_github_tools(mock_api: MockGithubApi):
         RunnableLambda(
             _convert_args_schema_to_string(mock_api.read_file, ReadFile)
         ).as_tool(name="read_file", description=READ_FILE_PROMPT, args_schema=ReadFile),
+        RunnableLambda(
+            _convert_args_schema_to_string(mock_api.commit_changes, CommitChanges)
+        ).as_tool(
+            name="commit_changes",
+            description=COMMIT_CHANGES_PROMPT,
+            args_schema=CommitChanges,
+        ),
+        # the paths are passed as a list, not converted to a string
+        RunnableLambda(lambda args: mock_api.read_files(args["paths"])).as_tool(
+            name="read_files",
+            description=READ_FILES_PROMPT,
+            args_schema=ReadFilesQuery,
+        ),
         RunnableLambda(
             _convert_args_schema_to_string(mock_api.delete_file, DeleteFile)
         ).as_tool(
@@ -440,8 +599,39 @@ def mock_github_tools(mock_api: MockGithubApi):
             args_schema=GetPR,
         ),
         RunnableLambda(
-            _convert_args_schema_to_string(
-                mock_api.create_pull_request_review, CreatePRReview
+            _convert_args_schema_to_string(mock_api.list_diff_files, GetPR)
+        ).as_tool(
+            name="list_diff_files",
+            description=LIST_DIFF_FILES_PROMPT,
+            args_schema=GetPR,
+        ),
+        RunnableLambda(
+            lambda args: mock_api.get_file_diff(
+                args["pr_number"], args["path"], args.get("page", 1)
+            )
+        ).as_tool(
+            name="get_file_diff",
+            description=GET_FILE_DIFF_PROMPT,
+            args_schema=FileDiffQuery,
+        ),
+        RunnableLambda(
+            lambda args: mock_api.get_pr_context(
+                args["pr_number"], args.get("sections")
+            )
+        ).as_tool(
+            name="get_pr_context",
+            description=GET_PR_CONTEXT_PROMPT,
+            args_schema=PRContextQuery,
+        ),
+        RunnableLambda(
+            lambda args: mock_api.create_pull_request_review(
+                args["pr_number"],
+                args["body"],
+                args["event"],
+                [
+                    c.to_gh_review() if isinstance(c, PRReviewComment) else c
+                    for c in args["comments"]
+                ],
             )
         ).as_tool(
             name="create_pull_request_review",
@@ -449,14 +639,16 @@ def mock_github_tools(mock_api: MockGithubApi):
             args_schema=CreatePRReview,
         ),
         RunnableLambda(
-            _convert_args_schema_to_string(mock_api.get_issue_body, GetIssueBody)
+            _convert_args_schema_to_string(mock_api.get_issue_body, GetIssueBodyQuery)
         ).as_tool(
             name="get_issue_body",
             description=GET_ISSUE_BODY_PROMPT,
             args_schema=GetIssueBodyQuery,
         ),
         RunnableLambda(
-            _convert_args_schema_to_string(mock_api.create_issue_comment, IssueComment)
+            lambda args: mock_api.create_issue_comment(
+                args["issue_number"], args["body"]
+            )
         ).as_tool(
             name="create_issue_comment",
             description=CREATE_ISSUE_COMMENT_PROMPT,
@@ -480,12 +672,23 @@ def mock_github_tools(mock_api: MockGithubApi):
     return tools
 
 
-def get_github_tools(source: Union[GitHubAPIWrapper, MockGithubApi]) -> list[BaseTool]:
+def get_github_tools(
+    source: Union[GitHubAPIWrapper, AsyncGithubApi, MockGithubApi],
+) -> list[BaseTool]:
     """Get the GitHub tools.
 
     Args:
-        source: Either a GitHubAPIWrapper or MockGithubApi instance
+        source: Either a GitHubAPIWrapper, AsyncGithubApi or MockGithubApi instance.
+            The tools of a GitHubAPIWrapper call the async API of its repository.
     """
     if isinstance(source, GitHubAPIWrapper):
-        return github_tools(source)
-    return mock_github_tools(source)
+        source = AsyncGithubApi.from_wrapper(source)
+    tools = (
+        github_tools(source)
+        if isinstance(source, AsyncGithubApi)
+        else mock_github_tools(source)
+    )
+    # tag the tools so that their calls are traced as GitHub API calls
+    for tool in tools:
+        tool.tags = [*(tool.tags or []), GITHUB_TAG]
+    return tools
@@ -0,0 +1,368 @@
+"""Record and replay of model responses.
+
+Graph tests, evaluations and scenarios call live models on every run, which is
+slow, non-deterministic and expensive. `RecordedChatModel` wraps a chat model so
+that its responses are stored in cassettes on disk, and replayed when the same
+request is made again:
+
+- `passthrough` calls the model, nothing is recorded,
+- `record` replays the recorded responses and records the missing ones,
+- `replay` only replays, and raises `CassetteMiss` for a request never recorded.
+
+Requests are keyed by model, normalized messages and bound tool schemas. The
+normalization drops message and tool call ids, and replaces UUIDs and ISO
+timestamps, so that a run replays even though its thread ids and system times
+differ from the recorded run.
+
+The mode and the cassette directory default to the `AI_NEXUS_LLM_CACHE` and
+`AI_NEXUS_LLM_CASSETTES` environment variables, so that whole test suites can
+be switched to replay without changing the agent configurations:
+
+    AI_NEXUS_LLM_CACHE=record pytest tests/graph_tests   # once, with live models
+    AI_NEXUS_LLM_CACHE=replay pytest tests/graph_tests   # offline
+
+No cassettes are committed: record them before replaying. In replay mode the
+provider models are not initialized, a `ReplayChatModel` stands in for them, so
+replays need no credentials. Requests are therefore keyed by the parameters the
+model is initialized with, not by the parameters of the provider model.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Literal, Optional, Sequence
+
+from langchain.chat_models import init_chat_model
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel, LanguageModelInput
+from langchain_core.messages import (
+    BaseMessage,
+    message_to_dict,
+    messages_from_dict,
+)
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from common.components.model_wrappers import DelegatingChatModel
+from common.logging import get_logger
+
+logger = get_logger(__name__)
+
+LlmCacheMode = Literal["passthrough", "record", "replay"]
+
+_VOLATILE_PATTERNS = [
+    (
+        re.compile(
+            r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.I
+        ),
+        "<uuid>",
+    ),
+    (
+        re.compile(
+            r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?([+-]\d{2}:\d{2}|Z)?"
+        ),
+        "<datetime>",
+    ),
+]
+
+
+@dataclass(kw_only=True)
+class LlmCacheConfiguration:
+    """Configuration for recording and replaying model responses."""
+
+    mode: LlmCacheMode = field(
+        default_factory=lambda: os.getenv("AI_NEXUS_LLM_CACHE", "passthrough")
+    )
+    """`passthrough`, `record` or `replay`. Defaults to the `AI_NEXUS_LLM_CACHE` environment variable."""
+    cassette_dir: str = field(
+        default_factory=lambda: os.getenv("AI_NEXUS_LLM_CASSETTES", "tests/cassettes")
+    )
+    """Directory of the cassettes. Defaults to the `AI_NEXUS_LLM_CASSETTES` environment variable."""
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode for a request that was never recorded."""
+
+
+def _normalize(text: str) -> str:
+    for pattern, placeholder in _VOLATILE_PATTERNS:
+        text = pattern.sub(placeholder, text)
+    return text
+
+
+def _request_message(message: BaseMessage) -> dict[str, Any]:
+    request = {"type": message.type, "content": message.content}
+    if tool_calls := getattr(message, "tool_calls", None):
+        request["tool_calls"] = [
+            {"name": call["name"], "args": call["args"]} for call in tool_calls
+        ]
+    if message.type == "tool":
+        request["status"] = message.status
+    return request
+
+
+def cassette_request(
+    model: str,
+    messages: list[BaseMessage],
+    *,
+    params: Optional[dict[str, Any]] = None,
+    tools: Optional[list[dict[str, Any]]] = None,
+    stop: Optional[list[str]] = None,
+    tool_choice: Any = None,
+) -> tuple[str, str]:
+    """Return the key of a request and its normalized JSON representation.
+
+    Args:
+        model: The model name.
+        messages: The messages sent to the model.
+        params: Parameters of the model changing its responses, such as the temperature.
+        tools: The JSON schemas of the bound tools.
+        stop: The stop sequences.
+        tool_choice: The tool choice, if any.
+
+    Returns:
+        The hex digest of the request, and the request.
+    """
+    request = {
+        "model": model,
+        "params": params or {},
+        "messages": [_request_message(m) for m in messages],
+        "tools": tools or [],
+        "stop": stop,
+        "tool_choice": tool_choice,
+    }
+    text = _normalize(json.dumps(request, sort_keys=True, default=str, indent=1))
+    return hashlib.sha256(text.encode()).hexdigest(), text
+
+
+class CassetteStore:
+    """Recorded responses, stored as one JSON file per request."""
+
+    def __init__(self, directory: str | Path):
+        """Initialize the store in the given directory."""
+        self.directory = Path(directory)
+
+    def path(self, model: str, key: str) -> Path:
+        """Return the cassette file of a request."""
+        slug = re.sub(r"[^\w.-]+", "_", model)
+        return self.directory / slug / f"{key[:32]}.json"
+
+    def get(self, model: str, key: str) -> Optional[ChatResult]:
+        """Return the recorded response of a request, None if not recorded."""
+        path = self.path(model, key)
+        if not path.exists():
+            return None
+        cassette = json.loads(path.read_text())
+        return ChatResult(
+            generations=[
+                ChatGeneration(
+                    message=messages_from_dict([g["message"]])[0],
+                    generation_info=g.get("generation_info"),
+                )
+                for g in cassette["generations"]
+            ],
+            llm_output=cassette.get("llm_output"),
+        )
+
+    def put(self, model: str, key: str, request: str, result: ChatResult):
+        """Record the response of a request."""
+        path = self.path(model, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        cassette = {
+            "request": json.loads(request),
+            "generations": [
+                {
+                    "message": message_to_dict(g.message),
+                    "generation_info": g.generation_info,
+                }
+                for g in result.generations
+            ],
+            "llm_output": result.llm_output,
+        }
+        # written atomically, concurrent runs may record the same request
+        with tempfile.NamedTemporaryFile(
+            "w", dir=path.parent, suffix=".tmp", delete=False
+        ) as f:
+            json.dump(cassette, f, indent=1, default=str)
+        os.replace(f.name, path)
+
+
+def _params(params: dict[str, Any]) -> dict[str, Any]:
+    return {k: v for k, v in params.items() if isinstance(v, str | int | float | bool)}
+
+
+class ReplayChatModel(BaseChatModel):
+    """Stand-in of a provider model in replay mode, needing no credentials.
+
+    Its responses are all replayed by the `RecordedChatModel` wrapping it, it is
+    never called.
+    """
+
+    model_name: str
+    """The model name, as given to `init_chat_model`."""
+
+    @property
+    def _llm_type(self) -> str:
+        return self.model_name.split(":", maxsplit=1)[0]
+
+    def bind_tools(
+        self, tools: Sequence[Any], **kwargs: Any
+    ) -> Runnable[LanguageModelInput, BaseMessage]:
+        """Bind the JSON schemas of the tools."""
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        raise CassetteMiss(f"{self.model_name} is not called in replay mode")
+
+
+class RecordedChatModel(DelegatingChatModel):
+    """A chat model recording and replaying its responses."""
+
+    llm_name: str
+    """The model name the responses are recorded under."""
+    store: Any
+    """The `CassetteStore` of the responses."""
+    mode: LlmCacheMode = "record"
+    params: dict[str, Any] = {}
+    """The parameters the model was initialized with, such as the temperature."""
+
+    def bind_tools(
+        self, tools: Sequence[Any], **kwargs: Any
+    ) -> Runnable[LanguageModelInput, BaseMessage]:
+        """Bind tools formatted by the wrapped model, keeping their schemas for the cassette keys."""
+        return self.bind(
+            **self.model.bind_tools(tools, **kwargs).kwargs,
+            tool_schemas=[convert_to_openai_tool(t) for t in tools],
+        )
+
+    def _lookup(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]],
+        kwargs: dict[str, Any],
+    ) -> tuple[str, str, Optional[ChatResult]]:
+        key, request = cassette_request(
+            self.llm_name,
+            messages,
+            params=_params(self.params),
+            tools=kwargs.pop("tool_schemas", None),
+            stop=stop,
+            tool_choice=kwargs.get("tool_choice"),
+        )
+        result = self.store.get(self.llm_name, key)
+        if result is None and self.mode == "replay":
+            raise CassetteMiss(
+                f"No response recorded for {self.llm_name} "
+                f"in {self.store.path(self.llm_name, key)}, "
+                f"record it with AI_NEXUS_LLM_CACHE=record. Request:\n{request}"
+            )
+        return key, request, result
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key, request, result = self._lookup(messages, stop, kwargs)
+        if result is None:
+            result = self.model._generate(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            )
+            self.store.put(self.llm_name, key, request, result)
+        return result
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key, request, result = self._lookup(messages, stop, kwargs)
+        if result is None:
+            result = await self.model._agenerate(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            )
+            self.store.put(self.llm_name, key, request, result)
+        return result
+
+
+def recorded(
+    llm: BaseChatModel,
+    model: str,
+    config: LlmCacheConfiguration,
+    params: Optional[dict[str, Any]] = None,
+) -> BaseChatModel:
+    """Wrap the chat model to record or replay its responses, unless in passthrough mode.
+
+    Args:
+        llm: The chat model.
+        model: The model name, the responses are recorded under.
+        config: The configuration of the recording.
+        params: The parameters the model was initialized with, part of the
+            cassette keys.
+
+    Returns:
+        The chat model, recorded or replayed.
+    """
+    if config.mode == "passthrough":
+        return llm
+    if config.mode not in ("record", "replay"):
+        raise ValueError(f"Unknown LLM cache mode: {config.mode}")
+    logger.debug(f"Using {config.mode} mode for {model} in {config.cassette_dir}")
+    return RecordedChatModel(
+        model=llm,
+        llm_name=model,
+        store=CassetteStore(config.cassette_dir),
+        mode=config.mode,
+        params=params or {},
+    )
+
+
+def init_recorded_chat_model(model: str, **kwargs: Any) -> BaseChatModel:
+    """Initialize a chat model like `init_chat_model`, recorded or replayed as set by the environment.
+
+    For models created without an agent configuration, such as evaluation judges.
+    See `common.components.llm_cache`.
+
+    Args:
+        model: The model to initialize.
+        **kwargs: Additional arguments passed to `init_chat_model`.
+
+    Returns:
+        The chat model.
+    """
+    config = LlmCacheConfiguration()
+    if config.mode == "replay":
+        # replayed responses need no provider model, nor its credentials
+        return recorded(ReplayChatModel(model_name=model), model, config, kwargs)
+    return recorded(init_chat_model(model, **kwargs), model, config, kwargs)
+
+
+__all__ = [
+    "CassetteMiss",
+    "CassetteStore",
+    "LlmCacheConfiguration",
+    "LlmCacheMode",
+    "RecordedChatModel",
+    "ReplayChatModel",
+    "cassette_request",
+    "init_recorded_chat_model",
+    "recorded",
+]
@@ -0,0 +1,304 @@
+"""Routing of cheap model calls to a small model, escalating to the agent's model.
+
+Some model calls are cheap or structured: the orchestrator deciding which agent
+to delegate to, repairing the arguments of a failed tool call, or simulating the
+human user. `RoutedChatModel` sends these steps to a small fast model first, and
+escalates to the agent's model when the small model fails, returns an empty or
+malformed reply, stops on its output limit, or reports a low confidence.
+
+The step of a call is given by the call site (`create_chat_model(..., step=...)`),
+except for tool repair, which is detected from the messages: a call following a
+failed tool call. Every call is recorded in per-step `RoutingStats`, giving the
+escalation rate and an estimate of the latency and cost saved compared to
+sending every call to the agent's model.
+
+Cached content holding the prompt of a call is of the agent's model only: the
+small model is then called with the inline prompt bound as `small_model_messages`
+by the `PromptAssembler`.
+"""
+
+import math
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Optional, Sequence
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel, LanguageModelInput
+from langchain_core.messages import BaseMessage, ToolMessage
+from langchain_core.outputs import ChatResult
+from langchain_core.runnables import Runnable
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from common.components.model_wrappers import DelegatingChatModel
+from common.components.telemetry import get_telemetry
+from common.logging import get_logger
+
+logger = get_logger(__name__)
+
+ROUTING_STEP = "routing"
+"""An orchestrator deciding the next delegation."""
+TOOL_REPAIR_STEP = "tool_repair"
+"""A call following a failed tool call, usually fixing the tool arguments."""
+SIMULATION_STEP = "simulation"
+"""An AI simulating the human user."""
+DEFAULT_STEP = "default"
+
+_TRUNCATED_FINISH_REASONS = ("MAX_TOKENS", "length")
+
+
+@dataclass(kw_only=True)
+class ModelRoutingConfiguration:
+    """Configuration for routing cheap model calls to a small model."""
+
+    use_model_routing: bool = False
+    """Whether the steps in `small_model_steps` are sent to the small model first."""
+    small_model: str = "google_genai:gemini-2.0-flash-lite"
+    """The small fast model, as given to `init_chat_model`."""
+    small_model_steps: list[str] = field(
+        default_factory=lambda: [ROUTING_STEP, TOOL_REPAIR_STEP, SIMULATION_STEP]
+    )
+    """Steps sent to the small model first."""
+    min_confidence: float = 0.5
+    """Escalate when the small model reports a lower mean token probability. Ignored for models not reporting log probabilities."""
+
+
+@dataclass(kw_only=True)
+class RoutingStats:
+    """Calls, escalations, latency and cost of a step."""
+
+    calls: int = 0
+    small_calls: int = 0
+    escalations: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    """Number of small model replies rejected, by reason."""
+    small_latency: float = 0.0
+    """Total latency of the small model calls, including the escalated ones."""
+    small_cost: float = 0.0
+    large_calls: int = 0
+    large_latency: float = 0.0
+    large_cost: float = 0.0
+    saved_cost: float = 0.0
+    """Estimated cost saved by the accepted small model replies, minus the cost of the escalated ones."""
+
+    @property
+    def accepted(self) -> int:
+        """Number of calls answered by the small model."""
+        return self.small_calls - sum(self.escalations.values())
+
+    @property
+    def saved_latency(self) -> Optional[float]:
+        """Estimated latency saved, from the mean latency of the large model on this step."""
+        if not self.large_calls:
+            return None
+        mean_large_latency = self.large_latency / self.large_calls
+        return self.accepted * mean_large_latency - self.small_latency
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the stats as a JSON serializable dictionary."""
+        saved_latency = self.saved_latency
+        return {
+            "calls": self.calls,
+            "small_calls": self.small_calls,
+            "accepted": self.accepted,
+            "escalations": dict(self.escalations),
+            "large_calls": self.large_calls,
+            "small_latency": round(self.small_latency, 3),
+            "large_latency": round(self.large_latency, 3),
+            "small_cost": round(self.small_cost, 6),
+            "large_cost": round(self.large_cost, 6),
+            "saved_latency": (
+                round(saved_latency, 3) if saved_latency is not None else None
+            ),
+            "saved_cost": round(self.saved_cost, 6),
+        }
+
+
+_ROUTING_STATS: dict[str, RoutingStats] = {}
+
+
+def get_routing_stats() -> dict[str, RoutingStats]:
+    """Return the routing stats of all steps."""
+    return _ROUTING_STATS
+
+
+def _cost(result: ChatResult, model: str) -> float:
+    price = get_telemetry().price(model)
+    if price is None:
+        return 0.0
+    cost = 0.0
+    for generation in result.generations:
+        if usage := generation.message.usage_metadata:
+            cost += usage["input_tokens"] * price.input / 1e6
+            cost += usage["output_tokens"] * price.output / 1e6
+    return cost
+
+
+def _confidence(message: BaseMessage) -> Optional[float]:
+    """Return the mean token probability reported by the provider, if any."""
+    metadata = message.response_metadata
+    if (avg_logprobs := metadata.get("avg_logprobs")) is not None:
+        return math.exp(avg_logprobs)
+    tokens = (metadata.get("logprobs") or {}).get("content") or []
+    if tokens:
+        return math.exp(sum(t["logprob"] for t in tokens) / len(tokens))
+    return None
+
+
+def _step(messages: list[BaseMessage]) -> Optional[str]:
+    if (
+        messages
+        and isinstance(messages[-1], ToolMessage)
+        and messages[-1].status == "error"
+    ):
+        return TOOL_REPAIR_STEP
+    return None
+
+
+class RoutedChatModel(DelegatingChatModel):
+    """A chat model sending some steps to a small model first."""
+
+    small_model: BaseChatModel
+    large_model_name: str
+    small_model_name: str
+    step: str = DEFAULT_STEP
+    """The step of the calls, unless detected from the messages."""
+    small_model_steps: list[str]
+    min_confidence: float = 0.5
+
+    def bind_tools(
+        self, tools: Sequence[Any], **kwargs: Any
+    ) -> Runnable[LanguageModelInput, BaseMessage]:
+        """Bind tools formatted by both models to this model."""
+        return self.bind(
+            **self.model.bind_tools(tools, **kwargs).kwargs,
+            small_model_kwargs=self.small_model.bind_tools(tools, **kwargs).kwargs,
+            tool_names=[convert_to_openai_tool(t)["function"]["name"] for t in tools],
+        )
+
+    def _rejection(
+        self, result: ChatResult, tool_names: Optional[list[str]]
+    ) -> Optional[str]:
+        """Return why the reply of the small model is rejected, None if accepted."""
+        if not result.generations:
+            return "empty"
+        message = result.generations[0].message
+        tool_calls = getattr(message, "tool_calls", [])
+        if getattr(message, "invalid_tool_calls", None):
+            return "invalid_tool_call"
+        if tool_names is not None and any(
+            call["name"] not in tool_names for call in tool_calls
+        ):
+            return "unknown_tool"
+        if not tool_calls and not message.text().strip():
+            return "empty"
+        if message.response_metadata.get("finish_reason") in _TRUNCATED_FINISH_REASONS:
+            return "truncated"
+        confidence = _confidence(message)
+        if confidence is not None and confidence < self.min_confidence:
+            return "low_confidence"
+        return None
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        # synchronous calls are not routed
+        kwargs.pop("small_model_kwargs", None)
+        kwargs.pop("small_model_messages", None)
+        kwargs.pop("tool_names", None)
+        return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        small_model_kwargs = kwargs.pop("small_model_kwargs", {})
+        small_model_messages = kwargs.pop("small_model_messages", None) or messages
+        tool_names = kwargs.pop("tool_names", None)
+        step = _step(messages) or self.step
+        stats = _ROUTING_STATS.setdefault(step, RoutingStats())
+        stats.calls += 1
+
+        if step in self.small_model_steps:
+            start = time.monotonic()
+            try:
+                # the cached content of a prompt is of the large model only
+                result = await self.small_model._agenerate(
+                    small_model_messages,
+                    stop=stop,
+                    run_manager=run_manager,
+                    **{
+                        **{k: v for k, v in kwargs.items() if k != "cached_content"},
+                        **small_model_kwargs,
+                    },
+                )
+                reason = self._rejection(result, tool_names)
+                cost = _cost(result, self.small_model_name)
+            except Exception as e:
+                logger.warning(f"Small model failed on {step} step: {e!r}")
+                reason, cost = "error", 0.0
+            stats.small_calls += 1
+            stats.small_latency += time.monotonic() - start
+            stats.small_cost += cost
+
+            if reason is None:
+                stats.saved_cost += _cost(result, self.large_model_name) - cost
+                for generation in result.generations:
+                    generation.message.response_metadata.setdefault(
+                        "model_name", self.small_model_name.split(":")[-1]
+                    )
+                return result
+
+            stats.escalations[reason] += 1
+            stats.saved_cost -= cost
+            logger.info(f"Escalating {step} step to {self.large_model_name}: {reason}")
+
+        start = time.monotonic()
+        result = await self.model._agenerate(
+            messages, stop=stop, run_manager=run_manager, **kwargs
+        )
+        stats.large_calls += 1
+        stats.large_latency += time.monotonic() - start
+        stats.large_cost += _cost(result, self.large_model_name)
+        return result
+
+
+def routed(
+    llm: BaseChatModel,
+    model: str,
+    small_llm: BaseChatModel,
+    config: ModelRoutingConfiguration,
+    step: Optional[str] = None,
+) -> RoutedChatModel:
+    """Route the steps of the configuration to the small model before the given model."""
+    return RoutedChatModel(
+        model=llm,
+        large_model_name=model,
+        small_model=small_llm,
+        small_model_name=config.small_model,
+        step=step or DEFAULT_STEP,
+        small_model_steps=config.small_model_steps,
+        min_confidence=config.min_confidence,
+    )
+
+
+__all__ = [
+    "DEFAULT_STEP",
+    "ModelRoutingConfiguration",
+    "ROUTING_STEP",
+    "RoutedChatModel",
+    "RoutingStats",
+    "SIMULATION_STEP",
+    "TOOL_REPAIR_STEP",
+    "get_routing_stats",
+    "routed",
+]
@@ -0,0 +1,73 @@
+"""Base class of chat models wrapping another chat model."""
+
+from typing import Any, Optional, Sequence
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel, LanguageModelInput
+from langchain_core.language_models.base import LangSmithParams
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+from langchain_core.runnables import Runnable
+from pydantic import ConfigDict
+
+
+class DelegatingChatModel(BaseChatModel):
+    """A chat model delegating generation to a wrapped chat model.
+
+    Subclasses override `_agenerate` (and `_generate`) to add behavior around the
+    calls of the wrapped model. Tools bound with `bind_tools` are formatted by the
+    wrapped model and passed through to it, and the tracing parameters (provider,
+    model name) are those of the wrapped model.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model: BaseChatModel
+    """The wrapped chat model."""
+
+    @property
+    def _llm_type(self) -> str:
+        return self.model._llm_type
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return self.model._identifying_params
+
+    def _get_ls_params(
+        self, stop: Optional[list[str]] = None, **kwargs: Any
+    ) -> LangSmithParams:
+        return self.model._get_ls_params(stop=stop, **kwargs)
+
+    def bind_tools(
+        self, tools: Sequence[Any], **kwargs: Any
+    ) -> Runnable[LanguageModelInput, BaseMessage]:
+        """Bind tools formatted by the wrapped model to this model."""
+        return self.bind(**self.model.bind_tools(tools, **kwargs).kwargs)
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return self.model._generate(
+            messages, stop=stop, run_manager=run_manager, **kwargs
+        )
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return await self.model._agenerate(
+            messages, stop=stop, run_manager=run_manager, **kwargs
+        )
+
+
+__all__ = ["DelegatingChatModel"]
@@ -0,0 +1,282 @@
+"""Context of a pull request in one GraphQL query.
+
+Reviewers and change request coders gathered the context of a pull request
+with several tools, `get_pull_request`, `list_pull_requests_files`,
+`get_pull_request_head_branch` and `get_latest_pr_workflow_run`, each a turn of
+the model and a REST request. `PR_CONTEXT_QUERY` fetches the description,
+refs, comments, reviews, changed files and check status of a pull request in
+one GraphQL query. Sections can be left out with its `with*` variables, and the
+comments, review threads and files are paginated with their cursor variables:
+`next_page_variables` returns the variables of the query fetching the next
+pages of the sections having more.
+
+`format_pr_context` renders the pull request as compact text.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Literal, Optional
+
+PrContextSection = Literal["comments", "reviews", "files", "checks"]
+
+PR_CONTEXT_SECTIONS: tuple[PrContextSection, ...] = (
+    "comments",
+    "reviews",
+    "files",
+    "checks",
+)
+
+PR_CONTEXT_QUERY = """
+query PullRequestContext(
+  $owner: String!, $name: String!, $number: Int!,
+  $withComments: Boolean!, $withReviews: Boolean!,
+  $withFiles: Boolean!, $withChecks: Boolean!,
+  $commentsCursor: String, $threadsCursor: String, $filesCursor: String
+) {
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $number) {
+      number
+      title
+      body
+      state
+      isDraft
+      url
+      author { login }
+      headRefName
+      headRefOid
+      baseRefName
+      additions
+      deletions
+      changedFiles
+      comments(first: 50, after: $commentsCursor) @include(if: $withComments) {
+        totalCount
+        pageInfo { hasNextPage endCursor }
+        nodes { author { login } body createdAt }
+      }
+      reviews(last: 20) @include(if: $withReviews) {
+        nodes { author { login } state body }
+      }
+      reviewThreads(first: 50, after: $threadsCursor) @include(if: $withReviews) {
+        totalCount
+        pageInfo { hasNextPage endCursor }
+        nodes {
+          path
+          line
+          isResolved
+          isOutdated
+          comments(first: 10) { nodes { author { login } body } }
+        }
+      }
+      files(first: 100, after: $filesCursor) @include(if: $withFiles) {
+        totalCount
+        pageInfo { hasNextPage endCursor }
+        nodes { path additions deletions changeType }
+      }
+      commits(last: 1) @include(if: $withChecks) {
+        nodes {
+          commit {
+            statusCheckRollup {
+              state
+              contexts(first: 50) {
+                nodes {
+                  __typename
+                  ... on CheckRun { name status conclusion }
+                  ... on StatusContext { context state }
+                }
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+_PAGINATED = {
+    "comments": ("withComments", "commentsCursor"),
+    "reviewThreads": ("withReviews", "threadsCursor"),
+    "files": ("withFiles", "filesCursor"),
+}
+"""The paginated connections, with the variables including them and their cursor."""
+
+_CHANGE_TYPES = {
+    "ADDED": "A",
+    "DELETED": "D",
+    "RENAMED": "R",
+    "COPIED": "C",
+    "MODIFIED": "M",
+    "CHANGED": "M",
+}
+
+
+@dataclass(kw_only=True)
+class PrContextConfiguration:
+    """Configuration for fetching the context of pull requests."""
+
+    max_pages: int = 5
+    """Pages fetched per paginated section, the others being counted but not shown."""
+    max_body_chars: int = 4_000
+    """Characters of the description shown, the rest being truncated."""
+    max_comment_chars: int = 1_000
+    """Characters of every comment shown, the rest being truncated."""
+
+
+def pr_context_variables(
+    repository: str, number: int, sections: Optional[list[str]] = None
+) -> dict[str, Any]:
+    """Return the variables of the query of the first page of a pull request.
+
+    Args:
+        repository: The repository, as `owner/name`.
+        number: The pull request number.
+        sections: The sections to fetch, all by default.
+    """
+    owner, name = repository.split("/")
+    sections = PR_CONTEXT_SECTIONS if sections is None else sections
+    return {
+        "owner": owner,
+        "name": name,
+        "number": number,
+        **{
+            f"with{section.title()}": section in sections
+            for section in PR_CONTEXT_SECTIONS
+        },
+    }
+
+
+def next_page_variables(
+    variables: dict[str, Any], pull: dict[str, Any]
+) -> Optional[dict[str, Any]]:
+    """Return the variables of the query of the next pages, None if there are none.
+
+    Only the sections having more pages are included.
+
+    Args:
+        variables: The variables of the last query.
+        pull: The pull request of its response.
+    """
+    next_variables = {
+        **variables,
+        **{f"with{section.title()}": False for section in PR_CONTEXT_SECTIONS},
+    }
+    more = False
+    for connection, (include, cursor) in _PAGINATED.items():
+        page_info = (pull.get(connection) or {}).get("pageInfo", {})
+        if page_info.get("hasNextPage"):
+            next_variables[include] = True
+            next_variables[cursor] = page_info["endCursor"]
+            more = True
+    return next_variables if more else None
+
+
+def merge_pages(pull: dict[str, Any], page: dict[str, Any]):
+    """Add the nodes of the next pages of a pull request to it."""
+    for connection in _PAGINATED:
+        if page.get(connection) is None:
+            continue
+        if pull.get(connection) is None:
+            pull[connection] = page[connection]
+            continue
+        pull[connection]["nodes"].extend(page[connection]["nodes"])
+        pull[connection]["pageInfo"] = page[connection]["pageInfo"]
+
+
+def _truncate(text: Optional[str], limit: int) -> str:
+    text = (text or "").strip()
+    return text if len(text) <= limit else text[:limit] + "… (truncated)"
+
+
+def _login(node: dict[str, Any]) -> str:
+    # the author of a deleted account is null
+    return (node.get("author") or {}).get("login", "ghost")
+
+
+def _more(connection: dict[str, Any], what: str) -> list[str]:
+    missing = connection.get("totalCount", 0) - len(connection["nodes"])
+    return [f"- ... {missing} more {what} not shown"] if missing > 0 else []
+
+
+def format_pr_context(
+    pull: dict[str, Any], config: Optional[PrContextConfiguration] = None
+) -> str:
+    """Return the context of a pull request as compact text.
+
+    Args:
+        pull: The pull request of the response, with the nodes of all the pages fetched.
+        config: The truncation limits.
+    """
+    config = config or PrContextConfiguration()
+    draft = ", draft" if pull.get("isDraft") else ""
+    lines = [
+        f"PR #{pull['number']}: {pull['title']} ({pull['state'].lower()}{draft}) "
+        f"by {_login(pull)}",
+        f"Head `{pull['headRefName']}` ({pull['headRefOid'][:7]}) "
+        f"into base `{pull['baseRefName']}`, {pull['changedFiles']} files changed, "
+        f"+{pull['additions']} -{pull['deletions']}",
+        *([pull["url"]] if pull.get("url") else []),
+        "",
+        "Description:",
+        _truncate(pull.get("body"), config.max_body_chars) or "(empty)",
+    ]
+
+    if pull.get("commits") is not None:
+        (commit,) = pull["commits"]["nodes"] or [{"commit": {}}]
+        rollup = commit["commit"].get("statusCheckRollup")
+        lines += ["", f"Checks: {rollup['state'].lower() if rollup else 'none'}"]
+        for check in rollup["contexts"]["nodes"] if rollup else []:
+            if check["__typename"] == "CheckRun":
+                state = check.get("conclusion") or check["status"]
+                lines.append(f"- {check['name']}: {state.lower()}")
+            else:
+                lines.append(f"- {check['context']}: {check['state'].lower()}")
+
+    if pull.get("files") is not None:
+        lines += ["", "Files:"]
+        lines += [
+            f"{_CHANGE_TYPES.get(file['changeType'], 'M')} {file['path']} "
+            f"+{file['additions']} -{file['deletions']}"
+            for file in pull["files"]["nodes"]
+        ]
+        lines += _more(pull["files"], "files")
+
+    if pull.get("comments") is not None:
+        lines += ["", f"Comments ({pull['comments']['totalCount']}):"]
+        lines += [
+            f"- {_login(comment)}: {_truncate(comment['body'], config.max_comment_chars)}"
+            for comment in pull["comments"]["nodes"]
+        ]
+        lines += _more(pull["comments"], "comments")
+
+    if pull.get("reviews") is not None:
+        lines += ["", "Reviews:"]
+        for review in pull["reviews"]["nodes"]:
+            body = _truncate(review.get("body"), config.max_comment_chars)
+            lines.append(
+                f"- {_login(review)} {review['state'].lower()}"
+                + (f": {body}" if body else "")
+            )
+        threads = pull["reviewThreads"]
+        unresolved = [t for t in threads["nodes"] if not t["isResolved"]]
+        lines += ["", f"Unresolved review threads ({len(unresolved)}):"]
+        for thread in unresolved:
+            outdated = " (outdated)" if thread["isOutdated"] else ""
+            lines.append(f"- {thread['path']}:{thread['line'] or '-'}{outdated}")
+            lines += [
+                f"  {_login(c)}: {_truncate(c['body'], config.max_comment_chars)}"
+                for c in thread["comments"]["nodes"]
+            ]
+        lines += _more(threads, "review threads")
+
+    return "\n".join(lines)
+
+
+__all__ = [
+    "PR_CONTEXT_QUERY",
+    "PR_CONTEXT_SECTIONS",
+    "PrContextConfiguration",
+    "PrContextSection",
+    "format_pr_context",
+    "merge_pages",
+    "next_page_variables",
+    "pr_context_variables",
+]
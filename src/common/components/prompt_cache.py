@@ -0,0 +1,352 @@
+"""Prompt assembly with stable prefixes and provider context caching.
+
+Providers cache request prefixes, so a system prompt that starts with (or is
+interleaved with) per-call content such as the current time is never served
+from cache. The `PromptAssembler` keeps the static part of a system prompt
+first and byte-identical across calls, and places volatile content after it.
+
+Large static prompts can additionally be uploaded once as a provider
+cached-content handle and referenced on subsequent calls. `ContextCache`
+creates and reuses these handles through a `ContextCacheProvider`; the
+`LocalContextCacheProvider` is an in-process stand-in used in tests.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Literal, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.runnables import Runnable, RunnableBinding, RunnableConfig
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from common.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(kw_only=True)
+class ContextCacheConfiguration:
+    """Configuration for provider context caching of static prompts."""
+
+    use_context_cache: bool = False
+    """Whether to upload large static prompts as provider cached content."""
+    provider: Literal["google_genai", "local"] = "google_genai"
+    """The cached-content provider. `local` is an in-process stand-in."""
+    min_tokens: int = 4_096
+    """Static prompts below this size are sent inline (providers enforce a minimum)."""
+    ttl_seconds: int = 3_600
+    """Lifetime of created cached content."""
+    refresh_margin_seconds: int = 60
+    """Handles expiring within this margin are recreated instead of reused."""
+
+
+@dataclass(frozen=True, kw_only=True)
+class CachedContent:
+    """A provider cached-content handle."""
+
+    name: str
+    model: str
+    expire_time: float
+
+
+class ContextCacheProvider(ABC):
+    """Creates provider cached content for a static system prompt and tools."""
+
+    @abstractmethod
+    async def acreate(
+        self,
+        *,
+        model: str,
+        system_instruction: str,
+        tools: Sequence[Any],
+        ttl_seconds: int,
+    ) -> CachedContent:
+        """Create cached content and return its handle."""
+
+
+class LocalContextCacheProvider(ContextCacheProvider):
+    """In-process stand-in for a provider cache, recording every creation."""
+
+    def __init__(self):
+        """Initialize an empty local cache."""
+        self.contents: dict[str, dict[str, Any]] = {}
+
+    async def acreate(
+        self,
+        *,
+        model: str,
+        system_instruction: str,
+        tools: Sequence[Any],
+        ttl_seconds: int,
+    ) -> CachedContent:
+        """Store the content in memory and return a handle to it."""
+        name = f"cachedContents/local-{uuid.uuid4().hex[:12]}"
+        self.contents[name] = {
+            "model": model,
+            "system_instruction": system_instruction,
+            "tools": list(tools),
+        }
+        return CachedContent(
+            name=name, model=model, expire_time=time.time() + ttl_seconds
+        )
+
+
+class GoogleGenAIContextCacheProvider(ContextCacheProvider):
+    """Cached content through the Gemini API (`google-genai`)."""
+
+    def __init__(self, client: Any = None):
+        """Initialize the provider, creating a default `genai.Client` if none is given."""
+        self._client = client
+
+    @property
+    def client(self):
+        """Returns the google-genai client, created lazily."""
+        if self._client is None:
+            from google import genai
+
+            self._client = genai.Client()
+        return self._client
+
+    async def acreate(
+        self,
+        *,
+        model: str,
+        system_instruction: str,
+        tools: Sequence[Any],
+        ttl_seconds: int,
+    ) -> CachedContent:
+        """Create cached content holding the system instruction and tool declarations."""
+        from google.genai import types
+
+        declarations = [
+            types.FunctionDeclaration(
+                name=tool["function"]["name"],
+                description=tool["function"].get("description", ""),
+                parameters=tool["function"].get("parameters"),
+            )
+            for tool in map(convert_to_openai_tool, tools)
+        ]
+        cache = await self.client.aio.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                system_instruction=system_instruction,
+                tools=[types.Tool(function_declarations=declarations)]
+                if declarations
+                else None,
+                ttl=f"{ttl_seconds}s",
+            ),
+        )
+        return CachedContent(
+            name=cache.name,
+            model=model,
+            expire_time=cache.expire_time.timestamp()
+            if cache.expire_time
+            else time.time() + ttl_seconds,
+        )
+
+
+@dataclass(kw_only=True)
+class ContextCacheStats:
+    """Hit/miss counters of a context cache."""
+
+    hits: int = 0
+    misses: int = 0
+    skipped: int = 0
+    errors: int = 0
+
+
+class ContextCache:
+    """Creates and reuses cached-content handles for static prompts."""
+
+    def __init__(
+        self,
+        provider: ContextCacheProvider,
+        config: Optional[ContextCacheConfiguration] = None,
+    ):
+        """Initialize the cache.
+
+        Args:
+            provider: The provider creating the cached content.
+            config: Optional configuration. Defaults are used if not provided.
+        """
+        self.provider = provider
+        self.config = config or ContextCacheConfiguration(use_context_cache=True)
+        self.stats = ContextCacheStats()
+        self._handles: dict[str, CachedContent] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    @staticmethod
+    def _key(model: str, system_instruction: str, tools: Sequence[Any]) -> str:
+        payload = json.dumps(
+            [model, system_instruction, [convert_to_openai_tool(t) for t in tools]],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def aget(
+        self, *, model: str, system_instruction: str, tools: Sequence[Any] = ()
+    ) -> Optional[str]:
+        """Return a cached-content handle for the prompt, creating it if needed.
+
+        Returns None if the prompt is too small to be cached or creation failed,
+        in which case the prompt should be sent inline.
+        """
+        if count_tokens_approximately([system_instruction]) < self.config.min_tokens:
+            self.stats.skipped += 1
+            return None
+
+        key = self._key(model, system_instruction, tools)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            handle = self._handles.get(key)
+            if handle and (
+                handle.expire_time - time.time() > self.config.refresh_margin_seconds
+            ):
+                self.stats.hits += 1
+                return handle.name
+
+            self.stats.misses += 1
+            try:
+                handle = await self.provider.acreate(
+                    model=model,
+                    system_instruction=system_instruction,
+                    tools=tools,
+                    ttl_seconds=self.config.ttl_seconds,
+                )
+            except Exception as e:
+                self.stats.errors += 1
+                logger.warning(f"Unable to create cached content for {model}: {e}")
+                return None
+
+            logger.info(f"Created cached content {handle.name} for {model}")
+            self._handles[key] = handle
+            return handle.name
+
+
+_CONTEXT_CACHES: dict[str, ContextCache] = {}
+_CACHED_CONTENT_KWARGS = ("tools", "tool_config", "tool_choice")
+"""Kwargs of a bound model declared in the cached content, not in the request."""
+
+
+def get_context_cache(config: ContextCacheConfiguration) -> Optional[ContextCache]:
+    """Return the process-wide context cache for the configured provider, if enabled."""
+    if not config.use_context_cache:
+        return None
+    if config.provider not in _CONTEXT_CACHES:
+        provider = (
+            LocalContextCacheProvider()
+            if config.provider == "local"
+            else GoogleGenAIContextCacheProvider()
+        )
+        _CONTEXT_CACHES[config.provider] = ContextCache(provider, config)
+    return _CONTEXT_CACHES[config.provider]
+
+
+@dataclass(kw_only=True)
+class AssembledPrompt:
+    """Messages to send to the model, and the cached content they rely on."""
+
+    messages: list[BaseMessage]
+    cached_content: Optional[str] = None
+    invoke_kwargs: dict[str, Any] = field(default_factory=dict)
+
+
+class PromptAssembler:
+    """Assemble model inputs with the static system prompt first and volatile content last."""
+
+    def __init__(
+        self,
+        static_prompt: str,
+        *,
+        model: str,
+        tools: Sequence[Any] = (),
+        cache: Optional[ContextCache] = None,
+    ):
+        """Initialize the assembler.
+
+        Args:
+            static_prompt: The part of the system prompt that is identical across calls.
+            model: The model name, as given to `init_chat_model`.
+            tools: The tools bound to the model. They are part of the cached content.
+            cache: Optional context cache. If None, prompts are always sent inline.
+        """
+        self.static_prompt = static_prompt
+        self.model = model
+        self.tools = list(tools)
+        self.cache = cache
+
+    def _inline(
+        self, messages: Sequence[BaseMessage], volatile: str
+    ) -> list[BaseMessage]:
+        """Return the messages with the static and volatile system prompts first."""
+        prefix = [SystemMessage(content=self.static_prompt)]
+        if volatile:
+            prefix.append(SystemMessage(content=volatile))
+        return [*prefix, *messages]
+
+    async def aassemble(
+        self, messages: Sequence[BaseMessage], volatile: str = ""
+    ) -> AssembledPrompt:
+        """Assemble the model input for the given conversation and volatile content."""
+        cached_content = None
+        if self.cache is not None:
+            cached_content = await self.cache.aget(
+                model=self.model.split(":", maxsplit=1)[-1],
+                system_instruction=self.static_prompt,
+                tools=self.tools,
+            )
+
+        if cached_content is None:
+            return AssembledPrompt(messages=self._inline(messages, volatile))
+
+        # the static prompt lives in the cached content, which cannot be combined
+        # with an inline system instruction: volatile content is sent as context
+        prefix = [HumanMessage(content=f"<context>\n{volatile}\n</context>")]
+        return AssembledPrompt(
+            messages=[*prefix, *messages] if volatile else list(messages),
+            cached_content=cached_content,
+            invoke_kwargs={"cached_content": cached_content},
+        )
+
+    async def ainvoke(
+        self,
+        llm: Runnable,
+        messages: Sequence[BaseMessage],
+        config: Optional[RunnableConfig] = None,
+        *,
+        volatile: str = "",
+    ) -> BaseMessage:
+        """Assemble the prompt and invoke the model with it."""
+        prompt = await self.aassemble(messages, volatile)
+        if prompt.cached_content is not None and isinstance(llm, RunnableBinding):
+            kwargs = {
+                name: value
+                for name, value in llm.kwargs.items()
+                if name not in _CACHED_CONTENT_KWARGS
+            }
+            if "small_model_kwargs" in kwargs:
+                # the cached content is of the large model of a `RoutedChatModel`,
+                # its small model is prompted inline
+                kwargs["small_model_messages"] = self._inline(messages, volatile)
+            llm = llm.model_copy(update={"kwargs": kwargs})
+        return await llm.ainvoke(prompt.messages, config, **prompt.invoke_kwargs)
+
+
+__all__ = [
+    "AssembledPrompt",
+    "CachedContent",
+    "ContextCache",
+    "ContextCacheConfiguration",
+    "ContextCacheProvider",
+    "GoogleGenAIContextCacheProvider",
+    "LocalContextCacheProvider",
+    "PromptAssembler",
+    "get_context_cache",
+]
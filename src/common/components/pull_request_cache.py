@@ -0,0 +1,198 @@
+"""Per-run cache of pull request metadata.
+
+A review cycle calls several GitHub tools on the same pull request: its diff,
+head branch, workflow run and the review itself each fetched the pull request
+again. `PullRequestCache` keeps, for every run, the pull request and what is
+derived from its head commit, its diff and changed files, so that they are
+fetched once per run and head commit.
+
+A run is identified by the thread of its root graph, so that the sub-agents of
+an orchestrator share its cache. An entry is dropped:
+
+- when a pull request fetched again, after `ttl_seconds`, has another head sha,
+- when the API writes to the head branch,
+- when the run is evicted, the cache keeping the last `max_runs` runs.
+
+Calls outside of a graph run are not cached.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from langchain_core.runnables.config import var_child_runnable_config
+
+from common.components.sub_agents import root_thread_id
+from common.logging import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass(kw_only=True)
+class PullRequestCacheConfiguration:
+    """Configuration for caching pull request metadata within a run."""
+
+    use_cache: bool = True
+    ttl_seconds: float = 300
+    """Seconds a pull request is used before being fetched again, to notice the commits pushed by others."""
+    max_runs: int = 100
+    """Runs whose pull requests are kept, the least recently used being evicted."""
+
+
+@dataclass(kw_only=True)
+class PullRequestCacheStats:
+    """Metrics of a pull request cache."""
+
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    """Entries dropped because the head of their pull request changed."""
+
+
+@dataclass(kw_only=True)
+class PullRequestEntry:
+    """The cached metadata of a pull request at a head commit."""
+
+    pull: dict[str, Any]
+    fetched_at: float
+    values: dict[str, Any] = field(default_factory=dict)
+    """Values derived from the head commit, such as the diff, by name."""
+
+    @property
+    def head_sha(self) -> str:
+        return self.pull["head"]["sha"]
+
+    @property
+    def head_ref(self) -> str:
+        return self.pull["head"]["ref"]
+
+
+class PullRequestCache:
+    """Pull requests, and values derived from their head commit, cached per run."""
+
+    def __init__(self, config: Optional[PullRequestCacheConfiguration] = None):
+        """Initialize an empty cache."""
+        self.config = config or PullRequestCacheConfiguration()
+        self.stats = PullRequestCacheStats()
+        self._runs: OrderedDict[str, dict[int, PullRequestEntry]] = OrderedDict()
+        self._pending: dict[tuple[str, int, str], asyncio.Future] = {}
+
+    def _run(self) -> Optional[str]:
+        """Return the run of the current call, or None outside of a run."""
+        config = var_child_runnable_config.get()
+        run = root_thread_id(config) if config else None
+        if not self.config.use_cache or not run:
+            return None
+        if run not in self._runs:
+            self._runs[run] = {}
+            while len(self._runs) > self.config.max_runs:
+                self._runs.popitem(last=False)
+        self._runs.move_to_end(run)
+        return run
+
+    async def _once(
+        self, key: tuple[str, int, str], fetch: Callable[[], Awaitable[T]]
+    ) -> T:
+        """Await the fetch of a key, shared by the concurrent calls of the event loop."""
+        pending = self._pending.get(key)
+        if pending is None or pending.get_loop() is not asyncio.get_running_loop():
+            pending = self._pending[key] = asyncio.ensure_future(fetch())
+
+            def done(future: asyncio.Future):
+                if self._pending.get(key) is future:
+                    del self._pending[key]
+
+            pending.add_done_callback(done)
+        return await asyncio.shield(pending)
+
+    async def _entry(
+        self, run: str, number: int, fetch: Callable[[], Awaitable[dict[str, Any]]]
+    ) -> PullRequestEntry:
+        entries = self._runs.setdefault(run, {})
+        entry = entries.get(number)
+        if entry and time.monotonic() - entry.fetched_at < self.config.ttl_seconds:
+            self.stats.hits += 1
+            return entry
+        self.stats.misses += 1
+        pull = await self._once((run, number, "pull"), fetch)
+        # a concurrent call may have stored the same fetch meanwhile
+        entry = entries.get(number)
+        if entry and entry.head_sha == pull["head"]["sha"]:
+            entry.pull, entry.fetched_at = pull, time.monotonic()
+            return entry
+        if entry:
+            logger.info(f"Head of pull request {number} moved to {pull['head']['sha']}")
+            self.stats.invalidations += 1
+        entries[number] = PullRequestEntry(pull=pull, fetched_at=time.monotonic())
+        return entries[number]
+
+    async def pull(
+        self, number: int, fetch: Callable[[], Awaitable[dict[str, Any]]]
+    ) -> dict[str, Any]:
+        """Return a pull request, fetching it if not cached or expired.
+
+        Args:
+            number: The pull request number.
+            fetch: Fetches the pull request.
+        """
+        run = self._run()
+        if run is None:
+            return await fetch()
+        return (await self._entry(run, number, fetch)).pull
+
+    async def value(
+        self,
+        number: int,
+        name: str,
+        fetch_pull: Callable[[], Awaitable[dict[str, Any]]],
+        fetch: Callable[[dict[str, Any]], Awaitable[T]],
+    ) -> T:
+        """Return a value derived from the head commit of a pull request, such as its diff.
+
+        Args:
+            number: The pull request number.
+            name: The name of the value.
+            fetch_pull: Fetches the pull request.
+            fetch: Fetches the value, given the pull request.
+        """
+        run = self._run()
+        if run is None:
+            return await fetch(await fetch_pull())
+        entry = await self._entry(run, number, fetch_pull)
+        if name in entry.values:
+            self.stats.hits += 1
+            return entry.values[name]
+        self.stats.misses += 1
+        value = await self._once(
+            (run, number, f"{entry.head_sha}:{name}"), lambda: fetch(entry.pull)
+        )
+        # the entry is not kept if the head moved meanwhile
+        if self._runs.get(run, {}).get(number) is entry:
+            entry.values[name] = value
+        return value
+
+    def invalidate_branch(self, branch: str):
+        """Drop the pull requests whose head is the branch, after a write to it."""
+        for entries in self._runs.values():
+            for number, entry in list(entries.items()):
+                if entry.head_ref == branch:
+                    del entries[number]
+                    self.stats.invalidations += 1
+
+    def clear(self, thread_id: Optional[str] = None):
+        """Drop the pull requests of a run, or of all the runs."""
+        if thread_id is None:
+            self._runs.clear()
+        else:
+            self._runs.pop(thread_id, None)
+
+
+__all__ = [
+    "PullRequestCache",
+    "PullRequestCacheConfiguration",
+    "PullRequestCacheStats",
+]
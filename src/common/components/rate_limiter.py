@@ -0,0 +1,415 @@
+"""Process-wide rate limiting of model calls.
+
+Concurrent orchestrations and sub-agents share the same provider quota. The
+`RateLimiter` keeps a token bucket for requests and one for tokens per minute,
+per model, and queues the calls that cannot be served yet instead of letting
+them fail with 429 errors. Waiting calls are served by priority (interactive
+runs first), and round-robin across threads within a priority, so that a single
+busy thread cannot starve the others.
+
+`RateLimitedChatModel` wraps a chat model so that every call goes through the
+limiter of its model. The token cost of a call is estimated from its messages
+when it is queued, and settled with the actual usage once the reply is known.
+The queue of the limiter is served by the event loop: only asynchronous calls
+are limited, synchronous calls (`invoke`) go to the model directly.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Literal, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.messages import BaseMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import ChatResult
+
+from common.components.model_wrappers import DelegatingChatModel
+from common.logging import get_logger
+
+logger = get_logger(__name__)
+
+Priority = Literal["interactive", "batch"]
+
+_PRIORITIES: tuple[Priority, ...] = ("interactive", "batch")
+
+
+@dataclass(kw_only=True)
+class RateLimiterConfiguration:
+    """Configuration for the shared model rate limiter."""
+
+    use_rate_limiter: bool = False
+    """Whether the agent's model calls go through the shared rate limiter."""
+    requests_per_minute: float = 60
+    """Requests per minute allowed for each model."""
+    tokens_per_minute: float = 1_000_000
+    """Input and output tokens per minute allowed for each model."""
+    priority: Priority = "batch"
+    """Default priority of the agent's calls. Runs can override it with the `priority` configurable."""
+    estimated_output_tokens: int = 1_024
+    """Output tokens reserved for each call until its actual usage is known."""
+    max_queue_depth: Optional[int] = None
+    """If set, calls are rejected with `RateLimiterQueueFull` when this many calls are already waiting."""
+    cooldown_seconds: float = 10.0
+    """Pause of the limiter after the provider rejected a call with a rate limit error."""
+
+
+class RateLimiterQueueFull(Exception):
+    """Raised when a call is rejected because too many calls are waiting."""
+
+
+class TokenBucket:
+    """A token bucket refilled continuously at a per-minute rate."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        """Initialize a full bucket.
+
+        Args:
+            rate_per_minute: The refill rate.
+            capacity: The maximum number of tokens. Defaults to one minute of refill.
+        """
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Return the number of seconds until `amount` tokens are available."""
+        self._refill()
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        """Take tokens from the bucket. The bucket may go into debt."""
+        self._refill()
+        self.tokens -= amount
+
+    def refund(self, amount: float):
+        """Give back tokens to the bucket, or take more if `amount` is negative."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def pause(self, seconds: float):
+        """Empty the bucket so that no tokens are available for `seconds`."""
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+@dataclass(kw_only=True)
+class RateLimiterStats:
+    """Queue metrics of a rate limiter."""
+
+    queue_depth: int = 0
+    """Number of calls currently waiting."""
+    queue_depth_by_priority: dict[str, int] = field(default_factory=dict)
+    max_queue_depth: int = 0
+    """Highest number of calls waiting at the same time."""
+    acquired: int = 0
+    queued: int = 0
+    """Number of calls that had to wait."""
+    rejected: int = 0
+    throttled: int = 0
+    """Number of calls rejected by the provider with a rate limit error."""
+    total_wait_seconds: float = 0.0
+
+
+@dataclass(kw_only=True)
+class _Waiter:
+    future: asyncio.Future
+    tokens: float
+    enqueued_at: float
+
+
+class RateLimiter:
+    """Token bucket rate limiter for requests and tokens, with a fair priority queue."""
+
+    def __init__(
+        self,
+        *,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        max_queue_depth: Optional[int] = None,
+        burst_seconds: float = 60.0,
+        name: str = "",
+    ):
+        """Initialize the limiter.
+
+        Args:
+            requests_per_minute: Requests per minute allowed.
+            tokens_per_minute: Tokens per minute allowed.
+            max_queue_depth: Optional number of waiting calls above which calls are rejected.
+            burst_seconds: Seconds of refill that can be consumed at once.
+            name: Name of the limiter, used in logs.
+        """
+        self.name = name
+        self.max_queue_depth = max_queue_depth
+        self._requests = TokenBucket(
+            requests_per_minute, requests_per_minute * burst_seconds / 60
+        )
+        self._tokens = TokenBucket(
+            tokens_per_minute, tokens_per_minute * burst_seconds / 60
+        )
+        self._queues: dict[Priority, OrderedDict[str, deque[_Waiter]]] = {
+            priority: OrderedDict() for priority in _PRIORITIES
+        }
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._stats = RateLimiterStats()
+
+    def _depth(self, priority: Optional[Priority] = None) -> int:
+        priorities = [priority] if priority else _PRIORITIES
+        return sum(
+            not waiter.future.done()
+            for p in priorities
+            for waiters in self._queues[p].values()
+            for waiter in waiters
+        )
+
+    @property
+    def stats(self) -> RateLimiterStats:
+        """Returns the current queue metrics."""
+        self._stats.queue_depth = self._depth()
+        self._stats.queue_depth_by_priority = {p: self._depth(p) for p in _PRIORITIES}
+        return self._stats
+
+    def _wait_time(self, tokens: float) -> float:
+        return max(self._requests.wait_time(1), self._tokens.wait_time(tokens))
+
+    def _grant(self, tokens: float):
+        self._requests.consume(1)
+        self._tokens.consume(tokens)
+        self._stats.acquired += 1
+
+    def _next(self) -> Optional[tuple[Priority, str, _Waiter]]:
+        for priority in _PRIORITIES:
+            queue = self._queues[priority]
+            while queue:
+                thread, waiters = next(iter(queue.items()))
+                while waiters and waiters[0].future.done():
+                    # cancelled while waiting
+                    waiters.popleft()
+                if waiters:
+                    return priority, thread, waiters[0]
+                del queue[thread]
+        return None
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while next_waiter := self._next():
+            priority, thread, waiter = next_waiter
+            wait = self._wait_time(waiter.tokens)
+            if wait > 0:
+                self._timer = waiter.future.get_loop().call_later(wait, self._dispatch)
+                return
+
+            self._grant(waiter.tokens)
+            self._stats.total_wait_seconds += time.monotonic() - waiter.enqueued_at
+            waiter.future.set_result(None)
+
+            # round-robin: the thread goes to the back of its priority queue
+            queue = self._queues[priority]
+            waiters = queue.pop(thread)
+            waiters.popleft()
+            if waiters:
+                queue[thread] = waiters
+
+    async def acquire(
+        self,
+        *,
+        tokens: float,
+        thread_id: Optional[str] = None,
+        priority: Priority = "batch",
+    ) -> float:
+        """Wait until a call of `tokens` tokens can be made.
+
+        Args:
+            tokens: The estimated number of tokens of the call.
+            thread_id: The thread making the call. Threads are served round-robin.
+            priority: The priority of the call. Interactive calls are served first.
+
+        Returns:
+            The number of tokens reserved, to be settled with `settle`.
+
+        Raises:
+            RateLimiterQueueFull: If `max_queue_depth` calls are already waiting.
+        """
+        tokens = min(tokens, self._tokens.capacity)
+        priority = priority if priority in _PRIORITIES else "batch"
+        if self._next() is None and self._wait_time(tokens) == 0:
+            self._grant(tokens)
+            return tokens
+
+        depth = self._depth()
+        if self.max_queue_depth is not None and depth >= self.max_queue_depth:
+            self._stats.rejected += 1
+            raise RateLimiterQueueFull(
+                f"Rate limiter {self.name} has {depth} calls waiting"
+            )
+
+        waiter = _Waiter(
+            future=asyncio.get_running_loop().create_future(),
+            tokens=tokens,
+            enqueued_at=time.monotonic(),
+        )
+        self._queues[priority].setdefault(thread_id or "", deque()).append(waiter)
+        self._stats.queued += 1
+        self._stats.max_queue_depth = max(self._stats.max_queue_depth, depth + 1)
+        self._dispatch()
+        await waiter.future
+        return tokens
+
+    def settle(self, reserved: float, used: float):
+        """Settle a reservation with the actual number of tokens used."""
+        self._tokens.refund(reserved - used)
+        if self._timer is not None:
+            self._dispatch()
+
+    def throttle(self, seconds: float):
+        """Pause the limiter after the provider rejected a call with a rate limit error."""
+        self._stats.throttled += 1
+        self._requests.pause(seconds)
+        logger.warning(f"Rate limiter {self.name} paused for {seconds}s")
+
+    @asynccontextmanager
+    async def reserve(
+        self,
+        *,
+        tokens: float,
+        thread_id: Optional[str] = None,
+        priority: Priority = "batch",
+    ) -> AsyncIterator["Reservation"]:
+        """Acquire a reservation for a call, settled on exit with the usage it recorded."""
+        reserved = await self.acquire(
+            tokens=tokens, thread_id=thread_id, priority=priority
+        )
+        reservation = Reservation(reserved=reserved)
+        try:
+            yield reservation
+        finally:
+            self.settle(reserved, reservation.used)
+
+
+@dataclass(kw_only=True)
+class Reservation:
+    """Tokens reserved for a call, and the tokens it actually used."""
+
+    reserved: float
+    used: Optional[float] = None
+
+    def __post_init__(self):
+        """Assume all reserved tokens are used until the actual usage is known."""
+        if self.used is None:
+            self.used = self.reserved
+
+
+_RATE_LIMITERS: dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(model: str, config: RateLimiterConfiguration) -> RateLimiter:
+    """Return the process-wide rate limiter of the model, creating it with the given limits."""
+    if model not in _RATE_LIMITERS:
+        _RATE_LIMITERS[model] = RateLimiter(
+            requests_per_minute=config.requests_per_minute,
+            tokens_per_minute=config.tokens_per_minute,
+            max_queue_depth=config.max_queue_depth,
+            name=model,
+        )
+    return _RATE_LIMITERS[model]
+
+
+def get_rate_limiter_stats() -> dict[str, RateLimiterStats]:
+    """Return the queue metrics of all rate limiters, by model."""
+    return {model: limiter.stats for model, limiter in _RATE_LIMITERS.items()}
+
+
+def _is_rate_limit_error(error: BaseException) -> bool:
+    return type(error).__name__ in (
+        "ResourceExhausted",
+        "RateLimitError",
+        "TooManyRequests",
+    ) or "429" in str(error)
+
+
+class RateLimitedChatModel(DelegatingChatModel):
+    """A chat model whose asynchronous calls go through a shared rate limiter.
+
+    Synchronous calls are not limited: the agents call their models asynchronously.
+    """
+
+    limiter: Any
+    """The `RateLimiter` of the model."""
+    priority: Priority = "batch"
+    """Default priority of the calls, overridden by a `priority` in the run metadata."""
+    estimated_output_tokens: int = 1_024
+    cooldown_seconds: float = 10.0
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        metadata = run_manager.metadata if run_manager else {}
+        estimate = count_tokens_approximately(messages) + self.estimated_output_tokens
+        async with self.limiter.reserve(
+            tokens=estimate,
+            thread_id=metadata.get("thread_id"),
+            priority=metadata.get("priority", self.priority),
+        ) as reservation:
+            try:
+                result = await self.model._agenerate(
+                    messages, stop=stop, run_manager=run_manager, **kwargs
+                )
+            except Exception as e:
+                if _is_rate_limit_error(e):
+                    self.limiter.throttle(self.cooldown_seconds)
+                raise
+
+            usage = [
+                generation.message.usage_metadata
+                for generation in result.generations
+                if generation.message.usage_metadata
+            ]
+            if usage:
+                reservation.used = sum(u["total_tokens"] for u in usage)
+            return result
+
+
+def rate_limited(
+    llm: Any, model: str, config: RateLimiterConfiguration
+) -> RateLimitedChatModel:
+    """Wrap the chat model with the shared rate limiter of its model."""
+    return RateLimitedChatModel(
+        model=llm,
+        limiter=get_rate_limiter(model, config),
+        priority=config.priority,
+        estimated_output_tokens=config.estimated_output_tokens,
+        cooldown_seconds=config.cooldown_seconds,
+    )
+
+
+__all__ = [
+    "RateLimitedChatModel",
+    "RateLimiter",
+    "RateLimiterConfiguration",
+    "RateLimiterQueueFull",
+    "RateLimiterStats",
+    "Reservation",
+    "TokenBucket",
+    "get_rate_limiter",
+    "get_rate_limiter_stats",
+    "rate_limited",
+]
@@ -0,0 +1,131 @@
+"""Batch reads of repository files.
+
+The agents explored a repository one `read_file` call at a time, each costing a
+turn of the model and a request. `read_files` takes paths, directories and glob
+patterns, resolves them against the list of the files of the branch with
+`match_paths`, and returns the files together, each bounded in size and the
+whole bounded in number of files and characters, with `format_files`.
+
+Patterns follow the shell: `*` and `?` match within a directory, `**` matches
+any number of directories, and a directory matches the files below it.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+_MAGIC = re.compile(r"[*?[]")
+
+
+@dataclass(kw_only=True)
+class ReadFilesConfiguration:
+    """Configuration for reading files in batches."""
+
+    max_files: int = 50
+    """Files read per call, the others being listed as not read."""
+    max_file_bytes: int = 1_000_000
+    """Larger files are not fetched."""
+    max_file_chars: int = 20_000
+    """Characters returned per file, the rest being truncated."""
+    max_total_chars: int = 100_000
+    """Characters returned per call, the files past it being listed as not read."""
+
+
+def _glob_regex(pattern: str) -> re.Pattern:
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex, i = regex + "(?:.*/)?", i + 3
+        elif pattern.startswith("**", i):
+            regex, i = regex + ".*", i + 2
+        elif pattern[i] == "*":
+            regex, i = regex + "[^/]*", i + 1
+        elif pattern[i] == "?":
+            regex, i = regex + "[^/]", i + 1
+        elif pattern[i] == "[" and "]" in pattern[i + 1 :]:
+            end = pattern.index("]", i + 1)
+            regex, i = regex + pattern[i : end + 1].replace("[!", "[^"), end + 1
+        else:
+            regex, i = regex + re.escape(pattern[i]), i + 1
+    return re.compile(regex)
+
+
+def match_paths(
+    patterns: list[str], paths: Iterable[str]
+) -> tuple[list[str], list[str]]:
+    """Return the paths matched by the patterns, and the patterns matching none.
+
+    Args:
+        patterns: Paths, directories or glob patterns.
+        paths: The paths of the files of the branch.
+
+    Returns:
+        The matched paths, in the order of the patterns then of the paths,
+        without duplicates, and the patterns matching no path.
+    """
+    paths = sorted(paths)
+    matched: dict[str, None] = {}
+    unmatched = []
+    for pattern in patterns:
+        pattern = pattern.strip().strip("/")
+        if _MAGIC.search(pattern):
+            regex = _glob_regex(pattern)
+            found = [path for path in paths if regex.fullmatch(path)]
+        else:
+            prefix = f"{pattern}/" if pattern else ""
+            found = [
+                path for path in paths if path == pattern or path.startswith(prefix)
+            ]
+        if not found:
+            unmatched.append(pattern)
+        matched.update(dict.fromkeys(found))
+    return list(matched), unmatched
+
+
+def format_files(
+    files: dict[str, Optional[str]],
+    *,
+    sizes: dict[str, int],
+    unmatched: list[str],
+    not_read: list[str],
+    config: ReadFilesConfiguration,
+) -> str:
+    """Format files read in a batch, within the size limits of the configuration.
+
+    Args:
+        files: The content of the files, by path, None for binary files or
+            files too large to fetch.
+        sizes: The size of the files in bytes, by path.
+        unmatched: The patterns matching no file.
+        not_read: The files matched but not read, past the limit of files.
+        config: The size limits.
+    """
+    sections = []
+    total = 0
+    for path, content in files.items():
+        if content is None:
+            kind = "binary" if sizes[path] <= config.max_file_bytes else "too large"
+            sections.append(f"==> {path} ({kind}, {sizes[path]} bytes) <==")
+            continue
+        if total >= config.max_total_chars:
+            not_read.append(path)
+            continue
+        limit = min(config.max_file_chars, config.max_total_chars - total)
+        header = f"==> {path} <=="
+        if len(content) > limit:
+            header = f"==> {path} (truncated, {limit} of {len(content)} characters) <=="
+            content = content[:limit]
+        total += len(content)
+        sections.extend([header, content])
+    if unmatched:
+        sections.append(f"No files found: {', '.join(unmatched)}")
+    if not_read:
+        sections.append(
+            f"Not read, past the limits of {config.max_files} files and "
+            f"{config.max_total_chars} characters: {', '.join(not_read)}"
+        )
+    return "\n".join(sections)
+
+
+__all__ = ["ReadFilesConfiguration", "format_files", "match_paths"]
@@ -0,0 +1,292 @@
+"""Deadlines, retries and hedging of model calls.
+
+A single slow model call can stall a whole agent loop. `ResilientChatModel`
+wraps a chat model so that each call:
+
+- is bounded by a per-attempt timeout and an overall deadline,
+- is retried on transient errors and timeouts, with jittered exponential backoff,
+- is optionally hedged: if no reply arrived after the observed p95 latency of the
+  model, a second identical request is sent, the first reply wins and the other
+  request is cancelled.
+
+Latencies of successful calls are recorded per model by a `LatencyTracker`,
+which provides the hedging delay and exposes latency percentiles.
+"""
+
+import asyncio
+import math
+import random
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+
+from common.components.model_wrappers import DelegatingChatModel
+from common.logging import get_logger
+
+logger = get_logger(__name__)
+
+_TRANSIENT_ERRORS = {
+    "APIConnectionError",
+    "APITimeoutError",
+    "ConnectionError",
+    "DeadlineExceeded",
+    "InternalServerError",
+    "RateLimitError",
+    "ResourceExhausted",
+    "ServerError",
+    "ServiceUnavailable",
+    "TimeoutError",
+    "TooManyRequests",
+}
+_TRANSIENT_STATUS_CODES = {429, 500, 502, 503, 504}
+_TRANSIENT_STATUS_PATTERN = re.compile(r"\b(?:429|500|502|503|504)\b")
+
+
+@dataclass(kw_only=True)
+class ModelCallConfiguration:
+    """Configuration for deadlines, retries and hedging of model calls."""
+
+    use_model_call_policy: bool = False
+    """Whether the agent's model calls are wrapped with deadlines, retries and hedging."""
+    timeout_seconds: Optional[float] = 120.0
+    """Timeout of a single attempt."""
+    deadline_seconds: Optional[float] = 300.0
+    """Overall deadline of a call, including retries. Can be overridden per call with a `deadline_seconds` kwarg."""
+    max_retries: int = 2
+    """Retries after a transient error or a timed out attempt."""
+    backoff_initial_seconds: float = 1.0
+    backoff_max_seconds: float = 30.0
+    use_hedging: bool = False
+    """Whether to send a second request when a reply takes longer than usual."""
+    hedge_percentile: float = 95
+    """Latency percentile after which the second request is sent."""
+    hedge_min_samples: int = 20
+    """Calls observed before hedging starts."""
+    hedge_min_delay_seconds: float = 1.0
+    """Lower bound of the hedging delay."""
+
+
+class ModelCallDeadlineExceeded(TimeoutError):
+    """Raised when a model call did not complete before its deadline."""
+
+
+def percentile(samples: list[float], q: float) -> float:
+    """Return the q-th percentile of the samples, using the nearest-rank method."""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class LatencyTracker:
+    """Rolling window of model call latencies, per model."""
+
+    def __init__(self, window: int = 500):
+        """Initialize the tracker keeping the last `window` latencies of each model."""
+        self.window = window
+        self._samples: dict[str, deque[float]] = {}
+
+    def record(self, model: str, latency: float):
+        """Record the latency of a successful call."""
+        self._samples.setdefault(model, deque(maxlen=self.window)).append(latency)
+
+    def count(self, model: str) -> int:
+        """Return the number of latencies recorded for the model."""
+        return len(self._samples.get(model, ()))
+
+    def percentile(self, model: str, q: float) -> Optional[float]:
+        """Return the q-th latency percentile of the model, None without samples."""
+        samples = self._samples.get(model)
+        return percentile(list(samples), q) if samples else None
+
+    def percentiles(self) -> dict[str, dict[str, float]]:
+        """Return the p50, p90, p95 and p99 latencies and the sample count, per model."""
+        return {
+            model: {
+                "count": len(samples),
+                **{f"p{q}": percentile(list(samples), q) for q in (50, 90, 95, 99)},
+            }
+            for model, samples in self._samples.items()
+            if samples
+        }
+
+
+_LATENCY_TRACKER = LatencyTracker()
+
+
+def get_latency_tracker() -> LatencyTracker:
+    """Return the process-wide latency tracker."""
+    return _LATENCY_TRACKER
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """Return the HTTP status code of an error, from its `status_code` or `code`."""
+    response = getattr(error, "response", None)
+    for code in (
+        getattr(error, "status_code", None),
+        getattr(error, "code", None),
+        getattr(response, "status_code", None),
+    ):
+        if isinstance(code, int):
+            return code
+    return None
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Return whether a model call error is worth retrying.
+
+    Errors carrying a status code are transient for the codes of rate limits and
+    server errors. Others are matched on their type, then on a status code
+    standing as a word of their message.
+    """
+    if isinstance(error, asyncio.TimeoutError | ConnectionError):
+        return True
+    if type(error).__name__ in _TRANSIENT_ERRORS:
+        return True
+    status_code = _status_code(error)
+    if status_code is not None:
+        return status_code in _TRANSIENT_STATUS_CODES
+    return _TRANSIENT_STATUS_PATTERN.search(str(error)) is not None
+
+
+class ResilientChatModel(DelegatingChatModel):
+    """A chat model with deadlines, retries and hedging of its calls."""
+
+    policy: ModelCallConfiguration
+    tracker: Any = None
+    """The `LatencyTracker` recording the latencies. Defaults to the process-wide tracker."""
+
+    @property
+    def _tracker(self) -> LatencyTracker:
+        return self.tracker or get_latency_tracker()
+
+    @property
+    def _model_name(self) -> str:
+        return self.model._get_ls_params().get("ls_model_name") or self._llm_type
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.policy.use_hedging:
+            return None
+        if self._tracker.count(self._model_name) < self.policy.hedge_min_samples:
+            return None
+        latency = self._tracker.percentile(
+            self._model_name, self.policy.hedge_percentile
+        )
+        return max(self.policy.hedge_min_delay_seconds, latency)
+
+    async def _timed_call(self, *args: Any, **kwargs: Any) -> ChatResult:
+        start = time.monotonic()
+        result = await self.model._agenerate(*args, **kwargs)
+        self._tracker.record(self._model_name, time.monotonic() - start)
+        return result
+
+    async def _hedged_call(self, *args: Any, **kwargs: Any) -> ChatResult:
+        primary = asyncio.ensure_future(self._timed_call(*args, **kwargs))
+        delay = self._hedge_delay()
+        if delay is None:
+            return await primary
+
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                logger.info(
+                    f"No reply from {self._model_name} after {delay:.1f}s, hedging"
+                )
+                pending.add(asyncio.ensure_future(self._timed_call(*args, **kwargs)))
+
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        deadline_seconds: Optional[float] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        deadline_seconds = deadline_seconds or self.policy.deadline_seconds
+        deadline = time.monotonic() + deadline_seconds if deadline_seconds else None
+
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic() if deadline else None
+            timeout = min(
+                (t for t in (self.policy.timeout_seconds, remaining) if t is not None),
+                default=None,
+            )
+            try:
+                return await asyncio.wait_for(
+                    self._hedged_call(
+                        messages, stop=stop, run_manager=run_manager, **kwargs
+                    ),
+                    timeout=timeout,
+                )
+            except Exception as e:
+                backoff = random.uniform(
+                    0,
+                    min(
+                        self.policy.backoff_max_seconds,
+                        self.policy.backoff_initial_seconds * 2**attempt,
+                    ),
+                )
+                if (
+                    not is_transient_error(e)
+                    or attempt >= self.policy.max_retries
+                    or (deadline and time.monotonic() + backoff >= deadline)
+                ):
+                    if timeout_error := self._timeout_error(e, deadline):
+                        raise timeout_error from e
+                    raise
+
+                attempt += 1
+                logger.warning(
+                    f"Call to {self._model_name} failed ({e!r}), "
+                    f"retry {attempt}/{self.policy.max_retries} in {backoff:.1f}s"
+                )
+                await asyncio.sleep(backoff)
+
+    def _timeout_error(
+        self, error: Exception, deadline: Optional[float]
+    ) -> Optional[ModelCallDeadlineExceeded]:
+        if deadline and time.monotonic() >= deadline:
+            return ModelCallDeadlineExceeded(
+                f"Call to {self._model_name} exceeded its deadline"
+            )
+        if isinstance(error, asyncio.TimeoutError):
+            return ModelCallDeadlineExceeded(f"Call to {self._model_name} timed out")
+        return None
+
+
+def resilient(llm: Any, config: ModelCallConfiguration) -> ResilientChatModel:
+    """Wrap the chat model with the deadlines, retries and hedging of the configuration."""
+    return ResilientChatModel(model=llm, policy=config)
+
+
+__all__ = [
+    "LatencyTracker",
+    "ModelCallConfiguration",
+    "ModelCallDeadlineExceeded",
+    "ResilientChatModel",
+    "get_latency_tracker",
+    "is_transient_error",
+    "percentile",
+    "resilient",
+]
@@ -0,0 +1,210 @@
+"""Resumable sub-agent runs.
+
+A sub-agent invoked by a tool of its parent graph checkpoints under the
+parent's thread, in the namespace of the tool's task. When it fails, the parent
+only sees an error message, and calling the tool again restarts the sub-agent
+from scratch, replaying every model turn and every GitHub write it had done.
+
+`ainvoke_sub_agent` can instead run the sub-agent as a root graph on its own
+thread, with a stable id derived from the parent's thread and tool call:
+
+- a tool call run again, as when the parent is resumed after its process died,
+  resumes the sub-agent from its last checkpoint, or returns its result if it
+  had finished,
+- a new tool call retrying a failed one resumes the failed run. A retry
+  running on the thread of the call it retried, the failed calls of the tool
+  since its last success are walked back to the thread holding the run.
+
+Steps completed before the failure are not run again. The new input of a
+retry is ignored: the failed run is continued with its original input, and a
+warning is logged when the arguments of the retry differ.
+
+The runs are checkpointed by the checkpointer of the sub-agent, or else by the
+one of the parent's run, as in the LangGraph server, which compiles the graphs
+without checkpointers and passes its own in the run config.
+
+A sub-agent run on its own thread does not propagate its interrupts to the
+parent, so sub-agents asking the human questions should not be resumable.
+"""
+
+from typing import Any, Optional, Sequence
+
+from langchain_core.messages import AIMessage, AnyMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.constants import (
+    CONFIG_KEY_CHECKPOINT_ID,
+    CONFIG_KEY_CHECKPOINT_MAP,
+    CONFIG_KEY_CHECKPOINT_NS,
+    CONFIG_KEY_CHECKPOINTER,
+)
+from langgraph.types import Checkpointer
+
+from common.graph import AgentGraph
+from common.logging import get_logger
+
+logger = get_logger(__name__)
+
+ROOT_THREAD_ID = "root_thread_id"
+"""Configurable key of the thread of the root graph, set for sub-agents running on their own thread."""
+
+_PARENT_CHECKPOINT_KEYS = (
+    CONFIG_KEY_CHECKPOINT_ID,
+    CONFIG_KEY_CHECKPOINT_MAP,
+    CONFIG_KEY_CHECKPOINT_NS,
+)
+
+
+def root_thread_id(config: RunnableConfig) -> Optional[str]:
+    """Return the thread id of the root graph of a run, such as the orchestrator's."""
+    configurable = config.get("configurable", {})
+    return configurable.get(ROOT_THREAD_ID) or configurable.get("thread_id")
+
+
+def sub_agent_thread_id(config: RunnableConfig, name: str, tool_call_id: str) -> str:
+    """Return the thread id of the sub-agent run by a tool call of the parent."""
+    parent_thread_id = config.get("configurable", {}).get("thread_id", "")
+    return f"{parent_thread_id}:{name}:{tool_call_id}"
+
+
+def failed_tool_call_ids(messages: Sequence[AnyMessage], name: str) -> list[str]:
+    """Return the ids of the calls of the tool that failed since its last successful call.
+
+    Args:
+        messages: The messages of the parent.
+        name: The tool name.
+
+    Returns:
+        The tool call ids, the last one first.
+    """
+    names = {
+        call["id"]: call["name"]
+        for message in messages
+        if isinstance(message, AIMessage)
+        for call in message.tool_calls
+    }
+    failed = []
+    for message in reversed(messages):
+        if isinstance(message, ToolMessage) and names.get(message.tool_call_id) == name:
+            if message.status != "error":
+                break
+            failed.append(message.tool_call_id)
+    return failed
+
+
+def failed_tool_call_id(messages: Sequence[AnyMessage], name: str) -> Optional[str]:
+    """Return the id of the last call of the tool, if it failed.
+
+    Args:
+        messages: The messages of the parent.
+        name: The tool name.
+
+    Returns:
+        The tool call id, or None if the tool was never called or its last call succeeded.
+    """
+    return next(iter(failed_tool_call_ids(messages, name)), None)
+
+
+def _tool_call_args(messages: Sequence[AnyMessage]) -> dict[str, dict[str, Any]]:
+    return {
+        call["id"]: call["args"]
+        for message in messages
+        if isinstance(message, AIMessage)
+        for call in message.tool_calls
+    }
+
+
+def _root_config(
+    config: RunnableConfig, thread_id: str, checkpointer: Checkpointer
+) -> RunnableConfig:
+    """Return the config running a graph as a root graph on the thread, keeping the callbacks."""
+    configurable = {
+        k: v
+        for k, v in config.get("configurable", {}).items()
+        if not k.startswith("__pregel_") and k not in _PARENT_CHECKPOINT_KEYS
+    }
+    return {
+        **config,
+        "configurable": {
+            **configurable,
+            ROOT_THREAD_ID: root_thread_id(config),
+            "thread_id": thread_id,
+            CONFIG_KEY_CHECKPOINTER: checkpointer,
+        },
+    }
+
+
+async def ainvoke_sub_agent(
+    graph: AgentGraph,
+    input: Any,
+    config: RunnableConfig,
+    *,
+    resumable: bool,
+    name: str,
+    tool_call_id: str,
+    messages: Sequence[AnyMessage] = (),
+) -> dict[str, Any]:
+    """Invoke a sub-agent from a tool of its parent, resuming its failed run if resumable.
+
+    Args:
+        graph: The sub-agent.
+        input: The input of the sub-agent.
+        config: The config of the tool.
+        resumable: Whether the sub-agent runs on its own thread, resumed if it failed.
+            Requires a checkpointer, the sub-agent's or the one of the parent's run.
+            If False, it runs nested under the parent's thread.
+        name: The tool name.
+        tool_call_id: The id of the tool call.
+        messages: The messages of the parent, to find a failed call of the tool.
+
+    Returns:
+        The output of the sub-agent.
+    """
+    checkpointer = graph.checkpointer or config.get("configurable", {}).get(
+        CONFIG_KEY_CHECKPOINTER
+    )
+    if not resumable or not checkpointer:
+        if resumable:
+            logger.warning(f"{name} is not resumable without a checkpointer")
+        return await graph.compiled_graph.ainvoke(input, config)
+
+    args = _tool_call_args(messages)
+    for failed in failed_tool_call_ids(messages, name):
+        if failed == tool_call_id:
+            continue
+        # a failed retry ran on the thread of the call it retried, which has
+        # the run, its own thread having no checkpoint
+        failed_config = _root_config(
+            config, sub_agent_thread_id(config, name, failed), checkpointer
+        )
+        if (await graph.compiled_graph.aget_state(failed_config)).next:
+            logger.info(f"Resuming {name} of the failed call {failed}")
+            if args.get(tool_call_id) != args.get(failed):
+                logger.warning(
+                    f"The input of the retry {tool_call_id} of {name} is ignored, "
+                    f"the failed run of {failed} is resumed with its own input: "
+                    f"{args.get(tool_call_id)}"
+                )
+            return await graph.compiled_graph.ainvoke(None, failed_config)
+
+    sub_agent_config = _root_config(
+        config, sub_agent_thread_id(config, name, tool_call_id), checkpointer
+    )
+    state = await graph.compiled_graph.aget_state(sub_agent_config)
+    if state.next:
+        logger.info(f"Resuming {name} of the call {tool_call_id} before {state.next}")
+        return await graph.compiled_graph.ainvoke(None, sub_agent_config)
+    if state.values:
+        # the parent died after the sub-agent finished
+        logger.info(f"{name} of the call {tool_call_id} already finished")
+        return state.values
+    return await graph.compiled_graph.ainvoke(input, sub_agent_config)
+
+
+__all__ = [
+    "ROOT_THREAD_ID",
+    "ainvoke_sub_agent",
+    "failed_tool_call_id",
+    "failed_tool_call_ids",
+    "root_thread_id",
+    "sub_agent_thread_id",
+]
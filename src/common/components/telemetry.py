@@ -0,0 +1,505 @@
+"""Token, latency and cost telemetry for agent graphs.
+
+A single process-wide `Telemetry` aggregator records one `TelemetryEvent` per
+model call and per tool call made by any `AgentGraph`. Events are collected by
+a LangChain callback handler attached to every compiled agent graph, and are
+attributed to the innermost agent run, the graph node and the thread they were
+made in. Because sub-agents are invoked with the configuration of their parent,
+the same handler instance sees the whole run tree without duplicates.
+
+The aggregator can be queried in-process, streams events to exporters (such as
+`JsonlTelemetryExporter`), and keeps a `TelemetrySummary` for each finished
+agent run, which the orchestrator returns in the metadata of sub-agent results.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Literal, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from common.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True, kw_only=True)
+class ModelPrice:
+    """Price of a model in USD per million tokens."""
+
+    input: float
+    output: float
+
+
+DEFAULT_MODEL_PRICES: dict[str, ModelPrice] = {
+    "gemini-2.5-flash": ModelPrice(input=0.15, output=0.60),
+    "gemini-2.5-pro": ModelPrice(input=1.25, output=10.00),
+    "gemini-2.0-flash": ModelPrice(input=0.10, output=0.40),
+    "gemini-2.0-flash-lite": ModelPrice(input=0.075, output=0.30),
+}
+"""Default prices, matched against model names by longest prefix."""
+
+
+@dataclass(kw_only=True)
+class TelemetryConfiguration:
+    """Configuration for model and tool call telemetry."""
+
+    use_telemetry: bool = False
+    """Whether to record telemetry of the agent's model and tool calls, adding a callback handler to every run."""
+    export_path: Optional[str] = None
+    """If set, every event is appended to this JSONL file."""
+    max_events: int = 10_000
+    """Number of most recent events kept in memory."""
+    prices: dict[str, ModelPrice] = field(
+        default_factory=lambda: dict(DEFAULT_MODEL_PRICES)
+    )
+    """Model prices used to estimate cost, keyed by model name prefix."""
+
+
+@dataclass(kw_only=True)
+class TelemetryEvent:
+    """A single model or tool call."""
+
+    kind: Literal["model", "tool"]
+    name: str
+    """The model name or the tool name."""
+    agent: Optional[str]
+    """The innermost agent graph the call was made in."""
+    node: Optional[str]
+    thread_id: Optional[str]
+    run_id: str
+    agent_runs: list[str]
+    """Ids of all enclosing agent runs, outermost first."""
+    started_at: float
+    latency: float
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost: float = 0.0
+    retries: int = 0
+    """Number of earlier attempts of the same call under the same parent run."""
+    error: Optional[str] = None
+
+
+@dataclass(kw_only=True)
+class TelemetrySummary:
+    """Aggregated telemetry of a set of events."""
+
+    model_calls: int = 0
+    tool_calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost: float = 0.0
+    model_latency: float = 0.0
+    tool_latency: float = 0.0
+    retries: int = 0
+    errors: int = 0
+
+    @classmethod
+    def from_events(cls, events: Iterable[TelemetryEvent]) -> "TelemetrySummary":
+        """Aggregate the given events."""
+        summary = cls()
+        for event in events:
+            if event.kind == "model":
+                summary.model_calls += 1
+                summary.model_latency += event.latency
+            else:
+                summary.tool_calls += 1
+                summary.tool_latency += event.latency
+            summary.input_tokens += event.input_tokens
+            summary.output_tokens += event.output_tokens
+            summary.cost += event.cost
+            summary.retries += event.retries
+            summary.errors += event.error is not None
+        return summary
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the summary as a JSON serializable dictionary."""
+        return {
+            **asdict(self),
+            "cost": round(self.cost, 6),
+            "model_latency": round(self.model_latency, 3),
+            "tool_latency": round(self.tool_latency, 3),
+        }
+
+
+class JsonlTelemetryExporter:
+    """Append telemetry events to a JSONL file."""
+
+    def __init__(self, path: str | Path):
+        """Initialize the exporter, creating the parent directory if needed."""
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def export(self, event: TelemetryEvent):
+        """Append the event as a JSON line."""
+        line = json.dumps(asdict(event), default=str)
+        with self._lock, self.path.open("a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class Telemetry:
+    """In-process aggregator of telemetry events."""
+
+    def __init__(
+        self,
+        *,
+        max_events: int = 10_000,
+        max_run_summaries: int = 1_000,
+        prices: Optional[dict[str, ModelPrice]] = None,
+    ):
+        """Initialize the aggregator.
+
+        Args:
+            max_events: Number of most recent events kept in memory.
+            max_run_summaries: Number of most recent agent run summaries kept in memory.
+            prices: Model prices used to estimate cost. Defaults to `DEFAULT_MODEL_PRICES`.
+        """
+        self.prices = dict(DEFAULT_MODEL_PRICES if prices is None else prices)
+        self.agents: set[str] = set()
+        self.exporters: list[Any] = []
+        self._events: deque[TelemetryEvent] = deque(maxlen=max_events)
+        self._run_summaries: OrderedDict[str, TelemetrySummary] = OrderedDict()
+        self._max_run_summaries = max_run_summaries
+        self._lock = threading.Lock()
+        self.handler = TelemetryCallbackHandler(self)
+
+    def configure(self, config: TelemetryConfiguration):
+        """Apply the prices, event limit and exporter of an agent configuration."""
+        with self._lock:
+            self.prices.update(config.prices)
+            if config.max_events > (self._events.maxlen or 0):
+                self._events = deque(self._events, maxlen=config.max_events)
+            if config.export_path and not any(
+                isinstance(e, JsonlTelemetryExporter)
+                and e.path == Path(config.export_path)
+                for e in self.exporters
+            ):
+                self.exporters.append(JsonlTelemetryExporter(config.export_path))
+
+    def register_agent(self, name: str):
+        """Register the name of an agent graph, so that calls are attributed to it."""
+        self.agents.add(name)
+
+    def price(self, model: str) -> Optional[ModelPrice]:
+        """Return the price of the model, matching the longest configured prefix."""
+        model = model.split(":", maxsplit=1)[-1].removeprefix("models/")
+        matches = [prefix for prefix in self.prices if model.startswith(prefix)]
+        return self.prices[max(matches, key=len)] if matches else None
+
+    def record(self, event: TelemetryEvent):
+        """Record an event and send it to the exporters."""
+        with self._lock:
+            self._events.append(event)
+        for exporter in self.exporters:
+            try:
+                exporter.export(event)
+            except Exception as e:
+                logger.warning(f"Unable to export telemetry event: {e}")
+
+    def events(
+        self,
+        *,
+        kind: Optional[Literal["model", "tool"]] = None,
+        agent: Optional[str] = None,
+        node: Optional[str] = None,
+        thread_id: Optional[str] = None,
+        run_id: Optional[str | UUID] = None,
+    ) -> list[TelemetryEvent]:
+        """Return the recorded events matching all given filters.
+
+        Args:
+            kind: Only model or only tool calls.
+            agent: The innermost agent the calls were made in.
+            node: The graph node the calls were made in.
+            thread_id: The thread the calls were made in.
+            run_id: An agent run enclosing the calls, including sub-agent runs.
+        """
+        run_id = str(run_id) if run_id else None
+        with self._lock:
+            events = list(self._events)
+        return [
+            e
+            for e in events
+            if (kind is None or e.kind == kind)
+            and (agent is None or e.agent == agent)
+            and (node is None or e.node == node)
+            and (thread_id is None or e.thread_id == thread_id)
+            and (run_id is None or run_id in e.agent_runs)
+        ]
+
+    def summary(self, **filters: Any) -> TelemetrySummary:
+        """Aggregate the events matching the given filters (see `events`)."""
+        return TelemetrySummary.from_events(self.events(**filters))
+
+    def summary_by(
+        self, key: Literal["agent", "node", "thread_id", "name"], **filters: Any
+    ) -> dict[str, TelemetrySummary]:
+        """Aggregate the events matching the given filters, grouped by `key`."""
+        groups: dict[str, list[TelemetryEvent]] = {}
+        for event in self.events(**filters):
+            groups.setdefault(getattr(event, key), []).append(event)
+        return {k: TelemetrySummary.from_events(v) for k, v in groups.items()}
+
+    def run_summary(self, run_id: str | UUID) -> Optional[TelemetrySummary]:
+        """Return the summary of a finished agent run, including its sub-agents."""
+        with self._lock:
+            return self._run_summaries.get(str(run_id))
+
+    def _finish_run(self, agent: str, run_id: str):
+        summary = self.summary(run_id=run_id)
+        with self._lock:
+            self._run_summaries[run_id] = summary
+            while len(self._run_summaries) > self._max_run_summaries:
+                self._run_summaries.popitem(last=False)
+        logger.debug(f"{agent} run {run_id}: {summary.to_dict()}")
+
+    def clear(self):
+        """Drop all recorded events and run summaries."""
+        with self._lock:
+            self._events.clear()
+            self._run_summaries.clear()
+
+
+@dataclass(kw_only=True)
+class _Run:
+    name: str
+    parent: Optional[UUID]
+    started_at: float
+    metadata: dict[str, Any]
+    attempt: int = 0
+    failures: dict[str, int] = field(default_factory=dict)
+    """Number of child runs failed so far, by name."""
+
+
+class TelemetryCallbackHandler(BaseCallbackHandler):
+    """Callback handler turning model and tool runs into telemetry events."""
+
+    run_inline = True
+
+    def __init__(self, telemetry: Telemetry):
+        """Initialize the handler recording to the given aggregator."""
+        self.telemetry = telemetry
+        self._runs: dict[UUID, _Run] = {}
+
+    def _start(
+        self,
+        run_id: UUID,
+        parent_run_id: Optional[UUID],
+        name: str,
+        metadata: Optional[dict[str, Any]],
+    ):
+        attempt = 0
+        if parent := self._runs.get(parent_run_id):
+            # a run following failed runs of the same name is retrying them,
+            # while the ones following successful runs are calls of their own
+            attempt = parent.failures.get(name, 0)
+        self._runs[run_id] = _Run(
+            name=name,
+            parent=parent_run_id,
+            started_at=time.time(),
+            metadata=metadata or {},
+            attempt=attempt,
+        )
+
+    def _pop(
+        self, run_id: UUID, error: Optional[BaseException] = None
+    ) -> Optional[_Run]:
+        """Stop tracking a finished run, counting its failure in its parent."""
+        run = self._runs.pop(run_id, None)
+        if run is not None and error and (parent := self._runs.get(run.parent)):
+            parent.failures[run.name] = parent.failures.get(run.name, 0) + 1
+        return run
+
+    def _agent_runs(self, run_id: Optional[UUID]) -> list[tuple[str, str]]:
+        agent_runs = []
+        while run_id is not None and (run := self._runs.get(run_id)):
+            if run.name in self.telemetry.agents:
+                agent_runs.append((run.name, str(run_id)))
+            run_id = run.parent
+        return agent_runs[::-1]
+
+    def _end(
+        self,
+        run_id: UUID,
+        kind: Literal["model", "tool"],
+        *,
+        name: Optional[str] = None,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        error: Optional[BaseException] = None,
+    ):
+        run = self._pop(run_id, error)
+        if run is None:
+            return
+        agent_runs = self._agent_runs(run.parent)
+        name = name or run.name
+
+        cost = 0.0
+        if kind == "model" and (price := self.telemetry.price(name)):
+            cost = (input_tokens * price.input + output_tokens * price.output) / 1e6
+
+        self.telemetry.record(
+            TelemetryEvent(
+                kind=kind,
+                name=name,
+                agent=agent_runs[-1][0] if agent_runs else None,
+                node=run.metadata.get("langgraph_node"),
+                thread_id=run.metadata.get("thread_id"),
+                run_id=str(run_id),
+                agent_runs=[agent_run_id for _, agent_run_id in agent_runs],
+                started_at=run.started_at,
+                latency=time.time() - run.started_at,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                cost=cost,
+                retries=run.attempt,
+                error=repr(error) if error else None,
+            )
+        )
+
+    def on_chain_start(
+        self,
+        serialized: Optional[dict[str, Any]],
+        inputs: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Track the run tree, to attribute calls to agents."""
+        name = kwargs.get("name") or (serialized or {}).get("name", "")
+        self._start(run_id, parent_run_id, name, metadata)
+
+    def _on_chain_finished(self, run_id: UUID, error: Optional[BaseException] = None):
+        run = self._pop(run_id, error)
+        if run is not None and run.name in self.telemetry.agents:
+            self.telemetry._finish_run(run.name, str(run_id))
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        """Store the summary of finished agent runs."""
+        self._on_chain_finished(run_id)
+
+    def on_chain_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        """Store the summary of failed agent runs."""
+        self._on_chain_finished(run_id, error)
+
+    def on_chat_model_start(
+        self,
+        serialized: Optional[dict[str, Any]],
+        messages: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Start timing a model call."""
+        metadata = metadata or {}
+        name = metadata.get("ls_model_name") or kwargs.get("name") or "model"
+        self._start(run_id, parent_run_id, name, metadata)
+
+    def on_llm_start(
+        self,
+        serialized: Optional[dict[str, Any]],
+        prompts: list[str],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Start timing a completion model call."""
+        self.on_chat_model_start(
+            serialized,
+            prompts,
+            run_id=run_id,
+            parent_run_id=parent_run_id,
+            metadata=metadata,
+            **kwargs,
+        )
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        """Record a model call with its token usage."""
+        input_tokens = output_tokens = 0
+        model_name = None
+        for generations in response.generations:
+            for generation in generations:
+                if isinstance(generation, ChatGeneration):
+                    message = generation.message
+                    if usage := getattr(message, "usage_metadata", None):
+                        input_tokens += usage.get("input_tokens", 0)
+                        output_tokens += usage.get("output_tokens", 0)
+                    model_name = model_name or message.response_metadata.get(
+                        "model_name"
+                    )
+        self._end(
+            run_id,
+            "model",
+            name=model_name,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+        )
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        """Record a failed model call."""
+        self._end(run_id, "model", error=error)
+
+    def on_tool_start(
+        self,
+        serialized: Optional[dict[str, Any]],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Start timing a tool call."""
+        name = kwargs.get("name") or (serialized or {}).get("name", "tool")
+        self._start(run_id, parent_run_id, name, metadata)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        """Record a tool call."""
+        self._end(run_id, "tool")
+
+    def on_tool_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        """Record a failed tool call."""
+        self._end(run_id, "tool", error=error)
+
+
+_TELEMETRY: Optional[Telemetry] = None
+
+
+def get_telemetry() -> Telemetry:
+    """Return the process-wide telemetry aggregator."""
+    global _TELEMETRY
+    if _TELEMETRY is None:
+        _TELEMETRY = Telemetry()
+    return _TELEMETRY
+
+
+__all__ = [
+    "DEFAULT_MODEL_PRICES",
+    "JsonlTelemetryExporter",
+    "ModelPrice",
+    "Telemetry",
+    "TelemetryCallbackHandler",
+    "TelemetryConfiguration",
+    "TelemetryEvent",
+    "TelemetrySummary",
+    "get_telemetry",
+]
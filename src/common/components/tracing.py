@@ -0,0 +1,568 @@
+"""Local span tracing for agent graphs, independent of LangSmith.
+
+The `Tracer` turns the runs of agent graphs into OpenTelemetry-style spans:
+agent (sub-)graph invocations, graph nodes, model calls and tool calls are
+collected by a LangChain callback handler attached to every compiled agent
+graph, while store operations and GitHub API calls are traced through
+`TracedStore` and the `github` tag of the GitHub tools. Spans can also be
+created manually with `Tracer.span`, and are parented to the current graph run.
+
+Finished spans are exported locally, either to JSONL or to the Chrome trace
+event format, which can be loaded in `chrome://tracing`, Perfetto or
+speedscope to get a flamegraph of a run. Sampling is decided once per trace,
+at the rate of the agent whose run starts it.
+"""
+
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Literal, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables.config import var_child_runnable_config
+from langgraph.store.base import (
+    BaseStore,
+    GetOp,
+    ListNamespacesOp,
+    Op,
+    PutOp,
+    Result,
+    SearchOp,
+)
+
+from common.logging import get_logger
+
+logger = get_logger(__name__)
+
+SpanKind = Literal["agent", "node", "llm", "tool", "github", "store", "internal"]
+
+GITHUB_TAG = "github"
+"""Tag of tools calling the GitHub API, traced as `github` spans."""
+
+
+@dataclass(kw_only=True)
+class TracingConfiguration:
+    """Configuration for local span tracing."""
+
+    use_tracing: bool = False
+    """Whether to trace the agent's runs."""
+    exporter: Literal["jsonl", "chrome"] = "jsonl"
+    """The format of the exported traces."""
+    path: Optional[str] = None
+    """The file spans are exported to. Defaults to `traces/spans.jsonl`, or `traces/trace.json` for the Chrome exporter."""
+    sample_rate: float = 1.0
+    """Fraction of the traces of the agent's runs that are recorded."""
+
+    def __post_init__(self):
+        """Derive the default path from the exporter."""
+        if self.path is None:
+            self.path = (
+                "traces/trace.json"
+                if self.exporter == "chrome"
+                else "traces/spans.jsonl"
+            )
+
+
+@dataclass(kw_only=True)
+class Span:
+    """A timed operation within a trace."""
+
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    kind: SpanKind
+    start_time: float
+    end_time: Optional[float] = None
+    status: Literal["ok", "error"] = "ok"
+    error: Optional[str] = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        """Returns the duration of the span in seconds."""
+        return (self.end_time or time.time()) - self.start_time
+
+
+class SpanExporter:
+    """Base class of span exporters."""
+
+    def export(self, span: Span):
+        """Export a finished span."""
+        raise NotImplementedError
+
+
+class JsonlSpanExporter(SpanExporter):
+    """Append spans to a JSONL file, one span per line."""
+
+    def __init__(self, path: str | Path):
+        """Initialize the exporter, creating the parent directory if needed."""
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        """Append the span as a JSON line."""
+        line = json.dumps(asdict(span), default=str)
+        with self._lock, self.path.open("a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class ChromeTraceExporter(SpanExporter):
+    """Append spans to a file in the Chrome trace event format.
+
+    Spans are written as complete (`X`) events. The closing bracket of the event
+    array is optional in this format, which allows appending to the file while a
+    process is running. Each agent is shown as a separate thread.
+    """
+
+    def __init__(self, path: str | Path):
+        """Initialize the exporter, creating the parent directory if needed."""
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._tids: dict[str, int] = {}
+        self._next_tid = itertools.count(1)
+
+    def _write(self, f, event: dict[str, Any]):
+        f.write(json.dumps(event, default=str) + ",\n")
+
+    def export(self, span: Span):
+        """Append the span as a complete event."""
+        thread = span.attributes.get("agent") or "main"
+        with self._lock, self.path.open("a", encoding="utf-8") as f:
+            if f.tell() == 0:
+                f.write("[\n")
+            if thread not in self._tids:
+                self._tids[thread] = next(self._next_tid)
+                self._write(
+                    f,
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": self._pid,
+                        "tid": self._tids[thread],
+                        "args": {"name": thread},
+                    },
+                )
+            self._write(
+                f,
+                {
+                    "name": span.name,
+                    "cat": span.kind,
+                    "ph": "X",
+                    "ts": int(span.start_time * 1e6),
+                    "dur": int(span.duration * 1e6),
+                    "pid": self._pid,
+                    "tid": self._tids[thread],
+                    "args": {
+                        **span.attributes,
+                        "trace_id": span.trace_id,
+                        "span_id": span.span_id,
+                        "parent_id": span.parent_id,
+                        "status": span.status,
+                        **({"error": span.error} if span.error else {}),
+                    },
+                },
+            )
+
+
+@dataclass(frozen=True, kw_only=True)
+class _SpanContext:
+    trace_id: str
+    span_id: Optional[str]
+    """The id of the closest recorded span, None if the trace is not sampled."""
+    agent: Optional[str]
+    sampled: bool
+
+
+_current_span: ContextVar[Optional[_SpanContext]] = ContextVar(
+    "current_span", default=None
+)
+
+
+class Tracer:
+    """Create spans and send them to exporters."""
+
+    def __init__(
+        self,
+        exporters: Iterable[SpanExporter] = (),
+        *,
+        sample_rate: float = 1.0,
+    ):
+        """Initialize the tracer.
+
+        Args:
+            exporters: The exporters receiving every finished span.
+            sample_rate: Fraction of traces that are recorded, unless they start
+                with the run of an agent registered with its own sample rate.
+        """
+        self.exporters = list(exporters)
+        self.sample_rate = sample_rate
+        # the sample rate of the traces started by every registered agent
+        self.agents: dict[str, float] = {}
+        self.handler = TracingCallbackHandler(self)
+
+    def configure(self, config: TracingConfiguration):
+        """Add the exporter of an agent configuration, if not added yet."""
+        if not any(
+            getattr(e, "path", None) == Path(config.path) for e in self.exporters
+        ):
+            exporter_cls = (
+                ChromeTraceExporter
+                if config.exporter == "chrome"
+                else JsonlSpanExporter
+            )
+            self.exporters.append(exporter_cls(config.path))
+
+    def register_agent(self, name: str, sample_rate: Optional[float] = None):
+        """Register the name of an agent graph, so that its runs are traced as agent spans.
+
+        Args:
+            name: The name of the agent graph.
+            sample_rate: Fraction of the traces started by the agent's runs that
+                are recorded. Defaults to the sample rate of the tracer.
+        """
+        self.agents[name] = self.sample_rate if sample_rate is None else sample_rate
+
+    def _root_context(self, sample_rate: Optional[float] = None) -> _SpanContext:
+        if sample_rate is None:
+            sample_rate = self.sample_rate
+        return _SpanContext(
+            trace_id=uuid.uuid4().hex,
+            span_id=None,
+            agent=None,
+            sampled=random.random() < sample_rate,
+        )
+
+    def current_context(self) -> Optional[_SpanContext]:
+        """Return the context of the innermost manual span or graph run, if any."""
+        if ctx := _current_span.get():
+            return ctx
+        config = var_child_runnable_config.get()
+        callbacks = config.get("callbacks") if config else None
+        parent_run_id = getattr(callbacks, "parent_run_id", None)
+        return self.handler.context(parent_run_id)
+
+    def start_span(
+        self,
+        name: str,
+        kind: SpanKind,
+        parent: Optional[_SpanContext],
+        *,
+        span_id: Optional[str] = None,
+        attributes: Optional[dict[str, Any]] = None,
+    ) -> tuple[Optional[Span], _SpanContext]:
+        """Start a span under the given parent context.
+
+        Returns:
+            The span, None if the trace is not sampled, and the context of its children.
+        """
+        # a trace is sampled at the rate of the agent it starts with
+        parent = parent or self._root_context(
+            self.agents.get(name) if kind == "agent" else None
+        )
+        if not parent.sampled:
+            return None, parent
+
+        agent = name if kind == "agent" else parent.agent
+        span = Span(
+            trace_id=parent.trace_id,
+            span_id=span_id or uuid.uuid4().hex[:16],
+            parent_id=parent.span_id,
+            name=name,
+            kind=kind,
+            start_time=time.time(),
+            attributes={**(attributes or {}), **({"agent": agent} if agent else {})},
+        )
+        return span, _SpanContext(
+            trace_id=span.trace_id, span_id=span.span_id, agent=agent, sampled=True
+        )
+
+    def end_span(self, span: Optional[Span], error: Optional[BaseException] = None):
+        """End the span and export it."""
+        if span is None:
+            return
+        span.end_time = time.time()
+        if error is not None:
+            span.status = "error"
+            span.error = repr(error)
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                logger.warning(f"Unable to export span {span.name}: {e}")
+
+    @contextmanager
+    def span(
+        self, name: str, kind: SpanKind = "internal", **attributes: Any
+    ) -> Iterator[Optional[Span]]:
+        """Trace the enclosed block as a span, parented to the current span or graph run.
+
+        Usable in both sync and async code. Yields None if the trace is not sampled.
+        """
+        span, ctx = self.start_span(
+            name, kind, self.current_context(), attributes=attributes
+        )
+        token = _current_span.set(ctx)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, e)
+            raise
+        else:
+            self.end_span(span)
+        finally:
+            _current_span.reset(token)
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Callback handler turning graph, model and tool runs into spans."""
+
+    run_inline = True
+
+    def __init__(self, tracer: Tracer):
+        """Initialize the handler creating spans with the given tracer."""
+        self.tracer = tracer
+        self._runs: dict[UUID, tuple[Optional[Span], _SpanContext]] = {}
+
+    def context(self, run_id: Optional[UUID]) -> Optional[_SpanContext]:
+        """Return the span context of a run tracked by the handler."""
+        run = self._runs.get(run_id) if run_id else None
+        return run[1] if run else None
+
+    def _start(
+        self,
+        run_id: UUID,
+        parent_run_id: Optional[UUID],
+        name: str,
+        kind: Optional[SpanKind],
+        attributes: dict[str, Any],
+    ):
+        parent = self.context(parent_run_id)
+        if kind is None:
+            # untraced runs (sequences, channel writes...) only forward their parent
+            self._runs[run_id] = (None, parent or self.tracer._root_context())
+            return
+        self._runs[run_id] = self.tracer.start_span(
+            name, kind, parent, span_id=run_id.hex[:16], attributes=attributes
+        )
+
+    def _end(
+        self,
+        run_id: UUID,
+        error: Optional[BaseException] = None,
+        attributes: Optional[dict[str, Any]] = None,
+    ):
+        span, _ = self._runs.pop(run_id, (None, None))
+        if span is not None and attributes:
+            span.attributes.update(attributes)
+        self.tracer.end_span(span, error)
+
+    def on_chain_start(
+        self,
+        serialized: Optional[dict[str, Any]],
+        inputs: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Start an agent or node span."""
+        metadata = metadata or {}
+        name = kwargs.get("name") or (serialized or {}).get("name", "")
+        kind: Optional[SpanKind] = None
+        attributes = {}
+        if name in self.tracer.agents:
+            kind = "agent"
+            attributes = {"thread_id": metadata.get("thread_id")}
+        elif name and name == metadata.get("langgraph_node"):
+            kind = "node"
+            attributes = {"step": metadata.get("langgraph_step")}
+        self._start(run_id, parent_run_id, name, kind, attributes)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        """End an agent or node span."""
+        self._end(run_id)
+
+    def on_chain_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        """End an agent or node span with an error."""
+        # interrupts are raised as exceptions but are part of the control flow
+        self._end(run_id, None if type(error).__name__ == "GraphInterrupt" else error)
+
+    def on_chat_model_start(
+        self,
+        serialized: Optional[dict[str, Any]],
+        messages: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Start a model call span."""
+        metadata = metadata or {}
+        name = metadata.get("ls_model_name") or kwargs.get("name") or "model"
+        self._start(
+            run_id,
+            parent_run_id,
+            name,
+            "llm",
+            {"provider": metadata.get("ls_provider")},
+        )
+
+    def on_llm_start(
+        self,
+        serialized: Optional[dict[str, Any]],
+        prompts: list[str],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Start a completion model call span."""
+        self.on_chat_model_start(
+            serialized,
+            prompts,
+            run_id=run_id,
+            parent_run_id=parent_run_id,
+            metadata=metadata,
+            **kwargs,
+        )
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        """End a model call span, with its token usage."""
+        attributes = {}
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(
+                    getattr(generation, "message", None), "usage_metadata", None
+                )
+                if usage:
+                    attributes["input_tokens"] = usage.get("input_tokens", 0)
+                    attributes["output_tokens"] = usage.get("output_tokens", 0)
+        self._end(run_id, attributes=attributes)
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        """End a model call span with an error."""
+        self._end(run_id, error)
+
+    def on_tool_start(
+        self,
+        serialized: Optional[dict[str, Any]],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        tags: Optional[list[str]] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Start a tool or GitHub API call span."""
+        name = kwargs.get("name") or (serialized or {}).get("name", "tool")
+        kind: SpanKind = "github" if GITHUB_TAG in (tags or []) else "tool"
+        self._start(run_id, parent_run_id, name, kind, {})
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        """End a tool span."""
+        self._end(run_id)
+
+    def on_tool_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        """End a tool span with an error."""
+        self._end(run_id, error)
+
+
+def _op_name(op: Op) -> str:
+    return {
+        GetOp: "store.get",
+        PutOp: "store.put",
+        SearchOp: "store.search",
+        ListNamespacesOp: "store.list_namespaces",
+    }.get(type(op), "store.op")
+
+
+def _op_attributes(ops: list[Op]) -> dict[str, Any]:
+    namespaces = {
+        "/".join(getattr(op, "namespace", None) or getattr(op, "namespace_prefix", ()))
+        for op in ops
+    }
+    return {"ops": len(ops), "namespaces": sorted(namespaces)}
+
+
+class TracedStore(BaseStore):
+    """A store tracing every batch of operations of the wrapped store as a span."""
+
+    def __init__(self, store: BaseStore, tracer: Tracer):
+        """Wrap the store, tracing its operations with the given tracer."""
+        self.store = store
+        self.tracer = tracer
+
+    def __getattr__(self, name: str) -> Any:
+        """Delegate other attributes, such as the index configuration, to the wrapped store."""
+        return getattr(self.store, name)
+
+    def _span_name(self, ops: list[Op]) -> str:
+        names = {_op_name(op) for op in ops}
+        return names.pop() if len(names) == 1 else "store.batch"
+
+    def batch(self, ops: Iterable[Op]) -> list[Result]:
+        """Execute the operations of the wrapped store in a span."""
+        ops = list(ops)
+        with self.tracer.span(self._span_name(ops), "store", **_op_attributes(ops)):
+            return self.store.batch(ops)
+
+    async def abatch(self, ops: Iterable[Op]) -> list[Result]:
+        """Execute the operations of the wrapped store asynchronously in a span."""
+        ops = list(ops)
+        with self.tracer.span(self._span_name(ops), "store", **_op_attributes(ops)):
+            return await self.store.abatch(ops)
+
+
+def traced_store(store: Optional[BaseStore], tracer: Tracer) -> Optional[BaseStore]:
+    """Wrap the store with tracing, unless it is None or already traced."""
+    if store is None or isinstance(store, TracedStore):
+        return store
+    return TracedStore(store, tracer)
+
+
+_TRACER: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    """Return the process-wide tracer."""
+    global _TRACER
+    if _TRACER is None:
+        _TRACER = Tracer()
+    return _TRACER
+
+
+__all__ = [
+    "GITHUB_TAG",
+    "ChromeTraceExporter",
+    "JsonlSpanExporter",
+    "Span",
+    "SpanExporter",
+    "TracedStore",
+    "Tracer",
+    "TracingCallbackHandler",
+    "TracingConfiguration",
+    "get_tracer",
+    "traced_store",
+]
@@ -0,0 +1,183 @@
+"""Failure reports of GitHub Actions workflow runs.
+
+The logs of a workflow run are a zip archive with the log of every job at its
+top level and the log of every step in a directory per job:
+
+    0_test.txt
+    test/1_Set up job.txt
+    test/3_Run tests.txt
+
+On a large CI run they add up to hundreds of MB, and concatenating them made a
+huge prompt out of mostly successful output. `failure_report` instead reads
+only the logs of the failed steps of the failed jobs, as listed by the jobs of
+the run, streaming the zip members line by line without extracting them. It
+keeps a bounded window of context around every error line and the tail of the
+step, where test runners print their summary, and bounds the whole report.
+
+Reading the archive is blocking: call it in a worker thread.
+"""
+
+import io
+import re
+import zipfile
+from collections import deque
+from dataclasses import dataclass
+from typing import IO, Any, Iterable, Iterator, Optional
+
+from common.logging import get_logger
+
+logger = get_logger(__name__)
+
+_TIMESTAMP = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?Z ")
+"""The timestamp GitHub prefixes every log line with."""
+
+
+@dataclass(kw_only=True)
+class WorkflowLogConfiguration:
+    """Configuration for the failure reports of workflow runs."""
+
+    error_pattern: str = (
+        r"##\[error\]|\berror\b|\bfailed\b|\bfailure\b|traceback|exception|assert"
+    )
+    """Case-insensitive pattern of the lines reporting an error."""
+    context_lines: int = 5
+    """Lines kept before and after every error line."""
+    max_windows: int = 10
+    """Error windows kept per step, the first ones."""
+    tail_lines: int = 30
+    """Last lines of a failed step kept, where the summary of a test run usually is."""
+    max_line_chars: int = 500
+    max_report_chars: int = 20_000
+    """The report is truncated past this size."""
+    max_download_bytes: int = 500_000_000
+    """Larger log archives are not downloaded."""
+    spool_bytes: int = 10_000_000
+    """Archives are downloaded in memory up to this size, then spooled to a temporary file."""
+
+
+def _lines(member: IO[bytes], max_line_chars: int) -> Iterator[str]:
+    for line in io.TextIOWrapper(member, encoding="utf-8", errors="replace"):
+        line = _TIMESTAMP.sub("", line.rstrip("\n"))
+        yield line if len(line) <= max_line_chars else line[:max_line_chars] + "…"
+
+
+def error_windows(
+    lines: Iterable[str], config: WorkflowLogConfiguration
+) -> tuple[list[list[tuple[int, str]]], list[tuple[int, str]]]:
+    """Return the windows of context around the error lines, and the tail of the lines.
+
+    The lines are read once, keeping at most the context, windows and tail in
+    memory. Overlapping windows are merged.
+
+    Returns:
+        The windows and the tail, as lists of numbered lines.
+    """
+    pattern = re.compile(config.error_pattern, re.IGNORECASE)
+    before: deque[tuple[int, str]] = deque(maxlen=config.context_lines)
+    tail: deque[tuple[int, str]] = deque(maxlen=config.tail_lines)
+    windows: list[list[tuple[int, str]]] = []
+    after = 0
+    for number, line in enumerate(lines, start=1):
+        tail.append((number, line))
+        if pattern.search(line) and (after or len(windows) < config.max_windows):
+            if not after:
+                windows.append(list(before))
+            windows[-1].append((number, line))
+            after = config.context_lines
+        elif after:
+            windows[-1].append((number, line))
+            after -= 1
+        before.append((number, line))
+    return windows, list(tail)
+
+
+def _format_step(
+    windows: list[list[tuple[int, str]]], tail: list[tuple[int, str]]
+) -> list[str]:
+    shown = {number for window in windows for number, _ in window}
+    sections = list(windows)
+    tail = [(number, line) for number, line in tail if number not in shown]
+    if tail:
+        sections.append(tail)
+    formatted = []
+    for section in sections:
+        formatted.append("    ...")
+        formatted.extend(f"    {number:>5} | {line}" for number, line in section)
+    return formatted
+
+
+def _job_members(names: list[str], job: dict[str, Any]) -> dict[str, str]:
+    """Return the log member names of a job: its log, and the ones of its steps by number."""
+    name = job["name"].replace("/", "_")
+    members = {}
+    for member in names:
+        directory, _, file = member.rpartition("/")
+        if directory == name:
+            members[file.split("_", 1)[0]] = member
+        elif not directory and file.split("_", 1)[-1] == f"{name}.txt":
+            members["job"] = member
+    return members
+
+
+def failure_report(
+    archive: Optional[IO[bytes]],
+    run: dict[str, Any],
+    jobs: list[dict[str, Any]],
+    config: Optional[WorkflowLogConfiguration] = None,
+) -> str:
+    """Return a compact report of the failures of a workflow run.
+
+    Args:
+        archive: The zip archive of the logs of the run, as a seekable file.
+            Not read if no job failed.
+        run: The workflow run.
+        jobs: The jobs of the run, with their steps.
+        config: The report configuration.
+    """
+    config = config or WorkflowLogConfiguration()
+    report = [
+        f"Workflow run `{run.get('name', run['id'])}` on {run['head_sha'][:7]}: "
+        f"{run.get('conclusion') or run.get('status', 'unknown')}"
+    ]
+    failed = [job for job in jobs if job.get("conclusion") == "failure"]
+    if not failed:
+        report.append("No job failed.")
+        return "\n".join(report)
+
+    with zipfile.ZipFile(archive) as logs:
+        names = logs.namelist()
+        for job in failed:
+            report.append(f"\nJob `{job['name']}` failed.")
+            members = _job_members(names, job)
+            steps = [
+                step
+                for step in job.get("steps", [])
+                if step.get("conclusion") == "failure"
+            ]
+            # without the log of a failed step, report on the log of the job
+            logged_steps = [
+                (
+                    f"Step {step['number']} `{step['name']}`",
+                    members[str(step["number"])],
+                )
+                for step in steps
+                if str(step["number"]) in members
+            ] or [("Job log", members["job"])] * ("job" in members)
+            if not logged_steps:
+                report.append("  No log found.")
+            for title, member in logged_steps:
+                with logs.open(member) as log:
+                    windows, tail = error_windows(
+                        _lines(log, config.max_line_chars), config
+                    )
+                report.append(f"  {title} failed:")
+                report.extend(_format_step(windows, tail))
+
+    text = "\n".join(report)
+    if len(text) > config.max_report_chars:
+        logger.info(f"Truncated the failure report of {len(text)} characters")
+        text = text[: config.max_report_chars] + "\n... (truncated)"
+    return text
+
+
+__all__ = ["WorkflowLogConfiguration", "error_windows", "failure_report"]
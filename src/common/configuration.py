@@ -3,7 +3,15 @@
 from dataclasses import dataclass, field
 from typing import Any
 
+from common.components.compaction import CompactionConfiguration
+from common.components.llm_cache import LlmCacheConfiguration
 from common.components.memory import MemoryConfiguration
+from common.components.model_router import ModelRoutingConfiguration
+from common.components.prompt_cache import ContextCacheConfiguration
+from common.components.rate_limiter import RateLimiterConfiguration
+from common.components.resilience import ModelCallConfiguration
+from common.components.telemetry import TelemetryConfiguration
+from common.components.tracing import TracingConfiguration
 
 _LANGGRAPH_CONFIGURABLES = ["user_id", "model", "provider"]
 
@@ -19,6 +27,20 @@ class AgentConfiguration:
 
     # extended config
     memory: MemoryConfiguration = field(default_factory=MemoryConfiguration)
+    compaction: CompactionConfiguration = field(default_factory=CompactionConfiguration)
+    context_cache: ContextCacheConfiguration = field(
+        default_factory=ContextCacheConfiguration
+    )
+    telemetry: TelemetryConfiguration = field(default_factory=TelemetryConfiguration)
+    tracing: TracingConfiguration = field(default_factory=TracingConfiguration)
+    rate_limiter: RateLimiterConfiguration = field(
+        default_factory=RateLimiterConfiguration
+    )
+    model_calls: ModelCallConfiguration = field(default_factory=ModelCallConfiguration)
+    routing: ModelRoutingConfiguration = field(
+        default_factory=ModelRoutingConfiguration
+    )
+    llm_cache: LlmCacheConfiguration = field(default_factory=LlmCacheConfiguration)
 
     @property
     def langgraph_configurables(self) -> dict[str, Any]:
@@ -10,6 +10,8 @@ from langgraph.store.base import BaseStore
 from langgraph.types import Checkpointer
 
 from common.components.memory import SemanticMemory
+from common.components.telemetry import Telemetry, get_telemetry
+from common.components.tracing import Tracer, get_tracer, traced_store
 from common.configuration import AgentConfiguration
 from common.logging import get_logger
 
@@ -40,6 +42,16 @@ class AgentGraph(ABC):
         self._name = name
         self._agent_config = agent_config or AgentConfiguration()
         self._checkpointer = checkpointer
+
+        self._tracer = None
+        if self._agent_config.tracing.use_tracing:
+            self._tracer = get_tracer()
+            self._tracer.configure(self._agent_config.tracing)
+            self._tracer.register_agent(
+                self._name, self._agent_config.tracing.sample_rate
+            )
+            store = traced_store(store, self._tracer)
+
         self._store = store
         self._builder = None
         self._compiled_graph = None
@@ -49,10 +61,16 @@ class AgentGraph(ABC):
         if self._agent_config.memory.use_memory:
             self._memory = SemanticMemory(
                 agent_name=self._name,
-                store=store,
+                store=self._store,
                 memory_config=self._agent_config.memory,
             )
 
+        self._telemetry = None
+        if self._agent_config.telemetry.use_telemetry:
+            self._telemetry = get_telemetry()
+            self._telemetry.configure(self._agent_config.telemetry)
+            self._telemetry.register_agent(self._name)
+
     @property
     def name(self) -> str:
         """Returns the agent's name."""
@@ -97,6 +115,16 @@ class AgentGraph(ABC):
         """Returns the semantic memory component if initialized, otherwise None."""
         return self._memory
 
+    @property
+    def telemetry(self) -> Optional[Telemetry]:
+        """Returns the telemetry aggregator recording the agent's calls, if enabled."""
+        return self._telemetry
+
+    @property
+    def tracer(self) -> Optional[Tracer]:
+        """Returns the tracer recording the agent's spans, if enabled."""
+        return self._tracer
+
     @property
     def builder(self):
         """Returns the graph builder instance, creating it if it does not already exist."""
@@ -121,6 +149,7 @@ class AgentGraph(ABC):
         """Return the compiled state graph for the agent, creating it if not already compiled.
 
         The graph is compiled using the agent's name, checkpointer, and store, and the result is cached for future calls.
+        The callback handlers of telemetry and tracing, if enabled, are attached to the compiled graph.
 
         Returns:
             CompiledStateGraph: The compiled state graph instance.
@@ -129,4 +158,13 @@ class AgentGraph(ABC):
             self._compiled_graph = self.builder.compile(
                 name=self._name, checkpointer=self._checkpointer, store=self._store
             )
+            callbacks = [
+                component.handler
+                for component in (self._telemetry, self._tracer)
+                if component is not None
+            ]
+            if callbacks:
+                self._compiled_graph = self._compiled_graph.with_config(
+                    callbacks=callbacks
+                )
         return self._compiled_graph
@@ -4,6 +4,10 @@ import os
 
 from github import Auth, Github, GithubIntegration
 
+from common.components.github_credentials import (
+    get_credential_manager,
+    read_private_key,
+)
 from common.logging import get_logger
 
 logger = get_logger(__name__)
@@ -20,18 +24,9 @@ def app_get_integration() -> GithubIntegration:
             "GITHUB_APP_ID, GITHUB_APP_PRIVATE_KEY and GITHUB_REPOSITORY environment variables must be set"
         )
 
-    try:
-        # interpret the key as a file path
-        # fallback to interpreting as the key itself
-        with open(github_app_private_key) as f:
-            github_app_private_key = f.read()
-    except FileNotFoundError:
-        # Treat as direct key content
-        pass
-
     auth = Auth.AppAuth(
         github_app_id,
-        github_app_private_key,
+        read_private_key(github_app_private_key),
     )
 
     return GithubIntegration(auth=auth)
@@ -56,9 +51,16 @@ def app_get_installation(integration: GithubIntegration):
 
 
 def app_get_client_from_credentials() -> Github:
-    """Get an authenticated github client provided corresponding app credentials are provided as environment variables."""
+    """Get an authenticated github client provided corresponding app credentials are provided as environment variables.
+
+    The client of the installation on `GITHUB_REPOSITORY` is shared, and its
+    token cached, see `GithubCredentialManager`.
+    """
     logger.debug("Getting github client")
-    integration = app_get_integration()
-    installation = app_get_installation(integration)
-    client = installation.get_github_for_installation()
-    return client
+    github_repo_name = os.getenv("GITHUB_REPOSITORY")
+    if not github_repo_name:
+        raise ValueError("GITHUB_REPOSITORY environment variable must be set")
+    try:
+        return get_credential_manager().client(github_repo_name)
+    except RuntimeError as e:
+        raise ValueError(str(e)) from e
@@ -14,7 +14,6 @@ from langchain_core.messages import (
     HumanMessage,
 )
 from langchain_core.runnables import RunnableConfig
-from langgraph.checkpoint.memory import InMemorySaver
 from langgraph.store.memory import InMemoryStore
 from langgraph.types import Command
 from langsmith import RunTree, traceable
@@ -23,6 +22,7 @@ from langsmith.evaluation import EvaluationResult
 from pydantic import BaseModel
 from termcolor import colored
 
+from common.components.checkpointer import create_checkpointer
 from orchestrator.configuration import (
     ArchitectAgentConfig,
     CodeReviewerAgentConfig,
@@ -134,7 +134,7 @@ if __name__ == "__main__":
                     use_stub=False,
                 ),
             ),
-            checkpointer=InMemorySaver(),
+            checkpointer=create_checkpointer(),
             store=InMemoryStore(),
         )
 
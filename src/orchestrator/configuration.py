@@ -1,6 +1,7 @@
 """Configuration for the graph."""
 
 from dataclasses import dataclass, field
+from typing import Literal, Union
 
 from architect.configuration import (
     Configuration as ArchitectConfiguration,
@@ -36,6 +37,15 @@ class SubAgentConfig:
             implementation of the agent that is used for testing purposes.
         stub_messages: The messages to use for the stub.
         config: The configuration for the sub-agent.
+        ephemeral: Whether the sub-agent runs without checkpoints, its state
+            kept in memory and only its result persisted by the orchestrator.
+            Sub-agents asking the human questions should not be ephemeral.
+        resumable: Whether the sub-agent runs on its own thread, derived from the
+            tool call, so that a failed or killed run is resumed from its last
+            checkpoint when the tool call is retried. Checkpointed by the
+            checkpointer of the sub-agent, or else by the one of the orchestrator's
+            run. Sub-agents asking the human questions should not be resumable.
+            See `common.components.sub_agents`.
     """
 
     """Whether to use a stub for the sub-agent."""
@@ -44,6 +54,15 @@ class SubAgentConfig:
     stub_messages: MessageWheel = MessageWheel(["I finished the task."])
     """The configuration for the sub-agent."""
     config: AgentConfiguration = field(default_factory=AgentConfiguration)
+    """Whether the sub-agent runs without checkpoints. If interrupted, it restarts from scratch on resume."""
+    ephemeral: bool = False
+    """Whether a retried sub-agent resumes its failed run from its last checkpoint."""
+    resumable: bool = False
+
+    def __post_init__(self):
+        """Check that the sub-agent is not both ephemeral and resumable."""
+        if self.ephemeral and self.resumable:
+            raise ValueError("A sub-agent cannot be both ephemeral and resumable")
 
 
 @dataclass(kw_only=True)
@@ -119,7 +138,8 @@ class Configuration(AgentConfiguration):
         )
     )
     github_base_branch: str = "main"
-    use_mocks: bool = False
+    use_mocks: Union[bool, Literal["git"]] = False
+    """Whether the GitHub tools use mocks, or "git" for a local git-backed stand-in of the repository."""
 
 
 __all__ = ["Configuration", "RequirementsAgentConfig", "SubAgentConfig"]
@@ -4,9 +4,8 @@ import os
 from datetime import datetime
 from typing import Any, Coroutine, Optional
 
-from langchain.chat_models import init_chat_model
 from langchain_core.language_models import LanguageModelInput
-from langchain_core.messages import AIMessage, BaseMessage, SystemMessage
+from langchain_core.messages import AIMessage, BaseMessage
 from langchain_core.runnables import Runnable, RunnableConfig
 from langgraph.graph import END, START, StateGraph
 from langgraph.prebuilt import ToolNode
@@ -26,8 +25,13 @@ from code_reviewer.graph import (
 )
 from coder.graph import CoderChangeRequestGraph, CoderNewPRGraph
 from common.chain import prechain, skip_on_summary_and_tool_errors
+from common.chat_model import create_chat_model
+from common.components.compaction import add_compaction_node
+from common.components.github_git_server import get_local_github
 from common.components.github_mocks import get_github, get_mock_github
 from common.components.github_tools import get_github_tools
+from common.components.model_router import ROUTING_STEP
+from common.components.prompt_cache import PromptAssembler, get_context_cache
 from common.configuration import AgentConfiguration
 from common.graph import AgentGraph
 from common.logging import get_logger
@@ -59,17 +63,18 @@ logger = get_logger(__name__)
 def _create_orchestrator(
     agent_config: Configuration,
     llm: Runnable[LanguageModelInput, BaseMessage],
+    prompt: PromptAssembler,
 ) -> Coroutine[Any, Any, dict]:
     @prechain(skip_on_summary_and_tool_errors())
     async def orchestrator(
         state: State, config: RunnableConfig, *, store: BaseStore
     ) -> dict:
         """Extract the user's state from the conversation and update the memory."""
-        sys_prompt = agent_config.system_prompt.format(time=datetime.now().isoformat())
-
-        msg = await llm.ainvoke(
-            [SystemMessage(sys_prompt), *state.messages],
+        msg = await prompt.ainvoke(
+            llm,
+            state.messages,
             config,
+            volatile=f"System Time: {datetime.now().isoformat()}",
         )
 
         return {"messages": [msg]}
@@ -128,6 +133,11 @@ class OrchestratorGraph(AgentGraph):
             store=store,
         )
 
+    def _sub_agent_checkpointer(self, sub_agent: SubAgentConfig) -> Checkpointer:
+        """Return the checkpointer of a sub-agent, disabling checkpoints if ephemeral."""
+        # False, unlike None, also ignores the checkpointer inherited from the orchestrator's run
+        return False if sub_agent.ephemeral else self._checkpointer
+
     def create_builder(self) -> StateGraph:
         """Construct and returns the orchestrator state graph for project workflow management.
 
@@ -136,62 +146,79 @@ class OrchestratorGraph(AgentGraph):
         requirements_graph = (
             stubs.RequirementsGathererStub(
                 agent_config=self._agent_config,
-                checkpointer=self._checkpointer,
+                checkpointer=self._sub_agent_checkpointer(
+                    self._agent_config.requirements_agent
+                ),
                 store=self._store,
                 stub_messages=self._agent_config.requirements_agent.stub_messages,
             )
             if self._agent_config.requirements_agent.use_stub
             else RequirementsGraph(
                 agent_config=self._agent_config.requirements_agent.config,
-                checkpointer=self._checkpointer,
+                checkpointer=self._sub_agent_checkpointer(
+                    self._agent_config.requirements_agent
+                ),
                 store=self._store,
             )
         )
         architect_graph = (
             stubs.ArchitectStub(
                 agent_config=self._agent_config,
-                checkpointer=self._checkpointer,
+                checkpointer=self._sub_agent_checkpointer(
+                    self._agent_config.architect_agent
+                ),
                 store=self._store,
                 stub_messages=self._agent_config.architect_agent.stub_messages,
             )
             if self._agent_config.architect_agent.use_stub
             else ArchitectGraph(
                 agent_config=self._agent_config.architect_agent.config,
-                checkpointer=self._checkpointer,
+                checkpointer=self._sub_agent_checkpointer(
+                    self._agent_config.architect_agent
+                ),
                 store=self._store,
             )
         )
         task_manager_graph = (
             stubs.TaskManagerStub(
                 agent_config=self._agent_config,
-                checkpointer=self._checkpointer,
+                checkpointer=self._sub_agent_checkpointer(
+                    self._agent_config.task_manager_agent
+                ),
                 store=self._store,
                 stub_messages=self._agent_config.task_manager_agent.stub_messages,
             )
             if self._agent_config.task_manager_agent.use_stub
             else TaskManagerGraph(
                 agent_config=self._agent_config.task_manager_agent.config,
-                checkpointer=self._checkpointer,
+                checkpointer=self._sub_agent_checkpointer(
+                    self._agent_config.task_manager_agent
+                ),
                 store=self._store,
             )
         )
-        github_source = (
-            get_github(self._agent_config.github_base_branch)
-            if not self._agent_config.use_mocks
-            else get_mock_github()
-        )
+        if self._agent_config.use_mocks == "git":
+            github_source = get_local_github(self._agent_config.github_base_branch)
+        elif self._agent_config.use_mocks:
+            github_source = get_mock_github()
+        else:
+            github_source = get_github(self._agent_config.github_base_branch)
         github_tools = get_github_tools(github_source)
         coder_new_pr_graph = (
             stubs.CoderNewPRStub(
                 agent_config=self._agent_config,
-                checkpointer=self._checkpointer,
+                checkpointer=self._sub_agent_checkpointer(
+                    self._agent_config.coder_new_pr_agent
+                ),
                 store=self._store,
                 stub_messages=self._agent_config.coder_new_pr_agent.stub_messages,
             )
             if self._agent_config.coder_new_pr_agent.use_stub
             else CoderNewPRGraph(
                 agent_config=self._agent_config.coder_new_pr_agent.config,
-                checkpointer=self._checkpointer,
+                checkpointer=self._sub_agent_checkpointer(
+                    self._agent_config.coder_new_pr_agent
+                ),
                 store=self._store,
                 github_tools=github_tools,
             )
@@ -199,14 +226,18 @@ class OrchestratorGraph(AgentGraph):
         coder_change_request_graph = (
             stubs.CoderChangeRequestStub(
                 agent_config=self._agent_config,
-                checkpointer=self._checkpointer,
+                checkpointer=self._sub_agent_checkpointer(
+                    self._agent_config.coder_change_request_agent
+                ),
                 store=self._store,
                 stub_messages=self._agent_config.coder_change_request_agent.stub_messages,
             )
             if self._agent_config.coder_change_request_agent.use_stub
             else CoderChangeRequestGraph(
                 agent_config=self._agent_config.coder_change_request_agent.config,
-                checkpointer=self._checkpointer,
+                checkpointer=self._sub_agent_checkpointer(
+                    self._agent_config.coder_change_request_agent
+                ),
                 store=self._store,
                 github_tools=github_tools,
             )
@@ -214,14 +245,18 @@ class OrchestratorGraph(AgentGraph):
         tester_graph = (
             stubs.TesterStub(
                 agent_config=self._agent_config,
-                checkpointer=self._checkpointer,
+                checkpointer=self._sub_agent_checkpointer(
+                    self._agent_config.tester_agent
+                ),
                 store=self._store,
                 stub_messages=self._agent_config.tester_agent.stub_messages,
             )
             if self._agent_config.tester_agent.use_stub
             else TesterAgentGraph(
                 agent_config=self._agent_config.tester_agent.config,
-                checkpointer=self._checkpointer,
+                checkpointer=self._sub_agent_checkpointer(
+                    self._agent_config.tester_agent
+                ),
                 store=self._store,
                 github_tools=github_tools,
             )
@@ -229,14 +264,18 @@ class OrchestratorGraph(AgentGraph):
         code_reviewer_graph = (
             stubs.CodeReviewerStub(
                 agent_config=self._agent_config,
-                checkpointer=self._checkpointer,
+                checkpointer=self._sub_agent_checkpointer(
+                    self._agent_config.reviewer_agent
+                ),
                 store=self._store,
                 stub_messages=self._agent_config.reviewer_agent.stub_messages,
             )
             if self._agent_config.reviewer_agent.use_stub
             else CodeReviewerGraph(
                 agent_config=self._agent_config.reviewer_agent.config,
-                checkpointer=self._checkpointer,
+                checkpointer=self._sub_agent_checkpointer(
+                    self._agent_config.reviewer_agent
+                ),
                 store=self._store,
                 github_tools=github_tools,
                 config=github_code_reviewer_config(),
@@ -260,8 +299,16 @@ class OrchestratorGraph(AgentGraph):
             common.tools.create_summarize_tool(self._name),
         ] + [tool for tool in github_tools if tool.name == "get_issue_body"]
         tool_node = ToolNode(all_tools, name="tools")
-        llm = init_chat_model(self._agent_config.model).bind_tools(all_tools)
-        orchestrator = _create_orchestrator(self._agent_config, llm)
+        llm = create_chat_model(self._agent_config, step=ROUTING_STEP).bind_tools(
+            all_tools
+        )
+        prompt = PromptAssembler(
+            self._agent_config.system_prompt,
+            model=self._agent_config.model,
+            tools=all_tools,
+            cache=get_context_cache(self._agent_config.context_cache),
+        )
+        orchestrator = _create_orchestrator(self._agent_config, llm, prompt)
         orchestrate_condition = _create_orchestrate_condition(
             self._agent_config, orchestrator, tool_node
         )
@@ -270,8 +317,11 @@ class OrchestratorGraph(AgentGraph):
         builder = StateGraph(State, config_schema=Configuration)
         builder.add_node(orchestrator)
         builder.add_node(tool_node.name, tool_node)
-        builder.add_edge(START, orchestrator.__name__)
-        builder.add_edge(tool_node.name, orchestrator.__name__)
+        entry = add_compaction_node(
+            builder, self._agent_config.compaction, target=orchestrator.__name__
+        )
+        builder.add_edge(START, entry)
+        builder.add_edge(tool_node.name, entry)
         builder.add_conditional_edges(
             orchestrator.__name__,
             orchestrate_condition,
@@ -301,7 +351,11 @@ graph = OrchestratorGraph(
         reviewer_agent=CodeReviewerAgentConfig(
             use_stub=False, config=AgentConfiguration()
         ),
-        use_mocks=os.getenv("AI_NEXUS_MOCKS") is not None,
+        use_mocks=(
+            "git"
+            if os.getenv("AI_NEXUS_MOCKS") == "git"
+            else os.getenv("AI_NEXUS_MOCKS") is not None
+        ),
     )
 ).compiled_graph
 
@@ -1,7 +1,5 @@
 """Define default prompts."""
 
-from datetime import datetime
-
 ORCHESTRATOR_MEM_SYSTEM_PROMPT = """You are an orchestrator of a professional engineering team. You have memory.
 
 ## Memory
@@ -41,9 +39,7 @@ I repeat, your absolute rules are:
 
 {absolute}
 
-and MUST not be broken.
-
-System Time: {time}"""
+and MUST not be broken."""
 
 
 def _read_memory_bank(type: str) -> str:
@@ -54,11 +50,12 @@ def _read_memory_bank(type: str) -> str:
 
 
 def get_prompt() -> str:
-    """Missing docs."""
+    """Return the static orchestrator system prompt, built from the memory bank.
+
+    The prompt holds no per-call content, so that it can be served from provider caches.
+    """
     memory = {
         k: _read_memory_bank(k)
         for k in ["absolute", "team", "project_states", "process"]
     }
-    return ORCHESTRATOR_MEM_SYSTEM_PROMPT.format(
-        time=datetime.now().isoformat(), **memory
-    )
+    return ORCHESTRATOR_MEM_SYSTEM_PROMPT.format(**memory)
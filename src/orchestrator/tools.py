@@ -2,6 +2,7 @@
 
 import glob
 import os
+import uuid
 from typing import Annotated, Literal
 
 from langchain_core.messages import HumanMessage, ToolMessage
@@ -14,6 +15,8 @@ from architect.state import State as ArchitectState
 from code_reviewer.graph import CodeReviewerGraph
 from code_reviewer.state import State as CodeReviewerState
 from coder.state import State as CoderState
+from common.components.sub_agents import ainvoke_sub_agent
+from common.components.telemetry import get_telemetry
 from orchestrator.configuration import Configuration
 from orchestrator.state import State
 from requirement_gatherer.graph import RequirementsGraph
@@ -23,6 +26,12 @@ from task_manager.state import State as TaskManagerState
 from tester.state import State as TesterState
 
 
+def _telemetry_metadata(run_id: uuid.UUID) -> dict:
+    """Return the telemetry summary of a finished sub-agent run, as message metadata."""
+    summary = get_telemetry().run_summary(run_id)
+    return {"telemetry": summary.to_dict()} if summary else {}
+
+
 def create_requirements_tool(
     agent_config: Configuration,
     requirements_graph: RequirementsGraph,
@@ -55,12 +64,19 @@ def create_requirements_tool(
         Returns:
             A Command that updates the agent's state with requirements gatherer's response.
         """
+        run_id = uuid.uuid4()
         config_with_recursion = RunnableConfig(**config)
         config_with_recursion["recursion_limit"] = recursion_limit
+        config_with_recursion["run_id"] = run_id
 
-        result = await requirements_graph.compiled_graph.ainvoke(
+        result = await ainvoke_sub_agent(
+            requirements_graph,
             RequirementsState(messages=[HumanMessage(content=content)]),
             config_with_recursion,
+            resumable=agent_config.requirements_agent.resumable,
+            name="requirements",
+            tool_call_id=tool_call_id,
+            messages=state.messages,
         )
 
         return Command(
@@ -72,6 +88,7 @@ def create_requirements_tool(
                         else result["error"],
                         tool_call_id=tool_call_id,
                         status="error" if result["error"] else "success",
+                        response_metadata=_telemetry_metadata(run_id),
                     )
                 ],
                 "project": result["project"],
@@ -102,14 +119,21 @@ def create_architect_tool(
         Returns:
             A Command that updates the agent's state with architect's response.
         """
+        run_id = uuid.uuid4()
         config_with_recursion = RunnableConfig(**config)
         config_with_recursion["recursion_limit"] = recursion_limit
+        config_with_recursion["run_id"] = run_id
 
-        result = await architect_graph.compiled_graph.ainvoke(
+        result = await ainvoke_sub_agent(
+            architect_graph,
             ArchitectState(
                 messages=[HumanMessage(content=content)], project=state.project
             ),
             config_with_recursion,
+            resumable=agent_config.architect_agent.resumable,
+            name="architect",
+            tool_call_id=tool_call_id,
+            messages=state.messages,
         )
 
         return Command(
@@ -121,6 +145,7 @@ def create_architect_tool(
                         else result["error"],
                         tool_call_id=tool_call_id,
                         status="error" if result["error"] else "success",
+                        response_metadata=_telemetry_metadata(run_id),
                     )
                 ],
             }
@@ -150,14 +175,21 @@ def create_task_manager_tool(
         Returns:
             A Command that updates the agent's state with task manager's response.
         """
+        run_id = uuid.uuid4()
         config_with_recursion = RunnableConfig(**config)
         config_with_recursion["recursion_limit"] = recursion_limit
+        config_with_recursion["run_id"] = run_id
 
-        result = await task_manager_graph.compiled_graph.ainvoke(
+        result = await ainvoke_sub_agent(
+            task_manager_graph,
             TaskManagerState(
                 messages=[HumanMessage(content=content)], project=state.project
             ),
             config_with_recursion,
+            resumable=agent_config.task_manager_agent.resumable,
+            name="task_manager",
+            tool_call_id=tool_call_id,
+            messages=state.messages,
         )
 
         return Command(
@@ -169,6 +201,7 @@ def create_task_manager_tool(
                         else result["error"],
                         tool_call_id=tool_call_id,
                         status="error" if result["error"] else "success",
+                        response_metadata=_telemetry_metadata(run_id),
                     )
                 ],
             }
@@ -197,9 +230,15 @@ def create_coder_new_pr_tool(
         Returns:
             A Command that updates the agent's state with coder's response.
         """
-        result = await coder_new_pr_graph.compiled_graph.ainvoke(
+        run_id = uuid.uuid4()
+        result = await ainvoke_sub_agent(
+            coder_new_pr_graph,
             CoderState(messages=[HumanMessage(content=content)]),
-            config,
+            {**config, "run_id": run_id},
+            resumable=agent_config.coder_new_pr_agent.resumable,
+            name="coder_new_pr",
+            tool_call_id=tool_call_id,
+            messages=state.messages,
         )
 
         return Command(
@@ -211,6 +250,7 @@ def create_coder_new_pr_tool(
                         else result["error"],
                         tool_call_id=tool_call_id,
                         status="error" if result["error"] else "success",
+                        response_metadata=_telemetry_metadata(run_id),
                     )
                 ],
             }
@@ -239,9 +279,15 @@ def create_coder_change_request_tool(
         Returns:
             A Command that updates the agent's state with coder's response.
         """
-        result = await coder_change_request_graph.compiled_graph.ainvoke(
+        run_id = uuid.uuid4()
+        result = await ainvoke_sub_agent(
+            coder_change_request_graph,
             CoderState(messages=[HumanMessage(content=content)]),
-            config,
+            {**config, "run_id": run_id},
+            resumable=agent_config.coder_change_request_agent.resumable,
+            name="coder_change_request",
+            tool_call_id=tool_call_id,
+            messages=state.messages,
         )
 
         return Command(
@@ -253,6 +299,7 @@ def create_coder_change_request_tool(
                         else result["error"],
                         tool_call_id=tool_call_id,
                         status="error" if result["error"] else "success",
+                        response_metadata=_telemetry_metadata(run_id),
                     )
                 ],
             }
@@ -281,12 +328,18 @@ def create_tester_tool(
         Returns:
             A Command that updates the agent's state with tester's response.
         """
-        result = await tester_graph.compiled_graph.ainvoke(
+        run_id = uuid.uuid4()
+        result = await ainvoke_sub_agent(
+            tester_graph,
             TesterState(
                 messages=[HumanMessage(content=content)],
                 project=state.project,
             ),
-            config,
+            {**config, "run_id": run_id},
+            resumable=agent_config.tester_agent.resumable,
+            name="tester",
+            tool_call_id=tool_call_id,
+            messages=state.messages,
         )
 
         return Command(
@@ -298,6 +351,7 @@ def create_tester_tool(
                         else result["error"],
                         tool_call_id=tool_call_id,
                         status="error" if result["error"] else "success",
+                        response_metadata=_telemetry_metadata(run_id),
                     )
                 ],
             }
@@ -326,11 +380,17 @@ def create_code_reviewer_tool(
         Returns:
             A Command that updates the agent's state with code reviewer's response.
         """
-        result = await code_reviewer_graph.compiled_graph.ainvoke(
+        run_id = uuid.uuid4()
+        result = await ainvoke_sub_agent(
+            code_reviewer_graph,
             CodeReviewerState(
                 messages=[HumanMessage(content=content)], project=state.project
             ),
-            config,
+            {**config, "run_id": run_id},
+            resumable=agent_config.reviewer_agent.resumable,
+            name="code_reviewer",
+            tool_call_id=tool_call_id,
+            messages=state.messages,
         )
 
         return Command(
@@ -342,6 +402,7 @@ def create_code_reviewer_tool(
                         else result["error"],
                         tool_call_id=tool_call_id,
                         status="error" if result["error"] else "success",
+                        response_metadata=_telemetry_metadata(run_id),
                     )
                 ],
             }
@@ -2,7 +2,6 @@
 
 from typing import Any, Callable, Coroutine, Dict, Optional
 
-from langchain.chat_models import init_chat_model
 from langchain_core.language_models import LanguageModelInput
 from langchain_core.messages import BaseMessage, SystemMessage
 from langchain_core.runnables import Runnable, RunnableConfig
@@ -13,6 +12,7 @@ from langgraph.types import Checkpointer
 
 import pr_memory_updater.prompts as prompts
 import pr_memory_updater.tools as AgentTools
+from common.chat_model import create_chat_model
 from common.components.memory import MemoryConfiguration
 from common.graph import AgentGraph
 from common.logging import get_logger
@@ -108,7 +108,7 @@ class PRMemoryUpdaterGraph(AgentGraph):
         all_tools.append(AgentTools.store_project_global_memory)
 
         # Init model
-        llm = init_chat_model(self._agent_config.model)
+        llm = create_chat_model(self._agent_config)
 
         # Bind tools to the LLM if there are any
         if all_tools:
@@ -3,7 +3,6 @@
 from datetime import datetime
 from typing import Any, Coroutine, Optional
 
-from langchain.chat_models import init_chat_model
 from langchain_core.language_models import LanguageModelInput
 from langchain_core.messages import (
     AIMessage,
@@ -18,6 +17,8 @@ from langgraph.types import Checkpointer
 
 import common.tools
 from common.chain import prechain, skip_on_summary_and_tool_errors
+from common.chat_model import create_chat_model
+from common.components.compaction import add_compaction_node
 from common.graph import AgentGraph
 from common.logging import get_logger
 from requirement_gatherer import tools
@@ -139,7 +140,7 @@ class RequirementsGraph(AgentGraph):
             common.tools.create_summarize_tool(self._name),
         ]
 
-        llm = init_chat_model(self._agent_config.model).bind_tools(all_tools)
+        llm = create_chat_model(self._agent_config).bind_tools(all_tools)
         tool_node = ToolNode(all_tools, name="tools")
         call_model = _create_call_model(self._agent_config, llm)
         gather_requirements = _create_gather_requirements(
@@ -150,13 +151,16 @@ class RequirementsGraph(AgentGraph):
         builder.add_node(call_model)
         builder.add_node(tool_node.name, tool_node)
 
-        builder.add_edge(START, call_model.__name__)
+        entry = add_compaction_node(
+            builder, self._agent_config.compaction, target=call_model.__name__
+        )
+        builder.add_edge(START, entry)
         builder.add_conditional_edges(
             call_model.__name__,
             gather_requirements,
             [tool_node.name, call_model.__name__, END],
         )
-        builder.add_edge(tool_node.name, call_model.__name__)
+        builder.add_edge(tool_node.name, entry)
 
         return builder
 
@@ -3,7 +3,6 @@
 import uuid
 from typing import Annotated, Optional
 
-from langchain.chat_models import init_chat_model
 from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import BaseTool, InjectedToolArg, InjectedToolCallId, tool
@@ -12,6 +11,8 @@ from langgraph.store.base import BaseStore
 from langgraph.types import Command, interrupt
 from termcolor import colored
 
+from common.chat_model import create_chat_model
+from common.components.model_router import SIMULATION_STEP
 from common.state import Project
 from requirement_gatherer.configuration import Configuration
 from requirement_gatherer.state import State
@@ -23,7 +24,11 @@ def create_human_feedback_tool(agent_config: Configuration) -> BaseTool:
 
     If configured to use a human, the tool prompts the user for input and returns their response. If configured to use an AI, it generates a reply using a chat model with specific instructions for concise and consistent answers. The tool returns a Command that updates the agent's state with the received feedback.
     """
-    ai_user = init_chat_model() if agent_config.use_human_ai else None
+    ai_user = (
+        create_chat_model(agent_config, step=SIMULATION_STEP)
+        if agent_config.use_human_ai
+        else None
+    )
 
     @tool("human_feedback", parse_docstring=True)
     async def human_feedback(
@@ -3,13 +3,10 @@
 from datetime import datetime
 from typing import Any, Coroutine, Optional
 
-from langchain.chat_models import init_chat_model
 from langchain_core.language_models import LanguageModelInput
-from langchain_core.messages import (
-    BaseMessage,
-    SystemMessage,
-)
+from langchain_core.messages import BaseMessage
 from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.tools import BaseTool
 from langgraph.graph import START, StateGraph
 from langgraph.prebuilt import ToolNode, tools_condition
 from langgraph.store.base import BaseStore
@@ -18,6 +15,9 @@ from langgraph.types import Checkpointer
 import common.tools
 from common import utils
 from common.chain import prechain, skip_on_summary_and_tool_errors
+from common.chat_model import create_chat_model
+from common.components.compaction import add_compaction_node
+from common.components.prompt_cache import PromptAssembler, get_context_cache
 from common.graph import AgentGraph
 from common.logging import get_logger
 from task_manager.configuration import TASK_MANAGER_MODEL, Configuration
@@ -31,6 +31,7 @@ TASK_MANAGER_RECURSION_LIMIT = 100
 def _create_call_model(
     agent_config: Configuration,
     llm_with_tools: Runnable[LanguageModelInput, BaseMessage],
+    tools: list[BaseTool],
 ) -> Coroutine[Any, Any, dict]:
     """Create an asynchronous function that retrieves recent user memories, formats them into a prompt, and invokes a language model with contextual information.
 
@@ -38,6 +39,7 @@ def _create_call_model(
 
     Args:
         llm_with_tools: A runnable language model instance capable of tool use.
+        tools: The tools bound to the language model.
 
     Returns:
         An asynchronous function that accepts the current state, configuration, and optional memory store, and returns a dictionary containing the model's response message.
@@ -89,22 +91,28 @@ def _create_call_model(
                 project_name = state.project.name
                 project_path = state.project.path
 
-        # This helps the model understand the context and temporal relevance
-        sys_prompt = agent_config.task_manager_system_prompt.format(
-            user_info=formatted,
-            time=datetime.now().isoformat(),
-            project_name=project_name,
-            project_path=project_path,
-            project_context="",
+        # The project-specific prompt is static for the whole run, while memories
+        # and the current time are volatile and go last to keep the prefix cacheable
+        prompt = PromptAssembler(
+            agent_config.task_manager_system_prompt.format(
+                project_name=project_name,
+                project_path=project_path,
+                project_context="",
+            ),
+            model=TASK_MANAGER_MODEL,
+            tools=tools,
+            cache=get_context_cache(agent_config.context_cache),
         )
 
         config_with_recursion = RunnableConfig(**config)
         config_with_recursion["recursion_limit"] = TASK_MANAGER_RECURSION_LIMIT
 
         # Invoke the language model with the prepared prompt and tools
-        msg = await llm_with_tools.ainvoke(
-            [SystemMessage(content=sys_prompt), *state.messages],
+        msg = await prompt.ainvoke(
+            llm_with_tools,
+            state.messages,
             config_with_recursion,
+            volatile=f"{formatted}\n\nSystem Time: {datetime.now().isoformat()}",
         )
 
         print(utils.format_message(msg, actor="TASK MANAGER"))  # noqa: T201
@@ -154,17 +162,22 @@ class TaskManagerGraph(AgentGraph):
             common.tools.create_summarize_tool(self._name),
         ]
 
-        llm = init_chat_model(model=TASK_MANAGER_MODEL).bind_tools(all_tools)
+        llm = create_chat_model(self._agent_config, TASK_MANAGER_MODEL).bind_tools(
+            all_tools
+        )
         tool_node = ToolNode(all_tools, name="tools")
-        call_model = _create_call_model(self._agent_config, llm)
+        call_model = _create_call_model(self._agent_config, llm, all_tools)
 
         builder = StateGraph(State, config_schema=Configuration)
         builder.add_node(call_model)
         builder.add_node(tool_node.name, tool_node)
 
-        builder.add_edge(START, call_model.__name__)
+        entry = add_compaction_node(
+            builder, self._agent_config.compaction, target=call_model.__name__
+        )
+        builder.add_edge(START, entry)
         builder.add_conditional_edges(call_model.__name__, tools_condition)
-        builder.add_edge(tool_node.name, call_model.__name__)
+        builder.add_edge(tool_node.name, entry)
 
         return builder
 
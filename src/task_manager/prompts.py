@@ -607,8 +607,4 @@ When creating tasks for CI/CD setup:
 
 *** IMPORTANT ***
 YOU MUST write a `summary` containing a brief information of the created tasks and you MUST call `summarize`.
-
-{user_info}
-
-System Time: {time}
 """
@@ -3,7 +3,6 @@
 from datetime import datetime
 from typing import Any, Coroutine, List, Optional
 
-from langchain.chat_models import init_chat_model
 from langchain_core.language_models import LanguageModelInput
 from langchain_core.messages import (
     BaseMessage,
@@ -17,6 +16,8 @@ from langgraph.store.base import BaseStore
 from langgraph.types import Checkpointer
 
 from common.chain import prechain, skip_on_summary_and_tool_errors
+from common.chat_model import create_chat_model
+from common.components.compaction import add_compaction_node
 from common.graph import AgentGraph
 from common.logging import get_logger
 from common.tools.list_files import list_files
@@ -38,7 +39,9 @@ def get_tester_github_tools():
         "create_file",
         "update_file",
         "read_file",
+        "read_files",
         "delete_file",
+        "commit_changes",
         "get_latest_pr_workflow_run",
     ]
 
@@ -199,7 +202,7 @@ class TesterAgentGraph(AgentGraph):
         call_model_name = "call_model"
         tool_node_name = "tools"
 
-        llm = init_chat_model(self._agent_config.model).bind_tools(all_tools)
+        llm = create_chat_model(self._agent_config).bind_tools(all_tools)
         tool_node = ToolNode(all_tools, name=tool_node_name)
         call_model = _create_call_model(self._agent_config, llm)
         workflow = _create_workflow(call_model_name, tool_node_name)
@@ -210,13 +213,16 @@ class TesterAgentGraph(AgentGraph):
         builder.add_node(tool_node_name, tool_node)
 
         # Define the graph flow
-        builder.add_edge(START, call_model_name)
+        entry = add_compaction_node(
+            builder, self._agent_config.compaction, target=call_model_name
+        )
+        builder.add_edge(START, entry)
         builder.add_conditional_edges(
             call_model_name,
             workflow,
             [tool_node_name, call_model_name, END],
         )
-        builder.add_edge(tool_node_name, call_model_name)
+        builder.add_edge(tool_node_name, entry)
 
         return builder
 
@@ -7,7 +7,6 @@ from datasets.coder_dataset import (
     CodeEvaluatorInputs,
     CodeEvaluatorReferenceOutputs,
 )
-from langchain.chat_models import init_chat_model
 from langchain_core.messages import HumanMessage
 from langsmith import aevaluate
 from openevals.types import EvaluatorResult
@@ -17,6 +16,7 @@ from coder.graph import CoderNewPRGraph
 from coder.state import State
 from common.components.github_mocks import MockGithubApi
 from common.components.github_tools import get_github_tools
+from common.components.llm_cache import init_recorded_chat_model
 
 EVAL_PROMPT = """You are an expert code reviewer.
 Provided a starting code, user input and a set of expectations, your job is to grade the quality of a coder agent's
@@ -62,7 +62,7 @@ class Result(TypedDict):
     comment: str
 
 
-judge_llm = init_chat_model(
+judge_llm = init_recorded_chat_model(
     "google_genai:gemini-2.0-flash", temperature=0
 ).with_structured_output(Result)
 
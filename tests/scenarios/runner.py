@@ -7,15 +7,15 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import TypedDict
 
-from langchain.chat_models import init_chat_model
 from langchain_core.messages import HumanMessage
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tracers.langchain import wait_for_all_tracers
-from langgraph.checkpoint.memory import InMemorySaver
 from langgraph.store.memory import InMemoryStore
 from langgraph.types import Command
 from termcolor import colored
 
+from common.components.checkpointer import create_checkpointer
+from common.components.llm_cache import init_recorded_chat_model
 from common.logging import get_logger
 from common.utils import github as github_utils
 from orchestrator.configuration import Configuration as OrchestratorConfiguration
@@ -91,6 +91,11 @@ class ScenarioRunner:
         try:
             result = await self._execute_scenario(orchestrator)
 
+            if stats := getattr(orchestrator.checkpointer, "stats", None):
+                logger.info(
+                    f"Checkpoints written: {stats.checkpoints}, bytes written: {stats.bytes_written}"
+                )
+
             run_info = self._extract_run_info(result)
 
             if self.config.save_run:
@@ -105,7 +110,7 @@ class ScenarioRunner:
         """Create orchestrator with standard components"""
         return OrchestratorGraph(
             agent_config=self.config.orchestrator_config,
-            checkpointer=InMemorySaver(),
+            checkpointer=create_checkpointer(),
             store=InMemoryStore(),
         )
 
@@ -196,7 +201,7 @@ class ScenarioRunner:
 
     def _parse_pr_info(self, coder_output: str) -> dict:
         """Parse PR information from coder output"""
-        llm = init_chat_model(
+        llm = init_recorded_chat_model(
             "google_genai:gemini-2.0-flash", temperature=0
         ).with_structured_output(CoderPR)
 
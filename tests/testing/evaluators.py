@@ -1,9 +1,9 @@
 from typing import Any, Callable, Union
 
-from langchain.chat_models import init_chat_model
 from openevals import create_llm_as_judge
 from openevals.types import SimpleEvaluator
 
+from common.components.llm_cache import init_recorded_chat_model
 from testing.prompts import CORRECTNESS_PROMPT
 
 
@@ -22,7 +22,7 @@ class LLMJudge:
         Returns:
             A LLMJudge object that can create evaluators.
         """
-        self.judge = init_chat_model(model=model, temperature=temperature)
+        self.judge = init_recorded_chat_model(model=model, temperature=temperature)
 
     def create_correctness_evaluator(
         self,
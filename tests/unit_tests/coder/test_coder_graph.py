@@ -0,0 +1,35 @@
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from coder.graph import _create_commit_changes
+from coder.state import State
+
+
+@pytest.mark.asyncio
+async def test_coder_commits_its_changes_when_it_finishes() -> None:
+    messages = []
+
+    @tool
+    async def commit_changes(message: str) -> str:
+        """Commit the staged changes."""
+        messages.append(message)
+        return "Unable to commit the changes due to error:\n409 Conflict"
+
+    commit = _create_commit_changes(commit_changes)
+    final = AIMessage(id="final", content="Added util\n\nAdds an add function.")
+    result = await commit(State(messages=[final]), {})
+
+    assert messages == ["Added util"]
+    # the failure is appended to the summary of the coder, which stays last
+    (message,) = result["messages"]
+    assert message.id == "final"
+    assert message.content == (
+        "Added util\n\nAdds an add function.\n\n"
+        "Unable to commit the changes due to error:\n409 Conflict"
+    )
+
+    # nor is the work of a coder stopped on tool errors
+    stopped = State(messages=[final], error="403 Forbidden")
+    assert await commit(stopped, {}) == {}
+    assert messages == ["Added util"]
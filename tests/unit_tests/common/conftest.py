@@ -0,0 +1,49 @@
+from dataclasses import fields
+from typing import Callable
+
+import pytest
+
+from common.components.github_client import AsyncGithubApi, GithubClientConfiguration
+from common.components.github_server import GithubStandInServer
+
+
+@pytest.fixture
+def server_class() -> type[GithubStandInServer]:
+    """The class of the `server`, overridden by the tests of other stand-ins."""
+    return GithubStandInServer
+
+
+@pytest.fixture
+def server_files() -> dict[str, str]:
+    """The files of the default branch of the `server`."""
+    return {"README.md": "# Project\n", "src/app.py": "print('hello')\n"}
+
+
+@pytest.fixture
+def server(server_class, server_files):
+    """A GitHub stand-in serving a repository of `server_files`."""
+    with server_class(files=server_files) as server:
+        yield server
+
+
+@pytest.fixture
+def github_api(server) -> Callable[..., AsyncGithubApi]:
+    """Return a factory of APIs of the repository of the `server`.
+
+    The factory takes the arguments of `AsyncGithubApi`, and the fields of its
+    `GithubClientConfiguration`.
+    """
+    config_fields = {field.name for field in fields(GithubClientConfiguration)}
+
+    def factory(**kwargs) -> AsyncGithubApi:
+        config = {
+            name: kwargs.pop(name) for name in list(kwargs) if name in config_fields
+        }
+        return AsyncGithubApi(
+            server.repository,
+            token=lambda: "token",
+            config=GithubClientConfiguration(base_url=server.url, **config),
+            **kwargs,
+        )
+
+    return factory
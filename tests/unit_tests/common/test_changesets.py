@@ -0,0 +1,94 @@
+import pytest
+
+from common.components.changesets import ChangesetConfiguration
+from common.components.github_client import AsyncGithubApi
+from common.components.github_server import GithubStandInServer
+
+
+@pytest.fixture
+def server(server):
+    server.branches["feature"] = dict(server.branches["main"])
+    return server
+
+
+@pytest.fixture
+def api(github_api) -> AsyncGithubApi:
+    return github_api(
+        active_branch="feature", staging=ChangesetConfiguration(staged=True)
+    )
+
+
+def _writes(server: GithubStandInServer) -> list[tuple[str, str]]:
+    return [(method, path) for method, path in server.requests if method != "GET"]
+
+
+@pytest.mark.asyncio
+async def test_writes_are_committed_at_once(server, api) -> None:
+    assert await api.create_file("src/util.py\n\ndef add(a, b):\n    return a + b") == (
+        "Created file src/util.py"
+    )
+    assert await api.update_file(
+        "src/app.py\nOLD <<<<\nhello\n>>>> OLD\nNEW <<<<\nhello world\n>>>> NEW"
+    ) == ("Updated file src/app.py")
+    assert await api.update_file(
+        "src/util.py\nOLD <<<<\na + b\n>>>> OLD\nNEW <<<<\nb + a\n>>>> NEW"
+    ) == ("Updated file src/util.py")
+    assert await api.delete_file("README.md") == "Deleted file README.md"
+
+    # the writes are read back, but not sent
+    assert await api.read_file("src/util.py") == "def add(a, b):\n    return b + a"
+    assert (await api.read_file("README.md")).startswith("File not found")
+    assert await api.get_files_from_directory("src") == str(
+        ["src/app.py", "src/util.py"]
+    )
+    assert "==> src/app.py <==\nprint('hello world')\n" in await api.read_files(["src"])
+    assert _writes(server) == []
+
+    assert await api.commit_changes("Add util") == (
+        f"Committed 3 files to branch `feature` in {server.sha('feature')[:7]}"
+    )
+    assert server.branches["feature"] == {
+        "src/app.py": "print('hello world')\n",
+        "src/util.py": "def add(a, b):\n    return b + a",
+    }
+    (commit,) = server.git_commits.values()
+    assert commit["message"] == "Add util"
+    assert [method for method, _ in _writes(server)] == ["POST", "POST", "PATCH"]
+    assert await api.commit_changes("Again") == "No staged changes to commit."
+    await api.aclose()
+
+
+@pytest.mark.asyncio
+async def test_files_changed_meanwhile_are_not_overwritten(server, api) -> None:
+    await api.update_file(
+        "src/app.py\nOLD <<<<\nhello\n>>>> OLD\nNEW <<<<\nhello world\n>>>> NEW"
+    )
+    await api.create_file("src/util.py\n\npass")
+    # pushed by someone else
+    server.branches["feature"]["src/app.py"] = "print('bye')\n"
+    server.branches["feature"]["docs.md"] = "# Docs\n"
+
+    assert await api.commit_changes("Greet the world") == (
+        "Unable to commit the changes, files were changed on branch `feature` "
+        "since they were read: src/app.py. Their staged changes were discarded: "
+        "read them again, apply the changes again, then commit."
+    )
+    assert await api.read_file("src/app.py") == "print('bye')\n"
+
+    # the other changes are committed on the new head
+    assert (await api.commit_changes("Add util")).startswith("Committed 1 files")
+    assert server.branches["feature"]["docs.md"] == "# Docs\n"
+    assert server.branches["feature"]["src/util.py"] == "pass"
+    await api.aclose()
+
+
+@pytest.mark.asyncio
+async def test_pull_request_commits_the_staged_changes(server, api) -> None:
+    await api.create_file("src/util.py\n\npass")
+
+    assert await api.create_pull_request("Add util\n\nAdds util.") == (
+        "Successfully created PR number 1"
+    )
+    assert server.branches["feature"]["src/util.py"] == "pass"
+    assert "+pass" in server.diff(1)
+    await api.aclose()
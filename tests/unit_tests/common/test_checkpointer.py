@@ -0,0 +1,221 @@
+import json
+import sqlite3
+from typing import Annotated
+
+import pytest
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.graph import END, START, StateGraph, add_messages
+from langgraph.types import Command, interrupt
+from typing_extensions import TypedDict
+
+from common.components.checkpointer import (
+    MESSAGE_REFS,
+    CheckpointRetention,
+    CheckpointRetentionConfiguration,
+    SqliteCheckpointer,
+)
+
+
+class State(TypedDict):
+    messages: Annotated[list[AnyMessage], add_messages]
+    steps: int
+
+
+def _build(checkpointer: SqliteCheckpointer, steps: int, ask: bool = False):
+    def call_tool(state: State) -> dict:
+        step = state.get("steps", 0) + 1
+        call = {"name": "read_file", "args": {"path": f"{step}.py"}, "id": f"c{step}"}
+        return {
+            "steps": step,
+            "messages": [
+                AIMessage(content="", tool_calls=[call]),
+                ToolMessage(content=f"{step}\n" * 2_000, tool_call_id=f"c{step}"),
+            ],
+        }
+
+    def ask_human(state: State) -> dict:
+        return {"messages": [HumanMessage(content=interrupt("continue?"))]}
+
+    builder = StateGraph(State)
+    builder.add_node(call_tool)
+    builder.add_node(ask_human)
+    builder.add_edge(START, "call_tool")
+    builder.add_conditional_edges(
+        "call_tool",
+        lambda state: (
+            "call_tool" if state["steps"] < steps else ("ask_human" if ask else END)
+        ),
+    )
+    builder.add_edge("ask_human", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def _refs(checkpointer: SqliteCheckpointer) -> list[dict]:
+    return [
+        json.loads(value)
+        for (value,) in checkpointer.conn.execute(
+            "SELECT value FROM blobs WHERE type = ? ORDER BY version", (MESSAGE_REFS,)
+        )
+    ]
+
+
+@pytest.mark.asyncio
+async def test_messages_are_stored_once_as_deltas(tmp_path) -> None:
+    checkpointer = SqliteCheckpointer(tmp_path / "checkpoints.db", snapshot_interval=4)
+    graph = _build(checkpointer, steps=10)
+    config = {"configurable": {"thread_id": "thread-1"}}
+
+    await graph.ainvoke({"messages": [HumanMessage(content="go")]}, config)
+
+    state = await graph.aget_state(config)
+    assert len(state.values["messages"]) == 21
+    assert state.values["messages"][-1].content.startswith("10\n")
+    history = [s async for s in graph.aget_state_history(config)]
+    assert [len(s.values.get("messages", [])) for s in history][:3] == [21, 19, 17]
+
+    assert checkpointer.stats.messages_written == 21
+    assert checkpointer.stats.bytes_saved_by_compression > 0
+    deltas = _refs(checkpointer)
+    assert len(deltas) == 11
+    # a snapshot every 4 versions, otherwise the two new messages
+    assert [d["base"] is None for d in deltas] == [True, False, False, False] * 2 + [
+        True,
+        False,
+        False,
+    ]
+    assert all(len(d["add"]) == 2 for d in deltas[1:] if d["base"])
+
+
+@pytest.mark.asyncio
+async def test_interrupted_run_resumes_from_a_new_checkpointer(tmp_path) -> None:
+    path = tmp_path / "checkpoints.db"
+    config = {"configurable": {"thread_id": "thread-1"}}
+    graph = _build(SqliteCheckpointer(path), steps=3, ask=True)
+    await graph.ainvoke({"messages": [HumanMessage(content="go")]}, config)
+    assert (await graph.aget_state(config)).next == ("ask_human",)
+
+    # a restarted process, without the cached references
+    checkpointer = SqliteCheckpointer(path)
+    graph = _build(checkpointer, steps=3, ask=True)
+    result = await graph.ainvoke(Command(resume="yes"), config)
+
+    assert len(result["messages"]) == 8
+    assert result["messages"][-1].content == "yes"
+    assert checkpointer.stats.messages_written == 1
+    assert checkpointer.stats.messages_deduplicated == 7
+
+
+def test_delete_thread(tmp_path) -> None:
+    checkpointer = SqliteCheckpointer()
+    graph = _build(checkpointer, steps=2)
+    config = {"configurable": {"thread_id": "thread-1"}}
+    graph.invoke({"messages": [HumanMessage(content="go")]}, config)
+
+    checkpointer.delete_thread("thread-1")
+
+    assert checkpointer.get_tuple(config) is None
+    assert list(checkpointer.list(None)) == []
+
+
+def test_prune_keeps_last_checkpoints_and_run_starts(tmp_path) -> None:
+    checkpointer = SqliteCheckpointer(
+        tmp_path / "checkpoints.db", snapshot_interval=100
+    )
+    graph = _build(checkpointer, steps=10)
+    config = {"configurable": {"thread_id": "thread-1"}}
+    graph.invoke({"messages": [HumanMessage(content="go")]}, config)
+    assert len(list(checkpointer.list(config))) == 12
+
+    # nothing is old enough
+    assert checkpointer.prune(keep_last=3, ttl_seconds=3600).checkpoints_deleted == 0
+
+    stats = checkpointer.prune(keep_last=3)
+
+    history = list(checkpointer.list(config))
+    assert [h.metadata["step"] for h in history] == [10, 9, 8, -1]
+    assert stats.checkpoints_deleted == 8
+    assert stats.blobs_deleted > 0
+    assert stats.bytes_reclaimed > 0
+    # the oldest kept message list was a delta on a deleted version
+    assert stats.deltas_compacted == 1
+    assert len(history[0].checkpoint["channel_values"]["messages"]) == 21
+    # a fresh checkpointer, resolving the deltas from the database
+    reader = SqliteCheckpointer(tmp_path / "checkpoints.db")
+    assert (
+        len(
+            reader.get_tuple(history[2].config).checkpoint["channel_values"]["messages"]
+        )
+        == 17
+    )
+
+
+def test_prune_deletes_unreferenced_messages() -> None:
+    checkpointer = SqliteCheckpointer()
+    graph = _build(checkpointer, steps=2)
+    for thread_id in ("thread-1", "thread-2"):
+        graph.invoke(
+            {"messages": [HumanMessage(content=thread_id)]},
+            {"configurable": {"thread_id": thread_id}},
+        )
+    checkpointer.delete_thread("thread-1")
+
+    retention = CheckpointRetention(
+        checkpointer, CheckpointRetentionConfiguration(keep_last=1, ttl_seconds=None)
+    )
+    stats = retention.collect()
+
+    # the messages of the deleted thread
+    assert stats.messages_deleted == 5
+    assert retention.stats.runs == 1
+    (count,) = checkpointer.conn.execute("SELECT COUNT(*) FROM messages").fetchone()
+    assert count == 5
+    config = {"configurable": {"thread_id": "thread-2"}}
+    assert (
+        len(checkpointer.get_tuple(config).checkpoint["channel_values"]["messages"])
+        == 5
+    )
+
+
+def test_failed_put_does_not_cache_its_messages(monkeypatch) -> None:
+    checkpointer = SqliteCheckpointer()
+    config = {"configurable": {"thread_id": "thread-1", "checkpoint_ns": ""}}
+    messages = [HumanMessage(content="hello")]
+
+    def put():
+        checkpoint = empty_checkpoint()
+        checkpoint["channel_values"] = {"messages": messages}
+        checkpoint["channel_versions"] = {"messages": "1"}
+        return checkpointer.put(config, checkpoint, {}, {"messages": "1"})
+
+    write = checkpointer._write
+
+    def failing_write(sql, params):
+        if "INTO checkpoints" in sql:
+            raise sqlite3.OperationalError("database is locked")
+        write(sql, params)
+
+    monkeypatch.setattr(checkpointer, "_write", failing_write)
+    with pytest.raises(sqlite3.OperationalError):
+        put()
+    monkeypatch.setattr(checkpointer, "_write", write)
+
+    # the messages rolled back are written again
+    put()
+    checkpoint = checkpointer.get_tuple(config).checkpoint
+    assert checkpoint["channel_values"]["messages"] == messages
+
+
+@pytest.mark.asyncio
+async def test_interrupted_run_resumes_after_pruning(tmp_path) -> None:
+    checkpointer = SqliteCheckpointer(tmp_path / "checkpoints.db")
+    graph = _build(checkpointer, steps=3, ask=True)
+    config = {"configurable": {"thread_id": "thread-1"}}
+    await graph.ainvoke({"messages": [HumanMessage(content="go")]}, config)
+
+    checkpointer.prune(keep_last=1, keep_run_starts=False)
+    assert len(list(checkpointer.list(config))) == 1
+
+    result = await graph.ainvoke(Command(resume="yes"), config)
+    assert len(result["messages"]) == 8
+    assert result["messages"][-1].content == "yes"
@@ -0,0 +1,150 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.graph import END, START, StateGraph
+
+from common.components.compaction import (
+    SUMMARY_MESSAGE_ID,
+    CompactionConfiguration,
+    acompact_messages,
+    add_compaction_node,
+    get_compaction_records,
+)
+from common.state import AgentState
+
+
+def _conversation(turns: int, tool_output_size: int = 2_000):
+    messages = [HumanMessage(content="Build me a website", id="human")]
+    for i in range(turns):
+        messages.append(
+            AIMessage(
+                content="",
+                id=f"ai-{i}",
+                tool_calls=[
+                    {"id": f"call-{i}-a", "name": "read_file", "args": {"path": "a"}},
+                    {"id": f"call-{i}-b", "name": "read_file", "args": {"path": "b"}},
+                ],
+            )
+        )
+        for suffix in ("a", "b"):
+            messages.append(
+                ToolMessage(
+                    content="x" * tool_output_size,
+                    id=f"tool-{i}-{suffix}",
+                    name="read_file",
+                    tool_call_id=f"call-{i}-{suffix}",
+                )
+            )
+    return messages
+
+
+def _apply(update):
+    # the update starts with a RemoveMessage for all messages
+    return update["messages"][1:]
+
+
+def _assert_tool_pairs_valid(messages):
+    requested = set()
+    for msg in messages:
+        if isinstance(msg, AIMessage):
+            requested.update(tc["id"] for tc in msg.tool_calls)
+        elif isinstance(msg, ToolMessage):
+            assert msg.tool_call_id in requested
+
+
+@pytest.mark.asyncio
+async def test_no_compaction_within_budget() -> None:
+    config = CompactionConfiguration(use_compaction=True, max_tokens=100_000)
+    assert await acompact_messages(_conversation(3), config) is None
+
+
+@pytest.mark.asyncio
+async def test_compaction_keeps_tool_pairs_and_records_savings() -> None:
+    config = CompactionConfiguration(
+        use_compaction=True, max_tokens=5_000, target_tokens=2_000, keep_last_messages=2
+    )
+    messages = _conversation(10)
+
+    compacted = _apply(await acompact_messages(messages, config))
+
+    assert compacted[0].id == SUMMARY_MESSAGE_ID
+    assert len(compacted) < len(messages)
+    assert compacted[-1].id == messages[-1].id
+    _assert_tool_pairs_valid(compacted[1:])
+    assert not isinstance(compacted[1], ToolMessage)
+
+    records = get_compaction_records(compacted)
+    assert len(records) == 1
+    assert records[0].tokens_saved > 0
+    assert records[0].tokens_saved == records[0].tokens_before - records[0].tokens_after
+
+    # a second compaction extends the rolling summary and its records
+    compacted = _apply(
+        await acompact_messages(compacted + _conversation(10)[1:], config)
+    )
+    records = get_compaction_records(compacted)
+    assert len(records) == 2
+    assert "Build me a website" in compacted[0].content
+
+
+@pytest.mark.asyncio
+async def test_last_message_over_the_target_is_kept() -> None:
+    config = CompactionConfiguration(
+        use_compaction=True,
+        max_tokens=1_000,
+        target_tokens=500,
+        keep_last_messages=0,
+        max_tool_output_chars=10,
+    )
+    task = "Build me a website " + "with a contact form " * 50
+    messages = [HumanMessage(content=task), *_conversation(3, 4_000)[1:]]
+
+    compacted = _apply(await acompact_messages(messages, config))
+
+    # the last tool results are kept with the AI message requesting them
+    assert [m.id for m in compacted[1:]] == ["ai-2", "tool-2-a", "tool-2-b"]
+    # the task of the user is not truncated in the digest
+    assert task in compacted[0].content
+    assert "x" * 11 not in compacted[0].content
+
+
+@pytest.mark.asyncio
+async def test_compaction_uses_summarizer() -> None:
+    config = CompactionConfiguration(
+        use_compaction=True, max_tokens=1_000, target_tokens=500, keep_last_messages=1
+    )
+
+    async def summarizer(previous_summary, messages):
+        return f"{len(messages)} messages"
+
+    compacted = _apply(await acompact_messages(_conversation(5), config, summarizer))
+    assert compacted[0].response_metadata["summary"].endswith("messages")
+
+
+@pytest.mark.asyncio
+async def test_compaction_node_in_graph() -> None:
+    config = CompactionConfiguration(
+        use_compaction=True, max_tokens=1_000, target_tokens=500, keep_last_messages=1
+    )
+
+    async def call_model(state: AgentState) -> dict:
+        return {"messages": [AIMessage(content="done")]}
+
+    builder = StateGraph(AgentState)
+    builder.add_node(call_model)
+    entry = add_compaction_node(builder, config, target=call_model.__name__)
+    builder.add_edge(START, entry)
+    builder.add_edge(call_model.__name__, END)
+
+    state = await builder.compile().ainvoke({"messages": _conversation(5)})
+
+    assert state["messages"][0].id == SUMMARY_MESSAGE_ID
+    assert state["messages"][-1].content == "done"
+    assert len(get_compaction_records(state["messages"])) == 1
+
+
+def test_compaction_disabled_routes_to_target() -> None:
+    builder = StateGraph(AgentState)
+    assert (
+        add_compaction_node(builder, CompactionConfiguration(), target="call_model")
+        == "call_model"
+    )
@@ -0,0 +1,151 @@
+import pytest
+
+from common.components.diff_index import DiffIndex, DiffIndexConfiguration
+from common.components.github_tools import get_github_tools
+
+DIFF = """diff --git a/app.py b/app.py
+index 1111111..2222222 100644
+--- a/app.py
++++ b/app.py
+@@ -1,3 +1,3 @@
+ import sys
+-print('hello')
++print('hello world')
+ sys.exit(0)
+@@ -10,2 +10,3 @@ def main():
+     pass
++    return 0
+ 
+diff --git a/old name.py b/new name.py
+similarity index 100%
+rename from old name.py
+rename to new name.py
+diff --git a/README.md b/README.md
+new file mode 100644
+--- /dev/null
++++ b/README.md
+@@ -0,0 +1 @@
++# Project
+\\ No newline at end of file
+diff --git a/logo.png b/logo.png
+Binary files a/logo.png and b/logo.png differ
+"""
+
+
+@pytest.fixture
+def server_files() -> dict[str, str]:
+    return {"app.py": "print('hello')\n"}
+
+
+def test_diff_is_indexed_by_file() -> None:
+    index = DiffIndex.parse(DIFF)
+
+    assert index.overview() == "\n".join(
+        [
+            "4 files changed, +3 -1. Read the diff of a file with `get_file_diff`.",
+            "M app.py +2 -1, 2 hunks, 1 page",
+            "R old name.py -> new name.py +0 -0, 0 hunks, 1 page",
+            "A README.md +1 -0, 1 hunks, 1 page",
+            "M logo.png (binary)",
+        ]
+    )
+    (first, second) = index.files["app.py"].hunks
+    # positions count the lines below the first hunk header, later headers included
+    assert [line.position for line in first.lines] == [1, 2, 3, 4]
+    assert second.position == 5
+    assert [(line.old_line, line.new_line) for line in second.lines] == [
+        (10, 10),
+        (None, 11),
+        (11, 12),
+    ]
+    assert index.page("app.py") == "\n".join(
+        [
+            "File `app.py` (modified, +2 -1), page 1 of 1. Lines are numbered in the base and head.",
+            "@@ -1,3 +1,3 @@",
+            "    1     1 |  import sys",
+            "    2       | -print('hello')",
+            "          2 | +print('hello world')",
+            "    3     3 |  sys.exit(0)",
+            "@@ -10,2 +10,3 @@ def main():",
+            "   10    10 |      pass",
+            "         11 | +    return 0",
+            "   11    12 |  ",
+        ]
+    )
+    assert index.position("app.py", 11) == 7
+    assert index.position("app.py", 2, "LEFT") == 2
+    with pytest.raises(ValueError, match="the lines that are: 1-3, 10-12"):
+        index.position("app.py", 4)
+    with pytest.raises(ValueError, match="the lines that are: 1-3, 10-11"):
+        index.position("app.py", 5, "LEFT")
+    assert index.page("logo.png") == "File `logo.png` is binary."
+    assert index.page("app.py", 2) == (
+        "Page 2 does not exist: the diff of `app.py` has 1 pages."
+    )
+    assert index.page("main.py").startswith("File `main.py` is not changed.")
+
+
+def test_long_hunks_are_split_across_pages() -> None:
+    added = "".join(f"+line {i}\n" for i in range(1, 8))
+    diff = f"diff --git a/a.txt b/a.txt\n--- a/a.txt\n+++ b/a.txt\n@@ -0,0 +1,7 @@\n{added}@@ -20 +27,2 @@\n-x\n+y\n+z\n"
+    index = DiffIndex.parse(diff, DiffIndexConfiguration(page_lines=4))
+
+    assert index.page_count("a.txt") == 4
+    assert index.page("a.txt", 3).splitlines()[1:] == [
+        "@@ -0,0 +1,7 @@ (continued)",
+        "          7 | +line 7",
+    ]
+    assert index.page("a.txt", 4).splitlines()[1:] == [
+        "@@ -20 +27,2 @@",
+        "   20       | -x",
+        "         27 | +y",
+        "         28 | +z",
+    ]
+
+
+def test_lines_are_split_on_newlines_only() -> None:
+    diff = "diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n@@ -1,2 +1,3 @@\n x = 1\n-y = 2\x0c\n+y = 3\x0c\n+z = 4\r\n"
+    index = DiffIndex.parse(diff)
+
+    assert index.page("a.py").split("\n")[1:] == [
+        "@@ -1,2 +1,3 @@",
+        "    1     1 |  x = 1",
+        "    2       | -y = 2\x0c",
+        "          2 | +y = 3\x0c",
+        "          3 | +z = 4",
+    ]
+    assert index.position("a.py", 3) == 4
+    assert index.position("a.py", 2, "LEFT") == 2
+
+
+@pytest.mark.asyncio
+async def test_diff_is_parsed_once_per_run(server, github_api) -> None:
+    server.branches["feature"] = {
+        "app.py": "print('hello world')\n",
+        "README.md": "# Project\n",
+    }
+    server.pulls[1] = {
+        "number": 1,
+        "title": "Greet the world",
+        "body": "",
+        "state": "open",
+        "head": {"ref": "feature"},
+        "base": {"ref": "main"},
+    }
+    api = github_api()
+    tools = {tool.name: tool for tool in get_github_tools(api)}
+    config = {"configurable": {"thread_id": "reviewer"}}
+
+    overview = await tools["list_diff_files"].ainvoke({"pr_number": 1}, config)
+    assert overview.splitlines()[1:] == [
+        "A README.md +1 -0, 1 hunks, 1 page",
+        "M app.py +1 -1, 1 hunks, 1 page",
+    ]
+    page = await tools["get_file_diff"].ainvoke(
+        {"pr_number": 1, "path": "app.py", "page": 1}, config
+    )
+    assert page.endswith("          1 | +print('hello world')")
+
+    # one fetch of the pull request, and one of its diff
+    assert server.requests.count(("GET", f"/repos/{server.repository}/pulls/1")) == 2
+    await api.aclose()
@@ -0,0 +1,172 @@
+import asyncio
+import gc
+import json
+import time
+
+import pytest
+
+from common.components.github_tools import GITHUB_TOOLS, get_github_tools
+
+
+@pytest.mark.asyncio
+async def test_tools_run_against_the_api(server, github_api) -> None:
+    server.branches["feature"] = dict(server.branches["main"])
+    tools = {tool.name: tool for tool in get_github_tools(github_api())}
+    assert set(tools) == set(GITHUB_TOOLS)
+
+    async def call(name: str, **args) -> str:
+        return await tools[name].ainvoke(args)
+
+    # the branch exists, so it is suffixed
+    assert (await call("create_a_new_branch", branch_name="feature")).startswith(
+        "Branch 'feature_v1' created"
+    )
+    assert (
+        await call(
+            "create_file",
+            formatted_file="src/util.py\n\ndef add(a, b):\n    return a + b\n",
+        )
+        == "Created file src/util.py"
+    )
+    assert (
+        await call(
+            "update_file",
+            formatted_file_update="README.md\nOLD <<<<\n# Project\n>>>> OLD\nNEW <<<<\n# Calculator\n>>>> NEW",
+        )
+        == "Updated file README.md"
+    )
+    assert await call("read_file", formatted_filepath="README.md") == "# Calculator\n"
+    assert await call("delete_file", formatted_filepath="src/app.py") == (
+        "Deleted file src/app.py"
+    )
+    assert await call("get_files_from_a_directory", input="") == str(
+        ["README.md", "src/util.py"]
+    )
+
+    assert (
+        await call(
+            "create_pull_request", formatted_pr="Add util\n\nAdds an add function."
+        )
+        == "Successfully created PR number 1"
+    )
+    pull_request = json.loads(await call("get_pull_request", pr_number=1))
+    assert pull_request["title"] == "Add util"
+    assert pull_request["body"] == "Adds an add function."
+    files = json.loads(await call("list_pull_requests_files", pr_number=1))
+    # the deleted file has no contents
+    assert [f["filename"] for f in files] == ["README.md", "src/util.py"]
+    assert await call("get_pull_request_head_branch", pr_number=1) == "feature_v1"
+    diff = await call("get_pull_request_diff", pr_number=1)
+    assert "+def add(a, b):" in diff and "-print('hello')" in diff
+
+    # comments not anchored to the diff are rejected without a request
+    assert await call(
+        "create_pull_request_review",
+        pr_number=1,
+        body="Looks good",
+        event="APPROVE",
+        comments=[{"path": "src/util.py", "line": 99, "body": "Nice"}],
+    ) == (
+        "Review not created, the comments must be anchored to lines of the diff:\n"
+        "- comment 1: line 99 of `src/util.py` is not in the diff on the RIGHT side, "
+        "the lines that are: 1-2"
+    )
+    assert 1 not in server.reviews
+    await call(
+        "create_pull_request_review",
+        pr_number=1,
+        body="Looks good",
+        event="APPROVE",
+        comments=[{"path": "src/util.py", "line": 1, "body": "Nice"}],
+    )
+    (review,) = server.reviews[1]
+    assert review["commit_id"] == server.sha("feature_v1")
+    assert review["comments"] == [
+        {"path": "src/util.py", "line": 1, "side": "RIGHT", "body": "Nice"}
+    ]
+    await call("create_issue_comment", issue_number=1, body="Thanks")
+    assert [c["body"] for c in server.comments[1]] == ["Thanks"]
+    assert await call("get_issue_body", issue_number=1) == "Adds an add function."
+
+    assert await call("get_latest_pr_workflow_run", pr_number=1) == ""
+    sha = server.sha("feature_v1")
+    server.workflow_logs[sha] = {
+        "0_test.txt": "step log\nFAILED test_add",
+        "test/1_Run tests.txt": "FAILED test_add",
+    }
+    server.workflow_jobs[sha] = [
+        {
+            "name": "test",
+            "conclusion": "failure",
+            "steps": [{"number": 1, "name": "Run tests", "conclusion": "failure"}],
+        }
+    ]
+    assert await call("get_latest_pr_workflow_run", pr_number=1) == (
+        f"Workflow run `CI` on {sha[:7]}: failure\n"
+        "\n"
+        "Job `test` failed.\n"
+        "  Step 1 `Run tests` failed:\n"
+        "    ...\n"
+        "        1 | FAILED test_add"
+    )
+
+
+@pytest.mark.asyncio
+async def test_requests_share_bounded_keep_alive_connections(
+    server, github_api
+) -> None:
+    server.latency = 0.05
+    for i in range(250):
+        server.branches[f"branch-{i}"] = dict(server.branches["main"])
+    api = github_api(max_concurrency=4)
+
+    # the branches are listed over three pages
+    message = await api.set_active_branch("branch-249")
+    assert message == "Switched to branch `branch-249`"
+
+    lags = []
+
+    async def ticker():
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - start - 0.005)
+
+    # a collection of the garbage of the previous tests would pause the loop
+    gc.collect()
+    ticking = asyncio.create_task(ticker())
+    contents = await asyncio.gather(*(api.read_file("README.md") for _ in range(20)))
+    ticking.cancel()
+
+    assert contents == ["# Project\n"] * 20
+    assert server.max_in_flight <= 4
+    # the connections are reused by the later requests
+    assert server.connections <= 4
+    # the event loop kept running while the requests were in flight
+    assert max(lags) < 0.05
+    await api.aclose()
+
+
+def test_tools_run_synchronously(github_api) -> None:
+    api = github_api()
+    tools = {tool.name: tool for tool in get_github_tools(api)}
+
+    assert tools["read_file"].invoke({"formatted_filepath": "README.md"}) == (
+        "# Project\n"
+    )
+    tools["create_a_new_branch"].invoke({"branch_name": "feature"})
+    # the clients of the event loops of the calls are closed
+    assert not api._clients
+    assert api.active_branch == "feature"
+
+
+@pytest.mark.asyncio
+async def test_tools_run_synchronously_in_a_running_event_loop(github_api) -> None:
+    api = github_api()
+    tools = {tool.name: tool for tool in get_github_tools(api)}
+
+    assert tools["read_file"].invoke({"formatted_filepath": "README.md"}) == (
+        "# Project\n"
+    )
+    assert "# Project" in tools["read_files"].invoke({"paths": ["README.md"]})
+    assert not api._clients
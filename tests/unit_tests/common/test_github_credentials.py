@@ -0,0 +1,93 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from common.components.github_credentials import (
+    GithubCredentialManager,
+    GithubCredentialsConfiguration,
+)
+
+
+class FakeIntegration:
+    """A GitHub App installed by owner, issuing tokens valid for `ttl` seconds."""
+
+    def __init__(self, ttl: float = 3600):
+        self.ttl = ttl
+        self.lookups: list[str] = []
+        self.tokens: list[int] = []
+
+    def get_repo_installation(self, owner: str, name: str):
+        self.lookups.append(f"{owner}/{name}")
+        return SimpleNamespace(id={"alice": 1, "bob": 2}[owner])
+
+    def get_access_token(self, installation_id: int):
+        # slow enough for concurrent callers to overlap
+        time.sleep(0.05)
+        self.tokens.append(installation_id)
+        return SimpleNamespace(
+            token=f"token-{installation_id}-{len(self.tokens)}",
+            expires_at=datetime.now(timezone.utc) + timedelta(seconds=self.ttl),
+        )
+
+
+def _manager(integration: FakeIntegration, **config) -> GithubCredentialManager:
+    return GithubCredentialManager(
+        "1",
+        "key",
+        config=GithubCredentialsConfiguration(**config),
+        integration=integration,
+    )
+
+
+def test_tokens_are_cached_by_installation() -> None:
+    integration = FakeIntegration()
+    manager = _manager(integration, background_refresh_seconds=0)
+
+    assert manager.token("alice/app") == "token-1-1"
+    assert manager.token("alice/app") == "token-1-1"
+    # another repository of the installation shares its token
+    assert manager.token("alice/lib") == "token-1-1"
+    assert manager.token("bob/app") == "token-2-2"
+    assert integration.lookups == ["alice/app", "alice/lib", "bob/app"]
+    assert integration.tokens == [1, 2]
+
+    # and so does the client of the installation
+    assert manager.client("alice/app") is manager.client("alice/lib")
+    assert manager.client("alice/app") is not manager.client("bob/app")
+
+    # tokens expiring within the margin are refreshed
+    manager._tokens[1].expires_at = time.time() + 60
+    assert manager.token("alice/app") == "token-1-3"
+    assert integration.tokens == [1, 2, 1]
+    manager.close()
+
+
+def test_concurrent_callers_refresh_once() -> None:
+    integration = FakeIntegration()
+    manager = _manager(integration, background_refresh_seconds=0)
+    tokens = []
+    threads = [
+        threading.Thread(target=lambda: tokens.append(manager.token("alice/app")))
+        for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert tokens == ["token-1-1"] * 10
+    assert integration.tokens == [1]
+
+
+def test_used_tokens_are_refreshed_in_the_background() -> None:
+    integration = FakeIntegration(ttl=3600)
+    # refreshed in the background 0.2s after they are fetched
+    manager = _manager(integration, background_refresh_seconds=3600 - 0.2)
+
+    assert manager.token("alice/app") == "token-1-1"
+    time.sleep(0.5)
+    # once, the refreshed token not being used since
+    assert integration.tokens == [1, 1]
+    assert manager.token("alice/app") == "token-1-2"
+    manager.close()
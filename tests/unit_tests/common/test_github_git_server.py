@@ -0,0 +1,122 @@
+import json
+
+import pytest
+
+from common.components.changesets import ChangesetConfiguration
+from common.components.github_git_server import GitGithubStandInServer
+from common.components.github_tools import GITHUB_TOOLS, get_github_tools
+
+
+@pytest.fixture
+def server_class() -> type[GitGithubStandInServer]:
+    return GitGithubStandInServer
+
+
+def _log(server: GitGithubStandInServer, branch: str) -> list[str]:
+    return server.git.git("log", "--format=%s", f"refs/heads/{branch}").splitlines()
+
+
+@pytest.mark.asyncio
+async def test_tools_commit_to_the_git_repository(server, github_api) -> None:
+    tools = {tool.name: tool for tool in get_github_tools(github_api())}
+    assert set(tools) == set(GITHUB_TOOLS)
+
+    async def call(name: str, **args) -> str:
+        return await tools[name].ainvoke(args)
+
+    await call("create_a_new_branch", branch_name="feature")
+    await call("create_file", formatted_file="src/util.py\n\ndef add(a, b):\n")
+    await call(
+        "update_file",
+        formatted_file_update="README.md\nOLD <<<<\n# Project\n>>>> OLD\nNEW <<<<\n# Calculator\n>>>> NEW",
+    )
+    await call("delete_file", formatted_filepath="src/app.py")
+    # every write is a commit on the branch, which shares the history of main
+    assert _log(server, "feature") == [
+        "Delete src/app.py",
+        "Update README.md",
+        "Update src/util.py",
+        "Set the files of main",
+    ]
+    assert await call("read_file", formatted_filepath="README.md") == "# Calculator\n"
+
+    assert await call(
+        "create_pull_request", formatted_pr="Add util\n\nAdds an add function."
+    ) == ("Successfully created PR number 1")
+    # main moving on does not show in the diff, computed from the merge base
+    server.branches["main"]["docs/index.md"] = "# Docs\n"
+    diff = await call("get_pull_request_diff", pr_number=1)
+    assert "+def add(a, b):" in diff and "-print('hello')" in diff
+    assert "docs/index.md" not in diff
+    files = json.loads(await call("list_pull_requests_files", pr_number=1))
+    # the deleted file has no contents
+    assert [f["filename"] for f in files] == ["README.md", "src/util.py"]
+    pull = server.pull_files(1)
+    assert [(f["status"], f["additions"], f["deletions"]) for f in pull] == [
+        ("modified", 1, 1),
+        ("removed", 0, 1),
+        ("added", 1, 0),
+    ]
+    status, commits, _ = server.route(
+        "GET", f"/repos/{server.repository}/pulls/1/commits", {}, None, ""
+    )
+    assert [c["commit"]["message"] for c in commits] == _log(server, "feature")[-2::-1]
+
+    assert (
+        await call(
+            "create_pull_request_review",
+            pr_number=1,
+            body="Almost",
+            event="REQUEST_CHANGES",
+            comments=[{"path": "src/util.py", "line": 1, "body": "Add a body"}],
+        )
+        == "review created successfully"
+    )
+    await call("create_issue_comment", issue_number=1, body="Thanks")
+    # the workflow runs of the head of a branch are scripted by branch
+    server.workflow_jobs["feature"] = [
+        {"id": 1, "name": "test", "conclusion": "failure", "steps": []}
+    ]
+    server.workflow_logs["feature"] = {"0_test.txt": "FAILED test_util.py\n"}
+    context = await call("get_pr_context", pr_number=1)
+    assert "PR #1: Add util (open)" in context
+    assert "Checks: failure\n- test: failure" in context
+    assert (
+        "Files:\nM README.md +1 -1\nD src/app.py +0 -1\nA src/util.py +1 -0" in context
+    )
+    assert "- bot: Thanks" in context
+    assert "changes_requested: Almost" in context
+    assert "- src/util.py:1\n  stand-in: Add a body" in context
+    assert "FAILED test_util.py" in await call(
+        "get_latest_pr_workflow_run", pr_number=1
+    )
+
+
+@pytest.mark.asyncio
+async def test_staged_changes_are_one_commit(server, github_api) -> None:
+    api = github_api(staging=ChangesetConfiguration(staged=True))
+    await api.create_branch("feature")
+    await api.create_file("src/util.py\n\ndef add(a, b):\n")
+    await api.delete_file("src/app.py")
+    assert (await api.commit_changes("Add util")).startswith(
+        "Committed 2 files to branch `feature`"
+    )
+    assert _log(server, "feature") == ["Add util", "Set the files of main"]
+    assert sorted(server.branches["feature"]) == ["README.md", "src/util.py"]
+
+    # a commit on a branch that moved is not a fast forward
+    head = server.sha("feature")
+    server.branches["feature"]["README.md"] = "# Moved\n"
+    status, payload, _ = server.route(
+        "PATCH",
+        f"/repos/{server.repository}/git/refs/heads/feature",
+        {},
+        {"sha": head, "force": False},
+        "",
+    )
+    assert status == 422
+    # unknown objects are not found
+    status, _, _ = server.route(
+        "GET", f"/repos/{server.repository}/git/commits/{'0' * 40}", {}, None, ""
+    )
+    assert status == 404
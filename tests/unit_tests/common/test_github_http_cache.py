@@ -0,0 +1,63 @@
+import pytest
+
+from common.components.github_http_cache import GithubHttpCacheConfiguration
+
+
+@pytest.fixture
+def server_files() -> dict[str, str]:
+    return {"README.md": "# Project\n"}
+
+
+@pytest.fixture
+def server(server):
+    server.branches["feature"] = dict(server.branches["main"])
+    return server
+
+
+@pytest.mark.asyncio
+async def test_unchanged_reads_are_served_from_the_cache(server, github_api) -> None:
+    api = github_api(active_branch="feature", http_cache=GithubHttpCacheConfiguration())
+
+    assert await api.read_file("README.md") == "# Project\n"
+    assert await api.read_file("README.md") == "# Project\n"
+    assert server.not_modified == 1
+
+    # a changed file is read again
+    await api.update_file(
+        "README.md\nOLD <<<<\n# Project\n>>>> OLD\nNEW <<<<\n# Calculator\n>>>> NEW"
+    )
+    assert await api.read_file("README.md") == "# Calculator\n"
+    assert server.not_modified == 2  # the read of the update
+
+    # the pages of a list are served with their link to the next page
+    for i in range(150):
+        server.branches[f"branch-{i}"] = {}
+    for _ in range(2):
+        assert await api.set_active_branch("branch-149") == (
+            "Switched to branch `branch-149`"
+        )
+    assert server.not_modified == 4
+
+    stats = api.http_cache.stats
+    assert stats.requests == 8
+    assert stats.rate_limit_saved == 4
+    assert stats.hit_ratio == 0.5
+    # reported with the metrics of the rate limit
+    assert api.rate_limits.stats.not_modified == 4
+    await api.aclose()
+
+
+@pytest.mark.asyncio
+async def test_disk_tier_is_shared_across_runs(github_api, tmp_path) -> None:
+    http_cache = GithubHttpCacheConfiguration(path=str(tmp_path / "github.db"))
+    api = github_api(active_branch="feature", http_cache=http_cache)
+    assert await api.get_files_from_directory("") == str(["README.md"])
+    await api.aclose()
+    api.http_cache.close()
+
+    api = github_api(active_branch="feature", http_cache=http_cache)
+    assert await api.get_files_from_directory("") == str(["README.md"])
+    assert api.http_cache.stats.disk_hits == 1
+    assert api.http_cache.stats.not_modified == 1
+    await api.aclose()
+    api.http_cache.close()
@@ -0,0 +1,169 @@
+import asyncio
+import random
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END, START, MessagesState, StateGraph
+from langgraph.prebuilt import ToolNode
+
+from common.components.github_mocks import MockGithubApi
+from common.components.github_tools import get_github_tools
+
+SCRIPT = [
+    ("create_a_new_branch", lambda i: {"branch_name": "feature"}),
+    ("create_file", lambda i: {"formatted_file": f"src/task_{i}.py\n\nprint({i})"}),
+    ("create_pull_request", lambda i: {"formatted_pr": f"Task {i}\n\nImplements {i}"}),
+    ("get_pull_request", lambda i: {"pr_number": 1}),
+    ("list_pull_requests_files", lambda i: {"pr_number": 1}),
+]
+
+
+def _build(mock: MockGithubApi):
+    """A coder-like graph calling the mock GitHub tools of a task, one at a time."""
+
+    async def agent(state: MessagesState) -> dict:
+        # interleave the concurrent runs
+        await asyncio.sleep(random.uniform(0, 0.01))
+        task = int(state["messages"][0].content)
+        turn = sum(isinstance(m, AIMessage) for m in state["messages"])
+        if turn == len(SCRIPT):
+            return {"messages": [AIMessage(content="done")]}
+        name, args = SCRIPT[turn]
+        call = {"name": name, "args": args(task), "id": f"{task}-{turn}"}
+        return {"messages": [AIMessage(content="", tool_calls=[call])]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node(agent)
+    builder.add_node("tools", ToolNode(get_github_tools(mock)))
+    builder.add_edge(START, "agent")
+    builder.add_conditional_edges(
+        "agent", lambda state: "tools" if state["messages"][-1].tool_calls else END
+    )
+    builder.add_edge("tools", "agent")
+    return builder.compile()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_mock_runs_are_isolated() -> None:
+    # the orchestrator needs a live model: 50 concurrent runs of a scripted
+    # coder-like graph stand in for the orchestrations
+    mock = MockGithubApi()
+    graph = _build(mock)
+
+    results = await asyncio.gather(
+        *(
+            graph.ainvoke(
+                {"messages": [HumanMessage(content=str(task))]},
+                {"configurable": {"thread_id": f"thread-{task}"}},
+            )
+            for task in range(50)
+        )
+    )
+
+    for task, result in enumerate(results):
+        outputs = [m.content for m in result["messages"] if m.type == "tool"]
+        # every run creates the same branch name, without a _v1 suffix
+        assert outputs[0].startswith("Branch 'feature' created")
+        assert f"'title': 'Task {task}'" in outputs[3]
+        assert outputs[4] == str([f"src/task_{task}.py"])
+
+        repository = mock.repository(f"thread-{task}")
+        assert repository.branches == ["main", "feature"]
+        assert len(repository.operations) == 1
+
+    # calls outside of a run use their own repository
+    assert mock.branches == ["main"]
+    assert mock.pull_request is None
+
+
+def test_sub_agents_share_the_repository_of_the_root_thread() -> None:
+    mock = MockGithubApi()
+    (create_branch,) = [
+        t for t in get_github_tools(mock) if t.name == "create_a_new_branch"
+    ]
+
+    create_branch.invoke(
+        {"branch_name": "feature"},
+        {
+            "configurable": {
+                "thread_id": "orchestrator:coder:call-1",
+                "root_thread_id": "orchestrator",
+            }
+        },
+    )
+
+    assert mock.repository("orchestrator").active_branch == "feature"
+    mock.delete_repository("orchestrator")
+    assert mock.repository("orchestrator").active_branch == "main"
+
+
+def test_least_recently_used_repositories_are_deleted() -> None:
+    mock = MockGithubApi(max_repositories=2)
+    mock.repository("thread-1").active_branch = "feature-1"
+    mock.repository("thread-2").active_branch = "feature-2"
+    mock.repository("thread-1")
+    mock.repository("thread-3")
+
+    assert mock.repository("thread-1").active_branch == "feature-1"
+    assert mock.repository("thread-2").active_branch == "main"
+
+
+def test_mock_tools_read_the_diff_of_the_pull_request() -> None:
+    mock = MockGithubApi()
+    mock.files["content"]["app.py"] = {"type": "file", "content": "x = 1\ny = 2\n"}
+    tools = {tool.name: tool for tool in get_github_tools(mock)}
+    tools["create_a_new_branch"].invoke({"branch_name": "feature"})
+    tools["update_file"].invoke(
+        {
+            "formatted_file_update": "app.py\nOLD <<<<\ny = 2\n>>>> OLD\nNEW <<<<\ny = 3\n>>>> NEW"
+        }
+    )
+    tools["create_file"].invoke({"formatted_file": "util.py\n\nz = 4\n"})
+    tools["create_pull_request"].invoke({"formatted_pr": "Change y\n\nChanges y"})
+
+    assert tools["list_diff_files"].invoke({"pr_number": 1}).splitlines()[1:] == [
+        "M app.py +1 -1, 1 hunks, 1 page",
+        "A util.py +1 -0, 1 hunks, 1 page",
+    ]
+    page = tools["get_file_diff"].invoke({"pr_number": 1, "path": "app.py", "page": 1})
+    assert page.splitlines()[-2:] == ["    2       | -y = 2", "          2 | +y = 3"]
+
+
+def test_mock_tools_review_the_pull_request() -> None:
+    mock = MockGithubApi()
+    mock.files["content"]["app.py"] = {"type": "file", "content": "x = 1\n"}
+    tools = {tool.name: tool for tool in get_github_tools(mock)}
+    tools["create_a_new_branch"].invoke({"branch_name": "feature"})
+    tools["create_file"].invoke({"formatted_file": "util.py\n\nz = 4\n"})
+    tools["create_pull_request"].invoke({"formatted_pr": "Add z\n\nAdds z"})
+
+    assert tools["get_pull_request_diff"].invoke({"pr_number": 1}) == (
+        "diff --git a/util.py b/util.py\n--- /dev/null\n+++ b/util.py\n"
+        "@@ -0,0 +1 @@\n+z = 4\n"
+    )
+    assert tools["get_issue_body"].invoke({"issue_number": 1}) == "Adds z"
+    assert tools["get_latest_pr_workflow_run"].invoke({"pr_number": 1}) == ""
+    review = {"pr_number": 1, "body": "Almost", "event": "REQUEST_CHANGES"}
+    # comments are anchored to lines of the diff
+    assert (
+        tools["create_pull_request_review"]
+        .invoke({**review, "comments": [{"path": "app.py", "line": 1, "body": "No"}]})
+        .startswith("Review not created")
+    )
+    assert (
+        tools["create_pull_request_review"].invoke(
+            {**review, "comments": [{"path": "util.py", "line": 1, "body": "Doc"}]}
+        )
+        == "review created successfully"
+    )
+    assert (
+        tools["create_issue_comment"].invoke({"issue_number": 1, "body": "Thanks"})
+        == "comment created successfully"
+    )
+
+    context = tools["get_pr_context"].invoke({"pr_number": 1})
+    assert "1 files changed, +1 -0" in context
+    assert "Files:\nA util.py +1 -0" in context
+    assert "- mock: Thanks" in context
+    assert "- mock changes_requested: Almost" in context
+    assert "- util.py:1\n  mock: Doc" in context
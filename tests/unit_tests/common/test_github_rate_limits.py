@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from common.components.github_client import GithubApiError
+from common.components.github_rate_limits import (
+    GithubRateLimitConfiguration,
+    GithubRateLimiter,
+    GithubRateLimitExceeded,
+)
+
+SECONDARY = {"message": "You have exceeded a secondary rate limit."}
+
+
+def _response(status: int = 200, **headers: str) -> httpx.Response:
+    return httpx.Response(
+        status,
+        headers={name.replace("_", "-"): value for name, value in headers.items()},
+        json=SECONDARY if status != 200 else {},
+    )
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_requests_are_retried(server, github_api) -> None:
+    server.rate_limit = 5_000
+    server.rate_limited = [
+        (403, SECONDARY, {"Retry-After": "0.2"}),
+        # without Retry-After, the backoff of secondary limits
+        (429, SECONDARY, {}),
+    ]
+    api = github_api(
+        rate_limits=GithubRateLimitConfiguration(secondary_backoff_seconds=0.1)
+    )
+
+    start = time.monotonic()
+    assert await api.read_file("README.md") == "# Project\n"
+    # 0.2s, then 0.1s doubled on the second attempt
+    assert time.monotonic() - start >= 0.4
+    assert len(server.requests) == 3
+
+    stats = api.rate_limits.stats
+    assert stats.rate_limited == stats.secondary_rate_limited == 2
+    assert stats.retries == 2
+    assert stats.limits["core"].limit == 5_000
+    assert stats.limits["core"].remaining == 5_000 - 3
+
+    # forbidden requests are not rate limited
+    server.rate_limited = [(403, {"message": "Resource not accessible"}, {})]
+    with pytest.raises(GithubApiError, match="403 Resource not accessible"):
+        await api.request("GET", f"/repos/{server.repository}")
+    assert api.rate_limits.stats.retries == 2
+
+    # nor retried past the retries
+    server.rate_limited = [(429, SECONDARY, {"Retry-After": "0"})] * 4
+    with pytest.raises(GithubApiError, match="429"):
+        await api.request("GET", f"/repos/{server.repository}")
+    assert api.rate_limits.stats.retries == 2 + 3
+
+
+@pytest.mark.asyncio
+async def test_reads_leave_the_budget_to_writes() -> None:
+    limiter = GithubRateLimiter(GithubRateLimitConfiguration(read_reserve=100))
+    reset = time.time() + 0.3
+    limiter.update(
+        _response(
+            x_ratelimit_limit="5000",
+            x_ratelimit_remaining="100",
+            x_ratelimit_reset=str(reset),
+        )
+    )
+
+    # writes use the reserve, reads wait for the reset
+    assert await limiter.acquire(write=True) == 0
+    assert await limiter.acquire() >= 0.2
+    # the read is not counted against the limit that reset
+    assert limiter.stats.limits["core"].remaining == 99
+    assert limiter.stats.waited == 1
+
+    # an exhausted limit resetting too late fails the requests
+    limiter.update(
+        _response(
+            403,
+            x_ratelimit_limit="5000",
+            x_ratelimit_remaining="0",
+            x_ratelimit_reset=str(time.time() + 3600),
+        )
+    )
+    with pytest.raises(GithubRateLimitExceeded):
+        await limiter.acquire(write=True)
+    assert limiter.stats.secondary_rate_limited == 0
+
+
+@pytest.mark.asyncio
+async def test_writes_go_first_and_are_spaced_after_a_secondary_limit() -> None:
+    limiter = GithubRateLimiter(
+        GithubRateLimitConfiguration(write_interval_seconds=0.1)
+    )
+    assert limiter.update(_response(429, retry_after="0.2")) == 0.2
+    sent = []
+
+    async def send(name: str, write: bool):
+        await limiter.acquire(write=write)
+        sent.append((name, time.monotonic()))
+
+    await asyncio.gather(
+        send("read", False), send("write 1", True), send("write 2", True)
+    )
+
+    names = [name for name, _ in sent]
+    assert names.index("write 1") < names.index("read")
+    writes = [at for name, at in sent if name.startswith("write")]
+    assert writes[1] - writes[0] >= 0.09
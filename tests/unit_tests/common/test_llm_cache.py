@@ -0,0 +1,124 @@
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, List
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+
+from common.components.llm_cache import (
+    CassetteMiss,
+    LlmCacheConfiguration,
+    ReplayChatModel,
+    init_recorded_chat_model,
+    recorded,
+)
+
+
+class FakeChatModel(BaseChatModel):
+    calls: List[dict] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[t.name for t in tools], **kwargs)
+
+    def _generate(
+        self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any
+    ):
+        self.calls.append(kwargs)
+        message = AIMessage(
+            content=f"reply {len(self.calls)}",
+            tool_calls=[{"name": "read_file", "args": {"path": "a.py"}, "id": "c1"}],
+            usage_metadata={"input_tokens": 9, "output_tokens": 2, "total_tokens": 11},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+@tool
+def read_file(path: str) -> str:
+    """Read a file."""
+    return path
+
+
+@tool
+def write_file(path: str, content: str) -> str:
+    """Write a file."""
+    return path
+
+
+def _messages(now: datetime) -> list[BaseMessage]:
+    return [
+        SystemMessage(content=f"System Time: {now.isoformat()}"),
+        HumanMessage(content=f"Start thread {uuid.uuid4()}", id=str(uuid.uuid4())),
+    ]
+
+
+def _llm(tmp_path, mode: str, **params) -> tuple[BaseChatModel, FakeChatModel]:
+    model = FakeChatModel(calls=[])
+    config = LlmCacheConfiguration(mode=mode, cassette_dir=str(tmp_path))
+    return recorded(model, "google_genai:gemini-2.0-flash", config, params), model
+
+
+@pytest.mark.asyncio
+async def test_record_then_replay_ignores_volatile_values(tmp_path) -> None:
+    llm, model = _llm(tmp_path, "record")
+    first = await llm.bind_tools([read_file]).ainvoke(_messages(datetime.now()))
+    assert len(model.calls) == 1
+    assert len(list(tmp_path.glob("google_genai_gemini-2.0-flash/*.json"))) == 1
+
+    llm, model = _llm(tmp_path, "replay")
+    later = datetime.now() + timedelta(days=3)
+    replayed = await llm.bind_tools([read_file]).ainvoke(_messages(later))
+
+    assert model.calls == []
+    assert replayed.content == first.content == "reply 1"
+    assert replayed.tool_calls == first.tool_calls
+    assert replayed.usage_metadata["total_tokens"] == 11
+
+
+@pytest.mark.asyncio
+async def test_replay_misses_on_different_tools(tmp_path) -> None:
+    llm, _ = _llm(tmp_path, "record")
+    await llm.bind_tools([read_file]).ainvoke("hello")
+
+    llm, model = _llm(tmp_path, "replay")
+    with pytest.raises(CassetteMiss, match="AI_NEXUS_LLM_CACHE=record"):
+        await llm.bind_tools([read_file, write_file]).ainvoke("hello")
+    assert model.calls == []
+
+
+def test_sync_calls_and_modes(tmp_path, monkeypatch) -> None:
+    llm, model = _llm(tmp_path, "record")
+    assert llm.invoke("hello").content == "reply 1"
+    assert llm.invoke("hello").content == "reply 1"
+    assert len(model.calls) == 1
+
+    llm, model = _llm(tmp_path, "passthrough")
+    assert llm is model
+
+    monkeypatch.setenv("AI_NEXUS_LLM_CACHE", "replay")
+    assert LlmCacheConfiguration().mode == "replay"
+
+
+@pytest.mark.asyncio
+async def test_replay_needs_no_provider_model(tmp_path, monkeypatch) -> None:
+    llm, _ = _llm(tmp_path, "record", temperature=0)
+    first = await llm.bind_tools([read_file]).ainvoke("hello")
+
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    monkeypatch.setenv("AI_NEXUS_LLM_CACHE", "replay")
+    monkeypatch.setenv("AI_NEXUS_LLM_CASSETTES", str(tmp_path))
+    llm = init_recorded_chat_model("google_genai:gemini-2.0-flash", temperature=0)
+
+    assert isinstance(llm.model, ReplayChatModel)
+    replayed = await llm.bind_tools([read_file]).ainvoke("hello")
+    assert replayed.content == first.content
+    # the parameters of the model are part of the request
+    llm = init_recorded_chat_model("google_genai:gemini-2.0-flash", temperature=1)
+    with pytest.raises(CassetteMiss):
+        await llm.bind_tools([read_file]).ainvoke("hello")
@@ -0,0 +1,138 @@
+import math
+from typing import Any, List
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+
+from common.components import model_router
+from common.components.model_router import (
+    ROUTING_STEP,
+    TOOL_REPAIR_STEP,
+    ModelRoutingConfiguration,
+    get_routing_stats,
+    routed,
+)
+
+
+class FakeChatModel(BaseChatModel):
+    reply: AIMessage
+    calls: List[dict] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[t.name for t in tools], **kwargs)
+
+    def _generate(
+        self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any
+    ):
+        self.calls.append(kwargs)
+        message = self.reply.model_copy(
+            update={
+                "usage_metadata": {
+                    "input_tokens": 1_000,
+                    "output_tokens": 100,
+                    "total_tokens": 1_100,
+                }
+            }
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+@tool
+def delegate(agent: str) -> str:
+    """Delegate to an agent."""
+    return agent
+
+
+@pytest.fixture(autouse=True)
+def routing_stats(monkeypatch):
+    monkeypatch.setattr(model_router, "_ROUTING_STATS", {})
+
+
+def _routed(small_reply: AIMessage, step: str = ROUTING_STEP):
+    large = FakeChatModel(reply=AIMessage(content="large"), calls=[])
+    small = FakeChatModel(reply=small_reply, calls=[])
+    config = ModelRoutingConfiguration(
+        use_model_routing=True, small_model="google_genai:gemini-2.0-flash-lite"
+    )
+    llm = routed(large, "google_genai:gemini-2.5-pro", small, config, step)
+    return llm, large, small
+
+
+def _tool_call(name: str) -> AIMessage:
+    return AIMessage(
+        content="", tool_calls=[{"name": name, "args": {"agent": "coder"}, "id": "1"}]
+    )
+
+
+@pytest.mark.asyncio
+async def test_small_model_reply_is_accepted() -> None:
+    llm, large, small = _routed(_tool_call("delegate"))
+
+    reply = await llm.bind_tools([delegate]).ainvoke("next step?")
+
+    assert reply.tool_calls[0]["name"] == "delegate"
+    assert reply.response_metadata["model_name"] == "gemini-2.0-flash-lite"
+    assert small.calls == [{"tools": ["delegate"]}]
+    assert large.calls == []
+
+    stats = get_routing_stats()[ROUTING_STEP]
+    assert (stats.calls, stats.small_calls, stats.accepted) == (1, 1, 1)
+    # 1000 input and 100 output tokens, at 1.25/10.00 vs 0.075/0.30 per million
+    assert stats.small_cost == pytest.approx(0.000105)
+    assert stats.saved_cost == pytest.approx(0.00225 - 0.000105)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("small_reply", "reason"),
+    [
+        (_tool_call("drop_database"), "unknown_tool"),
+        (AIMessage(content="  "), "empty"),
+        (
+            AIMessage(
+                content="coder", response_metadata={"finish_reason": "MAX_TOKENS"}
+            ),
+            "truncated",
+        ),
+        (
+            AIMessage(
+                content="coder", response_metadata={"avg_logprobs": math.log(0.2)}
+            ),
+            "low_confidence",
+        ),
+    ],
+)
+async def test_rejected_replies_escalate(small_reply: AIMessage, reason: str) -> None:
+    llm, large, small = _routed(small_reply)
+
+    reply = await llm.bind_tools([delegate]).ainvoke("next step?")
+
+    assert reply.content == "large"
+    assert len(small.calls) == len(large.calls) == 1
+    stats = get_routing_stats()[ROUTING_STEP]
+    assert stats.escalations == {reason: 1}
+    assert stats.accepted == 0
+    assert stats.saved_cost < 0
+
+
+@pytest.mark.asyncio
+async def test_only_configured_and_detected_steps_are_routed() -> None:
+    llm, large, small = _routed(AIMessage(content="fixed"), step="coding")
+
+    assert (await llm.ainvoke("write the code")).content == "large"
+    assert small.calls == []
+
+    failed = ToolMessage(content="bad args", tool_call_id="1", status="error")
+    reply = await llm.ainvoke([HumanMessage(content="write the code"), failed])
+    assert reply.content == "fixed"
+
+    stats = get_routing_stats()
+    assert (stats["coding"].calls, stats["coding"].large_calls) == (1, 1)
+    assert stats[TOOL_REPAIR_STEP].accepted == 1
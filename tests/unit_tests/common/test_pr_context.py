@@ -0,0 +1,111 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from common.components.github_tools import get_github_tools
+from common.components.pr_context import (
+    PrContextConfiguration,
+    next_page_variables,
+    pr_context_variables,
+)
+
+RECORDED = Path(__file__).parents[2] / "fixtures" / "github_graphql" / "pr_context.json"
+
+
+@pytest.fixture
+def server(server):
+    server.graphql_responses = [
+        (recorded["variables"], recorded["response"])
+        for recorded in json.loads(RECORDED.read_text())
+    ]
+    return server
+
+
+@pytest.fixture
+def get_pr_context(github_api):
+    def factory(**config):
+        api = github_api(pr_context=PrContextConfiguration(**config))
+        (tool,) = [t for t in get_github_tools(api) if t.name == "get_pr_context"]
+        return tool
+
+    return factory
+
+
+def test_sections_are_selected_and_paginated() -> None:
+    variables = pr_context_variables("owner/repository", 7, ["files", "checks"])
+    assert variables == {
+        "owner": "owner",
+        "name": "repository",
+        "number": 7,
+        "withComments": False,
+        "withReviews": False,
+        "withFiles": True,
+        "withChecks": True,
+    }
+    pull = {
+        "files": {"pageInfo": {"hasNextPage": True, "endCursor": "Mg"}, "nodes": []}
+    }
+    # only the sections having more pages are fetched again
+    assert next_page_variables(variables, pull) == {
+        **variables,
+        "withFiles": True,
+        "withChecks": False,
+        "filesCursor": "Mg",
+    }
+    pull["files"]["pageInfo"]["hasNextPage"] = False
+    assert next_page_variables(variables, pull) is None
+
+
+@pytest.mark.asyncio
+async def test_context_is_fetched_in_one_query_per_page(server, get_pr_context) -> None:
+    result = await get_pr_context().ainvoke({"pr_number": 7})
+
+    # the first page, then the next page of the comments
+    assert server.requests == [("POST", "/graphql")] * 2
+    assert result == "\n".join(
+        [
+            "PR #7: Add retries to the client (open) by alice",
+            "Head `retries` (3f2a1b9) into base `main`, 2 files changed, +42 -3",
+            "https://github.com/owner/repository/pull/7",
+            "",
+            "Description:",
+            "Retries the requests failing with a 5xx.\r\n\r\nCloses #5",
+            "",
+            "Checks: failure",
+            "- test: failure",
+            "- lint: in_progress",
+            "- ci/docs: success",
+            "",
+            "Files:",
+            "M src/client.py +30 -3",
+            "A tests/test_retries.py +12 -0",
+            "",
+            "Comments (3):",
+            "- bob: Should this retry on 429 too?",
+            "- alice: Good point, adding it.",
+            "- carol: LGTM once the delay is capped.",
+            "",
+            "Reviews:",
+            "- bob changes_requested: The backoff is not bounded.",
+            "- ghost commented",
+            "",
+            "Unresolved review threads (1):",
+            "- src/client.py:18",
+            "  bob: Cap the delay.",
+            "  alice: Will do.",
+        ]
+    )
+
+
+@pytest.mark.asyncio
+async def test_pages_and_errors_are_bounded(server, get_pr_context) -> None:
+    tool = get_pr_context(max_pages=1, max_comment_chars=10)
+    result = await tool.ainvoke({"pr_number": 7})
+    assert server.requests == [("POST", "/graphql")]
+    assert "- bob: Should thi… (truncated)" in result
+    assert "- ... 1 more comments not shown" in result
+
+    # the errors of the query are returned to the agent
+    result = await tool.ainvoke({"pr_number": 8, "sections": ["files"]})
+    assert result == "Error: status code 200, No recorded response"
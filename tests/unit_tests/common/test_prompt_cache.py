@@ -0,0 +1,156 @@
+from typing import Any, List
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+
+from common.components import model_router
+from common.components.model_router import ModelRoutingConfiguration, routed
+from common.components.prompt_cache import (
+    ContextCache,
+    ContextCacheConfiguration,
+    LocalContextCacheProvider,
+    PromptAssembler,
+)
+
+STATIC_PROMPT = "You are a project manager. " * 2_000
+
+
+class RecordingChatModel(BaseChatModel):
+    calls: List[dict] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[t.name for t in tools], **kwargs)
+
+    def _generate(
+        self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any
+    ):
+        self.calls.append({"messages": messages, "kwargs": kwargs})
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="ok"))])
+
+
+@tool
+def read_file(path: str) -> str:
+    """Read a file."""
+    return path
+
+
+@pytest.mark.asyncio
+async def test_static_prompt_first_and_volatile_last() -> None:
+    llm = RecordingChatModel(calls=[])
+    prompt = PromptAssembler(STATIC_PROMPT, model="google_genai:gemini")
+    history = [HumanMessage(content="hello")]
+
+    await prompt.ainvoke(llm, history, volatile="System Time: 1")
+    await prompt.ainvoke(llm, history, volatile="System Time: 2")
+
+    first, second = (call["messages"] for call in llm.calls)
+    assert first[0] == second[0] == SystemMessage(content=STATIC_PROMPT)
+    assert first[1].content == "System Time: 1"
+    assert second[1].content == "System Time: 2"
+    assert first[2:] == history
+    assert "cached_content" not in llm.calls[0]["kwargs"]
+
+
+@pytest.mark.asyncio
+async def test_cached_content_is_created_once_and_reused() -> None:
+    provider = LocalContextCacheProvider()
+    cache = ContextCache(provider, ContextCacheConfiguration(use_context_cache=True))
+    llm = RecordingChatModel(calls=[])
+    prompt = PromptAssembler(
+        STATIC_PROMPT, model="google_genai:gemini", tools=[read_file], cache=cache
+    )
+
+    for i in range(3):
+        await prompt.ainvoke(
+            llm.bind_tools([read_file]),
+            [HumanMessage(content="hello")],
+            volatile=f"System Time: {i}",
+        )
+
+    assert cache.stats.misses == 1
+    assert cache.stats.hits == 2
+    assert len(provider.contents) == 1
+
+    (content,) = provider.contents.values()
+    assert content["model"] == "gemini"
+    assert content["system_instruction"] == STATIC_PROMPT
+
+    handles = {call["kwargs"]["cached_content"] for call in llm.calls}
+    assert handles == set(provider.contents)
+    for call in llm.calls:
+        # the static prompt and the tools live in the cached content
+        assert "tools" not in call["kwargs"]
+        assert not any(isinstance(m, SystemMessage) for m in call["messages"])
+        assert "System Time" in call["messages"][0].content
+
+
+@pytest.mark.asyncio
+async def test_cached_content_is_sent_to_the_large_model_of_routed_calls(
+    monkeypatch,
+) -> None:
+    monkeypatch.setattr(model_router, "_ROUTING_STATS", {})
+    cache = ContextCache(
+        LocalContextCacheProvider(),
+        ContextCacheConfiguration(use_context_cache=True),
+    )
+    large, small = RecordingChatModel(calls=[]), RecordingChatModel(calls=[])
+    config = ModelRoutingConfiguration(
+        use_model_routing=True, small_model="google_genai:gemini-flash"
+    )
+    llm = routed(large, "google_genai:gemini", small, config, step="routing")
+    prompt = PromptAssembler(
+        STATIC_PROMPT, model="google_genai:gemini", tools=[read_file], cache=cache
+    )
+
+    for _ in range(2):
+        reply = await prompt.ainvoke(
+            llm.bind_tools([read_file]),
+            [HumanMessage(content="hello")],
+            volatile="System Time: 1",
+        )
+        assert reply.content == "ok"
+
+    # the small model replies to both calls, prompted inline with its tools
+    assert cache.stats.hits == 1
+    assert large.calls == []
+    for call in small.calls:
+        assert call["kwargs"] == {"tools": ["read_file"]}
+        assert call["messages"][0] == SystemMessage(content=STATIC_PROMPT)
+    assert model_router.get_routing_stats()["routing"].accepted == 2
+
+
+@pytest.mark.asyncio
+async def test_small_prompts_are_sent_inline() -> None:
+    provider = LocalContextCacheProvider()
+    cache = ContextCache(provider, ContextCacheConfiguration(use_context_cache=True))
+    prompt = PromptAssembler("Be brief.", model="gemini", cache=cache)
+
+    assembled = await prompt.aassemble([HumanMessage(content="hello")], "time")
+
+    assert assembled.cached_content is None
+    assert assembled.messages[0].content == "Be brief."
+    assert cache.stats.skipped == 1
+    assert not provider.contents
+
+
+@pytest.mark.asyncio
+async def test_provider_errors_fall_back_to_inline_prompt() -> None:
+    class FailingProvider(LocalContextCacheProvider):
+        async def acreate(self, **kwargs):
+            raise RuntimeError("quota exceeded")
+
+    cache = ContextCache(FailingProvider())
+    prompt = PromptAssembler(STATIC_PROMPT, model="gemini", cache=cache)
+
+    assembled = await prompt.aassemble([HumanMessage(content="hello")])
+
+    assert assembled.cached_content is None
+    assert assembled.messages[0].content == STATIC_PROMPT
+    assert cache.stats.errors == 1
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from common.components.github_server import GithubStandInServer
+from common.components.github_tools import get_github_tools
+
+
+@pytest.fixture
+def server_files() -> dict[str, str]:
+    return {"app.py": "print('hello')\n"}
+
+
+@pytest.fixture
+def server(server):
+    server.branches["feature"] = {"app.py": "print('hello world')\n"}
+    server.pulls[1] = {
+        "number": 1,
+        "title": "Greet the world",
+        "body": "",
+        "state": "open",
+        "head": {"ref": "feature"},
+        "base": {"ref": "main"},
+    }
+    return server
+
+
+def _pull_fetches(server: GithubStandInServer) -> int:
+    return server.requests.count(("GET", f"/repos/{server.repository}/pulls/1"))
+
+
+@pytest.mark.asyncio
+async def test_review_cycle_fetches_the_pull_request_once(server, github_api) -> None:
+    api = github_api()
+    tools = {tool.name: tool for tool in get_github_tools(api)}
+    config = {"configurable": {"thread_id": "reviewer"}}
+
+    async def review_cycle(config: dict):
+        await asyncio.gather(
+            tools["get_pull_request_diff"].ainvoke({"pr_number": 1}, config),
+            tools["get_pull_request_head_branch"].ainvoke({"pr_number": 1}, config),
+            tools["list_pull_requests_files"].ainvoke({"pr_number": 1}, config),
+        )
+        await tools["get_latest_pr_workflow_run"].ainvoke({"pr_number": 1}, config)
+        await tools["get_pull_request_diff"].ainvoke({"pr_number": 1}, config)
+        await tools["create_pull_request_review"].ainvoke(
+            {"pr_number": 1, "body": "LGTM", "event": "APPROVE", "comments": []},
+            config,
+        )
+
+    await review_cycle(config)
+    # one fetch of the pull request, and one of its diff
+    assert _pull_fetches(server) == 2
+    assert (
+        server.requests.count(("GET", f"/repos/{server.repository}/pulls/1/files")) == 1
+    )
+
+    # a new commit on the head branch invalidates the cache
+    await tools["set_active_branch"].ainvoke({"branch_name": "feature"}, config)
+    await tools["create_file"].ainvoke(
+        {"formatted_file": "README.md\n\n# Hello"}, config
+    )
+    diff = await tools["get_pull_request_diff"].ainvoke({"pr_number": 1}, config)
+    assert "+# Hello" in diff
+    assert _pull_fetches(server) == 4
+
+    # sub-agents of the run share its cache, other runs have their own
+    sub_agent_config = {
+        "configurable": {"thread_id": "reviewer:coder:1", "root_thread_id": "reviewer"}
+    }
+    await tools["get_pull_request_head_branch"].ainvoke(
+        {"pr_number": 1}, sub_agent_config
+    )
+    assert _pull_fetches(server) == 4
+    await review_cycle({"configurable": {"thread_id": "other"}})
+    assert _pull_fetches(server) == 6
+    assert api.pull_requests.stats.invalidations == 1
+
+    await api.aclose()
+
+
+@pytest.mark.asyncio
+async def test_moved_head_is_noticed_after_the_ttl(server, github_api) -> None:
+    api = github_api()
+    api.pull_requests.config.ttl_seconds = 0
+    (diff,) = [t for t in get_github_tools(api) if t.name == "get_pull_request_diff"]
+    config = {"configurable": {"thread_id": "reviewer"}}
+
+    assert "+print('hello world')" in await diff.ainvoke({"pr_number": 1}, config)
+    # pushed by someone else
+    server.branches["feature"]["app.py"] = "print('bye')\n"
+    assert "+print('bye')" in await diff.ainvoke({"pr_number": 1}, config)
+    assert api.pull_requests.stats.invalidations == 1
+
+    await api.aclose()
@@ -0,0 +1,141 @@
+import asyncio
+from typing import Any, List
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+
+from common.components.rate_limiter import (
+    RateLimitedChatModel,
+    RateLimiter,
+    RateLimiterQueueFull,
+)
+
+
+class FakeChatModel(BaseChatModel):
+    error: str = ""
+    calls: List[dict] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[t.name for t in tools], **kwargs)
+
+    def _generate(
+        self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any
+    ):
+        self.calls.append(kwargs)
+        if self.error:
+            raise RuntimeError(self.error)
+        message = AIMessage(
+            content="ok",
+            usage_metadata={
+                "input_tokens": 90,
+                "output_tokens": 20,
+                "total_tokens": 110,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+@tool
+def read_file(path: str) -> str:
+    """Read a file."""
+    return path
+
+
+@pytest.mark.asyncio
+async def test_interactive_first_then_round_robin_across_threads() -> None:
+    # one request every 10ms, no burst
+    limiter = RateLimiter(
+        requests_per_minute=6_000, tokens_per_minute=1e9, burst_seconds=0.01
+    )
+    granted = []
+
+    async def call(name: str, thread_id: str, priority: str = "batch"):
+        await limiter.acquire(tokens=1, thread_id=thread_id, priority=priority)
+        granted.append(name)
+
+    tasks = []
+    for name, thread_id, priority in [
+        ("a1", "a", "batch"),
+        ("a2", "a", "batch"),
+        ("a3", "a", "batch"),
+        ("b1", "b", "batch"),
+        ("c1", "c", "interactive"),
+    ]:
+        tasks.append(asyncio.create_task(call(name, thread_id, priority)))
+        await asyncio.sleep(0)
+
+    assert limiter.stats.queue_depth == 4
+    assert limiter.stats.queue_depth_by_priority == {"interactive": 1, "batch": 3}
+
+    await asyncio.gather(*tasks)
+
+    assert granted == ["a1", "c1", "a2", "b1", "a3"]
+    stats = limiter.stats
+    assert (stats.acquired, stats.queued, stats.queue_depth) == (5, 4, 0)
+    assert stats.max_queue_depth == 4
+    assert stats.total_wait_seconds > 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_calls() -> None:
+    limiter = RateLimiter(
+        requests_per_minute=60,
+        tokens_per_minute=1e9,
+        burst_seconds=1,
+        max_queue_depth=1,
+    )
+    await limiter.acquire(tokens=1)
+    waiting = asyncio.create_task(limiter.acquire(tokens=1))
+    await asyncio.sleep(0)
+
+    with pytest.raises(RateLimiterQueueFull):
+        await limiter.acquire(tokens=1)
+    assert limiter.stats.rejected == 1
+
+    waiting.cancel()
+    await asyncio.sleep(0)
+    assert limiter.stats.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_chat_model_settles_usage_and_passes_tools() -> None:
+    # a large bucket refilled slowly
+    limiter = RateLimiter(
+        requests_per_minute=60, tokens_per_minute=1_000, burst_seconds=6_000
+    )
+    model = FakeChatModel(calls=[])
+    llm = RateLimitedChatModel(
+        model=model, limiter=limiter, estimated_output_tokens=5_000
+    )
+
+    reply = await llm.bind_tools([read_file]).ainvoke(
+        "hello", {"configurable": {"thread_id": "thread-1"}}
+    )
+
+    assert reply.content == "ok"
+    assert model.calls == [{"tools": ["read_file"]}]
+    # the reservation is settled with the reported usage, not the estimate
+    assert 100_000 - 110 <= limiter._tokens.tokens < 100_000 - 100
+
+
+@pytest.mark.asyncio
+async def test_provider_rate_limit_errors_pause_the_limiter() -> None:
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=100_000)
+    llm = RateLimitedChatModel(
+        model=FakeChatModel(error="429 Resource has been exhausted"),
+        limiter=limiter,
+        cooldown_seconds=5,
+    )
+
+    with pytest.raises(RuntimeError):
+        await llm.ainvoke("hello")
+
+    assert limiter.stats.throttled == 1
+    assert limiter._wait_time(1) == pytest.approx(6, abs=0.1)
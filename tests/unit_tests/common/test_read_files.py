@@ -0,0 +1,73 @@
+import pytest
+
+from common.components.github_mocks import MockGithubApi
+from common.components.github_tools import get_github_tools
+from common.components.read_files import ReadFilesConfiguration, match_paths
+
+PATHS = ["README.md", "src/app.py", "src/lib/util.py", "tests/test_app.py"]
+
+
+def test_patterns_are_matched_against_the_tree() -> None:
+    assert match_paths(["src/*.py"], PATHS) == (["src/app.py"], [])
+    assert match_paths(["**/*.py"], PATHS) == (
+        ["src/app.py", "src/lib/util.py", "tests/test_app.py"],
+        [],
+    )
+    # directories match the files below them, in the order of the patterns
+    assert match_paths(["tests", "src/", "src/app.py", "docs"], PATHS) == (
+        ["tests/test_app.py", "src/app.py", "src/lib/util.py"],
+        ["docs"],
+    )
+    assert match_paths(["src/[!a]*/*.py", "?EADME.md"], PATHS) == (
+        ["src/lib/util.py", "README.md"],
+        [],
+    )
+
+
+@pytest.fixture
+def server_files() -> dict[str, str]:
+    return {**{path: f"# {path}\n" for path in PATHS}, "big.txt": "x" * 50}
+
+
+@pytest.mark.asyncio
+async def test_files_are_read_in_one_call(server, github_api) -> None:
+    api = github_api(batch_reads=ReadFilesConfiguration(max_files=3, max_file_chars=20))
+    (read_files,) = [t for t in get_github_tools(api) if t.name == "read_files"]
+
+    result = await read_files.ainvoke({"paths": ["big.txt", "src", "*.cfg"]})
+    assert result == "\n".join(
+        [
+            "==> big.txt (truncated, 20 of 50 characters) <==",
+            "x" * 20,
+            "==> src/app.py <==",
+            "# src/app.py\n",
+            "==> src/lib/util.py <==",
+            "# src/lib/util.py\n",
+            "No files found: *.cfg",
+        ]
+    )
+    assert (
+        server.requests.count(("GET", f"/repos/{server.repository}/git/trees/main"))
+        == 1
+    )
+
+    # the tree is revalidated, and the files past the limit listed
+    result = await read_files.ainvoke({"paths": ["**/*.py", "big.txt"]})
+    assert result.endswith(
+        "Not read, past the limits of 3 files and 100000 characters: " "big.txt"
+    )
+    assert server.not_modified >= 1
+    await api.aclose()
+
+
+def test_mock_reads_files() -> None:
+    mock = MockGithubApi()
+    mock.repository().files["content"]["src"] = {
+        "type": "dir",
+        "content": {"app.py": {"type": "file", "content": "print(1)"}},
+    }
+    tools = {tool.name: tool for tool in get_github_tools(mock)}
+
+    assert tools["read_files"].invoke({"paths": ["src/**"]}) == (
+        "==> src/app.py <==\nprint(1)"
+    )
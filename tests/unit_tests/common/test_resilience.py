@@ -0,0 +1,154 @@
+import asyncio
+import time
+from typing import Any, List
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from common.components.resilience import (
+    LatencyTracker,
+    ModelCallConfiguration,
+    ModelCallDeadlineExceeded,
+    ResilientChatModel,
+    is_transient_error,
+)
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Replies after the scripted delays, or raises the scripted errors, call after call."""
+
+    script: List[Any]
+    calls: int = 0
+    cancelled: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _generate(
+        self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs
+    ):
+        raise NotImplementedError
+
+    async def _agenerate(
+        self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs
+    ):
+        step = self.script[min(self.calls, len(self.script) - 1)]
+        self.calls += 1
+        if isinstance(step, Exception):
+            raise step
+        try:
+            await asyncio.sleep(step)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        message = AIMessage(content=f"reply after {step}s")
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def _policy(**kwargs) -> ModelCallConfiguration:
+    return ModelCallConfiguration(
+        use_model_call_policy=True, backoff_initial_seconds=0.01, **kwargs
+    )
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_wins_and_loser_is_cancelled() -> None:
+    tracker = LatencyTracker()
+    for _ in range(20):
+        tracker.record("scripted", 0.05)
+    model = ScriptedChatModel(script=[2.0, 0.01])
+    llm = ResilientChatModel(
+        model=model,
+        tracker=tracker,
+        policy=_policy(use_hedging=True, hedge_min_delay_seconds=0.05),
+    )
+
+    start = time.monotonic()
+    reply = await llm.ainvoke("hello")
+
+    assert reply.content == "reply after 0.01s"
+    assert time.monotonic() - start < 1
+    assert model.calls == 2
+    assert model.cancelled == 1
+
+
+@pytest.mark.asyncio
+async def test_no_hedging_before_enough_samples() -> None:
+    model = ScriptedChatModel(script=[0.1, 0.01])
+    llm = ResilientChatModel(
+        model=model,
+        tracker=LatencyTracker(),
+        policy=_policy(use_hedging=True, hedge_min_delay_seconds=0.01),
+    )
+
+    assert (await llm.ainvoke("hello")).content == "reply after 0.1s"
+    assert model.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_retried() -> None:
+    model = ScriptedChatModel(script=[RuntimeError("503 Service Unavailable"), 0])
+    tracker = LatencyTracker()
+    llm = ResilientChatModel(model=model, tracker=tracker, policy=_policy())
+
+    assert (await llm.ainvoke("hello")).content == "reply after 0s"
+    assert model.calls == 2
+    assert tracker.count("scripted") == 1
+
+
+@pytest.mark.asyncio
+async def test_other_errors_are_raised() -> None:
+    model = ScriptedChatModel(script=[ValueError("invalid argument")])
+    llm = ResilientChatModel(model=model, tracker=LatencyTracker(), policy=_policy())
+
+    with pytest.raises(ValueError):
+        await llm.ainvoke("hello")
+    assert model.calls == 1
+
+
+def test_errors_are_transient_by_their_status() -> None:
+    class ApiError(Exception):
+        def __init__(self, message: str, code: int):
+            super().__init__(message)
+            self.code = code
+
+    assert is_transient_error(ApiError("Resource has been exhausted", 429))
+    assert not is_transient_error(ApiError("Invalid request id 5030", 400))
+    # without a status, the code has to stand as a word of the message
+    assert is_transient_error(RuntimeError("Error calling model (503 UNAVAILABLE)"))
+    assert not is_transient_error(ValueError("max 1500 tokens"))
+    assert not is_transient_error(ValueError("request id 45039 failed"))
+
+
+@pytest.mark.asyncio
+async def test_timed_out_attempts_are_retried_until_the_deadline() -> None:
+    model = ScriptedChatModel(script=[1.0])
+    llm = ResilientChatModel(
+        model=model,
+        tracker=LatencyTracker(),
+        policy=_policy(timeout_seconds=0.05, max_retries=10),
+    )
+
+    start = time.monotonic()
+    with pytest.raises(ModelCallDeadlineExceeded):
+        await llm.ainvoke("hello", deadline_seconds=0.3)
+
+    assert time.monotonic() - start < 0.5
+    assert model.calls > 1
+    assert model.cancelled == model.calls
+
+
+def test_latency_percentiles() -> None:
+    tracker = LatencyTracker(window=100)
+    for latency in range(1, 201):
+        tracker.record("gemini", latency)
+
+    percentiles = tracker.percentiles()["gemini"]
+    assert percentiles["count"] == 100
+    assert percentiles["p50"] == 150
+    assert percentiles["p95"] == 195
+    assert percentiles["p99"] == 199
+    assert tracker.percentile("unknown", 50) is None
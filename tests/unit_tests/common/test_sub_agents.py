@@ -0,0 +1,228 @@
+import asyncio
+from typing import Annotated
+
+import pytest
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, ToolMessage
+from langgraph.constants import CONFIG_KEY_CHECKPOINTER
+from langgraph.graph import END, START, StateGraph, add_messages
+from typing_extensions import TypedDict
+
+from common.components.checkpointer import SqliteCheckpointer
+from common.components.sub_agents import (
+    ainvoke_sub_agent,
+    failed_tool_call_id,
+    failed_tool_call_ids,
+)
+from common.graph import AgentGraph
+
+
+class State(TypedDict):
+    messages: Annotated[list[AnyMessage], add_messages]
+    turns: int
+
+
+class SubAgent(AgentGraph):
+    """Takes five turns, recording them, and hangs or fails on the given turn."""
+
+    def __init__(self, checkpointer, *, hang_on: int = 0, fail_on: int = 0):
+        super().__init__(name="SubAgent", agent_config=None, checkpointer=checkpointer)
+        self.turns_run: list[int] = []
+        self.hang_on = hang_on
+        self.fail_on = fail_on
+
+    def create_builder(self) -> StateGraph:
+        async def turn(state: State) -> dict:
+            turn = state.get("turns", 0) + 1
+            self.turns_run.append(turn)
+            if turn == self.hang_on:
+                await asyncio.sleep(60)
+            if turn == self.fail_on:
+                raise RuntimeError("GitHub API unavailable")
+            return {"turns": turn, "messages": [AIMessage(content=f"turn {turn}")]}
+
+        builder = StateGraph(State)
+        builder.add_node(turn)
+        builder.add_edge(START, "turn")
+        builder.add_conditional_edges(
+            "turn", lambda state: "turn" if state["turns"] < 5 else END
+        )
+        return builder
+
+
+def _call(call_id: str) -> AIMessage:
+    return AIMessage(
+        content="", tool_calls=[{"name": "coder", "args": {}, "id": call_id}]
+    )
+
+
+PARENT_CONFIG = {"configurable": {"thread_id": "orchestrator"}}
+
+
+@pytest.mark.asyncio
+async def test_killed_sub_agent_resumes_from_its_last_checkpoint(tmp_path) -> None:
+    path = tmp_path / "checkpoints.db"
+    sub_agent = SubAgent(SqliteCheckpointer(path), hang_on=3)
+    run = ainvoke_sub_agent(
+        sub_agent,
+        {"messages": [HumanMessage(content="code it")]},
+        PARENT_CONFIG,
+        resumable=True,
+        name="coder",
+        tool_call_id="call-1",
+    )
+    # the process is killed during the third turn
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(run, timeout=0.5)
+    assert sub_agent.turns_run == [1, 2, 3]
+
+    # the parent is resumed in a new process, running the tool call again
+    sub_agent = SubAgent(SqliteCheckpointer(path))
+    result = await ainvoke_sub_agent(
+        sub_agent,
+        {"messages": [HumanMessage(content="code it")]},
+        PARENT_CONFIG,
+        resumable=True,
+        name="coder",
+        tool_call_id="call-1",
+    )
+
+    assert sub_agent.turns_run == [3, 4, 5]
+    assert result["turns"] == 5
+    assert [m.content for m in result["messages"]][:3] == [
+        "code it",
+        "turn 1",
+        "turn 2",
+    ]
+
+    # the finished run is not run again
+    result = await ainvoke_sub_agent(
+        sub_agent,
+        {"messages": [HumanMessage(content="code it")]},
+        PARENT_CONFIG,
+        resumable=True,
+        name="coder",
+        tool_call_id="call-1",
+    )
+    assert sub_agent.turns_run == [3, 4, 5]
+    assert result["turns"] == 5
+
+
+@pytest.mark.asyncio
+async def test_retry_of_a_failed_call_resumes_the_failed_run() -> None:
+    sub_agent = SubAgent(SqliteCheckpointer(), fail_on=4)
+    messages = [HumanMessage(content="build it"), _call("call-1")]
+    with pytest.raises(RuntimeError):
+        await ainvoke_sub_agent(
+            sub_agent,
+            {"messages": [HumanMessage(content="code it")]},
+            PARENT_CONFIG,
+            resumable=True,
+            name="coder",
+            tool_call_id="call-1",
+            messages=messages,
+        )
+
+    messages += [
+        ToolMessage(content="Error", tool_call_id="call-1", status="error"),
+        _call("call-2"),
+    ]
+    assert failed_tool_call_id(messages, "coder") == "call-1"
+    sub_agent.fail_on = 0
+    result = await ainvoke_sub_agent(
+        sub_agent,
+        {"messages": [HumanMessage(content="code it, again")]},
+        PARENT_CONFIG,
+        resumable=True,
+        name="coder",
+        tool_call_id="call-2",
+        messages=messages,
+    )
+
+    assert sub_agent.turns_run == [1, 2, 3, 4, 4, 5]
+    assert result["turns"] == 5
+
+    messages += [ToolMessage(content="Done", tool_call_id="call-2"), _call("call-3")]
+    assert failed_tool_call_id(messages, "coder") is None
+
+
+@pytest.mark.asyncio
+async def test_retries_failing_again_resume_the_first_failed_run() -> None:
+    sub_agent = SubAgent(SqliteCheckpointer(), fail_on=2)
+    messages = [HumanMessage(content="build it")]
+
+    async def call(call_id: str):
+        messages.append(_call(call_id))
+        try:
+            result = await ainvoke_sub_agent(
+                sub_agent,
+                {"messages": [HumanMessage(content="code it")]},
+                PARENT_CONFIG,
+                resumable=True,
+                name="coder",
+                tool_call_id=call_id,
+                messages=messages,
+            )
+        except RuntimeError:
+            messages.append(
+                ToolMessage(content="Error", tool_call_id=call_id, status="error")
+            )
+            return None
+        messages.append(ToolMessage(content="Done", tool_call_id=call_id))
+        return result
+
+    assert await call("call-1") is None
+    # the retry resumes the run of call-1, and fails again on the same turn
+    assert await call("call-2") is None
+    assert failed_tool_call_ids(messages, "coder") == ["call-2", "call-1"]
+
+    sub_agent.fail_on = 0
+    result = await call("call-3")
+    # the third attempt resumes the run still, on the thread of call-1
+    assert sub_agent.turns_run == [1, 2, 2, 2, 3, 4, 5]
+    assert result["turns"] == 5
+    assert failed_tool_call_ids(messages, "coder") == []
+
+
+@pytest.mark.asyncio
+async def test_sub_agents_use_the_checkpointer_of_the_parent_run() -> None:
+    # as in the LangGraph server, compiling the graphs without checkpointers
+    sub_agent = SubAgent(None, fail_on=4)
+    checkpointer = SqliteCheckpointer()
+    config = {
+        "configurable": {
+            **PARENT_CONFIG["configurable"],
+            CONFIG_KEY_CHECKPOINTER: checkpointer,
+        }
+    }
+    messages = [HumanMessage(content="build it"), _call("call-1")]
+    with pytest.raises(RuntimeError):
+        await ainvoke_sub_agent(
+            sub_agent,
+            {"messages": [HumanMessage(content="code it")]},
+            config,
+            resumable=True,
+            name="coder",
+            tool_call_id="call-1",
+            messages=messages,
+        )
+
+    messages += [
+        ToolMessage(content="Error", tool_call_id="call-1", status="error"),
+        _call("call-2"),
+    ]
+    sub_agent.fail_on = 0
+    result = await ainvoke_sub_agent(
+        sub_agent,
+        {"messages": [HumanMessage(content="code it, again")]},
+        config,
+        resumable=True,
+        name="coder",
+        tool_call_id="call-2",
+        messages=messages,
+    )
+
+    assert sub_agent.turns_run == [1, 2, 3, 4, 4, 5]
+    assert result["turns"] == 5
+    # the run is on its own thread
+    thread = {"configurable": {"thread_id": "orchestrator:coder:call-1"}}
+    assert checkpointer.get_tuple(thread).checkpoint["channel_values"]["turns"] == 5
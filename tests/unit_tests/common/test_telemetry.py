@@ -0,0 +1,186 @@
+import json
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import tool
+from langgraph.graph import END, START, StateGraph
+from langgraph.prebuilt import ToolNode, tools_condition
+
+from common.components.telemetry import (
+    JsonlTelemetryExporter,
+    ModelPrice,
+    Telemetry,
+    TelemetryConfiguration,
+    get_telemetry,
+)
+from common.configuration import AgentConfiguration
+from common.graph import AgentGraph
+from common.state import AgentState
+
+
+def _reply(content: str = "", **kwargs) -> AIMessage:
+    return AIMessage(
+        content=content,
+        usage_metadata={"input_tokens": 100, "output_tokens": 10, "total_tokens": 110},
+        response_metadata={"model_name": "gemini-2.5-flash-preview-05-20"},
+        **kwargs,
+    )
+
+
+class _FakeAgentGraph(AgentGraph):
+    def __init__(self, name: str, replies: list[AIMessage], tools=()):
+        super().__init__(
+            name=name,
+            agent_config=AgentConfiguration(
+                telemetry=TelemetryConfiguration(use_telemetry=True)
+            ),
+        )
+        self._llm = GenericFakeChatModel(messages=iter(replies))
+        self._tools = list(tools)
+
+    def create_builder(self) -> StateGraph:
+        async def call_model(state: AgentState) -> dict:
+            return {"messages": [await self._llm.ainvoke(state.messages)]}
+
+        builder = StateGraph(AgentState)
+        builder.add_node(call_model)
+        builder.add_edge(START, "call_model")
+        if self._tools:
+            builder.add_node("tools", ToolNode(self._tools))
+            builder.add_conditional_edges("call_model", tools_condition)
+            builder.add_edge("tools", "call_model")
+        else:
+            builder.add_edge("call_model", END)
+        return builder
+
+
+@pytest.fixture
+def telemetry() -> Telemetry:
+    telemetry = get_telemetry()
+    telemetry.clear()
+    return telemetry
+
+
+@pytest.mark.asyncio
+async def test_calls_are_attributed_to_agents_nodes_and_threads(telemetry) -> None:
+    sub_agent = _FakeAgentGraph("SubAgent", [_reply("done")])
+
+    @tool
+    async def delegate(content: str, config: RunnableConfig) -> str:
+        """Delegate to the sub-agent."""
+        result = await sub_agent.compiled_graph.ainvoke(
+            {"messages": [HumanMessage(content=content)]}, config
+        )
+        return result["messages"][-1].content
+
+    agent = _FakeAgentGraph(
+        "MainAgent",
+        [
+            _reply(
+                tool_calls=[{"id": "1", "name": "delegate", "args": {"content": "x"}}]
+            ),
+            _reply("finished"),
+        ],
+        tools=[delegate],
+    )
+
+    await agent.compiled_graph.ainvoke(
+        {"messages": [HumanMessage(content="hello")]},
+        {"configurable": {"thread_id": "thread-1"}},
+    )
+
+    by_agent = telemetry.summary_by("agent", thread_id="thread-1")
+    assert by_agent["MainAgent"].model_calls == 2
+    assert by_agent["MainAgent"].tool_calls == 1
+    assert by_agent["SubAgent"].model_calls == 1
+    assert by_agent["SubAgent"].input_tokens == 100
+
+    (tool_event,) = telemetry.events(kind="tool")
+    assert tool_event.name == "delegate"
+    assert tool_event.node == "tools"
+
+    # the run of the main agent includes the calls of its sub-agent
+    main_run = tool_event.agent_runs[0]
+    summary = telemetry.run_summary(main_run)
+    assert summary.model_calls == 3
+    assert summary.input_tokens == 300
+    assert summary.output_tokens == 30
+    assert summary.cost == pytest.approx(3 * (100 * 0.15 + 10 * 0.60) / 1e6)
+    assert summary.to_dict()["tool_calls"] == 1
+
+
+@pytest.mark.asyncio
+async def test_retries_and_errors_are_recorded(telemetry) -> None:
+    class _FlakyModel(GenericFakeChatModel):
+        failures: int = 1
+
+        async def _agenerate(self, *args, **kwargs):
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError("503")
+            return await super()._agenerate(*args, **kwargs)
+
+    llm = _FlakyModel(messages=iter([_reply("ok")])).with_retry(
+        stop_after_attempt=2, wait_exponential_jitter=False
+    )
+    await llm.ainvoke("hello", {"callbacks": [telemetry.handler]})
+
+    failed, succeeded = telemetry.events(kind="model")
+    assert failed.error and failed.retries == 0
+    assert succeeded.error is None and succeeded.retries == 1
+    summary = telemetry.summary()
+    assert (summary.retries, summary.errors) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_parallel_calls_are_not_retries(telemetry) -> None:
+    @tool
+    async def read_file(path: str) -> str:
+        """Read a file."""
+        return path
+
+    calls = [
+        {"id": str(i), "name": "read_file", "args": {"path": f"{i}.py"}}
+        for i in range(2)
+    ]
+    agent = _FakeAgentGraph(
+        "MainAgent", [_reply(tool_calls=calls), _reply("done")], tools=[read_file]
+    )
+    await agent.compiled_graph.ainvoke(
+        {"messages": [HumanMessage(content="hello")]},
+        {"configurable": {"thread_id": "thread-1"}},
+    )
+
+    events = telemetry.events(kind="tool")
+    assert [event.retries for event in events] == [0, 0]
+    assert telemetry.summary().retries == 0
+
+
+def test_price_matches_longest_prefix() -> None:
+    telemetry = Telemetry(
+        prices={
+            "gemini": ModelPrice(input=1, output=1),
+            "gemini-2.5-pro": ModelPrice(input=2, output=2),
+        }
+    )
+    assert telemetry.price("google_genai:gemini-2.5-pro").input == 2
+    assert telemetry.price("models/gemini-2.0-flash").input == 1
+    assert telemetry.price("gpt-4o") is None
+
+
+@pytest.mark.asyncio
+async def test_jsonl_export(tmp_path) -> None:
+    path = tmp_path / "telemetry" / "events.jsonl"
+    telemetry = Telemetry()
+    telemetry.exporters.append(JsonlTelemetryExporter(path))
+    llm = GenericFakeChatModel(messages=iter([_reply("a"), _reply("b")]))
+
+    for _ in range(2):
+        await llm.ainvoke("hello", {"callbacks": [telemetry.handler]})
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["kind"] for line in lines] == ["model", "model"]
+    assert lines[0]["name"] == "gemini-2.5-flash-preview-05-20"
+    assert lines[0]["output_tokens"] == 10
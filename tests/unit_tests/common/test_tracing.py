@@ -0,0 +1,177 @@
+import json
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import tool
+from langgraph.graph import START, StateGraph
+from langgraph.prebuilt import InjectedStore, ToolNode, tools_condition
+from langgraph.store.base import BaseStore
+from langgraph.store.memory import InMemoryStore
+from typing_extensions import Annotated
+
+import common.components.tracing
+from common.components.tracing import (
+    GITHUB_TAG,
+    ChromeTraceExporter,
+    TracingConfiguration,
+    get_tracer,
+)
+from common.configuration import AgentConfiguration
+from common.graph import AgentGraph
+from common.state import AgentState
+
+
+@tool
+async def remember(content: str, store: Annotated[BaseStore, InjectedStore()]) -> str:
+    """Store a memory."""
+    await store.aput(("memories",), "key", {"content": content})
+    with get_tracer().span("post_process", size=len(content)):
+        pass
+    return "stored"
+
+
+@tool
+def get_pull_request(pr_number: int) -> str:
+    """Get a pull request."""
+    return f"PR {pr_number}"
+
+
+get_pull_request.tags = [GITHUB_TAG]
+
+
+class _FakeAgentGraph(AgentGraph):
+    def __init__(self, tracing: TracingConfiguration, name: str = "TracedAgent"):
+        super().__init__(
+            name=name,
+            agent_config=AgentConfiguration(tracing=tracing),
+            store=InMemoryStore(),
+        )
+        self._llm = GenericFakeChatModel(
+            messages=iter(
+                [
+                    AIMessage(
+                        content="",
+                        tool_calls=[
+                            {"id": "1", "name": "remember", "args": {"content": "x"}},
+                            {
+                                "id": "2",
+                                "name": "get_pull_request",
+                                "args": {"pr_number": 1},
+                            },
+                        ],
+                    ),
+                    AIMessage(content="done"),
+                ]
+            )
+        )
+
+    def create_builder(self) -> StateGraph:
+        async def call_model(state: AgentState) -> dict:
+            return {"messages": [await self._llm.ainvoke(state.messages)]}
+
+        builder = StateGraph(AgentState)
+        builder.add_node(call_model)
+        builder.add_node("tools", ToolNode([remember, get_pull_request]))
+        builder.add_edge(START, "call_model")
+        builder.add_conditional_edges("call_model", tools_condition)
+        builder.add_edge("tools", "call_model")
+        return builder
+
+
+@pytest.fixture(autouse=True)
+def _reset_tracer(monkeypatch):
+    monkeypatch.setattr(common.components.tracing, "_TRACER", None)
+
+
+async def _run(tracing: TracingConfiguration):
+    await _invoke(_FakeAgentGraph(tracing))
+
+
+async def _invoke(agent: AgentGraph):
+    await agent.compiled_graph.ainvoke(
+        {"messages": [HumanMessage(content="hello")]},
+        {"configurable": {"thread_id": "thread-1"}},
+    )
+
+
+@pytest.mark.asyncio
+async def test_spans_form_a_tree(tmp_path) -> None:
+    path = tmp_path / "spans.jsonl"
+    await _run(TracingConfiguration(use_tracing=True, path=str(path)))
+
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    by_name = {span["name"]: span for span in spans}
+    assert len({span["trace_id"] for span in spans}) == 1
+
+    root = by_name["TracedAgent"]
+    assert root["kind"] == "agent" and root["parent_id"] is None
+    assert root["attributes"]["thread_id"] == "thread-1"
+
+    kinds = {span["name"]: span["kind"] for span in spans}
+    assert kinds["call_model"] == "node"
+    assert kinds["tools"] == "node"
+    assert kinds["remember"] == "tool"
+    assert kinds["get_pull_request"] == "github"
+    assert kinds["store.put"] == "store"
+    assert [s["kind"] for s in spans].count("llm") == 2
+
+    # store and manual spans are parented to the tool they were made in
+    assert by_name["store.put"]["parent_id"] == by_name["remember"]["span_id"]
+    assert by_name["post_process"]["parent_id"] == by_name["remember"]["span_id"]
+    assert by_name["post_process"]["attributes"]["size"] == 1
+    assert by_name["remember"]["parent_id"] == by_name["tools"]["span_id"]
+    assert by_name["tools"]["parent_id"] == root["span_id"]
+    assert all(span["attributes"]["agent"] == "TracedAgent" for span in spans)
+
+
+@pytest.mark.asyncio
+async def test_unsampled_traces_are_not_exported(tmp_path) -> None:
+    path = tmp_path / "spans.jsonl"
+    await _run(TracingConfiguration(use_tracing=True, path=str(path), sample_rate=0))
+    assert not path.exists() or not path.read_text()
+
+
+@pytest.mark.asyncio
+async def test_traces_are_sampled_at_the_rate_of_their_agent(tmp_path) -> None:
+    path = tmp_path / "spans.jsonl"
+    sampled = _FakeAgentGraph(TracingConfiguration(use_tracing=True, path=str(path)))
+    unsampled = _FakeAgentGraph(
+        TracingConfiguration(use_tracing=True, path=str(path), sample_rate=0),
+        name="UnsampledAgent",
+    )
+
+    await _invoke(unsampled)
+    assert not path.exists() or not path.read_text()
+    await _invoke(sampled)
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert {span["attributes"]["agent"] for span in spans} == {"TracedAgent"}
+
+
+def test_default_path_depends_on_the_exporter() -> None:
+    assert TracingConfiguration().path == "traces/spans.jsonl"
+    assert TracingConfiguration(exporter="chrome").path == "traces/trace.json"
+
+
+@pytest.mark.asyncio
+async def test_chrome_trace_export(tmp_path) -> None:
+    path = tmp_path / "trace.json"
+    await _run(
+        TracingConfiguration(use_tracing=True, exporter="chrome", path=str(path))
+    )
+    assert isinstance(get_tracer().exporters[0], ChromeTraceExporter)
+
+    # the closing bracket is optional in the Chrome trace format
+    events = json.loads(path.read_text().rstrip().rstrip(",") + "]")
+    complete = [e for e in events if e["ph"] == "X"]
+    assert {"TracedAgent", "call_model", "tools", "store.put"} <= {
+        e["name"] for e in complete
+    }
+    assert all(e["dur"] >= 0 and e["tid"] == 1 for e in complete)
+    assert events[0] == {
+        "name": "thread_name",
+        "ph": "M",
+        "pid": complete[0]["pid"],
+        "tid": 1,
+        "args": {"name": "TracedAgent"},
+    }
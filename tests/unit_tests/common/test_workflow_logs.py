@@ -0,0 +1,103 @@
+import io
+import zipfile
+
+from common.components.workflow_logs import (
+    WorkflowLogConfiguration,
+    error_windows,
+    failure_report,
+)
+
+RUN = {"id": 1, "name": "CI", "head_sha": "0123456789", "conclusion": "failure"}
+
+
+def _archive(files: dict[str, str]) -> io.BytesIO:
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as logs:
+        for name, content in files.items():
+            logs.writestr(name, content)
+    archive.seek(0)
+    return archive
+
+
+def test_error_windows_are_merged_and_bounded() -> None:
+    config = WorkflowLogConfiguration(context_lines=1, tail_lines=2, max_windows=2)
+    lines = ["ok"] * 10
+    lines[2] = lines[3] = "error: one"
+    lines[6] = "error: two"
+    lines[8] = "error: three"
+
+    windows, tail = error_windows(lines, config)
+
+    assert [[number for number, _ in window] for window in windows] == [
+        [2, 3, 4, 5],
+        [6, 7, 8],
+    ]
+    assert tail == [(9, "error: three"), (10, "ok")]
+
+
+def test_report_keeps_the_failed_steps() -> None:
+    passing = "\n".join(f"2024-01-01T00:00:00.0000000Z line {i}" for i in range(10_000))
+    failing = "\n".join(
+        ["collecting"] * 100
+        + ["def test_add():", ">   assert add(1, 1) == 3", "E   AssertionError"]
+        + ["more"] * 100
+        + ["1 failed, 41 passed"]
+    )
+    archive = _archive(
+        {
+            "0_lint.txt": passing,
+            "1_test.txt": passing + failing,
+            "lint/1_Run ruff.txt": passing,
+            "test/1_Set up job.txt": passing,
+            "test/3_Run tests.txt": failing,
+        }
+    )
+    jobs = [
+        {"name": "lint", "conclusion": "success", "steps": []},
+        {
+            "name": "test",
+            "conclusion": "failure",
+            "steps": [
+                {"number": 1, "name": "Set up job", "conclusion": "success"},
+                {"number": 3, "name": "Run tests", "conclusion": "failure"},
+            ],
+        },
+    ]
+
+    report = failure_report(
+        archive, RUN, jobs, WorkflowLogConfiguration(context_lines=2, tail_lines=1)
+    )
+
+    assert report == "\n".join(
+        [
+            "Workflow run `CI` on 0123456: failure",
+            "",
+            "Job `test` failed.",
+            "  Step 3 `Run tests` failed:",
+            "    ...",
+            "      100 | collecting",
+            "      101 | def test_add():",
+            "      102 | >   assert add(1, 1) == 3",
+            "      103 | E   AssertionError",
+            "      104 | more",
+            "      105 | more",
+            # the summary of the test run is an error window too
+            "    ...",
+            "      202 | more",
+            "      203 | more",
+            "      204 | 1 failed, 41 passed",
+        ]
+    )
+
+
+def test_report_falls_back_to_the_job_log() -> None:
+    archive = _archive({"0_build.txt": "##[error]Process completed with exit code 1."})
+    jobs = [{"name": "build", "conclusion": "failure", "steps": []}]
+
+    report = failure_report(archive, RUN, jobs)
+
+    assert "Job log failed:" in report
+    assert "1 | ##[error]Process completed with exit code 1." in report
+    assert failure_report(None, {**RUN, "conclusion": "success"}, []).endswith(
+        "No job failed."
+    )